@@ -4,9 +4,12 @@ Provides API endpoints for query processing
 """
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
+import asyncio
 import logging
 import json
 from datetime import datetime
@@ -25,6 +28,7 @@ logger = logging.getLogger(__name__)
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.config import config
+from src.query_features import query_features
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -47,6 +51,31 @@ app.add_middleware(
 # Initialize NLP processor
 nlp_processor = NLPProcessor()
 
+# Import RAG system once; the engine itself is loaded at startup
+try:
+    import rag.current as rag_service
+except Exception as e:
+    logger.error(f"RAG system could not be imported: {e}")
+    rag_service = None
+
+@app.on_event("startup")
+async def load_rag_engine():
+    """Load the embedder and FAISS index once so queries reuse them"""
+    if rag_service is None:
+        return
+    try:
+        rag_service.get_rag_engine().load()
+        logger.info("RAG engine loaded")
+    except Exception as e:
+        logger.error(f"RAG engine failed to load at startup: {e}")
+
+@app.on_event("shutdown")
+async def save_rag_query_cache():
+    """Persist the query cache (when RAG_QUERY_CACHE_PATH is set) for the next start and stop the LLM client"""
+    if rag_service is not None:
+        rag_service.get_rag_engine().query_cache.save()
+        rag_service.get_llm_client().close()
+
 # Pydantic models for request/response
 class SimpleQueryRequest(BaseModel):
     query: str = Field(..., description="User query to process (any language)")
@@ -390,160 +419,9 @@ async def process_query_async(request: QueryRequest, background_tasks: Backgroun
         logger.error(f"Error submitting background task: {e}")
         raise HTTPException(status_code=500, detail=f"Background processing error: {str(e)}")
 
-@app.post("/query-rag")
-async def process_query_with_rag(request: SimpleQueryRequest):
-    """
-    Enhanced endpoint that uses RAG system for better responses
-    
-    This endpoint:
-    1. Processes the query through NLP pipeline
-    2. Uses RAG system to find relevant information from agricultural data and weather
-    3. Returns comprehensive answers with confidence scores
-    """
-    try:
-        # Log the received query for debugging
-        logger.info(f"RAG Query received: {request.query}")
-        
-        # Extract location from context if available
-        location = None
-        if request.context and 'location' in request.context:
-            location = request.context['location']
-        
-        # Import RAG system
-        import sys
-        import os
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-        
-        from rag.current import process_rag_query, get_rag_status, add_weather_data_to_existing_index
-        
-        # Check if this is a weather-related query before fetching weather data
-        weather_data = None
-        
-        # First, determine if this is actually a weather-related query
-        is_weather_query = (
-            location and (  # Only proceed if location is provided
-                any(weather_word in request.query.lower() for weather_word in [
-                    'weather', 'temperature', 'rain', 'humidity', 'wind', 'climate', 'forecast',
-                    'hot', 'cold', 'sunny', 'cloudy', 'storm', 'precipitation', 'moisture'
-                ]) or
-                any(agri_word in request.query.lower() for agri_word in [
-                    'crop', 'farm', 'agriculture', 'plant', 'seed', 'harvest', 'grow',
-                    'soil', 'irrigation', 'cultivation', 'yield', 'suitable', 'productivity',
-                    'farming', 'agricultural', 'production', 'improve', 'increase', 'better',
-                    'tips', 'advice', 'techniques', 'methods', 'strategies'
-                ])
-            )
-        )
-        
-        # Check if this is an agricultural query that needs special handling (even without location)
-        is_agricultural_query = any(agri_word in request.query.lower() for agri_word in [
-            'crop', 'farm', 'agriculture', 'plant', 'seed', 'harvest', 'grow',
-            'soil', 'irrigation', 'cultivation', 'yield', 'suitable', 'productivity',
-            'farming', 'agricultural', 'production', 'improve', 'increase', 'better',
-            'tips', 'advice', 'techniques', 'methods', 'strategies'
-        ])
-        
-        if is_weather_query:
-            try:
-                from src.weather_service import WeatherService
-                weather_service = WeatherService()
-                # Use timeline-based weather fetching for all queries
-                weather_data = weather_service.get_weather_with_timeline(location, request.query)
-                
-                # Check if we should bypass RAG for maximum speed
-                timeline_info = weather_data.get('timeline_info', {})
-                processing_mode = timeline_info.get('mode', '')
-                requested_days = timeline_info.get('requested_days', 0)
-                
-                # Check if this is a crop-specific query that should use RAG
-                query_lower = request.query.lower()
-                is_crop_specific_query = any(crop in query_lower for crop in [
-                    'wheat', 'rice', 'corn', 'tomato', 'potato', 'onion', 'cotton', 'sugarcane',
-                    'maize', 'barley', 'oats', 'pulses', 'legumes', 'vegetables', 'fruits'
-                ]) and any(word in query_lower for word in [
-                    'when', 'suitable', 'grow', 'plant', 'cultivate', 'harvest', 'season',
-                    'timing', 'conditions', 'requirements', 'best time', 'optimal'
-                ])
-                
-                # ALL queries now go through RAG system - no bypassing
-                print(f"🔄 All queries routed to RAG system for comprehensive responses")
-                
-                # No direct response generation - all queries go to RAG
-                print(f"📚 Query '{request.query}' will be processed by RAG system")
-                
-                # Helper function to generate weather range information for RAG enhancement
-                def generate_weather_range_info(location, weather_data, timeline_info):
-                    """Generate weather range information for the detected timeline period"""
-                    try:
-                        timeline_desc = timeline_info.get('description', '120 days')
-                        requested_days = timeline_info.get('requested_days', 120)
-                        
-                        if 'daily' in weather_data and weather_data['daily']:
-                            daily_data = weather_data['daily']
-                            if len(daily_data) > 0:
-                                # Calculate ranges from daily data
-                                temps = [day.get('temp', day.get('temp_c', 0)) for day in daily_data if day.get('temp') or day.get('temp_c')]
-                                humidities = [day.get('humidity', 0) for day in daily_data if day.get('humidity')]
-                                moistures = [day.get('moisture', 0) for day in daily_data if day.get('moisture')]
-                                rainfalls = [day.get('precip_mm', day.get('precip', day.get('rainfall', 0))) for day in daily_data if day.get('precip_mm') or day.get('precip') or day.get('rainfall')]
-                                
-                                if temps:
-                                    temp_range = f"Temperature ranging from {min(temps):.1f}°C to {max(temps):.1f}°C"
-                                else:
-                                    temp_range = f"Temperature: {weather_data.get('temperature', 'N/A')}°C"
-                                    
-                                if humidities:
-                                    humidity_range = f"Humidity ranging from {min(humidities):.1f}% to {max(humidities):.1f}%"
-                                else:
-                                    humidity_range = f"Humidity: {weather_data.get('humidity', 'N/A')}%"
-                                    
-                                if moistures:
-                                    moisture_range = f"Moisture ranging from {min(moistures):.1f}% to {max(moistures):.1f}%"
-                                else:
-                                    moisture_range = f"Moisture: {weather_data.get('moisture', 'N/A')}%"
-                                    
-                                if rainfalls:
-                                    rainfall_range = f"Rainfall ranging from {min(rainfalls):.1f}mm to {max(rainfalls):.1f}mm"
-                                else:
-                                    rainfall_range = f"Rainfall: {weather_data.get('precipitation', 'N/A')}mm"
-                                
-                                return f"**Weather for {location} for {timeline_desc}:**\n{temp_range}, {humidity_range}, {moisture_range}, {rainfall_range}\n\n"
-                        
-                        # Fallback to current values
-                        return f"**Weather for {location} for {timeline_desc}:**\nTemperature: {weather_data.get('temperature', 'N/A')}°C, Humidity: {weather_data.get('humidity', 'N/A')}%, Moisture: {weather_data.get('moisture', 'N/A')}%, Rainfall: {weather_data.get('precipitation', 'N/A')}mm\n\n"
-                    except Exception as e:
-                        # Fallback to current weather if range calculation fails
-                        timeline_desc = timeline_info.get('description', '120 days')
-                        return f"**Weather for {location} for {timeline_desc}:**\nTemperature: {weather_data.get('temperature', 'N/A')}°C, Humidity: {weather_data.get('humidity', 'N/A')}%, Moisture: {weather_data.get('moisture', 'N/A')}%, Rainfall: {weather_data.get('precipitation', 'N/A')}mm\n\n"
-                
-                print(f"✅ Timeline-based weather data fetched for {location}: {weather_data.get('temperature', 'N/A')}°C, {weather_data.get('humidity', 'N/A')}% humidity, {weather_data.get('moisture', 'N/A')}% moisture, {weather_data.get('wind_speed', 'N/A')} m/s wind")
-                
-                # Log timeline information
-                if 'timeline_info' in weather_data:
-                    timeline = weather_data['timeline_info']
-                    print(f"📅 Timeline: {timeline.get('description', 'N/A')} ({timeline.get('data_points', 'N/A')} days)")
-                else:
-                    print(f"📅 Timeline: Default 120 days")
-                    
-            except Exception as e:
-                print(f"⚠️ Could not fetch weather data: {e}")
-                weather_data = {"error": f"Weather fetch failed: {str(e)}"}
-        elif is_agricultural_query and not location:
-            # Handle agricultural queries without location - provide general advice
-            print(f"🌾 Agricultural query detected without location - providing general farming advice")
-            
-            # Analyze the query to determine response type
-            query_lower = request.query.lower()
-            
-            # Check for yield improvement queries
-            is_yield_improvement = any(phrase in query_lower for phrase in [
-                'increase yield', 'improve yield', 'better yield', 'higher yield', 'maximize yield',
-                'crop yield', 'farming tips', 'agricultural advice', 'farming techniques',
-                'how to farm', 'farming methods', 'crop production', 'agricultural productivity'
-            ])
-            
-            if is_yield_improvement:
-                direct_response = """**🌾 General Yield Improvement Strategies (No Location Specified):**
+# ==== RAG query helpers ====
+# Answer for yield-improvement questions asked without a location
+YIELD_IMPROVEMENT_ADVICE = """**🌾 General Yield Improvement Strategies (No Location Specified):**
 
 **Soil Management:**
 • **Soil Testing:** Regular soil testing for pH, NPK levels, and organic matter
@@ -588,7 +466,148 @@ async def process_query_with_rag(request: SimpleQueryRequest):
 • **Risk Management:** Diversify crops and use insurance to manage climate risks
 
 **📍 To get location-specific advice:** Please provide your location (city, state, or region) for personalized recommendations based on your local weather, soil, and climate conditions."""
+
+def generate_weather_range_info(location: str, weather_data: Dict[str, Any], timeline_info: Dict[str, Any]) -> str:
+    """Generate weather range information for the detected timeline period"""
+    try:
+        timeline_desc = timeline_info.get('description', '120 days')
+        requested_days = timeline_info.get('requested_days', 120)
+        
+        if 'daily' in weather_data and weather_data['daily']:
+            daily_data = weather_data['daily']
+            if len(daily_data) > 0:
+                # Calculate ranges from daily data
+                temps = [day.get('temp', day.get('temp_c', 0)) for day in daily_data if day.get('temp') or day.get('temp_c')]
+                humidities = [day.get('humidity', 0) for day in daily_data if day.get('humidity')]
+                moistures = [day.get('moisture', 0) for day in daily_data if day.get('moisture')]
+                rainfalls = [day.get('precip_mm', day.get('precip', day.get('rainfall', 0))) for day in daily_data if day.get('precip_mm') or day.get('precip') or day.get('rainfall')]
+                
+                if temps:
+                    temp_range = f"Temperature ranging from {min(temps):.1f}°C to {max(temps):.1f}°C"
+                else:
+                    temp_range = f"Temperature: {weather_data.get('temperature', 'N/A')}°C"
+                    
+                if humidities:
+                    humidity_range = f"Humidity ranging from {min(humidities):.1f}% to {max(humidities):.1f}%"
+                else:
+                    humidity_range = f"Humidity: {weather_data.get('humidity', 'N/A')}%"
+                    
+                if moistures:
+                    moisture_range = f"Moisture ranging from {min(moistures):.1f}% to {max(moistures):.1f}%"
+                else:
+                    moisture_range = f"Moisture: {weather_data.get('moisture', 'N/A')}%"
+                    
+                if rainfalls:
+                    rainfall_range = f"Rainfall ranging from {min(rainfalls):.1f}mm to {max(rainfalls):.1f}mm"
+                else:
+                    rainfall_range = f"Rainfall: {weather_data.get('precipitation', 'N/A')}mm"
                 
+                return f"**Weather for {location} for {timeline_desc}:**\n{temp_range}, {humidity_range}, {moisture_range}, {rainfall_range}\n\n"
+        
+        # Fallback to current values
+        return f"**Weather for {location} for {timeline_desc}:**\nTemperature: {weather_data.get('temperature', 'N/A')}°C, Humidity: {weather_data.get('humidity', 'N/A')}%, Moisture: {weather_data.get('moisture', 'N/A')}%, Rainfall: {weather_data.get('precipitation', 'N/A')}mm\n\n"
+    except Exception as e:
+        # Fallback to current weather if range calculation fails
+        timeline_desc = timeline_info.get('description', '120 days')
+        return f"**Weather for {location} for {timeline_desc}:**\nTemperature: {weather_data.get('temperature', 'N/A')}°C, Humidity: {weather_data.get('humidity', 'N/A')}%, Moisture: {weather_data.get('moisture', 'N/A')}%, Rainfall: {weather_data.get('precipitation', 'N/A')}mm\n\n"
+
+def fetch_query_weather(query: str, location: Optional[str], features) -> Optional[Dict[str, Any]]:
+    """
+    Fetch timeline-based weather for a RAG query about weather or farming at a location
+
+    Args:
+        query: User query
+        location: Location from the request context
+        features: query_features() of the query
+
+    Returns:
+        Weather data, {"error": ...} if the fetch failed, or None when the query needs no weather
+    """
+    # Only proceed if location is provided and the query is about weather or agriculture
+    if not (location and (features.has("api_weather") or features.has("api_agricultural"))):
+        return None
+    try:
+        from src.weather_service import WeatherService
+        weather_service = WeatherService()
+        # Use timeline-based weather fetching for all queries
+        weather_data = weather_service.get_weather_with_timeline(location, query)
+        
+        # ALL queries now go through RAG system - no bypassing
+        print(f"🔄 All queries routed to RAG system for comprehensive responses")
+        print(f"📚 Query '{query}' will be processed by RAG system")
+        print(f"✅ Timeline-based weather data fetched for {location}: {weather_data.get('temperature', 'N/A')}°C, {weather_data.get('humidity', 'N/A')}% humidity, {weather_data.get('moisture', 'N/A')}% moisture, {weather_data.get('wind_speed', 'N/A')} m/s wind")
+        
+        # Log timeline information
+        if 'timeline_info' in weather_data:
+            timeline = weather_data['timeline_info']
+            print(f"📅 Timeline: {timeline.get('description', 'N/A')} ({timeline.get('data_points', 'N/A')} days)")
+        else:
+            print(f"📅 Timeline: Default 120 days")
+        return weather_data
+    except Exception as e:
+        print(f"⚠️ Could not fetch weather data: {e}")
+        return {"error": f"Weather fetch failed: {str(e)}"}
+
+def weather_summary(location: Optional[str], weather_data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Weather range header for a location, or None without usable weather data"""
+    if not location or not weather_data or weather_data.get('error'):
+        return None
+    return generate_weather_range_info(location, weather_data, weather_data.get('timeline_info', {}))
+
+def rag_answer_response(rag_result: Dict[str, Any], location: Optional[str]) -> Dict[str, Any]:
+    """Clean /query-rag response body without debugging info"""
+    return {
+        "answer": rag_result.get('answer', 'No answer generated'),
+        "source": rag_result.get('source', 'RAG System'),
+        "confidence": rag_result.get('confidence', 0.0),
+        "error": False,
+        "processing_mode": "RAG Enhanced",
+        # Remove debugging fields - only include essential info
+        "language": rag_result.get('detected_language', 'Unknown'),
+        "location": location
+    }
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/query-rag")
+async def process_query_with_rag(request: SimpleQueryRequest):
+    """
+    Enhanced endpoint that uses RAG system for better responses
+    
+    This endpoint:
+    1. Processes the query through NLP pipeline
+    2. Uses RAG system to find relevant information from agricultural data and weather
+    3. Returns comprehensive answers with confidence scores
+    """
+    try:
+        # Log the received query for debugging
+        logger.info(f"RAG Query received: {request.query}")
+        
+        # Extract location from context if available
+        location = None
+        if request.context and 'location' in request.context:
+            location = request.context['location']
+        
+        if rag_service is None:
+            raise RuntimeError("RAG system is not available")
+        
+        # Scan the query once for every routing keyword list
+        features = query_features(request.query)
+        
+        # Check if this is an agricultural query that needs special handling (even without location)
+        is_agricultural_query = features.has("api_agricultural")
+        
+        # Weather is only fetched for weather-related or agricultural queries with a location
+        weather_data = await run_in_threadpool(fetch_query_weather, request.query, location, features)
+        
+        if weather_data is None and is_agricultural_query and not location:
+            # Handle agricultural queries without location - provide general advice
+            print(f"🌾 Agricultural query detected without location - providing general farming advice")
+            
+            # Check for yield improvement queries
+            if features.has("yield_improvement"):
                 return SimpleQueryResponse(
                     query=request.query,
                     language='English',
@@ -598,18 +617,21 @@ async def process_query_with_rag(request: SimpleQueryRequest):
                     entities={"location": None, "timeline": "general"},
                     weather_data=None,
                     timeline_info=None,
-                    rag_response=direct_response,
+                    rag_response=YIELD_IMPROVEMENT_ADVICE,
                     processing_mode="agricultural_advice_direct"
                 )
         
-        else:
+        elif weather_data is None:
             if location:
                 print(f"🚫 Non-weather query detected - skipping weather data for location: {location}")
             else:
                 print("⚠️ No location provided - weather data unavailable")
         
         # Process query through RAG system with weather data
-        rag_result = process_rag_query(
+        # Retrieval and the LLM call block, so they run in a worker thread and the
+        # event loop keeps serving other requests meanwhile
+        rag_result = await run_in_threadpool(
+            rag_service.process_rag_query,
             query=request.query, 
             location=location,
             weather_data=weather_data  # Always pass weather data (even if error)
@@ -620,29 +642,19 @@ async def process_query_with_rag(request: SimpleQueryRequest):
             raise ValueError("RAG system returned empty or invalid result")
         
         # Add weather range information to RAG responses for agricultural queries
-        if is_agricultural_query and location and weather_data and not weather_data.get('error'):
+        if is_agricultural_query:
             try:
                 # Generate weather range info for RAG responses
-                weather_range_info = generate_weather_range_info(location, weather_data, timeline_info)
-                
-                # Prepend weather info to RAG answer
-                enhanced_answer = f"{weather_range_info}{rag_result.get('answer', '')}"
-                rag_result['answer'] = enhanced_answer
-                print(f"🌾 Enhanced RAG response with weather context for agricultural query")
+                weather_range_info = weather_summary(location, weather_data)
+                if weather_range_info:
+                    # Prepend weather info to RAG answer
+                    rag_result['answer'] = f"{weather_range_info}{rag_result.get('answer', '')}"
+                    print(f"🌾 Enhanced RAG response with weather context for agricultural query")
             except Exception as e:
                 print(f"⚠️ Could not enhance RAG response with weather info: {e}")
         
         # Return clean RAG result without debugging info
-        return {
-            "answer": rag_result.get('answer', 'No answer generated'),
-            "source": rag_result.get('source', 'RAG System'),
-            "confidence": rag_result.get('confidence', 0.0),
-            "error": False,
-            "processing_mode": "RAG Enhanced",
-            # Remove debugging fields - only include essential info
-            "language": rag_result.get('detected_language', 'Unknown'),
-            "location": location
-        }
+        return rag_answer_response(rag_result, location)
         
     except Exception as e:
         logger.error(f"Unexpected error processing RAG query: {e}")
@@ -679,18 +691,86 @@ async def process_query_with_rag(request: SimpleQueryRequest):
                 "processing_mode": "Error"
             }
 
+@app.post("/query-rag/stream")
+async def stream_query_with_rag(request: SimpleQueryRequest):
+    """
+    Streaming variant of /query-rag using Server-Sent Events
+
+    Events, in order:
+    - weather: weather summary for the location, sent as soon as it is fetched
+    - sources: context sources retrieved for the answer
+    - token: answer text as the LLM generates it
+    - done: the same body /query-rag returns (full answer and metadata)
+    - error: sent instead of done when the query fails
+    """
+    logger.info(f"RAG stream query received: {request.query}")
+    location = request.context.get('location') if request.context else None
+
+    async def events():
+        try:
+            if rag_service is None:
+                raise RuntimeError("RAG system is not available")
+            features = query_features(request.query)
+            is_agricultural_query = features.has("api_agricultural")
+            weather_data = await run_in_threadpool(fetch_query_weather, request.query, location, features)
+
+            if weather_data is None and is_agricultural_query and not location and features.has("yield_improvement"):
+                yield sse_event("token", {"text": YIELD_IMPROVEMENT_ADVICE})
+                yield sse_event("done", {"answer": YIELD_IMPROVEMENT_ADVICE, "source": "General Farming Advice",
+                                         "confidence": 0.95, "error": False,
+                                         "processing_mode": "agricultural_advice_direct",
+                                         "language": "English", "location": None})
+                return
+
+            summary = weather_summary(location, weather_data)
+            yield sse_event("weather", {
+                "location": location,
+                "summary": summary,
+                "error": weather_data.get('error') if weather_data else None,
+            })
+
+            # The RAG pipeline runs in a worker thread and reports sources and tokens
+            # through this queue as they become available
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+
+            def on_event(name: str, data: Dict[str, Any]):
+                loop.call_soon_threadsafe(queue.put_nowait, (name, data))
+
+            async def run_query():
+                try:
+                    return await run_in_threadpool(rag_service.process_rag_query, query=request.query,
+                                                   location=location, weather_data=weather_data, on_event=on_event)
+                finally:
+                    queue.put_nowait(None)
+
+            job = asyncio.ensure_future(run_query())
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+            rag_result = await job
+
+            if not rag_result or not rag_result.get('answer'):
+                raise ValueError("RAG system returned empty or invalid result")
+            if is_agricultural_query and summary:
+                rag_result['answer'] = f"{summary}{rag_result.get('answer', '')}"
+            yield sse_event("done", rag_answer_response(rag_result, location))
+        except Exception as e:
+            logger.error(f"Unexpected error streaming RAG query: {e}")
+            yield sse_event("error", {"message": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/rag-status")
 async def get_rag_system_status():
     """Get RAG system status"""
     try:
-        import sys
-        import os
-        rag_path = os.path.join(os.path.dirname(__file__), '..', 'rag')
-        if rag_path not in sys.path:
-            sys.path.append(rag_path)
-        
-        from rag.current import get_rag_status
-        return get_rag_status()
+        if rag_service is None:
+            raise RuntimeError("RAG system is not available")
+        return rag_service.get_rag_status()
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
@@ -698,17 +778,22 @@ async def get_rag_system_status():
 async def refresh_weather_data():
     """Force refresh of weather data in RAG system"""
     try:
-        import sys
-        import os
-        rag_path = os.path.join(os.path.dirname(__file__), '..', 'rag')
-        if rag_path not in sys.path:
-            sys.path.append(rag_path)
-        
-        from rag.current import refresh_weather_data
-        return refresh_weather_data()
+        if rag_service is None:
+            raise RuntimeError("RAG system is not available")
+        return rag_service.refresh_weather_data()
     except Exception as e:
         return {"status": "error", "message": f"Error refreshing weather data: {str(e)}"}
 
+@app.post("/rollback-index")
+async def rollback_index():
+    """Serve the previous RAG index generation again"""
+    try:
+        if rag_service is None:
+            raise RuntimeError("RAG system is not available")
+        return rag_service.rollback_index_generation()
+    except Exception as e:
+        return {"status": "error", "message": f"Error rolling back index: {str(e)}"}
+
 @app.post("/query-ui")
 async def process_query_for_ui(request: SimpleQueryRequest):
     """
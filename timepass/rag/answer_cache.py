@@ -0,0 +1,150 @@
+"""
+Answer cache for the RAG LLM step
+Answers are reused when the exact prompt was seen before, or when a query
+embedding is close enough to an earlier one asked for the same location,
+prompt type and weather band, so repeated questions skip the LLM call.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Weather snapshot bands; answers are only shared within the same bands
+TEMPERATURE_BAND = 2.0  # °C
+HUMIDITY_BAND = 10.0  # %
+MOISTURE_BAND = 10.0  # %
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(str(prompt).encode("utf-8")).hexdigest()
+
+
+def _band(value: Any, width: float) -> Optional[int]:
+    try:
+        return int(float(value) // width)
+    except (TypeError, ValueError):
+        return None
+
+
+def weather_bucket(weather_data: Optional[Dict[str, Any]]) -> Tuple:
+    """Quantized (temperature, humidity, moisture) snapshot, () without usable weather data"""
+    if not weather_data or 'error' in weather_data:
+        return ()
+    return (_band(weather_data.get('temperature'), TEMPERATURE_BAND),
+            _band(weather_data.get('humidity'), HUMIDITY_BAND),
+            _band(weather_data.get('moisture'), MOISTURE_BAND))
+
+
+def answer_partition(location: Optional[str], weather_data: Optional[Dict[str, Any]], prompt_name: str) -> Tuple:
+    """Answers are only matched semantically within one partition"""
+    return (str(location or "").strip().lower(), prompt_name, weather_bucket(weather_data))
+
+
+class AnswerCache:
+    """Bounded, expiring LRU of prompt hash -> LLM answer with nearest-neighbour lookup by query embedding"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, similarity: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.version = None
+        # prompt hash -> (partition, query vector, answer, created)
+        self._entries: "OrderedDict[str, Tuple[Tuple, Optional[np.ndarray], str, float]]" = OrderedDict()
+        self._partitions: Dict[Tuple, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def set_version(self, version: str):
+        """Drop cached answers when the index they were generated from changes"""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def _remove(self, key: str):
+        partition = self._entries.pop(key)[0]
+        keys = self._partitions.get(partition, {})
+        keys.pop(key, None)
+        if not keys:
+            self._partitions.pop(partition, None)
+
+    def _live(self, key: str, now: float) -> bool:
+        if now - self._entries[key][3] <= self.ttl:
+            return True
+        self._remove(key)
+        self.stats["expired"] += 1
+        return False
+
+    def get(self, key: str, partition: Tuple, vector: Optional[np.ndarray] = None) -> Optional[Tuple[str, str]]:
+        """
+        Look up an answer by exact prompt hash, then by query embedding
+
+        Args:
+            key: prompt_hash() of the final prompt
+            partition: answer_partition() of the request
+            vector: Normalized query embedding for the nearest-neighbour match
+
+        Returns:
+            (answer, "exact" | "semantic"), or None on a miss
+        """
+        if self.max_size <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            if key in self._entries and self._live(key, now):
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return self._entries[key][2], "exact"
+
+            if vector is not None and self.similarity > 0:
+                candidates = [k for k in self._partitions.get(partition, {})
+                              if self._entries[k][1] is not None]
+                candidates = [k for k in candidates if self._live(k, now)]
+                if candidates:
+                    matrix = np.vstack([self._entries[k][1] for k in candidates])
+                    scores = matrix @ np.asarray(vector, dtype=np.float32)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        self._entries.move_to_end(candidates[best])
+                        self.stats["semantic_hits"] += 1
+                        return self._entries[candidates[best]][2], "semantic"
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, partition: Tuple, vector: Optional[np.ndarray], answer: str):
+        if self.max_size <= 0:
+            return
+        vector = None if vector is None else np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (partition, vector, answer, time.time())
+            self._partitions.setdefault(partition, {})[key] = None
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["answers_cached"] = len(self._entries)
+        stats["hit_ratio"] = round(self.hit_ratio(), 4)
+        return stats
+
+    def _clear(self):
+        self._entries.clear()
+        self._partitions.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
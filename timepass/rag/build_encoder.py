@@ -0,0 +1,58 @@
+"""
+Index build encoder in its own process
+Builds embed every chunk with the whole build thread budget. torch's thread
+count is process-wide, so raising it in the serving process would make query
+encodes compete with the build for every core; the build encoder instead loads
+the model in a child process that has its own thread settings.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+
+_embedder = None
+
+
+def _load(loader: Callable[[], Any]):
+    global _embedder
+    _embedder = loader()
+
+
+def _encode(sentences, kwargs) -> np.ndarray:
+    return _embedder.encode(sentences, **kwargs)
+
+
+def _dimension() -> int:
+    return _embedder.get_sentence_embedding_dimension()
+
+
+class ProcessEncoder:
+    """SentenceTransformer-style encode() served by an embedder loaded in a child process"""
+
+    def __init__(self, loader: Callable[[], Any]):
+        """
+        Args:
+            loader: Picklable callable run once in the child to load the embedder,
+                e.g. functools.partial(load_embedder, model_name, threads=8)
+        """
+        # Spawned, not forked: the parent has OpenMP and torch thread pools running
+        self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_load, initargs=(loader,))
+
+    def __enter__(self) -> "ProcessEncoder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._pool.submit(_dimension).result()
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        texts = sentences if isinstance(sentences, str) else list(sentences)
+        return self._pool.submit(_encode, texts, kwargs).result()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
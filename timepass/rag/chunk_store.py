@@ -0,0 +1,225 @@
+"""
+Columnar, memory-mapped chunk store for the RAG index
+Chunk text is kept as one UTF-8 blob plus an offsets array, and source files
+as a small name table plus one id per chunk, so hits resolve by integer id
+without loading the corpus into a DataFrame.
+"""
+
+import json
+import mmap
+import os
+import shutil
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+TEXT_FILE = "text.bin"
+OFFSETS_FILE = "offsets.npy"
+SOURCE_IDS_FILE = "source_ids.npy"
+SOURCES_FILE = "sources.json"
+
+
+class ChunkStore:
+    """Read-only view over a chunk store directory, backed by mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._source_ids = np.load(os.path.join(path, SOURCE_IDS_FILE), mmap_mode="r")
+        with open(os.path.join(path, SOURCES_FILE), encoding="utf-8") as f:
+            self.sources: List[str] = json.load(f)
+
+        self._text = b""
+        self._text_file = None
+        if int(self._offsets[-1]) > 0:
+            self._text_file = open(os.path.join(path, TEXT_FILE), "rb")
+            self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return all(os.path.exists(os.path.join(path, name))
+                   for name in [TEXT_FILE, OFFSETS_FILE, SOURCE_IDS_FILE, SOURCES_FILE])
+
+    @classmethod
+    def write(cls, path: str, texts: Iterable[str], sources: Iterable[str]) -> "ChunkStore":
+        """
+        Write chunks to a store directory and open it
+
+        Args:
+            path: Store directory (created if missing)
+            texts: Chunk texts
+            sources: Source file name for each chunk
+        """
+        with ChunkStoreWriter(path) as writer:
+            writer.add(texts, sources)
+        return cls(path)
+
+    @classmethod
+    def append(cls, base: str, path: str, texts: List[str], sources: List[str]) -> "ChunkStore":
+        """
+        Write a new store holding the chunks of an existing one followed by new chunks, and open it
+
+        The existing store is only read (its text is copied in bulk), so readers that
+        have it open are unaffected; the new chunks get the next ids.
+
+        Args:
+            base: Existing store directory
+            path: Directory of the new store, which must not be base
+        """
+        if os.path.abspath(base) == os.path.abspath(path):
+            raise ValueError("A chunk store cannot be appended to in place")
+        store = cls(base)
+        try:
+            with ChunkStoreWriter(path) as writer:
+                writer.add_store(store)
+                writer.add(texts, sources)
+        finally:
+            store.close()
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def text(self, chunk_id: int) -> str:
+        start, end = int(self._offsets[chunk_id]), int(self._offsets[chunk_id + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def source(self, chunk_id: int) -> str:
+        return self.sources[int(self._source_ids[chunk_id])]
+
+    def get(self, chunk_id: int) -> Tuple[str, str]:
+        return self.text(chunk_id), self.source(chunk_id)
+
+    def ids_with_source_prefix(self, prefix: str) -> np.ndarray:
+        """Ids of all chunks whose source file name starts with prefix"""
+        table_ids = [i for i, name in enumerate(self.sources) if name.startswith(prefix)]
+        return np.nonzero(np.isin(self._source_ids, table_ids))[0].astype(np.int64)
+
+    def texts(self) -> Iterator[str]:
+        for chunk_id in range(len(self)):
+            yield self.text(chunk_id)
+
+    def source_names(self) -> Iterator[str]:
+        for source_id in self._source_ids:
+            yield self.sources[int(source_id)]
+
+    def close(self):
+        if self._text_file is not None:
+            self._text.close()
+            self._text_file.close()
+            self._text_file = None
+
+
+class SegmentedChunkStore:
+    """A base chunk store followed by a delta store whose chunk ids start at len(base)"""
+
+    def __init__(self, base: ChunkStore, delta: ChunkStore):
+        self.base = base
+        self.delta = delta
+        self.path = base.path
+        self.sources: List[str] = base.sources + [name for name in delta.sources if name not in set(base.sources)]
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    def _segment(self, chunk_id: int) -> Tuple[ChunkStore, int]:
+        chunk_id = int(chunk_id)
+        if chunk_id < len(self.base):
+            return self.base, chunk_id
+        return self.delta, chunk_id - len(self.base)
+
+    def text(self, chunk_id: int) -> str:
+        store, row = self._segment(chunk_id)
+        return store.text(row)
+
+    def source(self, chunk_id: int) -> str:
+        store, row = self._segment(chunk_id)
+        return store.source(row)
+
+    def get(self, chunk_id: int) -> Tuple[str, str]:
+        store, row = self._segment(chunk_id)
+        return store.get(row)
+
+    def ids_with_source_prefix(self, prefix: str) -> np.ndarray:
+        return np.concatenate([self.base.ids_with_source_prefix(prefix),
+                               self.delta.ids_with_source_prefix(prefix) + len(self.base)])
+
+    def texts(self) -> Iterator[str]:
+        yield from self.base.texts()
+        yield from self.delta.texts()
+
+    def source_names(self) -> Iterator[str]:
+        yield from self.base.source_names()
+        yield from self.delta.source_names()
+
+    def close(self):
+        self.base.close()
+        self.delta.close()
+
+
+class ChunkStoreWriter:
+    """
+    Streams chunks into a new store batch by batch
+
+    Text goes straight to disk; only the offsets and source ids are kept in
+    memory. Nothing replaces the existing store until close() succeeds, and
+    close() swaps the files in one by one, so never point a writer at a store
+    that is being served; write a fresh directory instead.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._source_table = {}
+        self._source_ids: List[int] = []
+        self._offsets: List[int] = [0]
+        self._tmp_text = os.path.join(path, TEXT_FILE + ".tmp")
+        self._text_file = open(self._tmp_text, "wb")
+
+    def __enter__(self) -> "ChunkStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._text_file.close()
+            os.remove(self._tmp_text)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def add(self, texts: Iterable[str], sources: Iterable[str]):
+        for text, source in zip(texts, sources):
+            data = str(text).encode("utf-8")
+            self._text_file.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+            self._source_ids.append(self._source_table.setdefault(str(source), len(self._source_table)))
+
+    def add_store(self, store: ChunkStore):
+        """Add every chunk of an open store, copying its text in one pass"""
+        if store._text_file is not None:
+            store._text_file.seek(0)
+            shutil.copyfileobj(store._text_file, self._text_file, 1 << 20)
+        base = self._offsets[-1]
+        self._offsets.extend((np.asarray(store._offsets[1:], dtype=np.int64) + base).tolist())
+        table = np.array([self._source_table.setdefault(name, len(self._source_table)) for name in store.sources],
+                         dtype=np.int32)
+        self._source_ids.extend(table[np.asarray(store._source_ids, dtype=np.int64)].tolist())
+
+    def close(self):
+        self._text_file.close()
+
+        # Write every column under a temporary name first, then swap them in
+        tmp_offsets = os.path.join(self.path, "offsets.tmp.npy")
+        tmp_ids = os.path.join(self.path, "source_ids.tmp.npy")
+        tmp_sources = os.path.join(self.path, SOURCES_FILE + ".tmp")
+        np.save(tmp_offsets, np.asarray(self._offsets, dtype=np.int64))
+        np.save(tmp_ids, np.asarray(self._source_ids, dtype=np.int32))
+        with open(tmp_sources, "w", encoding="utf-8") as f:
+            json.dump(list(self._source_table), f)
+
+        os.replace(self._tmp_text, os.path.join(self.path, TEXT_FILE))
+        os.replace(tmp_offsets, os.path.join(self.path, OFFSETS_FILE))
+        os.replace(tmp_ids, os.path.join(self.path, SOURCE_IDS_FILE))
+        os.replace(tmp_sources, os.path.join(self.path, SOURCES_FILE))
@@ -0,0 +1,64 @@
+"""
+Context packing for the RAG prompt
+Retrieved chunks are often near-copies of each other (a city's daily weather
+chunks, repeated farm-weather rows). Packing drops near-duplicates, orders the
+rest by Maximal Marginal Relevance and stops at a token budget, so the prompt
+carries more distinct facts in fewer tokens.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+# Rough OpenAI tokenizer ratio for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text (no tokenizer download needed)"""
+    return max(1, -(-len(str(text)) // CHARS_PER_TOKEN))
+
+
+def pack_context(scores: Sequence[float], vectors: np.ndarray, texts: Sequence[str], token_budget: int = 1000,
+                 max_chunks: int = 10, duplicate_threshold: float = 0.95, mmr_lambda: float = 0.7) -> List[int]:
+    """
+    Choose which retrieved chunks go into the prompt
+
+    Args:
+        scores: Relevance of each candidate (retrieval score incl. any location boost)
+        vectors: Normalized embedding of each candidate, row-aligned with scores
+        texts: Context line of each candidate, used for the token estimate
+        token_budget: Maximum estimated tokens of the chosen lines (0 = no limit)
+        max_chunks: Maximum number of chunks chosen
+        duplicate_threshold: Candidates at least this cosine-similar to a chosen one are dropped
+        mmr_lambda: Relevance weight in lambda * relevance - (1 - lambda) * max similarity to chosen
+
+    Returns:
+        Positions of the chosen candidates, in selection (MMR) order
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(scores) == 0:
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    similarity = vectors @ vectors.T
+    costs = [estimate_tokens(text) for text in texts]
+
+    chosen: List[int] = []
+    remaining = set(range(len(scores)))
+    # Highest similarity of each candidate to anything chosen so far
+    redundancy = np.full(len(scores), -np.inf, dtype=np.float32)
+    used = 0
+    while remaining and len(chosen) < max_chunks:
+        candidates = sorted(remaining)
+        penalty = np.where(np.isinf(redundancy[candidates]), 0.0, redundancy[candidates])
+        mmr = mmr_lambda * scores[candidates] - (1 - mmr_lambda) * penalty
+        best = candidates[int(np.argmax(mmr))]
+        remaining.discard(best)
+        if token_budget and used + costs[best] > token_budget:
+            # Too long for what is left of the budget; a shorter candidate may still fit
+            continue
+        chosen.append(best)
+        used += costs[best]
+        redundancy = np.maximum(redundancy, similarity[best])
+        remaining -= {i for i in remaining if redundancy[i] >= duplicate_threshold}
+    return chosen
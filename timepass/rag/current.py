@@ -1,44 +1,51 @@
 import os
-import gc
 import warnings
 warnings.filterwarnings('ignore')
 
-# Conservative thread settings to prevent segfaults
+# Tokenizer threads do not survive the fork of the ingestion process pool; other
+# thread counts come from the thread budget in rag/threads.py
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["OPENBLAS_NUM_THREADS"] = "1" 
-os.environ["MKL_NUM_THREADS"] = "1"
-os.environ["VECLIB_MAXIMUM_THREADS"] = "1"
-os.environ["NUMEXPR_NUM_THREADS"] = "1"
 
 import re, unicodedata, json
+import shutil
 import pandas as pd
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Callable
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
-try:
-    import torch
-    torch.set_num_threads(1)
-    torch.set_num_interop_threads(1)
-except:
-    pass
-
-try:
-    faiss.omp_set_num_threads(1)
-except:
-    pass
-
 # ==== API Key ====
 # Import centralized configuration
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.config import config
+from src.query_features import query_features
+from rag.chunk_store import ChunkStore, ChunkStoreWriter, SegmentedChunkStore
+from rag.delta_segment import DeltaSegment
+from rag.embedding_store import embedding_input, shared_embedding_store
+from rag.embedders import Embedder, embedding_key, load_embedder
+from rag.embedding_batcher import EmbeddingBatcher
+from rag.build_encoder import ProcessEncoder
+from rag.threads import build_threads, thread_budget, use_threads
+from rag.location_index import (LocationIndex, clean_location_names, is_location_column,
+                                read_location_names, write_location_names)
+from rag.sparse_index import SparseIndex
+from rag.structured_tables import StructuredTables, describe_result
+from rag.prompts import PromptRegistry, weather_context, weather_slots
+from rag.index_factory import SegmentedIndex, build_id_index, create_id_index, index_params_from_config, search_ids, apply_search_params, describe_index, index_ids
+from rag.query_cache import QueryCache, canonicalize_query, index_version
+from rag.answer_cache import AnswerCache, answer_partition, prompt_hash
+from rag.llm_client import get_llm_client
+from rag.context_packing import pack_context
+from rag.few_shots import FEW_SHOT_EXAMPLES, FewShotSelector, format_examples
+from rag.generations import (STAGING_SUFFIX, clone_generation, current_generation, generation_dir, new_generation_id,
+                             pointer_version, publish_generation, read_pointer, rollback_generation, seal_generation,
+                             staging_dir)
 
 OPENAI_KEY = config.OPENAI_API_KEY
 if OPENAI_KEY:
@@ -47,9 +54,27 @@ if OPENAI_KEY:
 # ==== Paths ====
 META_PATH = "faiss_meta.json"
 INDEX_PATH = "faiss_index.idx"
-CHUNKS_CSV = "faiss_chunks.csv"
-EMBEDDINGS_PATH = "embeddings.npy"
+CHUNKS_CSV = "faiss_chunks.csv"  # legacy format, migrated to CHUNK_STORE_DIR on load
+CHUNK_STORE_DIR = "faiss_chunks"
+EMBEDDINGS_PATH = "embeddings.npy"  # legacy row-aligned cache, replaced by EMBEDDING_STORE_DIR
+EMBEDDING_STORE_DIR = "embedding_store"
 WEATHER_DATA_PATH = "weather_data_cache.json"
+BUILD_DIR = "faiss_build"  # shards and checkpoint of an in-progress build
+BUILD_CHECKPOINT_PATH = os.path.join(BUILD_DIR, "checkpoint.json")
+LOCATION_INDEX_PATH = "faiss_locations.npz"
+SPARSE_INDEX_PATH = "faiss_bm25.npz"
+STRUCTURED_TABLES_DIR = "structured_tables"  # tables answered by aggregation (see rag/structured_tables.py)
+DELTA_DIR = "faiss_delta"  # chunks added and removed since the base index was built (see rag/delta_segment.py)
+# The index files above are read from the published generation under GENERATIONS_DIR
+# (see rag/generations.py), or from the working directory for a legacy layout
+
+def live_dir() -> str:
+    """Directory of the served index files: the current generation, "" for the legacy layout"""
+    generation = current_generation()
+    return generation_dir(generation) if generation else ""
+
+def live_path(name: str, root: str = None) -> str:
+    return os.path.join(live_dir() if root is None else root, name)
 
 # ==== Configuration ====
 MAX_CHUNKS = config.MAX_CHUNKS
@@ -66,40 +91,53 @@ def normalize_text(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
     return text.strip().lower()
 
+def normalize_series(texts: pd.Series) -> pd.Series:
+    """normalize_text over a whole column with vectorized string operations"""
+    texts = texts.fillna("").astype(str)
+    texts = texts.where(texts != 'nan', "")
+    return (texts.str.slice(0, 1000)
+            .str.replace(r'[^\w\s.,]', ' ', regex=True)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .str.lower())
+
 # ==== Memory-efficient data loading ====
-def load_file_safely(filepath: Path) -> pd.DataFrame:
+def iter_file_frames(filepath: Path, chunk_rows: int = None):
+    """
+    Yield a file's rows as DataFrames of at most chunk_rows rows
+
+    CSVs are read incrementally, so files of any size are covered without
+    being loaded whole. Excel sheets are read once and sliced.
+    """
+    chunk_rows = chunk_rows or config.RAG_READ_CHUNK_ROWS
     filename = filepath.name
-    try:
-        if filename.endswith(('.csv', '.csv.xls')):
-            try:
-                df = pd.read_csv(filepath, nrows=5000, dtype=str)
-            except:
-                df = pd.read_csv(filepath, dtype=str, encoding='utf-8', errors='ignore')
-                if len(df) > 5000:
-                    df = df.sample(n=5000, random_state=42)
-        elif filename.endswith('.xlsx'):
-            df = pd.read_excel(filepath, engine='openpyxl', dtype=str, nrows=5000)
-        elif filename.endswith('.xls'):
-            df = pd.read_excel(filepath, engine='xlrd', dtype=str, nrows=5000)
-        elif filename.endswith('.txt'):
+    if filename.endswith(('.csv', '.csv.xls')):
+        frames = pd.read_csv(filepath, dtype=str, chunksize=chunk_rows, encoding_errors='ignore')
+    elif filename.endswith(('.xlsx', '.xls')):
+        sheet = pd.read_excel(filepath, engine='openpyxl' if filename.endswith('.xlsx') else 'xlrd', dtype=str)
+        frames = (sheet.iloc[i:i + chunk_rows] for i in range(0, len(sheet), chunk_rows))
+    elif filename.endswith('.txt'):
+        def read_lines():
             with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                lines = [line.strip() for line in f.readlines()[:1000] if line.strip()]
-            if lines:
-                df = pd.DataFrame({"text": lines})
-            else:
-                return pd.DataFrame()
-        else:
-            return pd.DataFrame()
-
+                lines = []
+                for line in f:
+                    if line.strip():
+                        lines.append(line.strip())
+                    if len(lines) >= chunk_rows:
+                        yield pd.DataFrame({"text": lines})
+                        lines = []
+                if lines:
+                    yield pd.DataFrame({"text": lines})
+        frames = read_lines()
+    else:
+        return
+
+    for df in frames:
         if df.empty:
-            return pd.DataFrame()
+            continue
         df = df.fillna("").replace('nan', '')
         df["source_file"] = filename
-        print(f" Loaded {filename} ({len(df)} rows)")
-        return df
-    except Exception as e:
-        print(f" Could not read {filename}: {e}")
-        return pd.DataFrame()
+        yield df
 
 def load_weather_data_from_backend():
     """Load weather data from backend weather service"""
@@ -237,1105 +275,1297 @@ def convert_weather_to_chunks(weather_data_list):
     print(f" Converted weather data to {len(chunks)} chunks")
     return chunks
 
-def load_all_data():
-    # Look for ALL supported files in current folder
+def write_file_shard(filepath: Path, shard_path: str) -> int:
+    """
+    Stream one source file into its own chunk store shard (runs inside an ingestion worker process)
+
+    Returns:
+        Number of chunks written
+    """
+    rows = 0
+    location_names = set()
+    with ChunkStoreWriter(shard_path) as writer:
+        for df in iter_file_frames(filepath):
+            rows += len(df)
+            file_chunks = prepare_file_chunks(df)
+            writer.add(file_chunks["text"], file_chunks["source_file"])
+            for col in df.columns:
+                if col != "source_file" and is_location_column(col):
+                    location_names |= clean_location_names(df[col].unique())
+        chunk_count = len(writer)
+    write_location_names(shard_path, location_names)
+    print(f" Loaded {filepath.name} ({rows} rows, {chunk_count} chunks)")
+    return chunk_count
+
+def _file_signature(filepath: Path) -> Dict[str, Any]:
+    stat = filepath.stat()
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+def _shard_path(filepath: Path) -> str:
+    return os.path.join(BUILD_DIR, "shards", re.sub(r'\W+', '_', filepath.name))
+
+def read_build_checkpoint() -> Dict[str, Any]:
+    try:
+        with open(BUILD_CHECKPOINT_PATH) as f:
+            return json.load(f)
+    except Exception:
+        return {"files": {}}
+
+def write_build_checkpoint(checkpoint: Dict[str, Any]):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    tmp_path = f"{BUILD_CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, BUILD_CHECKPOINT_PATH)
+
+def build_file_shards(files: List[Path]):
+    """
+    Chunk every file into a shard, in parallel, skipping shards finished by an interrupted build
+
+    Progress is checkpointed per file, keyed by the file's size and mtime. A file
+    that cannot be read is reported and left out of the index.
+    """
+    checkpoint = read_build_checkpoint()
+    done = checkpoint.setdefault("files", {})
+    pending = [f for f in files
+               if done.get(f.name, {}).get("source") != _file_signature(f) or not ChunkStore.exists(_shard_path(f))]
+    if len(pending) < len(files):
+        print(f" Resuming build: {len(files) - len(pending)} of {len(files)} files already chunked")
+
+    def record(filepath: Path, chunk_count: int):
+        done[filepath.name] = {"source": _file_signature(filepath), "chunks": chunk_count}
+        write_build_checkpoint(checkpoint)
+
+    workers = min(config.RAG_INGEST_WORKERS or os.cpu_count() or 1, len(pending))
+    if workers <= 1:
+        for filepath in pending:
+            try:
+                record(filepath, write_file_shard(filepath, _shard_path(filepath)))
+            except Exception as e:
+                print(f" Could not read {filepath.name}, leaving it out of the index: {e}")
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(write_file_shard, filepath, _shard_path(filepath)): filepath for filepath in pending}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                print(f" Could not read {futures[future].name}, leaving it out of the index: {error}")
+                continue
+            record(futures[future], future.result())
+
+def load_all_data(path: str = CHUNK_STORE_DIR, tables_path: str = None) -> ChunkStore:
+    """
+    Collect weather and file chunks and stream them into a new chunk store
+
+    Files are chunked into per-file shards first (resumable), then
+    concatenated in file order. MAX_CHUNKS caps the total when set above 0.
+    Files listed in RAG_STRUCTURED_TABLES are written as typed tables instead
+    and left out of the chunk store.
+
+    Args:
+        path: Chunk store directory to write
+        tables_path: Structured tables directory to write (default: next to the chunk store)
+
+    Returns:
+        The written chunk store
+    """
+    # Look for ALL supported files in current folder (except our own chunk export)
     files = []
     for ext in ["*.csv", "*.csv.xls", "*.xlsx", "*.xls", "*.txt"]:
         files.extend(Path(".").glob(ext))
+    # "*.csv.xls" files also match "*.xls", so de-duplicate
+    files = sorted(set(f for f in files if f.name != CHUNKS_CSV))
+    structured_names = {name.strip() for name in config.RAG_STRUCTURED_TABLES if name.strip()}
+    tables = StructuredTables.build(f for f in files if f.name in structured_names)
+    tables.save(tables_path or os.path.join(os.path.dirname(path), STRUCTURED_TABLES_DIR))
+    files = [f for f in files if f.name not in tables.names]
+    build_file_shards(files)
+
+    limit = MAX_CHUNKS if MAX_CHUNKS > 0 else None
+    with ChunkStoreWriter(path) as writer:
+        # Load weather data first
+        print("Loading weather data from backend...")
+        weather_data = load_cached_weather_data()
+        if not weather_data:
+            weather_data = load_weather_data_from_backend()
+        
+        if weather_data:
+            weather_chunks = convert_weather_to_chunks(weather_data)[:limit]
+            writer.add([c["text"] for c in weather_chunks], [c["source_file"] for c in weather_chunks])
+            print(f" Weather data loaded: {len(weather_chunks)} chunks")
+
+        # Append each file's shard without loading it into memory
+        for filepath in files:
+            if not ChunkStore.exists(_shard_path(filepath)):
+                continue
+            shard = ChunkStore(_shard_path(filepath))
+            take = len(shard) if limit is None else min(len(shard), limit - len(writer))
+            writer.add((shard.text(i) for i in range(take)), (shard.source(i) for i in range(take)))
+            shard.close()
+            if limit is not None and len(writer) >= limit:
+                print(f" Reached maximum chunk limit ({MAX_CHUNKS}), stopping file loading")
+                break
+        print(f" Total chunks: {len(writer)}")
 
-    all_chunks = []
-    total_loaded = 0
-
-    # Load weather data first
-    print("Loading weather data from backend...")
-    weather_data = load_cached_weather_data()
-    if not weather_data:
-        weather_data = load_weather_data_from_backend()
-    
-    if weather_data:
-        weather_chunks = convert_weather_to_chunks(weather_data)
-        all_chunks.extend(weather_chunks)
-        total_loaded += len(weather_chunks)
-        print(f" Weather data loaded: {len(weather_chunks)} chunks")
+        if not len(writer):
+            raise ValueError("No valid data found.")
 
-    # Load file data
+    # Place names for the location index: table location columns plus weather locations
+    location_names = set()
     for filepath in files:
-        if total_loaded >= MAX_CHUNKS:
-            print(f" Reached maximum chunk limit ({MAX_CHUNKS}), stopping file loading")
-            break
-
-        df = load_file_safely(filepath)
-        if not df.empty:
-            file_chunks = prepare_file_chunks(df)
-            all_chunks.extend(file_chunks)
-            total_loaded += len(file_chunks)
-            del df
-            gc.collect()
-            print(f" Total chunks so far: {total_loaded}")
-
-    if not all_chunks:
-        raise ValueError("No valid data found.")
-    if len(all_chunks) > MAX_CHUNKS:
-        print(f" Limiting to {MAX_CHUNKS} chunks (was {len(all_chunks)})")
-        all_chunks = all_chunks[:MAX_CHUNKS]
-    return pd.DataFrame(all_chunks)
+        location_names |= read_location_names(_shard_path(filepath))
+    location_names |= clean_location_names(entry.get('location', '').split(',')[0] for entry in weather_data or [])
+    write_location_names(path, location_names)
+    return ChunkStore(path)
 
 
 # ==== Updated: keep numeric table rows intact ====
-def prepare_file_chunks(df: pd.DataFrame) -> List[dict]:
-    chunks = []
-    filename = df['source_file'].iloc[0] if not df.empty else "unknown"
+def prepare_file_chunks(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Serialize each table row as "col: value | col: value" and normalize it
+
+    Returns:
+        DataFrame with text and source_file columns
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["text", "source_file"])
+    filename = df['source_file'].iloc[0]
     non_source_cols = [col for col in df.columns if col != "source_file"]
-    for _, row in df.iterrows():
-        if len(chunks) >= 1000:
-            break
-        row_parts = []
-        for col in non_source_cols:
-            val = str(row[col]).strip()
-            if val and val != 'nan':
-                row_parts.append(f"{col}: {val}")
-        if row_parts:
-            row_text = " | ".join(row_parts)
-            normalized = normalize_text(row_text)
-            if len(normalized) > 20:
-                chunks.append({"text": normalized, "source_file": filename})
-    return chunks
+    row_text = pd.Series("", index=df.index, dtype=object)
+    for col in non_source_cols:
+        values = df[col].astype(str).str.strip()
+        valid = (values != "") & (values != "nan")
+        separator = pd.Series(np.where((row_text != "") & valid, " | ", ""), index=df.index)
+        row_text = row_text + separator + (f"{col}: " + values).where(valid, "")
+    normalized = normalize_series(row_text)
+    normalized = normalized[normalized.str.len() > 20]
+    return pd.DataFrame({"text": normalized.values, "source_file": filename})
 
 # ==== Embeddings and FAISS ====
-def generate_embeddings_safely(texts: List[str], embedder: SentenceTransformer) -> np.ndarray:
-    print(f"Generating embeddings for {len(texts)} texts...")
-    if os.path.exists(EMBEDDINGS_PATH):
-        try:
-            print(" Loading cached embeddings...")
-            embeddings = np.load(EMBEDDINGS_PATH)
-            if embeddings.shape[0] == len(texts):
-                return embeddings.astype(np.float32)
-        except Exception:
-            pass
-    all_embeddings = []
-    for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
-        batch = texts[i:i+EMBEDDING_BATCH_SIZE]
-        clean_batch = [str(t).strip()[:500] if len(str(t).strip()) > 5 else "empty text" for t in batch]
+def _batch_encoder(embedder: Embedder):
+    def encode(batch: List[str]) -> np.ndarray:
         batch_emb = embedder.encode(
-            clean_batch,
+            batch,
             convert_to_numpy=True,
             show_progress_bar=False,
             batch_size=16,
             device='cpu',
             normalize_embeddings=True
         )
-        all_embeddings.append(batch_emb.astype(np.float32))
-        gc.collect()
-    embeddings = np.vstack(all_embeddings)
+        return batch_emb.astype(np.float32)
+    return encode
+
+def generate_embeddings_safely(texts: List[str], embedder: Embedder, model_name: str = None) -> np.ndarray:
+    """
+    Embed chunk texts, reusing vectors from the content-addressed embedding store
+
+    Args:
+        texts: Chunk texts
+        embedder: Sentence embedding model, only called for chunks not seen before
+        model_name: Name of the embedder's model, part of every cache key
+    """
+    print(f"Generating embeddings for {len(texts)} texts...")
+    store = shared_embedding_store(EMBEDDING_STORE_DIR, model_name or config.EMBEDDING_MODEL,
+                                   dtype=config.RAG_EMBEDDING_DTYPE)
+    return store.embed([embedding_input(t) for t in texts], _batch_encoder(embedder), batch_size=EMBEDDING_BATCH_SIZE)
+
+def build_faiss_index_safe(texts: List[str], embedder: Embedder, model_name: str = None) -> faiss.Index:
+    embeddings = generate_embeddings_safely(texts, embedder, model_name)
+    print(f"🏗️ Building FAISS index ({config.RAG_INDEX_TYPE})...")
     try:
-        np.save(EMBEDDINGS_PATH, embeddings)
-    except Exception:
-        pass
-    return embeddings
-
-def build_faiss_index_safe(texts: List[str], embedder: SentenceTransformer) -> faiss.Index:
-    embeddings = generate_embeddings_safely(texts, embedder)
-    print("🏗️ Building FAISS index...")
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
+        index = build_id_index(embeddings)
+    except Exception as e:
+        print(f" Could not build {config.RAG_INDEX_TYPE} index ({e}), falling back to flat")
+        index = build_id_index(embeddings, params={"index_type": "flat"})
     print(f"Index built with {index.ntotal} vectors")
     return index
 
+def build_index_from_store(chunks: ChunkStore, embedder: Embedder, model_name: str = None) -> faiss.Index:
+    """
+    Embed and index a chunk store batch by batch, with bounded memory
+
+    Embeddings are appended to the on-disk embedding store as they are computed,
+    so an interrupted build resumes where it stopped. IVF/PQ indexes are trained
+    on a sample of RAG_INDEX_TRAIN_SAMPLE chunks, then filled batch by batch.
+
+    Args:
+        chunks: Chunk store to index (chunk ids are its row numbers)
+        embedder: Sentence embedding model
+        model_name: Name of the embedder's model
+    """
+    store = shared_embedding_store(EMBEDDING_STORE_DIR, model_name or config.EMBEDDING_MODEL,
+                                   dtype=config.RAG_EMBEDDING_DTYPE)
+    encode = _batch_encoder(embedder)
+    batch_size = config.RAG_BUILD_BATCH_SIZE
+    total = len(chunks)
+
+    def batch_keys(ids) -> List[bytes]:
+        return store.keys_for([embedding_input(chunks.text(int(i))) for i in ids])
+
+    print(f"Generating embeddings for {total} chunks in batches of {batch_size}...")
+    for start in range(0, total, batch_size):
+        ids = range(start, min(start + batch_size, total))
+        store.embed([embedding_input(chunks.text(i)) for i in ids], encode, batch_size=EMBEDDING_BATCH_SIZE)
+        print(f" Embedded {ids[-1] + 1}/{total} chunks")
+
+    sample_size = config.RAG_INDEX_TRAIN_SAMPLE
+    sample_ids = np.arange(total) if sample_size <= 0 or total <= sample_size else \
+        np.sort(np.random.default_rng(42).choice(total, sample_size, replace=False))
+    training = store.vectors(store.lookup(batch_keys(sample_ids)))
+
+    print(f"🏗️ Building FAISS index ({config.RAG_INDEX_TYPE})...")
+    try:
+        params = index_params_from_config()
+        index = create_id_index(training, total, params)
+    except Exception as e:
+        print(f" Could not build {config.RAG_INDEX_TYPE} index ({e}), falling back to flat")
+        params = {"index_type": "flat"}
+        index = create_id_index(training, total, params)
+    del training
+
+    for start in range(0, total, batch_size):
+        ids = np.arange(start, min(start + batch_size, total), dtype=np.int64)
+        index.add_with_ids(store.vectors(store.lookup(batch_keys(ids))), ids)
+    print(f"Index built with {index.ntotal} vectors")
+    return apply_search_params(index, params)
+
 # ==== File operations ====
-def save_index(index: faiss.Index, df_chunks: pd.DataFrame, meta: dict):
+def save_index(index: faiss.Index, df_chunks: pd.DataFrame, meta: dict, root: str = None):
+    """Write index and metadata; df_chunks=None when the chunk store was already streamed to disk"""
     try:
-        faiss.write_index(index, INDEX_PATH)
-        df_chunks.to_csv(CHUNKS_CSV, index=False)
-        with open(META_PATH, "w") as f:
+        faiss.write_index(index, live_path(INDEX_PATH, root))
+        if df_chunks is not None:
+            ChunkStore.write(live_path(CHUNK_STORE_DIR, root), df_chunks["text"], df_chunks["source_file"])
+        with open(live_path(META_PATH, root), "w") as f:
             json.dump(meta, f, indent=2)
     except Exception as e:
         print(f"Error saving index: {e}")
 
-def load_index():
-    if all(os.path.exists(p) for p in [INDEX_PATH, CHUNKS_CSV, META_PATH]):
+def read_index_mmap(path: str) -> faiss.Index:
+    """Open a FAISS index memory-mapped so workers share its pages"""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        return faiss.read_index(path, flags)
+    except Exception:
+        # Older FAISS builds cannot mmap flat indexes
+        return faiss.read_index(path)
+
+def load_chunk_store(root: str = None):
+    """Open the chunk store, migrating a legacy faiss_chunks.csv once if needed"""
+    root = live_dir() if root is None else root
+    store_dir = live_path(CHUNK_STORE_DIR, root)
+    if not root and not ChunkStore.exists(store_dir) and os.path.exists(CHUNKS_CSV):
+        df_chunks = pd.read_csv(CHUNKS_CSV, usecols=["text", "source_file"]).fillna("")
+        ChunkStore.write(store_dir, df_chunks["text"], df_chunks["source_file"])
+        print(f" Migrated {CHUNKS_CSV} to chunk store {CHUNK_STORE_DIR}/")
+    if ChunkStore.exists(store_dir):
+        return ChunkStore(store_dir)
+    return None
+
+def load_index(root: str = None):
+    """
+    Open index, chunk store and metadata of one generation (the served one by default)
+
+    A generation with a non-empty delta segment is served through a SegmentedIndex
+    and SegmentedChunkStore over its base and delta.
+    """
+    root = live_dir() if root is None else root
+    if os.path.exists(live_path(INDEX_PATH, root)) and os.path.exists(live_path(META_PATH, root)):
         try:
-            index = faiss.read_index(INDEX_PATH)
-            df_chunks = pd.read_csv(CHUNKS_CSV)
-            with open(META_PATH) as f:
+            chunks = load_chunk_store(root)
+            if chunks is None:
+                return None, None, None
+            index = apply_search_params(read_index_mmap(live_path(INDEX_PATH, root)))
+            index, chunks = DeltaSegment.load(live_path(DELTA_DIR, root), len(chunks)).segmented(index, chunks)
+            with open(live_path(META_PATH, root)) as f:
                 meta = json.load(f)
-            return index, df_chunks, meta
+            return index, chunks, meta
         except Exception as e:
             print(f" Error loading cached index: {e}")
     return None, None, None
 
-# ==== Search function ====
-def faiss_search(query: str, embedder: SentenceTransformer, index: faiss.Index, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+def base_chunks(chunks):
+    """The base chunk store of a (possibly segmented) chunk store, which the posting files cover"""
+    return chunks.base if isinstance(chunks, SegmentedChunkStore) else chunks
+
+def load_location_index(chunks: ChunkStore, root: str = None):
+    """Open the location posting index, building it from the base chunk store if it is missing"""
+    root = live_dir() if root is None else root
+    chunks = base_chunks(chunks)
+    locations = LocationIndex.load(live_path(LOCATION_INDEX_PATH, root))
+    if locations is None and chunks is not None:
+        names = read_location_names(live_path(CHUNK_STORE_DIR, root))
+        if names:
+            print(f" Building location index for {len(names)} places...")
+            locations = LocationIndex.build(names, chunks)
+            locations.save(live_path(LOCATION_INDEX_PATH, root))
+    return locations
+
+def load_sparse_index(chunks: ChunkStore, root: str = None):
+    """Open the BM25 index, building it from the base chunk store if it is missing"""
+    root = live_dir() if root is None else root
+    chunks = base_chunks(chunks)
+    sparse = SparseIndex.load(live_path(SPARSE_INDEX_PATH, root))
+    if sparse is None and chunks is not None:
+        print(f" Building BM25 index for {len(chunks)} chunks...")
+        sparse = SparseIndex.build(chunks)
+        sparse.save(live_path(SPARSE_INDEX_PATH, root))
+    return sparse
+
+def load_structured_tables(root: str = None):
+    """Open the structured tables of a generation, None for a generation built before they existed"""
+    root = live_dir() if root is None else root
+    return StructuredTables.load(live_path(STRUCTURED_TABLES_DIR, root))
+
+def load_posting_indexes(root: str = None) -> Dict[str, Any]:
+    """Location and BM25 indexes on disk, keyed by file name; both are keyed by chunk id like the FAISS index"""
+    root = live_dir() if root is None else root
+    postings = {LOCATION_INDEX_PATH: LocationIndex.load(live_path(LOCATION_INDEX_PATH, root)),
+                SPARSE_INDEX_PATH: SparseIndex.load(live_path(SPARSE_INDEX_PATH, root))}
+    return {path: posting for path, posting in postings.items() if posting is not None}
+
+def add_delta_postings(postings: Dict[str, Any], delta_ids: np.ndarray, chunks: ChunkStore):
+    """
+    Add live delta chunks to posting indexes loaded for the base
+
+    The posting files only cover the base, so they stay hard-linked across
+    incremental updates; weather chunks register their location as a place name.
+    """
+    delta_ids = np.sort(np.asarray(delta_ids, dtype=np.int64))
+    texts = [chunks.text(int(i)) for i in delta_ids]
+    locations = postings.get(LOCATION_INDEX_PATH)
+    if locations is not None:
+        for chunk_id, text in zip(delta_ids, texts):
+            source = chunks.source(int(chunk_id))
+            names = [weather_source_location(source).split(',')[0]] if source.startswith(WEATHER_SOURCE_PREFIX) else []
+            locations.add(int(chunk_id), text, source, names=names)
+    if postings.get(SPARSE_INDEX_PATH) is not None:
+        postings[SPARSE_INDEX_PATH].extend(delta_ids, texts)
+
+# ==== Index generations ====
+_rebuild_lock = threading.Lock()
+_rebuild_status = {"state": "idle", "generation": None, "error": None, "finished_at": None}
+
+@contextmanager
+def build_encoder(engine: "RagEngine"):
+    """
+    Embedder for an index build
+
+    With RAG_BUILD_ENCODER_PROCESS the model runs in a child process with the build
+    thread budget, so the serving process's torch threads are never raised; without
+    it the build shares the serving embedder at its query encoding thread count.
+    """
+    if not config.RAG_BUILD_ENCODER_PROCESS:
+        yield engine.get_embedder()
+        return
+    with ProcessEncoder(partial(load_embedder, engine.model_name, threads=thread_budget()["build"])) as encoder:
+        yield encoder
+
+def build_index_generation(embedder: Embedder, model_name: str = None) -> str:
+    """
+    Build the whole index into a new generation directory and seal it
+
+    The served generation is not touched; a failed build leaves nothing behind.
+
+    Args:
+        embedder: Sentence embedding model
+        model_name: Name of the embedder's model
+
+    Returns:
+        Name of the sealed (not yet published) generation
+    """
+    model_name = model_name or config.EMBEDDING_MODEL
+    generation = new_generation_id()
+    staging = staging_dir(generation)
+    os.makedirs(staging, exist_ok=True)
     try:
-        normalized_query = normalize_text(query)
-        if not normalized_query:
-            return np.array([]), np.array([])
-        query_embedding = embedder.encode(
-            [normalized_query],
+        chunks = load_all_data(os.path.join(staging, CHUNK_STORE_DIR))
+        with build_threads():
+            index = build_index_from_store(chunks, embedder, model_name)
+        meta = {"model_name": model_name, "total_chunks": len(chunks), "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "index": describe_index(index), "generation": generation}
+        save_index(index, None, meta, root=staging)
+        if not os.path.exists(live_path(INDEX_PATH, staging)):
+            raise RuntimeError("index file was not written")
+        load_location_index(chunks, staging)
+        load_sparse_index(chunks, staging)
+        DeltaSegment(len(chunks)).save(live_path(DELTA_DIR, staging))
+        chunks.close()
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    # The build finished, so its shards and checkpoint are no longer needed
+    shutil.rmtree(BUILD_DIR, ignore_errors=True)
+    return seal_generation(staging, meta)
+
+def publish_index_generation(generation: str) -> Dict[str, Any]:
+    """Verify and publish a sealed generation, then switch this process's engine over to it"""
+    with _index_update_lock:
+        pointer = publish_generation(generation, keep=config.RAG_INDEX_GENERATIONS_KEEP)
+    get_rag_engine().swap_generation()
+    return pointer
+
+def _rebuild_in_background():
+    """Build and publish a generation; the caller has acquired _rebuild_lock"""
+    _rebuild_status.update({"state": "running", "error": None})
+    try:
+        engine = get_rag_engine()
+        with build_encoder(engine) as encoder:
+            generation = build_index_generation(encoder, engine.embedding_key)
+        publish_index_generation(generation)
+        _rebuild_status.update({"state": "idle", "generation": generation})
+        print(f"✅ Published index generation {generation}")
+    except Exception as e:
+        _rebuild_status.update({"state": "failed", "error": str(e)})
+        print(f"❌ Index rebuild failed, still serving the current generation: {e}")
+    finally:
+        _rebuild_status["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        _rebuild_lock.release()
+
+# ==== Search function ====
+def query_vectors(canonical_queries: List[str], embedder: Embedder, cache: QueryCache = None) -> np.ndarray:
+    """Embeddings for canonical queries, encoding only those not in the query cache (in one call)"""
+    vectors = [cache.get_embedding(q) if cache is not None else None for q in canonical_queries]
+    to_encode = [i for i, vector in enumerate(vectors) if vector is None]
+    if to_encode:
+        encoded = embedder.encode(
+            [canonical_queries[i] for i in to_encode],
             convert_to_numpy=True,
             show_progress_bar=False,
+            batch_size=EMBEDDING_BATCH_SIZE,
             normalize_embeddings=True
         ).astype(np.float32)
-        distances, indices = index.search(query_embedding, min(top_k, index.ntotal))
-        return indices[0], distances[0]
+        for row, i in enumerate(to_encode):
+            vectors[i] = encoded[row]
+            if cache is not None:
+                cache.put_embedding(canonical_queries[i], encoded[row])
+    return np.vstack(vectors)
+
+def chunk_vectors(index: faiss.Index, chunk_ids: List[int], chunks: ChunkStore, embedder: Embedder) -> np.ndarray:
+    """Stored embeddings of chunks, re-encoded from their text when the index cannot reconstruct them (IVF)"""
+    try:
+        return np.vstack([index.reconstruct(int(idx)) for idx in chunk_ids]).astype(np.float32)
+    except RuntimeError:
+        return _batch_encoder(embedder)([embedding_input(chunks.text(idx)) for idx in chunk_ids])
+
+def context_line(text: str, source_file: str) -> str:
+    return f"- {text} (source: {source_file})"
+
+def batch_search(queries: List[str], embedder: Embedder, index: faiss.Index, top_k: int = 5,
+                 cache: QueryCache = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Retrieve top_k chunks for many queries with one encode call and one index search
+
+    Args:
+        queries: Query texts
+        embedder: Sentence embedding model
+        index: FAISS index
+        top_k: Number of results per query
+        cache: Optional query cache; cached queries skip encoding and search
+
+    Returns:
+        (indices, scores) per query, in input order (empty arrays for blank queries)
+    """
+    use_threads("search")
+    results = [(np.array([]), np.array([]))] * len(queries)
+    try:
+        # Group positions by canonical text so duplicates are encoded and searched once
+        pending = {}
+        for pos, query in enumerate(queries):
+            canonical_query = canonicalize_query(normalize_text(query))
+            if not canonical_query:
+                continue
+            if cache is not None:
+                cached = cache.get_results(canonical_query, top_k)
+                if cached is not None:
+                    results[pos] = cached
+                    continue
+            pending.setdefault(canonical_query, []).append(pos)
+        if not pending:
+            return results
+
+        unique_queries = list(pending)
+        distances, indices = index.search(query_vectors(unique_queries, embedder, cache), min(top_k, index.ntotal))
+        for row, canonical_query in enumerate(unique_queries):
+            if cache is not None:
+                cache.put_results(canonical_query, top_k, indices[row], distances[row])
+            for pos in pending[canonical_query]:
+                results[pos] = (indices[row], distances[row])
     except Exception as e:
         print(f" Search error: {e}")
+    return results
+
+def faiss_search(query: str, embedder: Embedder, index: faiss.Index, top_k: int = 5,
+                 cache: QueryCache = None) -> Tuple[np.ndarray, np.ndarray]:
+    return batch_search([query], embedder, index, top_k=top_k, cache=cache)[0]
+
+def location_search(query: str, embedder: Embedder, index: faiss.Index, chunk_ids: np.ndarray,
+                    top_k: int = 5, cache: QueryCache = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Retrieve top_k chunks for a query among the chunk ids of a location
+
+    Args:
+        query: Query text
+        embedder: Sentence embedding model
+        index: Id-mapped FAISS index
+        chunk_ids: Candidate chunk ids from the location index
+        top_k: Number of results
+        cache: Optional query cache, used for the query embedding
+
+    Returns:
+        (indices, scores), empty on error
+    """
+    use_threads("search")
+    try:
+        canonical_query = canonicalize_query(normalize_text(query))
+        if not canonical_query or len(chunk_ids) == 0:
+            return np.array([]), np.array([])
+        vectors = query_vectors([canonical_query], embedder, cache)
+        distances, indices = search_ids(index, vectors, chunk_ids, min(top_k, len(chunk_ids)))
+        found = indices[0] >= 0
+        return indices[0][found], distances[0][found]
+    except Exception as e:
+        print(f" Location search error: {e}")
         return np.array([]), np.array([])
-# ==== Few-shot examples ====
-few_shots = """
-Example 1:
-Context:
-State | Crop | Yield
-Karnataka | Wheat | 3.5
-Karnataka | Rice | 4.2
-Query:
-Which crop has the highest yield in Karnataka?
-Answer:
-Rice has the highest yield in Karnataka at 4.2.
-
-Example 2:
-Context:
-Crop | A2+FL
-Arhar | 1200
-Arhar | 1400
-Arhar | 1600
-Query:
-What is the average A2+FL for Arhar?
-Answer:
-The average A2+FL for Arhar is 1400.00.
-
-Example 3:
-Context:
-State | Crop | C2 | Yield
-Bihar | Wheat | 3000 | 2
-Punjab | Rice | 3200 | 4
-Query:
-Which state–crop combination offers the best cost-to-yield ratio using C2?
-Answer:
-Punjab Rice has the best cost-to-yield ratio with 3200 / 4 = 800.
-
-Example 4:
-Context:
-Crop | State | Cost of Cultivation (C2) | Yield
-Wheat | Karnataka | 20000 | 30
-Rice | Karnataka | 25000 | 40
-Query:
-What is the total cost of cultivation in Karnataka?
-Answer:
-The total cost of cultivation in Karnataka is 45,000 (20,000 + 25,000).
-
-Example 5:
-Context:
-State | Crop | Month | Average Yield
-Punjab | Rice | July | 50
-Punjab | Wheat | November | 35
-Query:
-What is the best time for agriculture in Punjab?
-Answer:
-July for Rice, which has the highest average yield of 50.
-
-Example 6:
-Context:
-Crop | State | Yield
-Sugarcane | Karnataka | 986.21
-Sugarcane | Tamil Nadu | 1015.45
-Query:
-Which state has the highest sugarcane yield?
-Answer:
-Tamil Nadu at 1015.45.
-
-Example 7:
-Context:
-Date | Precipitation
-2023-07-01 | 5
-2023-07-02 | 10
-Query:
-What was the total rainfall in the first two days of July 2023?
-Answer:
-15 mm (5 + 10).
-
-Example 8:
-Context:
-Crop | State | Cost of Production (C2) | Yield
-Wheat | Punjab | 800 | 40
-Wheat | Rajasthan | 900 | 35
-Query:
-Which state produces wheat more cost-effectively?
-Answer:
-Punjab with 800/40 = 20 vs Rajasthan 900/35 ≈ 25.71, so Punjab.
-
-Example 9:
-Context:
-State | Crop | Yield
-Bihar | Maize | 42.95
-Andhra Pradesh | Maize | 42.68
-Query:
-Which state grows maize with the highest yield?
-Answer:
-Bihar at 42.95.
-
-Example 10:
-Context:
-State | Crop | A2+FL | Yield
-Gujarat | Groundnut | 1500 | 20
-Gujarat | Groundnut | 1700 | 22
-Query:
-What is the average cost-to-yield ratio (A2+FL per unit yield) for groundnut in Gujarat?
-Answer:
-(1500/20 + 1700/22) / 2 = (75.00 + 77.27) / 2 ≈ 76.14.
-
-Example 11:
-Context:
-State | Crop | Month | Yield
-Maharashtra | Cotton | August | 18
-Maharashtra | Cotton | September | 22
-Maharashtra | Cotton | October | 21
-Query:
-When should Maharashtra farmers plant cotton for best yield?
-Answer:
-September (highest yield 22).
-
-Example 12:
-Context:
-Date | MaxT | MinT
-2023-03-01 | 34 | 21
-2023-03-02 | 36 | 22
-2023-03-03 | 33 | 20
-Query:
-What was the average maximum temperature from 1–3 March 2023?
-Answer:
-(34 + 36 + 33) / 3 = 34.33.
-
-Example 13:
-Context:
-State | Crop | C2 | Yield
-Odisha | Paddy | 2600 | 38
-Odisha | Paddy | 2800 | 41
-Query:
-What is the total yield of paddy in Odisha and average C2?
-Answer:
-Total yield = 79 (38 + 41); average C2 = (2600 + 2800)/2 = 2700.
-
-Example 14:
-Context:
-State | Crop | Yield
-Rajasthan | Bajra | 12
-Rajasthan | Bajra | 14
-Rajasthan | Bajra | 13
-Query:
-What is the median yield of bajra in Rajasthan?
-Answer:
-13.
-
-Example 15:
-Context:
-Date | Precipitation
-2023-08-10 | 0
-2023-08-11 | 0
-2023-08-12 | 12
-2023-08-13 | 0
-Query:
-How many dry days (0 rainfall) were there?
-Answer:
-3 dry days.
-
-Example 16:
-Context:
-State | Crop | A2+FL | Yield
-Andhra Pradesh | Chili | 4000 | 10
-Andhra Pradesh | Chili | 4500 | 12
-Query:
-What is the total revenue needed (A2+FL) and weighted average yield for chili in Andhra Pradesh?
-Answer:
-Total A2+FL = 8500; weighted average yield = (4000*10 + 4500*12) / (4000 + 4500) ≈ 11.06.
-
-Example 17:
-Context:
-State | Crop | Month | Yield
-Karnataka | Ragi | June | 15
-Karnataka | Ragi | July | 19
-Karnataka | Ragi | August | 18
-Query:
-Best month to sow ragi in Karnataka for highest yield?
-Answer:
-July (yield 19).
-
-Example 18:
-Context:
-State | Crop | C2 | Yield
-Tamil Nadu | Rice | 3200 | 50
-Kerala | Rice | 3100 | 44
-Query:
-Which state is more efficient for rice (lower C2 per unit yield)?
-Answer:
-Tamil Nadu: 3200/50 = 64 vs Kerala: 3100/44 ≈ 70.45; Tamil Nadu is more efficient.
-
-Example 19:
-Context
-YEAR |ANNUAL |JAN-FEB |MAR-MAY|JUN-SEP|OCT-DEC
-1901 28.96 23.27 31.46 31.27 27.25
-1902 29.22 25.75 31.76 31.09 26.49 
-
-State |District |Date|Year |Month|Avg_rainfall|Agency_name
-Kerala Kannur 2025-02-20 2025 02 0.0 NRSC VIC MODEL
-Kerala Kannur 2025-02-21 2025 02 0.0200524299 NRSC VIC MODEL
-
-Query: When should we irrigate in Kannur district in Kerala?
-Answer:
-The perfect time to irrigate is when the Avg_rainfall <= 3.6 and temperature <= 28. So in this case in Kannur district in Kerala it is best to irrigate in the 02 month which is February. So finally perfect time to irrigate is January - February where Avg_rainfall <= 3.6 and temperature <= 28.
-
-Context:
-Crop | State | MinTemp | MaxTemp
-Paddy | Tamil Nadu | 20 | 35
-Paddy | Andhra Pradesh | 22 | 34
-Query:
-Is it suitable to grow rice at 30 degrees?
-Answer:
-Yes. Rice (paddy) can be grown between 20°C and 35°C in the dataset. Since 30°C is within this range, it is suitable.
-
-Context:
-Cost of Cultivation (C2) | Cost of Production | Yield
-8000 | 12000 | 20
-9000 | 13500 | 22
-10000 | 15000 | 24
-Query:
-If my cost of cultivation is 9500, what will be my cost of production and yield?
-Answer:
-By analyzing the trend:
-- Cost of production increases by about 1500 for every +1000 in cultivation cost.
-- Yield increases by about 2 for every +1000 in cultivation cost.
-So for 9500, we can estimate:
-Cost of production ≈ 14250
-Yield ≈ 23.
-
-
-Context:
-Cost of Cultivation (C2) | Cost of Production | Yield
-5000 | 7000 | 15
-6000 | 8500 | 17
-7000 | 10000 | 19
-Query:
-If my cost of cultivation is 8000, what will be my cost of production and yield?
-Answer:
-Following the trend:
-- Cost of production increases by about 1500 for every +1000 in cultivation cost.
-- Yield increases by about 2 for every +1000 in cultivation cost.
-So for 8000, we can estimate:
-Cost of production ≈ 11500
-Yield ≈ 21.
-
-Context:
-Cost of Cultivation (C2) | Cost of Production | Yield
-12000 | 16000 | 28
-14000 | 18500 | 32
-Query:
-If my cost of cultivation is 13000, what will be my cost of production and yield?
-Answer:
-The midpoint between 12000 and 14000:
-- Cost of production ≈ (16000 + 18500)/2 = 17250
-- Yield ≈ (28 + 32)/2 = 30
-So for 13000, estimated cost of production is 17250 and yield is 30.
-
-Context:
-Crop | Growth Days | Sowing Month | Harvest Month
-Rice | 120         | June         | October
-Rice | 105         | December     | March
-
-Query: How many days does rice take to harvest?
-Answer: About 120 days for Kharif season, 105 days for Rabi season rice.
-
-
-Context:
-State | Crop | Yield | Fertilizer Used | Irrigation | Soil Quality
-Punjab | Wheat | 35 | High | Drip | Good
-Punjab | Wheat | 30 | Low | Flood | Poor
-Query:
-How can I increase wheat yield in Punjab?
-Answer:
-To increase wheat yield in Punjab:
-1. **Improve Fertilizer Use**: Switch from low to high-quality fertilizers for better growth.
-2. **Optimize Irrigation**: Use drip irrigation instead of flood irrigation to avoid water wastage and increase soil moisture consistency.
-3. **Enhance Soil Quality**: Conduct soil health tests and add organic matter to improve soil structure and fertility.
-4. **Crop Variety**: Use high-yielding or drought-resistant varieties suited for the local climate.
-
-
-Context:
-State | Crop | Yield | Temperature | Rainfall
-Karnataka | Rice | 4.5 | 30°C | 1000 mm
-Karnataka | Rice | 3.5 | 32°C | 900 mm
-Query:
-How can I improve rice yield in Karnataka?
-Answer:
-To improve rice yield in Karnataka:
-1. **Temperature Management**: Opt for rice varieties that are tolerant to higher temperatures (if it frequently exceeds 32°C).
-2. **Water Management**: Use efficient irrigation techniques (e.g., SRI - System of Rice Intensification) to manage water and reduce irrigation needs.
-3. **Soil Fertility**: Apply balanced fertilizers, including micronutrients, to support healthy growth and increase yield.
-4. **Pest Control**: Monitor for pests and diseases, and use organic or chemical treatments as needed to prevent yield loss.
-
-
-Context:
-State | Crop | Yield | Soil Type | Irrigation
-Tamil Nadu | Groundnut | 1200 | Sandy | Drip
-Tamil Nadu | Groundnut | 1000 | Clay | Flood
-Query:
-What can be done to increase groundnut yield in Tamil Nadu?
-Answer:
-To increase groundnut yield in Tamil Nadu:
-1. **Improve Irrigation**: For clay soils, switch from flood to drip irrigation to prevent waterlogging and ensure better root development.
-2. **Soil Health**: Use organic compost to improve soil texture and enhance nutrient retention, especially for sandy soils.
-3. **Fertilization**: Use a balanced mix of nitrogen, phosphorus, and potassium, along with micronutrients to enhance growth.
-4. **Pest and Disease Control**: Regularly monitor for pests and treat early to prevent any damage that may reduce yields.
-
-
-Context:
-State | Crop | Yield | Sowing Month | Harvest Month | Temperature
-Uttar Pradesh | Maize | 3.2 | March | July | 25°C
-Uttar Pradesh | Maize | 2.8 | April | August | 28°C
-Query:
-How can I increase maize yield in Uttar Pradesh?
-Answer:
-To increase maize yield in Uttar Pradesh:
-1. **Optimize Sowing Month**: Sowing in March (as shown in the dataset) has a higher yield. Avoid delaying sowing into April when temperatures rise.
-2. **Temperature Management**: Use heat-resistant maize varieties to cope with temperatures exceeding 28°C during the growing season.
-3. **Irrigation Techniques**: Implement water-saving irrigation practices (e.g., drip or sprinkler) to maintain soil moisture during peak heat periods.
-4. **Soil Fertility**: Apply high-quality fertilizers and ensure the soil has adequate levels of nitrogen and other essential nutrients for maize growth.
-
-Example 24:
-Context:
-Crop | Fertilizer | Yield
-Barley | Urea | 32
-Barley | DAP | 35
-Barley | NPK | 38
-Query:
-What is the best fertilizer for Barley?
-Answer:
-The best fertilizer for Barley is NPK, as it gives the highest yield (38) compared to Urea (32) and DAP (35).
-
-Example 25:
-Context:
-Weather forecast for Delhi_India on day 2: Time 2024-01-22T12:00:00Z, Temperature 18.5°C, Humidity 65.0, Soil moisture 22.3, Wind speed 12.5 km/h, Precipitation 0.0 mm (tomorrow)
-Query:
-What will be the weather tomorrow in Delhi?
-Answer:
-Tomorrow in Delhi, the weather will be: Temperature 18.5°C, Humidity 65%, Soil moisture 22.3%, Wind speed 12.5 km/h, with no precipitation expected (0.0 mm).
-
-Example 26:
-Context:
-Current weather in Mumbai_India: Temperature 28.2°C, Feels like 30.1°C, Humidity 78.0, Soil moisture 35.2, Wind speed 3.2 m/s, Description: humid and warm
-Weather forecast for Mumbai_India on day 1: Temperature 29.0°C, Humidity 75.0, (today)
-Query:
-What's the weather like today in Mumbai?
-Answer:
-Today in Mumbai: Current temperature is 28.2°C (feels like 30.1°C), humidity 78%, soil moisture 35.2%, wind speed 3.2 m/s. Conditions are humid and warm. Forecast shows temperature reaching 29°C with 75% humidity.
-
-Example 27:
-Context:
-Weather forecast for Bangalore_India on day 3: Temperature 22.8°C, Humidity 58.0, Soil moisture 18.7, Wind speed 8.3 km/h, Precipitation 2.5 mm (in 3 days)
-Weather forecast for Bangalore_India on day 4: Temperature 23.1°C, Humidity 60.0, Soil moisture 19.2, Wind speed 9.1 km/h, Precipitation 1.2 mm (in 4 days)
-Query:
-Will it rain in Bangalore this week?
-Answer:
-Yes, rain is expected in Bangalore this week. Day 3: light rain with 2.5 mm precipitation, temperature 22.8°C. Day 4: light rain with 1.2 mm precipitation, temperature 23.1°C.
-
-Example 28:
-Context:
-Current weather in Hyderabad_India: Temperature 24.1°C, Humidity 90.0%, Soil moisture 75.0%
-Crop data: Cotton - Temperature range 21-30°C, Humidity tolerance high, Water requirement moderate
-Rice - Temperature range 20-35°C, Humidity tolerance very high, Water requirement high
-Wheat - Temperature range 15-25°C, Humidity tolerance low, Water requirement moderate
-Query:
-What are suitable crops for current weather?
-Answer:
-Based on current weather in Hyderabad (24.1°C, 90% humidity, 75% soil moisture), suitable crops are:
-1. Rice/Paddy - Excellent match (thrives in high humidity and moisture)
-2. Cotton - Good match (suitable temperature and humidity tolerance)
-3. Sugarcane - Good for high moisture conditions
-Avoid wheat as it prefers lower humidity conditions.
-
-Example 29:
-Context:
-Current weather in Delhi_India: Temperature 18.5°C, Humidity 45.0%, Soil moisture 35.0%
-Query:
-Which crops are best for current weather conditions?
-Answer:
-For Delhi's current conditions (18.5°C, 45% humidity, 35% soil moisture), recommended crops:
-1. Wheat - Perfect temperature range and moderate moisture needs
-2. Mustard - Thrives in cooler temperatures and moderate humidity
-3. Barley - Well-suited for these conditions
-4. Peas - Good for cooler weather and moderate moisture
-
-Example 30:
-Context:
-Weather forecast for Chennai_India on day 1: Temperature 32.1°C, Humidity 82.0, Soil moisture 28.5, Wind speed 15.2 km/h, Precipitation 0.0 mm (today)
-Weather forecast for Chennai_India on day 2: Temperature 33.5°C, Humidity 79.0, Soil moisture 26.8, Wind speed 17.1 km/h, Precipitation 0.0 mm (tomorrow)
-Query:
-Is it good weather for farming in Chennai this week?
-Answer:
-Chennai weather shows: Today 32.1°C with 82% humidity, tomorrow 33.5°C with 79% humidity. Soil moisture is good (28.5% today, 26.8% tomorrow). No rain expected. The high humidity and warm temperatures are suitable for tropical crops, but irrigation may be needed due to no precipitation.
-
-Example 29:
-Context:
-Soil information for Delhi_India: Dominant soil type is Alluvial
-Weather forecast for Delhi_India on day 1: Temperature 15.2°C, Humidity 45.0, Soil moisture 12.3, Wind speed 6.8 km/h (today)
-Query:
-What type of soil is in Delhi and current conditions?
-Answer:
-Delhi has Alluvial soil type. Current conditions: Temperature 15.2°C, Humidity 45%, Soil moisture 12.3%, Wind speed 6.8 km/h. The alluvial soil with current low moisture (12.3%) may need irrigation for optimal crop growth.
-
-Example 30:
-Context:
-Weather forecast for Hyderabad_India on day 7: Temperature 26.8°C, Humidity 62.0, Soil moisture 24.1, Wind speed 11.5 km/h, Precipitation 0.5 mm (in 7 days, week 1)
-Query:
-What will be the weather next week in Hyderabad?
-Answer:
-Next week (day 7) in Hyderabad: Temperature 26.8°C, Humidity 62%, Soil moisture 24.1%, Wind speed 11.5 km/h, with light precipitation of 0.5 mm expected.
 
-"""
+def hybrid_search(queries: List[str], embedder: Embedder, index: faiss.Index, sparse: SparseIndex,
+                  top_k: int = 5, weight: float = None, cache: QueryCache = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Retrieve top_k chunks per query by fusing dense (FAISS) and BM25 scores
+
+    Each query's candidates are its dense top_k plus its BM25 top_k. BM25-only
+    candidates get their dense score from a filtered FAISS search, and the fused
+    score is (1 - weight) * dense + weight * bm25 / max(bm25), so scores stay on
+    the cosine scale the relevance thresholds expect.
+
+    Args:
+        queries: Query texts
+        embedder: Sentence embedding model
+        index: Id-mapped FAISS index (plain indexes fall back to dense search)
+        sparse: BM25 index, or None for dense search only
+        top_k: Number of results per query
+        weight: BM25 share of the fused score (defaults to RAG_HYBRID_WEIGHT; 0 = dense only)
+        cache: Optional query cache for the dense search and query embeddings
+
+    Returns:
+        (indices, scores) per query, in input order
+    """
+    weight = config.RAG_HYBRID_WEIGHT if weight is None else weight
+    dense_results = batch_search(queries, embedder, index, top_k=top_k, cache=cache)
+    if sparse is None or weight <= 0 or not isinstance(index, (faiss.IndexIDMap2, SegmentedIndex)):
+        return dense_results
+
+    results = []
+    for query, (dense_ids, dense_scores) in zip(queries, dense_results):
+        try:
+            canonical_query = canonicalize_query(normalize_text(query))
+            bm25_scores = sparse.scores(canonical_query) if canonical_query else np.zeros(0)
+            top_bm25 = bm25_scores.max() if len(bm25_scores) else 0.0
+            if top_bm25 <= 0:
+                results.append((dense_ids, dense_scores))
+                continue
+
+            scores = {int(i): float(score) for i, score in zip(dense_ids, dense_scores) if i >= 0}
+            sparse_ids, _ = sparse.search(canonical_query, top_k)
+            missing = np.array([i for i in sparse_ids.tolist() if i not in scores], dtype=np.int64)
+            if len(missing):
+                distances, found = search_ids(index, query_vectors([canonical_query], embedder, cache),
+                                              missing, len(missing))
+                scores.update({int(i): float(d) for i, d in zip(found[0], distances[0]) if i >= 0})
+
+            ids = np.array(list(scores), dtype=np.int64)
+            fused = ((1 - weight) * np.array(list(scores.values()), dtype=np.float32)
+                     + weight * bm25_scores[ids] / top_bm25)
+            order = np.argsort(-fused, kind="stable")[:top_k]
+            results.append((ids[order], fused[order]))
+        except Exception as e:
+            print(f" Hybrid search error: {e}")
+            results.append((dense_ids, dense_scores))
+    return results
 
 # ==== RAG Service Functions ====
-def process_rag_query(query: str, location: str = None, weather_data: Dict[str, Any] = None, top_k: int = 5) -> Dict[str, Any]:
+class RagEngine:
     """
-    Process a query through the RAG system and return structured response with confidence
-    
-    Args:
-        query: User query (any language)
-        location: User location
-        weather_data: Current weather data from weather service
-        top_k: Number of top results to retrieve
+    Long-lived RAG engine shared by every query in the process.
+
+    Holds the embedding model, FAISS index, chunk table, language services and
+    compiled prompt templates so they are loaded once instead of per request.
     """
-    # Step 1: Auto-detect language and translate to English
-    english_query = query
-    detected_language = "English"
-    translation_confidence = 1.0
+
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        # Identity of the vector space in caches and index metadata (differs per quantized backend)
+        self.embedding_key = embedding_key(self.model_name)
+        self.embedder = None
+        self.batcher = None
+        self.index = None
+        self.chunks = None
+        self.meta = None
+        self.locations = None
+        self.sparse = None
+        self.tables = None
+        self.generation = None
+        self._pointer_version = None
+        self.few_shots = None
+        self.language_detector = None
+        self.translation_service = None
+        self.prompts = PromptRegistry()
+        self.repl_template = self.prompts.get("repl")
+        self.query_cache = QueryCache(max_size=config.RAG_QUERY_CACHE_SIZE, path=config.RAG_QUERY_CACHE_PATH,
+                                      model_name=self.embedding_key)
+        self.answer_cache = AnswerCache(max_size=config.RAG_ANSWER_CACHE_SIZE, ttl=config.RAG_ANSWER_CACHE_TTL,
+                                        similarity=config.RAG_ANSWER_CACHE_SIMILARITY)
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.index is not None and self.chunks is not None
+
+    def get_embedder(self) -> Embedder:
+        """Return the shared embedder, loading it on first use"""
+        if self.embedder is None:
+            with self._lock:
+                if self.embedder is None:
+                    self.embedder = load_embedder(self.model_name, threads=thread_budget()["embed"])
+        return self.embedder
+
+    def query_encoder(self) -> Embedder:
+        """Encoder for request-time queries: the embedder behind the shared micro-batching worker"""
+        if config.RAG_EMBED_BATCH_MAX <= 1:
+            return self.get_embedder()
+        if self.batcher is None:
+            embedder = self.get_embedder()
+            with self._lock:
+                if self.batcher is None:
+                    self.batcher = EmbeddingBatcher(embedder, max_batch=config.RAG_EMBED_BATCH_MAX,
+                                                    max_wait_ms=config.RAG_EMBED_BATCH_WAIT_MS)
+        return self.batcher
+
+    def load(self) -> "RagEngine":
+        """
+        Load the served index generation if not already resident
+
+        A generation published since the last call (by this or another worker)
+        is swapped in; the index is only built here when there is nothing to serve.
+        """
+        if self.is_loaded:
+            if self._pointer_version != pointer_version():
+                self.swap_generation()
+            return self
+        self.get_embedder()
+        with self._lock:
+            if self.is_loaded:
+                return self
+            version = pointer_version()
+            resources = self._open_generation(live_dir())
+            if resources is not None:
+                self._install(resources, version)
+                return self
+
+        # Nothing to serve yet: build the first generation (the engine lock is not held,
+        # so a background rebuild publishing meanwhile cannot deadlock with this one)
+        with _rebuild_lock:
+            if not os.path.exists(live_path(INDEX_PATH)):
+                with build_encoder(self) as encoder:
+                    generation = build_index_generation(encoder, self.embedding_key)
+                with _index_update_lock:
+                    publish_generation(generation, keep=config.RAG_INDEX_GENERATIONS_KEEP)
+        if not self.swap_generation():
+            raise RuntimeError("The built index generation could not be loaded")
+        return self
+
+    def _open_generation(self, root: str):
+        """Index, chunks, metadata, posting indexes and structured tables of a generation, None if it has no index"""
+        index, chunks, meta = load_index(root)
+        if index is None:
+            return None
+        locations, sparse = load_location_index(chunks, root), load_sparse_index(chunks, root)
+        if isinstance(index, SegmentedIndex) and index.delta is not None:
+            add_delta_postings({LOCATION_INDEX_PATH: locations, SPARSE_INDEX_PATH: sparse}, index_ids(index.delta), chunks)
+        return index, chunks, meta, locations, sparse, load_structured_tables(root)
+
+    def _install(self, resources, version):
+        index, chunks, meta, locations, sparse, tables = resources
+        self.index, self.chunks, self.meta, self.locations, self.sparse = index, chunks, meta, locations, sparse
+        self.tables = tables
+        self.generation = meta.get("generation")
+        self._pointer_version = version
+        self.query_cache.set_version(index_version(meta, index.ntotal))
+        self.answer_cache.set_version(index_version(meta, index.ntotal))
+        print(f"RAG engine ready with {len(chunks)} chunks" + (f" (generation {self.generation})" if self.generation else ""))
+
+    def swap_generation(self) -> bool:
+        """
+        Switch to the published generation without a gap in service
+
+        The new generation is opened while queries keep using the resident one,
+        then all of its parts are swapped in together.
+
+        Returns:
+            True if the engine now serves the published generation
+        """
+        version = pointer_version()
+        resources = self._open_generation(live_dir())
+        with self._lock:
+            # Not retried per query; the next publish or reset tries again
+            self._pointer_version = version
+            if resources is None:
+                print(" Published index generation could not be opened, keeping the resident one")
+                return False
+            self._install(resources, version)
+        return True
+
+    def snapshot(self):
+        """Index, chunks, location and BM25 indexes of the same generation"""
+        with self._lock:
+            return self.index, self.chunks, self.locations, self.sparse
+
+    def reset(self):
+        """Drop the resident index so the next query reloads it from disk; cached answers go with it"""
+        with self._lock:
+            self.index, self.chunks, self.meta, self.locations, self.sparse = None, None, None, None, None
+            self.tables = None
+        self.answer_cache.clear()
+
+    def get_few_shots(self) -> FewShotSelector:
+        """Return the few-shot selector, embedding the example queries on first use"""
+        if self.few_shots is None:
+            embedder = self.get_embedder()
+            with self._lock:
+                if self.few_shots is None:
+                    store = shared_embedding_store(EMBEDDING_STORE_DIR, self.embedding_key,
+                                                   dtype=config.RAG_EMBEDDING_DTYPE)
+                    encode = _batch_encoder(embedder)
+                    self.few_shots = FewShotSelector(FEW_SHOT_EXAMPLES, lambda texts: store.embed(texts, encode))
+        return self.few_shots
+
+    def few_shot_block(self, query: str) -> str:
+        """
+        Worked examples for the REPL prompt: the ones closest to the query under the few-shot token budget
+
+        Args:
+            query: Query text (the query embedding is shared with retrieval through the query cache)
+
+        Returns:
+            Numbered examples block, empty if few-shot examples are disabled
+        """
+        if config.RAG_FEW_SHOT_K <= 0:
+            return ""
+        canonical_query = canonicalize_query(normalize_text(query))
+        if not canonical_query:
+            return ""
+        vector = query_vectors([canonical_query], self.query_encoder(), self.query_cache)[0]
+        examples = self.get_few_shots().select(query, vector, k=config.RAG_FEW_SHOT_K,
+                                               token_budget=config.RAG_FEW_SHOT_TOKEN_BUDGET,
+                                               filter_intents=config.RAG_FEW_SHOT_INTENT_FILTER)
+        return format_examples(examples)
+
+    def _get_language_services(self):
+        if self.language_detector is None or self.translation_service is None:
+            from src.language_detection import LanguageDetector
+            from src.translation_service import TranslationService
+            with self._lock:
+                if self.language_detector is None:
+                    self.language_detector = LanguageDetector()
+                if self.translation_service is None:
+                    self.translation_service = TranslationService()
+        return self.language_detector, self.translation_service
+
+    def translate_query(self, query: str) -> Tuple[str, str, float]:
+        """
+        Auto-detect the query language and translate it to English
+
+        Returns:
+            (english_query, detected_language, translation_confidence); the original
+            query is returned unchanged when detection or translation fails
+        """
+        english_query = query
+        detected_language = "English"
+        translation_confidence = 1.0
     
-    try:
-        # Import language detection and translation services
-        import sys
-        import os
-        parent_dir = Path(__file__).parent.parent
-        sys.path.insert(0, str(parent_dir))
-        
-        from src.language_detection import LanguageDetector
-        from src.translation_service import TranslationService
-        
-        # Detect language
-        language_detector = LanguageDetector()
-        lang_code, lang_confidence = language_detector.detect_language(query)
-        detected_language = language_detector.get_language_name(lang_code)
-        
-        # Translate to English if not already English
-        if lang_code != 'en':
-            translation_service = TranslationService()
-            translation_result = translation_service.translate_to_english(query, lang_code)
+        try:
+            # Language services are created once and reused across queries
+            language_detector, translation_service = self._get_language_services()
+
+            # Detect language
+            lang_code, lang_confidence = language_detector.detect_language(query)
+            detected_language = language_detector.get_language_name(lang_code)
+
+            # Translate to English if not already English
+            if lang_code != 'en':
+                translation_result = translation_service.translate_to_english(query, lang_code)
             
-            if translation_result.get('translated_text'):
-                english_query = translation_result['translated_text']
-                translation_confidence = translation_result.get('confidence', 0.8)
-            else:
-                # Translation failed, use original query
-                pass
+                if translation_result.get('translated_text'):
+                    english_query = translation_result['translated_text']
+                    translation_confidence = translation_result.get('confidence', 0.8)
+                else:
+                    # Translation failed, use original query
+                    pass
             
-    except Exception as e:
-        # Language processing error, use original query
-        pass
+        except Exception as e:
+            # Language processing error, use original query
+            pass
+
+        return english_query, detected_language, translation_confidence
+
+    def batch_search(self, queries: List[str], top_k: int = 5) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Retrieve top_k (indices, scores) for many English queries with one encode and one search, fused with BM25"""
+        self.load()
+        index, _, _, sparse = self.snapshot()
+        return hybrid_search(queries, self.query_encoder(), index, sparse, top_k=top_k, cache=self.query_cache)
+
+    def process_queries(self, queries: List[str], location: str = None, weather_data: Dict[str, Any] = None,
+                        top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Process many queries, retrieving for all of them in a single batch first
+
+        The batch warms the query cache, so each process_query call below reuses
+        its hits instead of encoding and searching one query at a time.
+        """
+        translations = [self.translate_query(query) for query in queries]
+        self.batch_search([english_query for english_query, _, _ in translations],
+                          top_k=max(top_k, config.RAG_CONTEXT_CANDIDATES))
+        return [
+            self.process_query(query, location=location, weather_data=weather_data, top_k=top_k, translation=translation)
+            for query, translation in zip(queries, translations)
+        ]
+
+    def _structured_response(self, structured: Dict[str, Any], query: str, english_query: str,
+                             detected_language: str, translation_confidence: float, location: str = None,
+                             on_event: Callable[[str, Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Answer from a structured table aggregate alone, without retrieval or an LLM call"""
+        answer = describe_result(structured)
+        if on_event is not None:
+            on_event("sources", {"sources": [{"source": structured["table"], "score": 1.0}], "relevant_chunks": 0})
+            on_event("token", {"text": answer})
+        return {
+            "answer": answer,
+            "confidence": 0.95 if structured["rows"] else 0.5,
+            "source": "Structured Table",
+            "original_query": query,
+            "english_query": english_query,
+            "detected_language": detected_language,
+            "translation_confidence": translation_confidence,
+            "location": location,
+            "relevant_chunks": 0,
+            "table_rows": structured["rows"],
+            "processing_time": "< 1s",
+            "model_used": "Structured Table Aggregation",
+            "context_sources": [structured["table"]],
+            "structured": structured
+        }
+
+    def process_query(self, query: str, location: str = None, weather_data: Dict[str, Any] = None, top_k: int = 5,
+                      translation: Tuple[str, str, float] = None,
+                      on_event: Callable[[str, Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Process a query through the RAG system and return structured response with confidence
+        
+        Args:
+            query: User query (any language)
+            location: User location
+            weather_data: Current weather data from weather service
+            top_k: Number of top results to retrieve
+            translation: Precomputed translate_query() result, if already available
+            on_event: Streaming callback, called with ("sources", {...}) once the context is
+                retrieved and ("token", {"text": ...}) for each piece of the LLM answer
+        """
+        # Step 1: Auto-detect language and translate to English
+        english_query, detected_language, translation_confidence = translation or self.translate_query(query)
+        # One keyword scan of the English query feeds every routing check below
+        features = query_features(english_query)
     
-    # Step 2: Use weather data passed from API (no duplicate fetching)
-    fresh_weather_data = weather_data  # Use weather data passed from API
-    target_date = None
-    confidence_score = 0.75  # Default confidence
+        # Step 2: Use weather data passed from API (no duplicate fetching)
+        fresh_weather_data = weather_data  # Use weather data passed from API
+        target_date = None
+        confidence_score = 0.75  # Default confidence
     
-    if location and fresh_weather_data and 'error' not in fresh_weather_data:
-        # Parse date from English query for confidence scoring
-        from datetime import datetime, timedelta
-        import re
-        
-        today = datetime.now()
-        query_lower = english_query.lower()
+        if location and fresh_weather_data and 'error' not in fresh_weather_data:
+            # Parse date from English query for confidence scoring
+            from datetime import datetime, timedelta
+            import re
         
-        if 'tomorrow' in query_lower:
-            target_date = today + timedelta(days=1)
-            confidence_score = 0.90
-        elif 'today' in query_lower:
-            target_date = today
-            confidence_score = 0.95
-        elif 'day' in query_lower:
-            # Look for patterns like "7 days later", "in 5 days", "after 3 days"
-            day_patterns = [
-                r'(\d+)\s*days?\s*later',
-                r'in\s*(\d+)\s*days?',
-                r'after\s*(\d+)\s*days?',
-                r'(\d+)\s*days?\s*from\s*now'
-            ]
-            for pattern in day_patterns:
-                match = re.search(pattern, query_lower)
-                if match:
-                    days_ahead = int(match.group(1))
-                    target_date = today + timedelta(days=days_ahead)
-                    confidence_score = max(0.60, 0.95 - (days_ahead * 0.05))
-                    break
+            today = datetime.now()
+            query_lower = english_query.lower()
         
-        if not target_date:
-            target_date = today
-            confidence_score = 0.85
-        
-        # For direct weather queries ONLY (not crop/agriculture questions), return immediate response
-        is_direct_weather_query = (
-            any(word in english_query.lower() for word in ['weather tomorrow', 'weather today', 'temperature tomorrow', 'humidity tomorrow']) or
-            (any(word in english_query.lower() for word in ['weather', 'temperature']) and 
-             not any(crop_word in english_query.lower() for crop_word in ['crop', 'crops', 'suitable', 'farming', 'agriculture', 'plant', 'grow', 'cultivation']))
-        )
-        
-        if is_direct_weather_query:
-            date_str = "today" if target_date.date() == today.date() else target_date.strftime('%B %d, %Y')
             if 'tomorrow' in query_lower:
-                date_str = "tomorrow"
+                target_date = today + timedelta(days=1)
+                confidence_score = 0.90
+            elif 'today' in query_lower:
+                target_date = today
+                confidence_score = 0.95
+            elif 'day' in query_lower:
+                # Look for patterns like "7 days later", "in 5 days", "after 3 days"
+                day_patterns = [
+                    r'(\d+)\s*days?\s*later',
+                    r'in\s*(\d+)\s*days?',
+                    r'after\s*(\d+)\s*days?',
+                    r'(\d+)\s*days?\s*from\s*now'
+                ]
+                for pattern in day_patterns:
+                    match = re.search(pattern, query_lower)
+                    if match:
+                        days_ahead = int(match.group(1))
+                        target_date = today + timedelta(days=days_ahead)
+                        confidence_score = max(0.60, 0.95 - (days_ahead * 0.05))
+                        break
+        
+            if not target_date:
+                target_date = today
+                confidence_score = 0.85
+        
+            # For direct weather queries ONLY (not crop/agriculture questions), return immediate response
+            is_direct_weather_query = (
+                features.has("weather_day") or
+                (features.has("weather_terms") and not features.has("crop_context"))
+            )
+        
+            if is_direct_weather_query:
+                date_str = "today" if target_date.date() == today.date() else target_date.strftime('%B %d, %Y')
+                if 'tomorrow' in query_lower:
+                    date_str = "tomorrow"
             
-            return {
-                "answer": f"The weather in {location} {date_str}: Temperature {fresh_weather_data.get('temperature', 'N/A')}°C, Humidity {fresh_weather_data.get('humidity', 'N/A')}%, Wind speed {fresh_weather_data.get('wind_speed', 'N/A')} m/s, Soil moisture {fresh_weather_data.get('moisture', 'N/A')}%.",
-                "confidence": confidence_score,
-                "source": "Live Weather Data",
-                "original_query": query,
-                "english_query": english_query,
-                "detected_language": detected_language,
-                "translation_confidence": translation_confidence,
-                "location": location,
-                "target_date": target_date.strftime('%Y-%m-%d'),
-                "relevant_chunks": 1,
-                "total_chunks_searched": 1,
-                "processing_time": "< 1s",
-                "model_used": "Weather Service API",
-                "context_sources": ["Live Weather API"]
-            }
+                return {
+                    "answer": f"The weather in {location} {date_str}: Temperature {fresh_weather_data.get('temperature', 'N/A')}°C, Humidity {fresh_weather_data.get('humidity', 'N/A')}%, Wind speed {fresh_weather_data.get('wind_speed', 'N/A')} m/s, Soil moisture {fresh_weather_data.get('moisture', 'N/A')}%.",
+                    "confidence": confidence_score,
+                    "source": "Live Weather Data",
+                    "original_query": query,
+                    "english_query": english_query,
+                    "detected_language": detected_language,
+                    "translation_confidence": translation_confidence,
+                    "location": location,
+                    "target_date": target_date.strftime('%Y-%m-%d'),
+                    "relevant_chunks": 1,
+                    "total_chunks_searched": 1,
+                    "processing_time": "< 1s",
+                    "model_used": "Weather Service API",
+                    "context_sources": ["Live Weather API"]
+                }
     
-    try:
-        # Step 3: Initialize embedder and load/create index
-        model_name = config.EMBEDDING_MODEL
-        embedder = SentenceTransformer(model_name, device="cpu")
-        
-        # Load existing index or create new one
-        index, df_chunks, meta = load_index()
-        if index is None:
-            df_chunks = load_all_data()
-            
-            texts = df_chunks["text"].tolist()
-            index = build_faiss_index_safe(texts, embedder)
-            meta = {"model_name": model_name, "total_chunks": len(df_chunks), "created_at": time.strftime("%Y-%m-%d %H:%M:%S")}
-            save_index(index, df_chunks, meta)
-        
-        # ALWAYS add fresh weather data to context when available (irrespective of query type)
-        if fresh_weather_data and location:
-            if 'error' not in str(fresh_weather_data).lower():
-                weather_text = feed_weather_data_to_rag(fresh_weather_data, location)
-                if weather_text and "error" not in weather_text.lower():
-                    # Add weather data as a temporary chunk for this query
-                    weather_chunk = {
-                        'text': f"Current weather in {location}: {weather_text}",
-                        'source_file': f'live_weather_{location}_{int(time.time())}',
-                        'chunk_id': f'live_weather_{location}_{int(time.time())}'
-                    }
-                    df_chunks = pd.concat([df_chunks, pd.DataFrame([weather_chunk])], ignore_index=True)
-                    print(f"✅ Weather data added to RAG context for {location}")
-            else:
-                print(f"⚠️ Weather data has error, not adding to RAG context: {fresh_weather_data}")
-        else:
-            print(f"⚠️ No weather data available for RAG processing")
-        
-        # Step 4: Preprocess English query (handle rice -> paddy, etc.)
-        processed_query = english_query.lower().replace("rice", "paddy")
-        
-        # Search for relevant chunks using English query
-        indices, scores = faiss_search(processed_query, embedder, index, top_k=top_k)
-        
-        if len(indices) == 0:
-            return {
-                "answer": "I couldn't find relevant information for your query. Please try rephrasing or ask about agriculture, crops, or weather.",
-                "confidence": 0.0,
-                "source": "RAG System - No Results",
-                "query": query,
-                "relevant_chunks": 0
-            }
-        
-        # Get valid indices and filter by score threshold
-        valid_indices = indices[indices < len(df_chunks)]
-        if len(valid_indices) == 0:
-            return {
-                "answer": "I couldn't find valid information for your query. Please try a different question.",
-                "confidence": 0.0,
-                "source": "RAG System - Invalid Results",
-                "query": query,
-                "relevant_chunks": 0
-            }
-        
-        # Filter by relevance score with location priority
-        high_confidence_indices = []
-        high_confidence_scores = []
-        location_specific_results = []
-        general_results = []
-        
-        for i, idx in enumerate(valid_indices[:top_k]):
-            if i < len(scores) and scores[i] > 0.2:
-                chunk_text = df_chunks.iloc[idx]['text'].lower()
-                
-                # Check if this chunk mentions the requested location
-                if location and any(loc_part.lower() in chunk_text for loc_part in location.split(',')):
-                    location_specific_results.append((scores[i] + 0.3, idx))  # Boost location-specific results
+        try:
+            # Step 3: Use the resident embedder and index (loaded once per process)
+            self.load()
+            embedder = self.query_encoder()
+            index, chunks, locations, sparse = self.snapshot()
+            live_chunks = 0
+
+            # Step 3b: Questions about a structured table ("fertilizer for cotton on black soil") are
+            # answered by aggregating its typed columns, since its rows are not in the vector index
+            tables = self.tables
+            structured = tables.answer(english_query) if tables is not None else None
+            if structured is not None and config.RAG_STRUCTURED_ANSWER == "direct":
+                return self._structured_response(structured, query, english_query, detected_language,
+                                                 translation_confidence, location, on_event)
+
+            # ALWAYS add fresh weather data to context when available (irrespective of query type)
+            if fresh_weather_data and location:
+                if 'error' not in str(fresh_weather_data).lower():
+                    weather_text = feed_weather_data_to_rag(fresh_weather_data, location)
+                    if weather_text and "error" not in weather_text.lower():
+                        # Live weather is a per-query chunk; it is counted but never written to the shared store
+                        live_chunks += 1
+                        print(f"✅ Weather data added to RAG context for {location}")
                 else:
-                    general_results.append((scores[i], idx))
-        
-        # Combine results: location-specific first, then general
-        all_results = sorted(location_specific_results, reverse=True) + sorted(general_results, reverse=True)
-        
-        for score, idx in all_results[:10]:  # Take top 10 results
-            high_confidence_indices.append(idx)
-            high_confidence_scores.append(score)
-        
-        if not high_confidence_indices:
-            return {
-                "answer": "I found some information but it doesn't seem directly relevant to your query. Please try asking more specific questions about agriculture, weather, or crops.",
-                "confidence": 0.1,
-                "source": "RAG System - Low Relevance",
-                "query": query,
-                "relevant_chunks": len(valid_indices)
-            }
-        
-        # Get relevant chunks
-        retrieved = df_chunks.iloc[high_confidence_indices]
-        context_parts = []
-        for i, (_, row) in enumerate(retrieved.iterrows()):
-            context_parts.append(f"- {row['text']} (source: {row['source_file']})")
-        
-        context = "\n".join(context_parts)
-        
-        # Calculate dynamic confidence based on relevance scores and data freshness
-        avg_relevance = sum(high_confidence_scores) / len(high_confidence_scores)
-        base_confidence = min(0.95, avg_relevance)  # Cap at 95%
+                    print(f"⚠️ Weather data has error, not adding to RAG context: {fresh_weather_data}")
+            else:
+                print(f"⚠️ No weather data available for RAG processing")
+        
+            # Step 4: Search for relevant chunks using the English query; the search canonicalizes
+            # it (punctuation, whitespace, rice -> paddy), serves repeats from the query cache and
+            # fuses BM25 scores in so exact names and codes ("14-35-14") are not missed
+            # More candidates than top_k are fetched so context packing has distinct chunks to choose from
+            fetch_k = max(top_k, config.RAG_CONTEXT_CANDIDATES)
+            indices, scores = hybrid_search([english_query], embedder, index, sparse, top_k=fetch_k,
+                                            cache=self.query_cache)[0]
+            hits = list(zip(indices.tolist(), scores.tolist()))
+
+            # Step 4b: Search within the requested location's chunks too, so its rows surface
+            # even when they fall outside the global top_k
+            location_ids = None
+            if locations is not None and isinstance(index, (faiss.IndexIDMap2, SegmentedIndex)):
+                candidate_ids = locations.candidates(location, english_query)
+                if len(candidate_ids):
+                    location_ids = set(candidate_ids.tolist())
+                    local_indices, local_scores = location_search(english_query, embedder, index, candidate_ids,
+                                                                  top_k=fetch_k, cache=self.query_cache)
+                    seen = set(indices.tolist())
+                    hits += [(idx, score) for idx, score in zip(local_indices.tolist(), local_scores.tolist()) if idx not in seen]
+        
+            if not hits:
+                if structured is not None:
+                    return self._structured_response(structured, query, english_query, detected_language,
+                                                     translation_confidence, location, on_event)
+                return {
+                    "answer": "I couldn't find relevant information for your query. Please try rephrasing or ask about agriculture, crops, or weather.",
+                    "confidence": 0.0,
+                    "source": "RAG System - No Results",
+                    "query": query,
+                    "relevant_chunks": 0
+                }
+        
+            # Get valid indices and filter by score threshold
+            hits = [(idx, score) for idx, score in hits if 0 <= idx < len(chunks)]
+            valid_indices = [idx for idx, _ in hits]
+            if len(valid_indices) == 0:
+                if structured is not None:
+                    return self._structured_response(structured, query, english_query, detected_language,
+                                                     translation_confidence, location, on_event)
+                return {
+                    "answer": "I couldn't find valid information for your query. Please try a different question.",
+                    "confidence": 0.0,
+                    "source": "RAG System - Invalid Results",
+                    "query": query,
+                    "relevant_chunks": 0
+                }
+        
+            # Filter by relevance score with location priority
+            high_confidence_indices = []
+            high_confidence_scores = []
+            location_specific_results = []
+            general_results = []
+        
+            for idx, score in hits:
+                if score > 0.2:
+                    # Location membership comes from the location index when available,
+                    # otherwise from the chunk text mentioning a part of the location
+                    if location_ids is not None:
+                        is_location_specific = idx in location_ids
+                    else:
+                        chunk_text = chunks.text(idx).lower()
+                        is_location_specific = bool(location) and any(loc_part.lower() in chunk_text for loc_part in location.split(','))
+                    if is_location_specific:
+                        location_specific_results.append((score + 0.3, idx))  # Boost location-specific results
+                    else:
+                        general_results.append((score, idx))
+        
+            # Combine results: location-specific first, then general
+            all_results = sorted(location_specific_results, reverse=True) + sorted(general_results, reverse=True)
+
+            # Pack the context: drop near-duplicate chunks (e.g. a city's daily weather rows), prefer
+            # chunks adding something new (MMR) and stop at the prompt token budget
+            if all_results:
+                candidate_ids = [idx for _, idx in all_results]
+                lines = [context_line(*chunks.get(idx)) for idx in candidate_ids]
+                packed = pack_context([score for score, _ in all_results],
+                                      chunk_vectors(index, candidate_ids, chunks, embedder), lines,
+                                      token_budget=config.RAG_CONTEXT_TOKEN_BUDGET,
+                                      max_chunks=config.RAG_CONTEXT_MAX_CHUNKS,
+                                      duplicate_threshold=config.RAG_CONTEXT_DUPLICATE_THRESHOLD,
+                                      mmr_lambda=config.RAG_CONTEXT_MMR_LAMBDA)
+                all_results = [all_results[i] for i in packed]
+        
+            for score, idx in all_results:
+                high_confidence_indices.append(idx)
+                high_confidence_scores.append(score)
+        
+            if not high_confidence_indices:
+                if structured is not None:
+                    return self._structured_response(structured, query, english_query, detected_language,
+                                                     translation_confidence, location, on_event)
+                return {
+                    "answer": "I found some information but it doesn't seem directly relevant to your query. Please try asking more specific questions about agriculture, weather, or crops.",
+                    "confidence": 0.1,
+                    "source": "RAG System - Low Relevance",
+                    "query": query,
+                    "relevant_chunks": len(valid_indices)
+                }
+        
+            # Get relevant chunks
+            retrieved = [chunks.get(idx) for idx in high_confidence_indices]
+            context_parts = []
+            for text, source_file in retrieved:
+                context_parts.append(context_line(text, source_file))
+            context_sources = [str(source_file) for _, source_file in retrieved]
+            if structured is not None:
+                # The exact aggregate leads the context; retrieved chunks add the surrounding knowledge
+                context_parts.insert(0, context_line(describe_result(structured), structured["table"]))
+                context_sources.insert(0, structured["table"])
         
-        # Adjust confidence based on whether we have fresh weather data
-        if fresh_weather_data and location:
-            confidence = min(0.95, base_confidence + 0.10)  # Boost for fresh weather data
-        else:
-            confidence = base_confidence
+            context = "\n".join(context_parts)
+            if on_event is not None:
+                on_event("sources", {
+                    "sources": ([{"source": structured["table"], "score": 1.0}] if structured is not None else []) +
+                               [{"source": str(source_file), "score": round(float(score), 4)}
+                                for (_, source_file), score in zip(retrieved, high_confidence_scores)],
+                    "relevant_chunks": int(len(high_confidence_indices)),
+                })
+        
+            # Calculate dynamic confidence based on relevance scores and data freshness
+            avg_relevance = sum(high_confidence_scores) / len(high_confidence_scores)
+            base_confidence = min(0.95, avg_relevance)  # Cap at 95%
+        
+            # Adjust confidence based on whether we have fresh weather data
+            if fresh_weather_data and location:
+                confidence = min(0.95, base_confidence + 0.10)  # Boost for fresh weather data
+            else:
+                confidence = base_confidence
             
-        # Use the confidence score calculated from date parsing if available
-        if 'confidence_score' in locals() and confidence_score:
-            confidence = max(confidence, confidence_score)
-        
-        # Check if this is a simple weather query (using English query) - exclude agriculture questions
-        is_simple_weather = (
-            any(word in english_query.lower() for word in ['weather tomorrow', 'temperature tomorrow', 'humidity tomorrow', 'weather today', 'tomorrow weather', 'tomorrow temperature', 'tomorrow humidity']) and
-            not any(crop_word in english_query.lower() for crop_word in ['crop', 'crops', 'suitable', 'farming', 'agriculture', 'plant', 'grow', 'cultivation'])
-        )
-        
-        # Check if this is specifically asking for tomorrow's temperature only
-        is_tomorrow_temp_only = any(phrase in english_query.lower() for phrase in [
-            'what will be the weather tomorrow',
-            'weather tomorrow',
-            'temperature tomorrow', 
-            'tomorrow weather',
-            'tomorrow temperature'
-        ]) and not any(crop_word in english_query.lower() for crop_word in ['crop', 'crops', 'suitable', 'farming', 'agriculture', 'plant', 'grow', 'cultivation'])
-        
-        if is_tomorrow_temp_only:
-            # For tomorrow weather queries, provide only temperature forecast without farming advice
-            if fresh_weather_data and 'error' not in str(fresh_weather_data).lower():
-                # Get tomorrow's forecast from daily data if available
-                tomorrow_temp = "N/A"
-                if 'daily' in fresh_weather_data and fresh_weather_data['daily']:
-                    # Look for tomorrow's data (index 1, since 0 is today)
-                    if len(fresh_weather_data['daily']) > 1:
-                        tomorrow_data = fresh_weather_data['daily'][1]
-                        tomorrow_temp = tomorrow_data.get('temp', tomorrow_data.get('temp_c', 'N/A'))
-                    elif len(fresh_weather_data['daily']) > 0:
-                        # If only today's data available, use current temperature as estimate
+            # Use the confidence score calculated from date parsing if available
+            if 'confidence_score' in locals() and confidence_score:
+                confidence = max(confidence, confidence_score)
+        
+            # Check if this is a simple weather query (using English query) - exclude agriculture questions
+            is_simple_weather = features.has("simple_weather") and not features.has("crop_context")
+        
+            # Check if this is specifically asking for tomorrow's temperature only
+            is_tomorrow_temp_only = features.has("tomorrow_temperature") and not features.has("crop_context")
+        
+            # Prompts are compiled once by the engine; only their slots are filled here
+            prompt_values = {"context": context, "query": english_query, "location": location,
+                             "location_label": location or 'Not specified', "detected_language": detected_language,
+                             **weather_slots(fresh_weather_data)}
+            if is_tomorrow_temp_only:
+                # For tomorrow weather queries, provide only temperature forecast without farming advice
+                if fresh_weather_data and 'error' not in str(fresh_weather_data).lower():
+                    # Get tomorrow's forecast from daily data if available
+                    tomorrow_temp = "N/A"
+                    if 'daily' in fresh_weather_data and fresh_weather_data['daily']:
+                        # Look for tomorrow's data (index 1, since 0 is today)
+                        if len(fresh_weather_data['daily']) > 1:
+                            tomorrow_data = fresh_weather_data['daily'][1]
+                            tomorrow_temp = tomorrow_data.get('temp', tomorrow_data.get('temp_c', 'N/A'))
+                        elif len(fresh_weather_data['daily']) > 0:
+                            # If only today's data available, use current temperature as estimate
+                            tomorrow_temp = fresh_weather_data.get('temperature', 'N/A')
+                    else:
+                        # Fallback to current temperature
                         tomorrow_temp = fresh_weather_data.get('temperature', 'N/A')
-                else:
-                    # Fallback to current temperature
-                    tomorrow_temp = fresh_weather_data.get('temperature', 'N/A')
                 
-                # Simple template for temperature-only queries
-                template = ChatPromptTemplate.from_template(f"""
-Answer this weather question directly and briefly. Only provide the temperature information requested.
-
-Question: {{query}}
-
-Tomorrow's temperature in {location}: {tomorrow_temp}°C
-
-Keep the response short and only mention the temperature. Do not provide farming advice or other weather details unless specifically asked.""")
-            else:
-                template = ChatPromptTemplate.from_template(f"""
-Weather data is not available for {location} at this time. Please try again later.
-
-Question: {{query}}""")
-        elif is_simple_weather and context_parts:
-            # For simple weather queries, use a direct template with location priority (ALWAYS includes weather context)
-            weather_context = ""
-            if fresh_weather_data and 'error' not in str(fresh_weather_data).lower():
-                weather_context = f"""
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-"""
+                    # Simple template for temperature-only queries
+                    prompt_name = "tomorrow_temperature"
+                    prompt_values["tomorrow_temp"] = tomorrow_temp
+                else:
+                    prompt_name = "weather_unavailable"
+            elif is_simple_weather and context_parts:
+                # For simple weather queries, use a direct template with location priority (ALWAYS includes weather context)
+                prompt_name = "simple_weather"
+                prompt_values["weather_context"] = weather_context(location, fresh_weather_data)
             else:
-                weather_context = f"""
-**Weather Data:**
-No current weather data available for {location}
-"""
+                # Better classification of different query types
+                is_crop_recommendation_query = features.has("crop_recommendation")
             
-            template = ChatPromptTemplate.from_template(f"""
-IMPORTANT: ALWAYS start your response with current weather data for {location}:
-
-{weather_context}
-
-Then give a simple, direct answer for the SPECIFIC LOCATION requested.
-
-Location requested: {location or 'Not specified'}
-Original query language: {detected_language}
-
-Context:
-{{context}}
-
-English Query: {{query}}
-
-IMPORTANT: 
-1. ALWAYS show current weather data first
-2. Only use weather data that matches the requested location "{location}"
-3. If no data for "{location}" is found, say "Weather data not available for {location}"
-4. Keep it simple and direct
-
-Answer format: 
-**Current Weather in {location}:**
-[Show current weather data]
-
-**Forecast:**
-[Answer the specific question]""")
-        else:
-            # Better classification of different query types
-            is_crop_recommendation_query = any(phrase in english_query.lower() for phrase in [
-                'suitable crops', 'crops for', 'which crops', 'best crops', 'recommend crops',
-                'what crops', 'crop recommendations', 'crops suitable', 'good crops',
-                'seed variety', 'seed varieties', 'what seeds', 'which seeds', 'unpredictable weather',
-                'variable weather', 'changing weather', 'weather resistant', 'hardy crops',
-                'resilient crops', 'adaptable crops', 'flexible crops'
-            ])
-            
-            is_specific_crop_query = any(crop in english_query.lower() for crop in [
-                'wheat', 'rice', 'corn', 'tomato', 'potato', 'onion', 'cotton', 'sugarcane',
-                'barley', 'mustard', 'peas', 'lentils', 'beans', 'cucumber', 'carrot'
-            ]) and any(word in english_query.lower() for word in ['good', 'suitable', 'grow', 'plant', 'weather'])
+                is_specific_crop_query = features.has("specific_crop_names") and features.has("crop_suitability")
             
-            is_general_weather_query = any(phrase in english_query.lower() for phrase in [
-                'how is the weather', 'weather conditions', 'current weather', 'weather forecast'
-            ]) and not any(crop_word in english_query.lower() for crop_word in ['crop', 'plant', 'grow', 'farm'])
+                is_general_weather_query = features.has("general_weather") and not features.has("general_weather_exclusions")
             
-            is_farming_advice_query = any(phrase in english_query.lower() for phrase in [
-                'farming advice', 'agricultural advice', 'when to plant', 'how to grow',
-                'irrigation', 'fertilizer', 'pest control', 'harvest time'
-            ])
+                is_farming_advice_query = features.has("farming_advice")
             
-            if is_crop_recommendation_query and fresh_weather_data:
-                # Use concise crop recommendation template
-                # Check if this is a seed variety question
-                is_seed_variety_question = any(phrase in english_query.lower() for phrase in [
-                    'seed variety', 'seed varieties', 'what seeds', 'which seeds', 'unpredictable weather',
-                    'variable weather', 'changing weather', 'weather resistant'
-                ])
+                if is_crop_recommendation_query and fresh_weather_data:
+                    # Use concise crop recommendation template
+                    # Check if this is a seed variety question
+                    is_seed_variety_question = features.has("seed_variety")
                 
-                if is_seed_variety_question:
-                    # Enhanced template for seed variety questions
-                    template = ChatPromptTemplate.from_template(f"""
-IMPORTANT: ALWAYS start your response with current weather data for {location}:
-
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-
-Based on these weather conditions, provide comprehensive seed variety recommendations:
-
-**Best Seed Varieties for Current Conditions (5-7 varieties):**
-1. [Crop Name + Variety] - [Why this variety is ideal for current weather]
-2. [Crop Name + Variety] - [Why this variety is ideal for current weather]
-3. [Crop Name + Variety] - [Why this variety is ideal for current weather]
-4. [Crop Name + Variety] - [Why this variety is ideal for current weather]
-5. [Crop Name + Variety] - [Why this variety is ideal for current weather]
-
-**Seed Varieties to Avoid (3-4 varieties):**
-• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
-• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
-• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
-
-**Seed Selection Strategy for Unpredictable Weather:**
-• **Disease-Resistant Varieties**: Essential for high humidity conditions
-• **Drought-Tolerant Seeds**: Important if soil moisture varies
-• **Early-Maturing Varieties**: Reduce exposure to weather changes
-• **Weather-Adaptive Strains**: Handle temperature and humidity fluctuations
-• **Local Climate-Adapted Seeds**: Best suited for {location} conditions
-
-**Planting Recommendations:**
-- Plant in stages to spread risk
-- Start with hardy, weather-resistant varieties
-- Consider crop rotation for disease prevention
-- Monitor weather forecasts for optimal planting times
-
-Context: {{context}}
-Question: {{query}}""")
+                    # Enhanced template for seed variety questions, standard crop recommendation otherwise
+                    prompt_name = "seed_variety" if is_seed_variety_question else "crop_recommendation"
+                elif is_specific_crop_query and fresh_weather_data:
+                    # Template for specific crop suitability questions
+                    prompt_name = "specific_crop"
+                elif is_general_weather_query:
+                    # Template for general weather questions
+                    prompt_name = "general_weather"
                 else:
-                    # Standard crop recommendation template
-                    template = ChatPromptTemplate.from_template(f"""
-IMPORTANT: ALWAYS start your response with current weather data for {location}:
-
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-
-Based on these weather conditions, provide:
-
-**Recommended Crops (3-5 crops):**
-1. [Crop Name] - [Brief reason why it's suitable for current weather]
-2. [Crop Name] - [Brief reason why it's suitable for current weather]  
-3. [Crop Name] - [Brief reason why it's suitable for current weather]
-
-**Crops to Avoid (2-3 crops):**
-• [Crop Name] - [Reason why it's not suitable for current weather]
-• [Crop Name] - [Reason why it's not suitable for current weather]
-
-**Key Considerations:**
-- Temperature range: {fresh_weather_data.get('temperature', 'N/A')}°C is [optimal/too hot/too cold] for [crop types]
-- Humidity level: {fresh_weather_data.get('humidity', 'N/A')}% is [ideal/too high/too low] for [crop types]
-- Soil moisture: {fresh_weather_data.get('moisture', 'N/A')}% indicates [good drainage/water retention needed]
-
-Keep recommendations practical and based on current weather conditions.
-
-Context: {{context}}
-Question: {{query}}""")
-            elif is_specific_crop_query and fresh_weather_data:
-                # Template for specific crop suitability questions
-                template = ChatPromptTemplate.from_template(f"""
-Answer this specific crop question directly and concisely.
-
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-
-Based on the current weather conditions above, answer the specific question about the crop mentioned.
-
-Question: {{query}}
-
-**Answer Format:**
-1. **Direct Answer**: [YES/NO] - [Crop name] is [suitable/not suitable] for current weather
-2. **Reasoning**: [Brief explanation based on temperature, humidity, and soil conditions]
-3. **Alternative Crops**: If not suitable, suggest 2-3 crops that would work better
-4. **Avoidance Note**: If applicable, mention what conditions this crop prefers
-
-Be specific to the crop and weather mentioned in the question. Keep it concise but informative.
-
-Context: {{context}}""")
-            elif is_general_weather_query:
-                # Template for general weather questions
-                template = ChatPromptTemplate.from_template(f"""
-Provide current weather information for {location}.
-
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-- Description: {fresh_weather_data.get('description', 'N/A')}
-
-Answer the weather question directly based on the current conditions above.
-
-Question: {{query}}""")
-            else:
-                # Use detailed template for complex queries (ALWAYS includes weather context)
-                weather_context = ""
-                if fresh_weather_data and 'error' not in str(fresh_weather_data).lower():
-                    weather_context = f"""
-**Current Weather in {location}:**
-- Temperature: {fresh_weather_data.get('temperature', 'N/A')}°C
-- Humidity: {fresh_weather_data.get('humidity', 'N/A')}%
-- Soil Moisture: {fresh_weather_data.get('moisture', 'N/A')}%
-- Wind Speed: {fresh_weather_data.get('wind_speed', 'N/A')} m/s
-- Rainfall: {fresh_weather_data.get('precip_mm', 'N/A')} mm
-"""
-                else:
-                    weather_context = f"""
-**Weather Data:**
-No current weather data available for {location}
-"""
-                
-                template = ChatPromptTemplate.from_template(f"""
-You are an expert Agriculture and Weather assistant. Answer the user's question directly and specifically.
-
-{weather_context}
+                    # Use detailed template for complex queries (ALWAYS includes weather context)
+                    prompt_name = "detailed"
+                    prompt_values["weather_context"] = weather_context(location, fresh_weather_data)
 
-CRITICAL INSTRUCTIONS:
-1. Read the question carefully and answer EXACTLY what is being asked
-2. Do NOT provide generic farming advice unless specifically requested
-3. For specific crop questions (like "is wheat good for this weather"): Give a direct YES/NO answer with brief reasoning
-4. For weather questions: Provide the specific weather information requested
-5. For crop recommendation questions: List suitable crops
-6. Keep responses focused and relevant to the specific question
-
-Question: {{query}}
-Location: {location or 'Not specified'}
-
-Available context: {{context}}
-
-Answer the question directly and specifically. Do not add unnecessary information.""")
-
-        try:
-            final_prompt = template.format(context=context, query=english_query)
-            llm = ChatOpenAI(model=config.OPENAI_MODEL, temperature=config.LLM_TEMPERATURE)
-            response = llm.invoke(final_prompt)
+            try:
+                final_prompt = self.prompts.format(prompt_name, **prompt_values)
+
+                # Same prompt, or a near-identical question for the same location, prompt
+                # and weather band, is answered from the cache without calling the LLM
+                answer_key = prompt_hash(final_prompt)
+                partition = answer_partition(location, fresh_weather_data, prompt_name)
+                query_vector = query_vectors([canonicalize_query(normalize_text(english_query)) or english_query],
+                                             embedder, self.query_cache)[0]
+                cached = self.answer_cache.get(answer_key, partition, query_vector)
+                if cached is not None:
+                    answer = cached[0]
+                    if on_event is not None:
+                        on_event("token", {"text": answer})
+                else:
+                    # Shared client: pooled connections, rate limiting, identical in-flight prompts sent once
+                    on_token = (lambda text: on_event("token", {"text": text})) if on_event is not None else None
+                    answer = get_llm_client().invoke(final_prompt, temperature=config.LLM_TEMPERATURE, on_token=on_token)
+                    self.answer_cache.put(answer_key, partition, query_vector, answer)
             
-            answer = response.content.strip()
+                return {
+                    "answer": answer,
+                    "confidence": float(confidence),
+                    "source": "RAG System",
+                    "original_query": query,
+                    "english_query": english_query,
+                    "detected_language": detected_language,
+                    "translation_confidence": translation_confidence,
+                    "location": location,
+                    "relevant_chunks": int(len(high_confidence_indices)),
+                    "total_chunks_searched": int(len(chunks) + live_chunks),
+                    "processing_time": "< 3s",
+                    "model_used": config.OPENAI_MODEL,
+                    "context_sources": context_sources,
+                    "answer_cache": cached[1] if cached is not None else "miss"
+                }
             
-            return {
-                "answer": answer,
-                "confidence": float(confidence),
-                "source": "RAG System",
-                "original_query": query,
-                "english_query": english_query,
-                "detected_language": detected_language,
-                "translation_confidence": translation_confidence,
-                "location": location,
-                "relevant_chunks": int(len(high_confidence_indices)),
-                "total_chunks_searched": int(len(df_chunks)),
-                "processing_time": "< 3s",
-                "model_used": config.OPENAI_MODEL,
-                "context_sources": [str(row['source_file']) for _, row in retrieved.iterrows()]
-            }
+            except Exception as e:
+                return {
+                    "answer": f"I found relevant information but encountered an error generating the response: {str(e)}",
+                    "confidence": 0.3,
+                    "source": "RAG System - Generation Error",
+                    "query": query,
+                    "relevant_chunks": int(len(high_confidence_indices)),
+                    "error": str(e)
+                }
             
         except Exception as e:
             return {
-                "answer": f"I found relevant information but encountered an error generating the response: {str(e)}",
-                "confidence": 0.3,
-                "source": "RAG System - Generation Error",
+                "answer": f"Error processing your query: {str(e)}",
+                "confidence": 0.0,
+                "source": "RAG System - Processing Error",
                 "query": query,
-                "relevant_chunks": int(len(high_confidence_indices)),
                 "error": str(e)
             }
-            
-    except Exception as e:
-        return {
-            "answer": f"Error processing your query: {str(e)}",
-            "confidence": 0.0,
-            "source": "RAG System - Processing Error",
-            "query": query,
-            "error": str(e)
-        }
+
+
+_rag_engine = None
+_rag_engine_lock = threading.Lock()
+
+def get_rag_engine() -> RagEngine:
+    """Return the process-wide RAG engine, creating it on first call"""
+    global _rag_engine
+    if _rag_engine is None:
+        with _rag_engine_lock:
+            if _rag_engine is None:
+                _rag_engine = RagEngine()
+    return _rag_engine
+
+def process_rag_query(query: str, location: str = None, weather_data: Dict[str, Any] = None, top_k: int = 5,
+                      on_event: Callable[[str, Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    """
+    Process a query through the RAG system and return structured response with confidence
+    
+    Args:
+        query: User query (any language)
+        location: User location
+        weather_data: Current weather data from weather service
+        top_k: Number of top results to retrieve
+        on_event: Optional streaming callback (see RagEngine.process_query)
+    """
+    return get_rag_engine().process_query(query, location=location, weather_data=weather_data, top_k=top_k,
+                                          on_event=on_event)
+
+def process_rag_queries(queries: List[str], location: str = None, weather_data: Dict[str, Any] = None, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Process a list of queries through the RAG system, batching retrieval across them
+    
+    Args:
+        queries: User queries (any language)
+        location: User location, shared by all queries
+        weather_data: Current weather data from weather service
+        top_k: Number of top results to retrieve per query
+    
+    Returns:
+        One response dict per query, in input order
+    """
+    return get_rag_engine().process_queries(queries, location=location, weather_data=weather_data, top_k=top_k)
 
 def feed_weather_data_to_rag(weather_data: Dict[str, Any], location: str) -> str:
     """
@@ -1422,23 +1652,47 @@ This weather data is suitable for agricultural planning, crop selection, and far
     except Exception as e:
         return f"Weather data processing error for {location}: {str(e)}"
 
-def refresh_weather_data():
-    """Force refresh of weather data in RAG system"""
+def refresh_weather_data(wait: bool = False):
+    """
+    Force refresh of weather data in RAG system
+    
+    A new index generation is built in the background and swapped in once it is
+    complete and verified; queries keep being served from the current one.
+    
+    Args:
+        wait: Block until the new generation is published (or the build failed)
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        return {"status": "in_progress", "message": "An index rebuild is already running"}
     try:
-        # Remove cached weather data to force refresh
+        # Remove cached weather data so the build fetches fresh data
         if os.path.exists(WEATHER_DATA_PATH):
             os.remove(WEATHER_DATA_PATH)
             print("Cached weather data cleared")
-        
-        # Remove existing index to force rebuild with fresh data
-        for file_path in [INDEX_PATH, CHUNKS_CSV, META_PATH, EMBEDDINGS_PATH]:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        
-        print("RAG index cleared - will rebuild with fresh weather data on next query")
-        return {"status": "success", "message": "Weather data refresh initiated"}
+        worker = threading.Thread(target=_rebuild_in_background, name="rag-index-rebuild", daemon=True)
+        worker.start()
     except Exception as e:
+        _rebuild_lock.release()
         return {"status": "error", "message": f"Error refreshing weather data: {str(e)}"}
+    
+    if not wait:
+        return {"status": "success", "message": "Weather data refresh initiated - the index is rebuilt in the background"}
+    worker.join()
+    if _rebuild_status["state"] == "failed":
+        return {"status": "error", "message": f"Error refreshing weather data: {_rebuild_status['error']}"}
+    return {"status": "success", "message": f"Index generation {_rebuild_status['generation']} published",
+            "generation": _rebuild_status["generation"]}
+
+def rollback_index_generation():
+    """Serve the previous index generation again"""
+    try:
+        with _index_update_lock:
+            pointer = rollback_generation()
+        get_rag_engine().swap_generation()
+        return {"status": "success", "message": f"Rolled back to index generation {pointer['current']}",
+                "generation": pointer["current"]}
+    except Exception as e:
+        return {"status": "error", "message": f"Error rolling back index: {str(e)}"}
 
 def analyze_weather_for_crops(daily_forecast: List[Dict], location: str) -> str:
     """
@@ -1577,10 +1831,194 @@ Weather Conditions: {'Stable' if temp_variability < 10 else 'Variable'} temperat
     except Exception as e:
         return f"Crop analysis error: {str(e)}"
 
+# ==== Incremental weather updates ====
+WEATHER_SOURCE_PREFIX = "weather_data_"
+_index_update_lock = threading.Lock()
+
+def weather_source_name(location: str, day: str = None) -> str:
+    return f'{WEATHER_SOURCE_PREFIX}{location}_{day or time.strftime("%Y%m%d")}.txt'
+
+def weather_source_location(source_name: str) -> str:
+    """Location of a weather chunk's source name (the inverse of weather_source_name)"""
+    return source_name[len(WEATHER_SOURCE_PREFIX):].rsplit('_', 1)[0]
+
+def live_weather_locations(index: faiss.IndexIDMap2, chunks: ChunkStore) -> List[str]:
+    """Locations that have a weather chunk still present in the index"""
+    weather_ids = np.intersect1d(index_ids(index), chunks.ids_with_source_prefix(WEATHER_SOURCE_PREFIX))
+    names = set(weather_source_location(chunks.source(int(i))) for i in weather_ids)
+    return sorted(names)
+
+def live_weather_ids(chunks: ChunkStore, delta: DeltaSegment) -> np.ndarray:
+    """Ids of the weather chunks of a base chunk store and its delta that are still searchable"""
+    view = delta.chunk_store(chunks)
+    weather_ids = view.ids_with_source_prefix(WEATHER_SOURCE_PREFIX)
+    return weather_ids[delta.is_live(weather_ids)]
+
+def write_index_atomic(index: faiss.Index, path: str = None):
+    """Write the index under a temporary name and swap it in, so mmapped readers keep the old file"""
+    path = path or live_path(INDEX_PATH)
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+def open_index_for_update():
+    """
+    Read the served base chunk store and delta segment as the starting point of an update
+
+    Updates only change the delta. The base index is read just for a generation
+    without a delta, whose chunk ids missing from the index start out deleted;
+    indexes from before chunk ids were stored are rebuilt once.
+
+    Returns:
+        (chunks, delta, rebuilt) where rebuilt is a base index the update must write
+        (else None); all None if there is no index
+    """
+    root = live_dir()
+    chunks = load_chunk_store(root) if os.path.exists(live_path(INDEX_PATH, root)) else None
+    if chunks is None:
+        return None, None, None
+    delta_dir = live_path(DELTA_DIR, root)
+    delta = DeltaSegment.load(delta_dir, len(chunks))
+    rebuilt = None
+    if not DeltaSegment.exists(delta_dir):
+        index = read_index_mmap(live_path(INDEX_PATH, root))
+        if not isinstance(index, faiss.IndexIDMap2):
+            print(" Index has no chunk ids, rebuilding it once with ids")
+            engine = get_rag_engine()
+            with build_encoder(engine) as encoder, build_threads():
+                index = rebuilt = build_faiss_index_safe(list(chunks.texts()), encoder, engine.embedding_key)
+        delta.remove(np.setdiff1d(np.arange(len(chunks), dtype=np.int64), index_ids(index)))
+    return chunks, delta, rebuilt
+
+@contextmanager
+def staged_index_update():
+    """
+    Staging directory of the generation an incremental update is written to
+
+    It starts as hard links to the served generation (or to the index files of a
+    legacy layout, which the update moves into generations); changed files are
+    replaced, never written through the links. Removed again if the update fails.
+    """
+    staging = staging_dir(new_generation_id())
+    root = live_dir()
+    clone_generation(root, staging, None if root else
+                     [INDEX_PATH, META_PATH, CHUNK_STORE_DIR, LOCATION_INDEX_PATH, SPARSE_INDEX_PATH,
+                      STRUCTURED_TABLES_DIR, DELTA_DIR])
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+def compact_index(chunks: ChunkStore, delta: DeltaSegment, staging: str) -> Tuple[faiss.IndexIDMap2, ChunkStore, DeltaSegment]:
+    """
+    Fold the delta segment into a new base in the staged generation
+
+    Live chunks are renumbered from 0 into a new chunk store, the base index is
+    rebuilt from the embedding store (so HNSW graphs are only rebuilt here), the
+    posting indexes are renumbered to match and the staged delta is left empty.
+    """
+    view = delta.chunk_store(chunks)
+    all_ids = np.arange(len(view), dtype=np.int64)
+    live_ids = all_ids[delta.is_live(all_ids)]
+    postings = load_posting_indexes(live_dir())
+    add_delta_postings(postings, delta.ids(), view)
+    for posting in postings.values():
+        posting.remap(live_ids)
+    texts = [view.text(int(i)) for i in live_ids]
+    sources = [view.source(int(i)) for i in live_ids]
+    view.close()
+
+    store_dir = live_path(CHUNK_STORE_DIR, staging)
+    names = read_location_names(store_dir)
+    shutil.rmtree(store_dir)
+    chunks = ChunkStore.write(store_dir, texts, sources)
+    if names:
+        write_location_names(store_dir, names)
+    engine = get_rag_engine()
+    with build_encoder(engine) as encoder, build_threads():
+        index = build_index_from_store(chunks, encoder, engine.embedding_key)
+    write_index_atomic(index, live_path(INDEX_PATH, staging))
+    for name, posting in postings.items():
+        posting.save(live_path(name, staging))
+
+    delta_dir = live_path(DELTA_DIR, staging)
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    delta = DeltaSegment(len(chunks))
+    delta.save(delta_dir)
+    print(f" Compacted index to {len(chunks)} chunks")
+    return index, chunks, delta
+
+def commit_index_update(chunks: ChunkStore, delta: DeltaSegment, staging: str, compact_ratio: float = None,
+                        rebuilt: faiss.Index = None) -> str:
+    """
+    Save the delta segment and metadata to the staged generation, then seal and publish
+    it and switch the engine over to it
+
+    The base index, chunk store and posting files stay links to the served generation,
+    so sealing only hashes the small delta files; once enough rows are dead or the
+    delta holds more than RAG_DELTA_MAX_CHUNKS chunks, the update compacts instead.
+    Other workers pick the update up through the pointer, like a full rebuild.
+
+    Args:
+        chunks: Base chunk store of the served generation
+        delta: Its delta segment with the update applied
+        staging: Directory from staged_index_update()
+        rebuilt: Base index to write (see open_index_for_update)
+
+    Returns:
+        Name of the published generation
+    """
+    compact_ratio = config.RAG_COMPACT_DEAD_RATIO if compact_ratio is None else compact_ratio
+    base = live_dir()
+    stored = len(chunks) + delta.stored
+    index_info = None
+    if rebuilt is not None:
+        write_index_atomic(rebuilt, live_path(INDEX_PATH, staging))
+        index_info = describe_index(rebuilt)
+    if (stored and delta.dead / stored > compact_ratio) or len(delta) > config.RAG_DELTA_MAX_CHUNKS:
+        index, chunks, delta = compact_index(chunks, delta, staging)
+        index_info = describe_index(index)
+    else:
+        delta.save(live_path(DELTA_DIR, staging))
+
+    meta_path = live_path(META_PATH, staging)
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    view = delta.chunk_store(chunks)
+    meta.update({
+        "total_chunks": len(chunks) - len(delta.deleted) + len(delta),
+        "stored_chunks": len(view),
+        "delta_chunks": len(delta),
+        "deleted_chunks": len(delta.deleted),
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "weather_locations": sorted(set(weather_source_location(view.source(int(i)))
+                                        for i in live_weather_ids(chunks, delta))),
+        "generation": os.path.basename(staging)[:-len(STAGING_SUFFIX)]
+    })
+    if index_info is not None:
+        meta["index"] = index_info
+    # The metadata file is still a link to the served generation's, so it is replaced
+    with open(f"{meta_path}.tmp", 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    view.close()
+    generation = seal_generation(staging, meta, base)
+    publish_generation(generation, keep=config.RAG_INDEX_GENERATIONS_KEEP)
+    get_rag_engine().swap_generation()
+    return generation
+
 def add_weather_data_to_existing_index(weather_data: Dict[str, Any], location: str) -> bool:
     """
     Add weather data to existing RAG index without rebuilding
     
+    Only the new chunk is embedded; it goes to the delta segment, and older
+    weather chunks for the same location are marked deleted, so the base index
+    and chunk store are neither rewritten nor rebuilt. The result is published
+    as a new index generation.
+    
     Args:
         weather_data: Weather data from weather service
         location: Location name
@@ -1589,54 +2027,36 @@ def add_weather_data_to_existing_index(weather_data: Dict[str, Any], location: s
         True if successful, False otherwise
     """
     try:
-        if not os.path.exists(INDEX_PATH) or not os.path.exists(CHUNKS_CSV):
-            print("No existing index found, cannot add weather data")
-            return False
-        
-        # Load existing chunks
-        df_chunks = pd.read_csv(CHUNKS_CSV)
-        
-        # Check if weather data for this location already exists
-        weather_files = [f for f in df_chunks['source_file'] if f.startswith(f'weather_data_{location}')]
-        if weather_files:
-            print(f"Weather data for {location} already exists in index")
-            return True
-        
-        # Add new weather data
-        weather_text = feed_weather_data_to_rag(weather_data, location)
-        if weather_text and "error" not in weather_text.lower():
-            weather_chunk = {
-                'text': weather_text,
-                'source_file': f'weather_data_{location}_{time.strftime("%Y%m%d")}.txt',
-                'chunk_id': f'weather_{location}_{int(time.time())}'
-            }
-            
-            # Add to existing chunks
-            df_chunks = pd.concat([df_chunks, pd.DataFrame([weather_chunk])], ignore_index=True)
-            
-            # Save updated chunks
-            df_chunks.to_csv(CHUNKS_CSV, index=False)
+        with _index_update_lock:
+            chunks, delta, rebuilt = open_index_for_update()
+            if chunks is None:
+                print("No existing index found, cannot add weather data")
+                return False
             
-            # Rebuild index with new data
-            model_name = config.EMBEDDING_MODEL
-            embedder = SentenceTransformer(model_name, device="cpu")
-            texts = df_chunks["text"].tolist()
-            new_index = build_faiss_index_safe(texts, embedder)
+            # Live weather chunks for exactly this location ("Hyderabad" must not match
+            # "Hyderabad_India"); today's one is still current
+            source_name = weather_source_name(location)
+            view = delta.chunk_store(chunks)
+            location_ids = np.array([i for i in live_weather_ids(chunks, delta)
+                                     if weather_source_location(view.source(int(i))) == location], dtype=np.int64)
+            if any(view.source(int(i)) == source_name for i in location_ids):
+                print(f"Weather data for {location} already exists in index")
+                view.close()
+                return True
             
-            # Save new index
-            faiss.write_index(new_index, INDEX_PATH)
-            
-            # Update metadata
-            meta = {
-                "model_name": model_name, 
-                "total_chunks": len(df_chunks), 
-                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "weather_locations": list(set([f.split('_')[2] for f in df_chunks['source_file'] if f.startswith('weather_data_')]))
-            }
-            
-            with open(META_PATH, 'w') as f:
-                json.dump(meta, f, indent=2)
+            weather_text = feed_weather_data_to_rag(weather_data, location)
+            if not weather_text or "error" in weather_text.lower():
+                view.close()
+                return False
             
+            # Embed only the new chunk and add it to the delta under the next chunk id
+            engine = get_rag_engine()
+            embedding = generate_embeddings_safely([weather_text], engine.get_embedder(), engine.embedding_key)
+            with staged_index_update() as staging:
+                delta.add(live_path(DELTA_DIR, staging), embedding, [weather_text], [source_name])
+                # Superseded forecasts for this location are dropped by id
+                delta.remove(location_ids)
+                commit_index_update(chunks, delta, staging, rebuilt=rebuilt)
             print(f"✅ Successfully added weather data for {location} to existing RAG index")
             return True
             
@@ -1644,10 +2064,45 @@ def add_weather_data_to_existing_index(weather_data: Dict[str, Any], location: s
         print(f"❌ Error adding weather data to existing index: {e}")
         return False
 
+def expire_weather_chunks(max_age_days: int = None) -> int:
+    """
+    Remove weather chunks older than max_age_days from the index
+    
+    Args:
+        max_age_days: Maximum age in days (defaults to RAG_WEATHER_MAX_AGE_DAYS)
+        
+    Returns:
+        Number of chunks removed
+    """
+    max_age_days = config.RAG_WEATHER_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    cutoff = time.strftime("%Y%m%d", time.localtime(time.time() - max_age_days * 86400))
+    try:
+        with _index_update_lock:
+            chunks, delta, rebuilt = open_index_for_update()
+            if chunks is None:
+                return 0
+            view = delta.chunk_store(chunks)
+            expired = []
+            for chunk_id in live_weather_ids(chunks, delta):
+                match = re.search(r'_(\d{8})\.txt$', view.source(int(chunk_id)))
+                if match and match.group(1) < cutoff:
+                    expired.append(chunk_id)
+            if not expired:
+                view.close()
+                return 0
+            delta.remove(np.array(expired, dtype=np.int64))
+            with staged_index_update() as staging:
+                commit_index_update(chunks, delta, staging, rebuilt=rebuilt)
+            print(f" Expired {len(expired)} weather chunks older than {max_age_days} days")
+            return len(expired)
+    except Exception as e:
+        print(f"❌ Error expiring weather chunks: {e}")
+        return 0
+
 def get_rag_status():
     """Get status of RAG system"""
     try:
-        index_exists = os.path.exists(INDEX_PATH)
+        index_exists = os.path.exists(live_path(INDEX_PATH))
         cache_exists = os.path.exists(WEATHER_DATA_PATH)
         cache_age = None
         
@@ -1656,15 +2111,23 @@ def get_rag_status():
         
         chunk_count = 0
         weather_locations = []
-        if os.path.exists(CHUNKS_CSV):
-            try:
-                df = pd.read_csv(CHUNKS_CSV)
-                chunk_count = len(df)
-                # Extract weather locations from source files
-                weather_files = [f for f in df['source_file'] if f.startswith('weather_data_')]
-                weather_locations = list(set([f.split('_')[2] for f in weather_files]))
-            except:
-                pass
+        engine = get_rag_engine()
+        try:
+            chunks = engine.chunks
+            if chunks is None:
+                chunks = load_chunk_store()
+            if chunks is not None:
+                chunk_count = len(chunks)
+                if isinstance(engine.index, (faiss.IndexIDMap2, SegmentedIndex)):
+                    # Only chunks still in the index count; removed rows linger until compaction
+                    chunk_count = int(engine.index.ntotal)
+                    weather_locations = live_weather_locations(engine.index, chunks)
+                else:
+                    # Extract weather locations from the source table (one entry per file, not per chunk)
+                    weather_files = [f for f in chunks.sources if f.startswith(WEATHER_SOURCE_PREFIX)]
+                    weather_locations = list(set([f.split('_')[2] for f in weather_files]))
+        except:
+            pass
         
         return {
             "status": "ready" if index_exists else "needs_initialization",
@@ -1672,6 +2135,15 @@ def get_rag_status():
             "weather_cache_exists": cache_exists,
             "weather_cache_age_minutes": cache_age,
             "total_chunks": chunk_count,
+            "index": describe_index(engine.index) if engine.index is not None else None,
+            "index_generation": {**read_pointer(), "serving": engine.generation, "rebuild": dict(_rebuild_status)},
+            "threads": thread_budget(),
+            "query_cache": engine.query_cache.get_stats(),
+            "embedding_batcher": engine.batcher.get_stats() if engine.batcher is not None else None,
+            "answer_cache": engine.answer_cache.get_stats(),
+            "structured_tables": engine.tables.sizes() if engine.tables is not None else None,
+            "prompts": engine.prompts.sizes(),
+            "llm_client": get_llm_client().get_stats(),
             "weather_locations": weather_locations,
             "last_updated": time.strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -1684,17 +2156,10 @@ def main():
     start_time = time.time()
     try:
         print("Loading embedding model...")
-        model_name = config.EMBEDDING_MODEL
-        embedder = SentenceTransformer(model_name, device="cpu")
-        index, df_chunks, meta = load_index()
-        if index is None:
-            df_chunks = load_all_data()
-            print(f"Processing {len(df_chunks)} text chunks")
-            texts = df_chunks["text"].tolist()
-            index = build_faiss_index_safe(texts, embedder)
-            meta = {"model_name": model_name, "total_chunks": len(df_chunks), "created_at": time.strftime("%Y-%m-%d %H:%M:%S")}
-            save_index(index, df_chunks, meta)
-        print(f"Ready with {len(df_chunks)} chunks")
+        engine = get_rag_engine().load()
+        embedder, index, chunks = engine.query_encoder(), engine.index, engine.chunks
+        template = engine.repl_template
+        print(f"Ready with {len(chunks)} chunks")
 
         def preprocess_query(q: str) -> str: 
             q = q.lower().replace("rice", "paddy") 
@@ -1708,55 +2173,30 @@ def main():
                 break
             if not query:
                 continue
-            indices, scores = faiss_search(query, embedder, index)
+            indices, scores = faiss_search(query, embedder, index, cache=engine.query_cache)
             if len(indices) == 0:
                 print("No relevant results found.")
                 continue
-            valid_indices = indices[indices < len(df_chunks)]
+            valid_indices = indices[(indices >= 0) & (indices < len(chunks))]
             if len(valid_indices) == 0:
                 print("No valid results found.")
                 continue
-            retrieved = df_chunks.iloc[valid_indices[:5]]
             context_parts = []
-            for i, (_, row) in enumerate(retrieved.iterrows()):
+            for i, idx in enumerate(valid_indices[:5]):
                 if i < len(scores) and scores[i] > 0.2:
-                    context_parts.append(f"- {row['text']} (source: {row['source_file']})")
+                    text, source_file = chunks.get(idx)
+                    context_parts.append(context_line(text, source_file))
             if not context_parts:
                 print(" No sufficiently relevant results found.")
                 continue
             context = "\n".join(context_parts)
 
-            template = ChatPromptTemplate.from_template(f"""
-You are an Agriculture assistant.
-- Use the context tables to interpolate/extrapolate values when queries involve numeric estimates (e.g., cost of cultivation → yield).
-- Always show your calculation steps.
-- If no relevant numeric context is found, reply "Data not available".
-- Treat "rice" as equivalent to "paddy".
--If the query includes a numeric value that does not exactly match the dataset, 
-analyze the nearest available values and explain the estimated trend 
-(e.g., "for cultivation cost slightly lower/higher than X, the yield increases/decreases, 
-so the expected value is around Y").
--- If no relevant numeric context is found, DO NOT reply "Data not available".
-  Instead, fall back to general agricultural knowledge (e.g., cotton usually takes 150–180 days to harvest).
-                                                        
-
-
-{few_shots}
-
-Context:
-{{context}}
-
-Query:
-{{query}}
-""")
-
             try:
-                final_prompt = template.format(context=context, query=query)
-                llm = ChatOpenAI(model=config.OPENAI_MODEL, temperature=config.LLM_TEMPERATURE_ZERO)
-                response = llm.invoke(final_prompt)
+                final_prompt = template.format(examples=engine.few_shot_block(query), context=context, query=query)
+                answer = get_llm_client().invoke(final_prompt, temperature=config.LLM_TEMPERATURE_ZERO)
                 print("\n ANSWER:")
                 print("-" * 50)
-                print(response.content.strip())
+                print(answer)
                 print("-" * 50)
             except Exception as e:
                 print(f" Error generating response: {e}")
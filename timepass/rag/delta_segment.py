@@ -0,0 +1,139 @@
+"""
+Delta segment of an index generation
+Chunks added by incremental updates go to a small flat index and chunk store of
+their own (ids continue after the base chunk store), and base chunks that are
+removed are only marked deleted. An update therefore rewrites a few small files
+while the staged generation hard-links the large base index, chunk store and
+posting files; compaction folds the delta back into a rebuilt base.
+"""
+
+import os
+import shutil
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+from rag.chunk_store import ChunkStore, SegmentedChunkStore
+from rag.index_factory import SegmentedIndex, index_ids, remove_ids
+
+INDEX_FILE = "index.idx"
+CHUNKS_DIR = "chunks"
+DELETED_FILE = "deleted.npy"
+
+
+class DeltaSegment:
+    """Chunks added after the base was built and base chunk ids marked deleted"""
+
+    def __init__(self, base_count: int, index: Optional[faiss.IndexIDMap2] = None,
+                 chunks: Optional[ChunkStore] = None, deleted: Optional[np.ndarray] = None):
+        """
+        Args:
+            base_count: Number of chunks in the base chunk store (the first delta id)
+            index: Flat id-mapped index of the live delta chunks
+            chunks: Delta chunk store; row r has chunk id base_count + r
+            deleted: Base chunk ids to leave out of every search
+        """
+        self.base_count = base_count
+        self.index = index
+        self.chunks = chunks
+        self.deleted = np.unique(np.asarray([] if deleted is None else deleted, dtype=np.int64))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, DELETED_FILE))
+
+    @classmethod
+    def load(cls, path: str, base_count: int) -> "DeltaSegment":
+        """Open the delta segment in path; a generation without one has an empty delta"""
+        index_path = os.path.join(path, INDEX_FILE)
+        deleted_path = os.path.join(path, DELETED_FILE)
+        chunks_dir = os.path.join(path, CHUNKS_DIR)
+        return cls(base_count,
+                   faiss.read_index(index_path) if os.path.exists(index_path) else None,
+                   ChunkStore(chunks_dir) if ChunkStore.exists(chunks_dir) else None,
+                   np.load(deleted_path) if os.path.exists(deleted_path) else None)
+
+    def __len__(self) -> int:
+        """Number of live delta chunks"""
+        return int(self.index.ntotal) if self.index is not None else 0
+
+    @property
+    def stored(self) -> int:
+        """Number of rows in the delta chunk store, removed ones included"""
+        return len(self.chunks) if self.chunks is not None else 0
+
+    @property
+    def dead(self) -> int:
+        """Chunks still stored but no longer searchable, in the base and the delta"""
+        return len(self.deleted) + self.stored - len(self)
+
+    def ids(self) -> np.ndarray:
+        """Chunk ids of the live delta chunks"""
+        return index_ids(self.index) if self.index is not None else np.empty(0, dtype=np.int64)
+
+    def is_live(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Mask of the chunk ids that are still searchable"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        in_base = chunk_ids < self.base_count
+        return np.where(in_base, ~np.isin(chunk_ids, self.deleted), np.isin(chunk_ids, self.ids()))
+
+    def add(self, path: str, embeddings: np.ndarray, texts: List[str], sources: List[str]) -> np.ndarray:
+        """
+        Add chunks under the next ids; the grown delta chunk store is written to path
+
+        Args:
+            path: Delta directory of the staged generation (see save)
+
+        Returns:
+            The new chunk ids
+        """
+        ids = np.arange(self.base_count + self.stored, self.base_count + self.stored + len(texts), dtype=np.int64)
+        chunks_dir = os.path.join(path, CHUNKS_DIR)
+        # The staged directory holds links to the served store; the new store replaces it whole
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+        if self.chunks is None:
+            chunks = ChunkStore.write(chunks_dir, texts, sources)
+        else:
+            self.chunks.close()
+            chunks = ChunkStore.append(self.chunks.path, chunks_dir, texts, sources)
+        self.chunks = chunks
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.shape[1]))
+        self.index.add_with_ids(embeddings, ids)
+        return ids
+
+    def remove(self, chunk_ids: np.ndarray):
+        """Mark base chunks deleted and drop delta chunks from the delta index"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.deleted = np.union1d(self.deleted, chunk_ids[chunk_ids < self.base_count])
+        delta_ids = chunk_ids[chunk_ids >= self.base_count]
+        if len(delta_ids) and self.index is not None:
+            remove_ids(self.index, delta_ids)
+
+    def save(self, path: str):
+        """Write the delta index and deleted ids to path, replacing (never writing through) linked files"""
+        os.makedirs(path, exist_ok=True)
+        if self.index is not None:
+            index_path = os.path.join(path, INDEX_FILE)
+            faiss.write_index(self.index, f"{index_path}.tmp")
+            os.replace(f"{index_path}.tmp", index_path)
+        deleted_path = os.path.join(path, DELETED_FILE)
+        with open(f"{deleted_path}.tmp", "wb") as f:
+            np.save(f, self.deleted)
+        os.replace(f"{deleted_path}.tmp", deleted_path)
+
+    def chunk_store(self, chunks: ChunkStore):
+        """Chunk store over the base chunks and this delta's (the base store if the delta has none)"""
+        return SegmentedChunkStore(chunks, self.chunks) if self.stored else chunks
+
+    def segmented(self, index: faiss.IndexIDMap2, chunks: ChunkStore):
+        """Search index and chunk store over the base and this delta (the base ones if the delta is empty)"""
+        if len(self) or len(self.deleted):
+            index = SegmentedIndex(index, self.index, self.deleted)
+        return index, self.chunk_store(chunks)
+
+    def close(self):
+        if self.chunks is not None:
+            self.chunks.close()
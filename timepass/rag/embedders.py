@@ -0,0 +1,323 @@
+"""
+Embedding backends for the RAG system
+The PyTorch sentence-transformer can be replaced at serving time by its ONNX
+export (optionally int8 dynamically quantized) run through onnxruntime, so the
+API process never imports torch. An export is only used once its cosine parity
+with the PyTorch model has been checked and recorded next to it.
+"""
+
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config import config
+
+EMBEDDING_BACKENDS = ["torch", "onnx", "onnx_int8"]
+MODEL_FILES = {"onnx": "model.onnx", "onnx_int8": "model_int8.onnx"}
+TOKENIZER_FILE = "tokenizer.json"
+EXPORT_CONFIG_FILE = "export.json"
+PARITY_FILE = "parity.json"
+
+# Queries and chunk-like texts used when no corpus sample is given to the parity check
+PARITY_TEXTS = [
+    "What is the best time to sow wheat in Punjab?",
+    "fertilizer for cotton on black soil",
+    "Will it rain in Kannur tomorrow?",
+    "rice yield per hectare in west bengal",
+    "crop type: maize | soil type: sandy | fertilizer name: urea",
+    "state: kerala | district: kannur | date: 2025 02 20 | avg_rainfall: 0.0",
+    "paddy grows best between 20 c and 35 c with high humidity",
+    "how much does a quintal of DAP cost",
+    "pest control for aphids on mustard",
+    "weather forecast for delhi, india on day 2 temperature 18.5 c tomorrow",
+]
+
+
+class Embedder(Protocol):
+    """What the RAG code needs from an embedder (SentenceTransformer or OnnxEmbedder)"""
+
+    def encode(self, sentences, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=False, batch_size=32, device=None) -> np.ndarray: ...
+
+
+def embedding_key(model_name: str, backend: str = None) -> str:
+    """
+    Model identity used in embedding store and query cache keys
+
+    The float32 ONNX export reproduces the PyTorch vectors and shares their key;
+    int8 vectors differ slightly, so they are cached separately.
+    """
+    backend = backend or config.RAG_EMBEDDING_BACKEND
+    return f"{model_name}#int8" if backend == "onnx_int8" else model_name
+
+
+def onnx_model_dir(model_name: str, root: str = None) -> str:
+    """Directory holding the ONNX export of a model"""
+    return os.path.join(root or config.RAG_ONNX_MODEL_DIR, re.sub(r'[^\w.-]+', '_', model_name))
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average token embeddings over real (unpadded) tokens, as sentence-transformers mean pooling does"""
+    mask = attention_mask[..., None].astype(np.float32)
+    return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class OnnxEmbedder:
+    """ONNX Runtime embedder with the SentenceTransformer.encode signature"""
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 1):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, EXPORT_CONFIG_FILE), encoding="utf-8") as f:
+            export = json.load(f)
+        self.model_dir = model_dir
+        self.backend = "onnx_int8" if quantized else "onnx"
+        self.dimension = export["dimension"]
+        self.input_names = export["input_names"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=export["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=export["pad_token_id"], pad_token=export["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, MODEL_FILES[self.backend]), options,
+                                            providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=False, batch_size=32, device=None):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            token_embeddings = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+            batches.append(mean_pool(token_embeddings, inputs["attention_mask"]))
+        vectors = np.vstack(batches).astype(np.float32) if batches else np.empty((0, self.dimension), np.float32)
+        if normalize_embeddings:
+            vectors = normalize(vectors)
+        return vectors[0] if single else vectors
+
+
+def load_torch_embedder(model_name: str, threads: int = 1):
+    """
+    PyTorch sentence-transformer on CPU (imports torch)
+
+    torch's thread count is process-wide, so this is called once per process: for
+    the serving embedder, and in the build encoder's own process for builds.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # interop threads can only be set before torch's first parallel work
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def read_parity(model_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(model_dir, PARITY_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _model_stamp(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parity_problem(model_dir: str, backend: str, min_cosine: float = None) -> Optional[str]:
+    """Why an ONNX export may not serve (None if it passed its parity check and is unchanged since)"""
+    min_cosine = config.RAG_EMBEDDING_PARITY_MIN if min_cosine is None else min_cosine
+    path = os.path.join(model_dir, MODEL_FILES[backend])
+    if not os.path.exists(path):
+        return f"{path} not found"
+    result = read_parity(model_dir).get("backends", {}).get(backend)
+    if not result:
+        return "no parity check recorded"
+    if result.get("model_file") != _model_stamp(path):
+        return "model changed since its parity check"
+    if result["min_cosine"] < min_cosine:
+        return f"min cosine {result['min_cosine']:.4f} below {min_cosine}"
+    return None
+
+
+def load_embedder(model_name: str, backend: str = None, model_dir: str = None, threads: int = 1):
+    """
+    Load the embedder for a model with the configured backend
+
+    ONNX backends are used only when their export passed the parity check; otherwise
+    this warns and falls back to PyTorch.
+
+    Args:
+        model_name: sentence-transformers model name
+        backend: torch, onnx or onnx_int8 (default RAG_EMBEDDING_BACKEND)
+        model_dir: Export directory (default under RAG_ONNX_MODEL_DIR)
+        threads: Intra-op inference threads
+    """
+    backend = backend or config.RAG_EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    if backend != "torch":
+        model_dir = model_dir or onnx_model_dir(model_name)
+        problem = parity_problem(model_dir, backend)
+        if problem is None:
+            print(f"🔌 Using {backend} embedder from {model_dir}")
+            return OnnxEmbedder(model_dir, quantized=backend == "onnx_int8", threads=threads)
+        print(f" Warning: {backend} embedder for {model_name} is not usable ({problem}); "
+              f"run python -m rag.embedders --model {model_name}. Falling back to PyTorch")
+    return load_torch_embedder(model_name, threads)
+
+
+# ==== Export and parity check (needs torch, sentence-transformers and onnx) ====
+def export_onnx(model_name: str, model_dir: str = None, quantize: bool = True, opset: int = 14) -> str:
+    """
+    Export a mean-pooling sentence-transformer to ONNX, plus an int8 dynamically quantized copy
+
+    Returns:
+        The export directory
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"Only mean pooling is supported, {model_name} uses {pooling.get_pooling_mode_str()}")
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in ["input_ids", "attention_mask", "token_type_ids"]
+                   if name in tokenizer.model_input_names]
+
+    model_dir = model_dir or onnx_model_dir(model_name)
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, TOKENIZER_FILE))
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    path = os.path.join(model_dir, MODEL_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(TokenEmbeddings(transformer.auto_model).eval(), tuple(sample[name] for name in input_names),
+                          path, input_names=input_names, output_names=["token_embeddings"],
+                          dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]},
+                          opset_version=opset, dynamo=False)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(path, os.path.join(model_dir, MODEL_FILES["onnx_int8"]), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(model_dir, EXPORT_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "dimension": model.get_sentence_embedding_dimension(),
+                   "max_seq_length": model.max_seq_length, "input_names": input_names,
+                   "pad_token": tokenizer.pad_token, "pad_token_id": tokenizer.pad_token_id}, f, indent=2)
+    return model_dir
+
+
+def query_latency_ms(embedder, texts: Sequence[str], repeats: int = 3) -> float:
+    """Median time to encode one query, which is how the API encodes"""
+    embedder.encode([texts[0]], normalize_embeddings=True)  # warm up
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            embedder.encode([text], normalize_embeddings=True)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def check_parity(model_name: str, model_dir: str = None, texts: List[str] = None, threads: int = 1) -> Dict[str, Any]:
+    """
+    Compare every ONNX export of a model with the PyTorch model and record the result
+
+    Cosine similarity of each text's embedding with the PyTorch one (min and mean)
+    and single-query latency are written to parity.json, which load_embedder reads.
+    """
+    model_dir = model_dir or onnx_model_dir(model_name)
+    texts = texts or PARITY_TEXTS
+    reference = load_torch_embedder(model_name)
+    expected = reference.encode(texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    torch_ms = query_latency_ms(reference, texts[:20])
+    backends = {"torch": {"query_ms": round(torch_ms, 3)}}
+
+    for backend, file_name in MODEL_FILES.items():
+        path = os.path.join(model_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        embedder = OnnxEmbedder(model_dir, quantized=backend == "onnx_int8", threads=threads)
+        cosines = (embedder.encode(texts, normalize_embeddings=True) * expected).sum(axis=1)
+        latency = query_latency_ms(embedder, texts[:20])
+        backends[backend] = {"min_cosine": round(float(cosines.min()), 6), "mean_cosine": round(float(cosines.mean()), 6),
+                             "query_ms": round(latency, 3), "speedup": round(torch_ms / max(latency, 1e-9), 2),
+                             "model_file": _model_stamp(path)}
+
+    parity = {"model_name": model_name, "checked_at": time.strftime("%Y-%m-%d %H:%M:%S"), "texts": len(texts),
+              "backends": backends}
+    with open(os.path.join(model_dir, PARITY_FILE), "w", encoding="utf-8") as f:
+        json.dump(parity, f, indent=2)
+    return parity
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check parity with PyTorch")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL, help="sentence-transformers model name")
+    parser.add_argument("--output", help="Export directory (default under RAG_ONNX_MODEL_DIR)")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 quantized copy")
+    parser.add_argument("--check-only", action="store_true", help="Re-run the parity check on an existing export")
+    parser.add_argument("--chunks", help="Chunk CSV to sample parity texts from (default: built-in samples)")
+    parser.add_argument("--samples", type=int, default=200, help="Chunks sampled from --chunks")
+    args = parser.parse_args()
+
+    directory = args.output or onnx_model_dir(args.model)
+    if not args.check_only:
+        export_onnx(args.model, directory, quantize=not args.no_quantize)
+    sample_texts = None
+    if args.chunks:
+        import pandas as pd
+        chunk_texts = pd.read_csv(args.chunks, usecols=["text"])["text"].dropna().astype(str)
+        sample_texts = PARITY_TEXTS + chunk_texts.sample(min(args.samples, len(chunk_texts)), random_state=7).tolist()
+    report = check_parity(args.model, directory, sample_texts)
+
+    print(f"{'backend':<10} {'min cos':>9} {'mean cos':>9} {'query ms':>9} {'speedup':>8}")
+    failed = False
+    for name, result in report["backends"].items():
+        if name == "torch":
+            print(f"{name:<10} {'':>9} {'':>9} {result['query_ms']:>9.3f} {1.0:>8.2f}")
+            continue
+        print(f"{name:<10} {result['min_cosine']:>9.4f} {result['mean_cosine']:>9.4f} "
+              f"{result['query_ms']:>9.3f} {result['speedup']:>8.2f}")
+        failed = failed or result["min_cosine"] < config.RAG_EMBEDDING_PARITY_MIN
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,126 @@
+"""
+Micro-batching query encoder shared by concurrent requests
+One worker thread owns the embedder. Queries submitted while it is busy, or
+within a few milliseconds of each other under load, are encoded together in a
+single encode call and each caller gets its own rows back through a future.
+A lone request at low load is encoded at once, without waiting for company.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+
+
+class EmbeddingBatcher:
+    """Drop-in encode() that coalesces concurrent callers into batched encode calls"""
+
+    def __init__(self, embedder, max_batch: int = 32, max_wait_ms: float = 3.0):
+        """
+        Args:
+            embedder: Anything with the SentenceTransformer.encode signature
+            max_batch: Most texts per encode call
+            max_wait_ms: How long a batch waits for more queries when requests are arriving concurrently
+        """
+        self.embedder = embedder
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "errors": 0}
+        self._last_batch_requests = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding; the future resolves to their normalized float32 vectors"""
+        request = _Request(list(texts))
+        if not request.texts:
+            request.future.set_result(np.empty((0, 0), dtype=np.float32))
+        else:
+            self._queue.put(request)
+        return request.future
+
+    def encode(self, sentences, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=True, batch_size=32, device=None) -> np.ndarray:
+        """
+        Encode through the shared worker
+
+        Vectors are always L2-normalized, as every RAG query path asks for;
+        batch_size is ignored in favour of the batcher's own max_batch.
+        """
+        single = isinstance(sentences, str)
+        vectors = self.submit([sentences] if single else sentences).result()
+        return vectors[0] if single else vectors
+
+    def close(self):
+        """Stop the worker after the queued requests are served"""
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["mean_batch_texts"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        """Gather requests for one batch; returns them and whether the batcher was closed meanwhile"""
+        batch, size = [first], len(first.texts)
+        # Only wait for stragglers when the last batch served several callers; otherwise
+        # requests that arrive while this batch encodes simply form the next one
+        deadline = time.monotonic() + self.max_wait if self._last_batch_requests > 1 else None
+        while size < self.max_batch:
+            try:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is None or timeout <= 0:
+                    request = self._queue.get_nowait()
+                else:
+                    request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+            size += len(request.texts)
+        return batch, False
+
+    def _run(self):
+        closed = False
+        while not closed:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, closed = self._collect(first)
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = np.asarray(self.embedder.encode(texts, convert_to_numpy=True, show_progress_bar=False,
+                                                          batch_size=self.max_batch, normalize_embeddings=True),
+                                     dtype=np.float32)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            start = 0
+            for request in batch:
+                request.future.set_result(vectors[start:start + len(request.texts)])
+                start += len(request.texts)
+            self._last_batch_requests = len(batch)
+            with self._lock:
+                self.stats["requests"] += len(batch)
+                self.stats["texts"] += len(texts)
+                self.stats["batches"] += 1
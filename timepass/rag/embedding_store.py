@@ -0,0 +1,256 @@
+"""
+Content-addressed embedding store for the RAG index
+Vectors live in one append-only file and are looked up by hash(model name,
+chunk text), so rebuilds only encode chunks not seen before regardless of
+their order or which dataset they came from. They can be stored as float32,
+float16 or int8 (scaled by 127, since the embeddings are unit-normalized).
+The key of each row is appended to a key file after its vector, so processes
+sharing the directory see a row only once it is complete; appends are
+serialized with a file lock.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process
+    fcntl = None
+
+# Storage dtype -> vector file name
+VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+INT8_SCALE = 127.0
+KEYS_FILE = "keys.bin"
+LEGACY_KEYS_FILE = "keys.npy"  # whole key table rewritten per append, migrated to KEYS_FILE on open
+LOCK_FILE = "append.lock"
+META_FILE = "meta.json"
+KEY_DTYPE = "S32"  # hex digests; numpy strips trailing NULs from raw bytes
+KEY_BYTES = np.dtype(KEY_DTYPE).itemsize
+
+
+def embedding_input(text: str) -> str:
+    """The exact text handed to the encoder for a chunk"""
+    text = str(text).strip()
+    return text[:500] if len(text) > 5 else "empty text"
+
+
+def content_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()[:32].encode("ascii")
+
+
+def quantize_vectors(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """float32 vectors in a storage dtype"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+    return vectors.astype(dtype)
+
+
+def dequantize_vectors(stored: np.ndarray, dtype: str) -> np.ndarray:
+    """Stored vectors back as float32"""
+    if dtype == "int8":
+        return stored.astype(np.float32) / INT8_SCALE
+    return np.asarray(stored, dtype=np.float32)
+
+
+class EmbeddingStore:
+    """
+    Append-only vector file plus an append-only key file (row i of one is key i of the other)
+
+    Several stores, in this or other processes, may share a directory: each picks
+    up the rows the others appended when the key file grows. Within a process use
+    shared_embedding_store() so threads share one key table.
+    """
+
+    def __init__(self, path: str, model_name: str, dtype: str = "float32"):
+        if dtype not in VECTOR_FILES:
+            raise ValueError(f"Unknown embedding dtype '{dtype}', expected one of {list(VECTOR_FILES)}")
+        self.path = path
+        self.model_name = model_name
+        self.dtype = dtype
+        self.dimension = None
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(os.path.join(self.path, META_FILE)):
+            return
+        try:
+            with self._file_lock():
+                if os.path.exists(os.path.join(self.path, LEGACY_KEYS_FILE)):
+                    self._migrate_keys()
+                meta = self._read_meta()
+                stored_dtype = meta.get("dtype", "float32")
+                self._refresh()
+                if stored_dtype != self.dtype:
+                    self._convert(stored_dtype)
+        except Exception as e:
+            print(f" Warning: Could not load embedding store: {e}")
+            self.dimension, self._rows, self._count = None, {}, 0
+
+    def _read_meta(self) -> dict:
+        with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimension = meta["dimension"]
+        return meta
+
+    def _migrate_keys(self):
+        """Turn a legacy keys.npy table into the append-only key file (once)"""
+        keys = np.load(os.path.join(self.path, LEGACY_KEYS_FILE)).astype(KEY_DTYPE)
+        tmp_path = os.path.join(self.path, KEYS_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(keys.tobytes())
+        os.replace(tmp_path, os.path.join(self.path, KEYS_FILE))
+        os.remove(os.path.join(self.path, LEGACY_KEYS_FILE))
+
+    def _refresh(self):
+        """Pick up rows appended since the last read, by this store or another one"""
+        keys_path = os.path.join(self.path, KEYS_FILE)
+        with self._lock:
+            try:
+                if os.path.getsize(keys_path) < (self._count + 1) * KEY_BYTES:
+                    return
+                with open(keys_path, "rb") as f:
+                    f.seek(self._count * KEY_BYTES)
+                    data = f.read()
+            except OSError:
+                return
+            if self.dimension is None:
+                self._read_meta()
+            # A torn key at the end belongs to an interrupted append and is ignored
+            keys = np.frombuffer(data[:len(data) - len(data) % KEY_BYTES], dtype=KEY_DTYPE)
+            for offset, key in enumerate(keys.tolist()):
+                self._rows.setdefault(key, self._count + offset)
+            self._count += len(keys)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive access to the directory for this thread, across processes where fcntl exists"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, LOCK_FILE), "a") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _vectors_path(self, dtype: str = None) -> str:
+        return os.path.join(self.path, VECTOR_FILES[dtype or self.dtype])
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "dtype": self.dtype}, f)
+
+    def _convert(self, stored_dtype: str):
+        """Rewrite the vectors of a store written with another dtype (once, when the setting changes)"""
+        if self._count:
+            print(f" Converting embedding store from {stored_dtype} to {self.dtype}")
+            self._rewrite_vectors(stored_dtype)
+        self._write_meta()
+        if os.path.exists(self._vectors_path(stored_dtype)):
+            os.remove(self._vectors_path(stored_dtype))
+
+    def _rewrite_vectors(self, stored_dtype: str):
+        stored = np.memmap(self._vectors_path(stored_dtype), dtype=stored_dtype, mode="r",
+                           shape=(self._count, self.dimension))
+        tmp_path = f"{self._vectors_path()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(stored), 65536):
+                block = dequantize_vectors(np.array(stored[start:start + 65536]), stored_dtype)
+                f.write(quantize_vectors(block, self.dtype).tobytes())
+        del stored
+        os.replace(tmp_path, self._vectors_path())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def keys_for(self, texts: List[str]) -> List[bytes]:
+        return [content_key(self.model_name, text) for text in texts]
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Row for each key, -1 where the key has not been embedded yet"""
+        self._refresh()
+        return np.array([self._rows.get(key, -1) for key in keys], dtype=np.int64)
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Read the given rows into memory as float32"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self) == 0:
+            return np.empty((len(rows), self.dimension or 0), dtype=np.float32)
+        matrix = np.memmap(self._vectors_path(), dtype=self.dtype, mode="r", shape=(len(self), self.dimension))
+        return dequantize_vectors(np.array(matrix[rows]), self.dtype)
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        """Append vectors for keys not already stored (by this store or any other on the directory)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._file_lock():
+            self._refresh()
+            if self.dimension is not None and vectors.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dimension}")
+            fresh, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    fresh.append(i)
+            if not fresh:
+                return
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+                self._write_meta()
+
+            # Vectors go in first; rows only become visible once their keys are appended.
+            # Both files are cut back to the rows every store knows about, dropping what
+            # an interrupted append left behind
+            with open(self._vectors_path(), "ab") as f:
+                f.truncate(self._count * self.dimension * np.dtype(self.dtype).itemsize)
+                f.write(quantize_vectors(vectors[fresh], self.dtype).tobytes())
+            with open(os.path.join(self.path, KEYS_FILE), "ab") as f:
+                f.truncate(self._count * KEY_BYTES)
+                f.write(np.array([keys[i] for i in fresh], dtype=KEY_DTYPE).tobytes())
+            self._refresh()
+
+    def embed(self, texts: List[str], encode: Callable[[List[str]], np.ndarray], batch_size: int = 64) -> np.ndarray:
+        """
+        Embeddings for texts, encoding only those not already in the store
+
+        Args:
+            texts: Encoder inputs (see embedding_input)
+            encode: Function mapping a batch of texts to normalized float32 vectors
+            batch_size: Texts per encode call
+
+        Returns:
+            float32 matrix with one row per text, in input order
+        """
+        keys = self.keys_for(texts)
+        self._refresh()
+        missing = list({key: text for key, text in zip(keys, texts) if key not in self._rows}.items())
+        if missing:
+            print(f" Embedding {len(missing)} new chunks ({len(texts) - len(missing)} cached)")
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            self.add([key for key, _ in batch], encode([text for _, text in batch]))
+        return self.vectors(self.lookup(keys))
+
+
+_shared_stores: Dict[Tuple[str, str, str], EmbeddingStore] = {}
+_shared_stores_lock = threading.Lock()
+
+
+def shared_embedding_store(path: str, model_name: str, dtype: str = "float32") -> EmbeddingStore:
+    """The process-wide store for a directory, model and dtype, opened on first use"""
+    key = (os.path.abspath(path), model_name, dtype)
+    with _shared_stores_lock:
+        if key not in _shared_stores:
+            _shared_stores[key] = EmbeddingStore(path, model_name, dtype=dtype)
+        return _shared_stores[key]
@@ -0,0 +1,405 @@
+"""
+Few-shot examples for the REPL prompt
+The worked examples are kept as records tagged with the kind of question they
+show. Their queries are embedded once and, per request, only the few examples
+closest to the user's query (and sharing its intent, if any) are placed in the
+prompt under a token budget instead of the whole set.
+"""
+
+from typing import Any, Callable, Dict, FrozenSet, List, Sequence
+
+import numpy as np
+
+from rag.context_packing import estimate_tokens
+from rag.embedding_store import embedding_input
+from src.query_features import query_features
+
+# Intent tag -> keyword group in src/query_features.py
+INTENT_GROUPS = {
+    "yield": "few_shot_yield",
+    "cost": "few_shot_cost",
+    "weather": "few_shot_weather",
+    "timing": "few_shot_timing",
+    "estimate": "few_shot_estimate",
+    "improve": "few_shot_improve",
+    "suitability": "few_shot_suitability",
+    "statistics": "few_shot_statistics",
+    "soil": "few_shot_soil",
+}
+
+FEW_SHOT_EXAMPLES: List[Dict[str, Any]] = [
+    {
+        "intents": ("yield", "statistics"),
+        "context": "State | Crop | Yield\nKarnataka | Wheat | 3.5\nKarnataka | Rice | 4.2",
+        "query": "Which crop has the highest yield in Karnataka?",
+        "answer": "Rice has the highest yield in Karnataka at 4.2.",
+    },
+    {
+        "intents": ("cost", "statistics"),
+        "context": "Crop | A2+FL\nArhar | 1200\nArhar | 1400\nArhar | 1600",
+        "query": "What is the average A2+FL for Arhar?",
+        "answer": "The average A2+FL for Arhar is 1400.00.",
+    },
+    {
+        "intents": ("cost", "yield"),
+        "context": "State | Crop | C2 | Yield\nBihar | Wheat | 3000 | 2\nPunjab | Rice | 3200 | 4",
+        "query": "Which state–crop combination offers the best cost-to-yield ratio using C2?",
+        "answer": "Punjab Rice has the best cost-to-yield ratio with 3200 / 4 = 800.",
+    },
+    {
+        "intents": ("cost", "statistics"),
+        "context": "Crop | State | Cost of Cultivation (C2) | Yield\nWheat | Karnataka | 20000 | 30\n"
+                   "Rice | Karnataka | 25000 | 40",
+        "query": "What is the total cost of cultivation in Karnataka?",
+        "answer": "The total cost of cultivation in Karnataka is 45,000 (20,000 + 25,000).",
+    },
+    {
+        "intents": ("timing", "yield"),
+        "context": "State | Crop | Month | Average Yield\nPunjab | Rice | July | 50\nPunjab | Wheat | November | 35",
+        "query": "What is the best time for agriculture in Punjab?",
+        "answer": "July for Rice, which has the highest average yield of 50.",
+    },
+    {
+        "intents": ("yield", "statistics"),
+        "context": "Crop | State | Yield\nSugarcane | Karnataka | 986.21\nSugarcane | Tamil Nadu | 1015.45",
+        "query": "Which state has the highest sugarcane yield?",
+        "answer": "Tamil Nadu at 1015.45.",
+    },
+    {
+        "intents": ("weather", "statistics"),
+        "context": "Date | Precipitation\n2023-07-01 | 5\n2023-07-02 | 10",
+        "query": "What was the total rainfall in the first two days of July 2023?",
+        "answer": "15 mm (5 + 10).",
+    },
+    {
+        "intents": ("cost", "yield"),
+        "context": "Crop | State | Cost of Production (C2) | Yield\nWheat | Punjab | 800 | 40\nWheat | Rajasthan | 900 | 35",
+        "query": "Which state produces wheat more cost-effectively?",
+        "answer": "Punjab with 800/40 = 20 vs Rajasthan 900/35 ≈ 25.71, so Punjab.",
+    },
+    {
+        "intents": ("yield", "statistics"),
+        "context": "State | Crop | Yield\nBihar | Maize | 42.95\nAndhra Pradesh | Maize | 42.68",
+        "query": "Which state grows maize with the highest yield?",
+        "answer": "Bihar at 42.95.",
+    },
+    {
+        "intents": ("cost", "yield", "statistics"),
+        "context": "State | Crop | A2+FL | Yield\nGujarat | Groundnut | 1500 | 20\nGujarat | Groundnut | 1700 | 22",
+        "query": "What is the average cost-to-yield ratio (A2+FL per unit yield) for groundnut in Gujarat?",
+        "answer": "(1500/20 + 1700/22) / 2 = (75.00 + 77.27) / 2 ≈ 76.14.",
+    },
+    {
+        "intents": ("timing", "yield"),
+        "context": "State | Crop | Month | Yield\nMaharashtra | Cotton | August | 18\n"
+                   "Maharashtra | Cotton | September | 22\nMaharashtra | Cotton | October | 21",
+        "query": "When should Maharashtra farmers plant cotton for best yield?",
+        "answer": "September (highest yield 22).",
+    },
+    {
+        "intents": ("weather", "statistics"),
+        "context": "Date | MaxT | MinT\n2023-03-01 | 34 | 21\n2023-03-02 | 36 | 22\n2023-03-03 | 33 | 20",
+        "query": "What was the average maximum temperature from 1–3 March 2023?",
+        "answer": "(34 + 36 + 33) / 3 = 34.33.",
+    },
+    {
+        "intents": ("cost", "yield", "statistics"),
+        "context": "State | Crop | C2 | Yield\nOdisha | Paddy | 2600 | 38\nOdisha | Paddy | 2800 | 41",
+        "query": "What is the total yield of paddy in Odisha and average C2?",
+        "answer": "Total yield = 79 (38 + 41); average C2 = (2600 + 2800)/2 = 2700.",
+    },
+    {
+        "intents": ("yield", "statistics"),
+        "context": "State | Crop | Yield\nRajasthan | Bajra | 12\nRajasthan | Bajra | 14\nRajasthan | Bajra | 13",
+        "query": "What is the median yield of bajra in Rajasthan?",
+        "answer": "13.",
+    },
+    {
+        "intents": ("weather", "statistics"),
+        "context": "Date | Precipitation\n2023-08-10 | 0\n2023-08-11 | 0\n2023-08-12 | 12\n2023-08-13 | 0",
+        "query": "How many dry days (0 rainfall) were there?",
+        "answer": "3 dry days.",
+    },
+    {
+        "intents": ("cost", "yield", "statistics"),
+        "context": "State | Crop | A2+FL | Yield\nAndhra Pradesh | Chili | 4000 | 10\nAndhra Pradesh | Chili | 4500 | 12",
+        "query": "What is the total revenue needed (A2+FL) and weighted average yield for chili in Andhra Pradesh?",
+        "answer": "Total A2+FL = 8500; weighted average yield = (4000*10 + 4500*12) / (4000 + 4500) ≈ 11.06.",
+    },
+    {
+        "intents": ("timing", "yield"),
+        "context": "State | Crop | Month | Yield\nKarnataka | Ragi | June | 15\nKarnataka | Ragi | July | 19\n"
+                   "Karnataka | Ragi | August | 18",
+        "query": "Best month to sow ragi in Karnataka for highest yield?",
+        "answer": "July (yield 19).",
+    },
+    {
+        "intents": ("cost", "yield"),
+        "context": "State | Crop | C2 | Yield\nTamil Nadu | Rice | 3200 | 50\nKerala | Rice | 3100 | 44",
+        "query": "Which state is more efficient for rice (lower C2 per unit yield)?",
+        "answer": "Tamil Nadu: 3200/50 = 64 vs Kerala: 3100/44 ≈ 70.45; Tamil Nadu is more efficient.",
+    },
+    {
+        "intents": ("timing", "weather"),
+        "context": "YEAR |ANNUAL |JAN-FEB |MAR-MAY|JUN-SEP|OCT-DEC\n1901 28.96 23.27 31.46 31.27 27.25\n"
+                   "1902 29.22 25.75 31.76 31.09 26.49\n\n"
+                   "State |District |Date|Year |Month|Avg_rainfall|Agency_name\n"
+                   "Kerala Kannur 2025-02-20 2025 02 0.0 NRSC VIC MODEL\n"
+                   "Kerala Kannur 2025-02-21 2025 02 0.0200524299 NRSC VIC MODEL",
+        "query": "When should we irrigate in Kannur district in Kerala?",
+        "answer": "The perfect time to irrigate is when the Avg_rainfall <= 3.6 and temperature <= 28. So in this case "
+                  "in Kannur district in Kerala it is best to irrigate in the 02 month which is February. So finally "
+                  "perfect time to irrigate is January - February where Avg_rainfall <= 3.6 and temperature <= 28.",
+    },
+    {
+        "intents": ("suitability", "weather"),
+        "context": "Crop | State | MinTemp | MaxTemp\nPaddy | Tamil Nadu | 20 | 35\nPaddy | Andhra Pradesh | 22 | 34",
+        "query": "Is it suitable to grow rice at 30 degrees?",
+        "answer": "Yes. Rice (paddy) can be grown between 20°C and 35°C in the dataset. Since 30°C is within this "
+                  "range, it is suitable.",
+    },
+    {
+        "intents": ("estimate", "cost", "yield"),
+        "context": "Cost of Cultivation (C2) | Cost of Production | Yield\n8000 | 12000 | 20\n9000 | 13500 | 22\n"
+                   "10000 | 15000 | 24",
+        "query": "If my cost of cultivation is 9500, what will be my cost of production and yield?",
+        "answer": "By analyzing the trend:\n- Cost of production increases by about 1500 for every +1000 in cultivation "
+                  "cost.\n- Yield increases by about 2 for every +1000 in cultivation cost.\nSo for 9500, we can "
+                  "estimate:\nCost of production ≈ 14250\nYield ≈ 23.",
+    },
+    {
+        "intents": ("estimate", "cost", "yield"),
+        "context": "Cost of Cultivation (C2) | Cost of Production | Yield\n5000 | 7000 | 15\n6000 | 8500 | 17\n"
+                   "7000 | 10000 | 19",
+        "query": "If my cost of cultivation is 8000, what will be my cost of production and yield?",
+        "answer": "Following the trend:\n- Cost of production increases by about 1500 for every +1000 in cultivation "
+                  "cost.\n- Yield increases by about 2 for every +1000 in cultivation cost.\nSo for 8000, we can "
+                  "estimate:\nCost of production ≈ 11500\nYield ≈ 21.",
+    },
+    {
+        "intents": ("estimate", "cost", "yield"),
+        "context": "Cost of Cultivation (C2) | Cost of Production | Yield\n12000 | 16000 | 28\n14000 | 18500 | 32",
+        "query": "If my cost of cultivation is 13000, what will be my cost of production and yield?",
+        "answer": "The midpoint between 12000 and 14000:\n- Cost of production ≈ (16000 + 18500)/2 = 17250\n"
+                  "- Yield ≈ (28 + 32)/2 = 30\nSo for 13000, estimated cost of production is 17250 and yield is 30.",
+    },
+    {
+        "intents": ("timing",),
+        "context": "Crop | Growth Days | Sowing Month | Harvest Month\nRice | 120         | June         | October\n"
+                   "Rice | 105         | December     | March",
+        "query": "How many days does rice take to harvest?",
+        "answer": "About 120 days for Kharif season, 105 days for Rabi season rice.",
+    },
+    {
+        "intents": ("improve", "yield", "soil"),
+        "context": "State | Crop | Yield | Fertilizer Used | Irrigation | Soil Quality\n"
+                   "Punjab | Wheat | 35 | High | Drip | Good\nPunjab | Wheat | 30 | Low | Flood | Poor",
+        "query": "How can I increase wheat yield in Punjab?",
+        "answer": "To increase wheat yield in Punjab:\n"
+                  "1. **Improve Fertilizer Use**: Switch from low to high-quality fertilizers for better growth.\n"
+                  "2. **Optimize Irrigation**: Use drip irrigation instead of flood irrigation to avoid water wastage "
+                  "and increase soil moisture consistency.\n"
+                  "3. **Enhance Soil Quality**: Conduct soil health tests and add organic matter to improve soil "
+                  "structure and fertility.\n"
+                  "4. **Crop Variety**: Use high-yielding or drought-resistant varieties suited for the local climate.",
+    },
+    {
+        "intents": ("improve", "yield", "weather"),
+        "context": "State | Crop | Yield | Temperature | Rainfall\nKarnataka | Rice | 4.5 | 30°C | 1000 mm\n"
+                   "Karnataka | Rice | 3.5 | 32°C | 900 mm",
+        "query": "How can I improve rice yield in Karnataka?",
+        "answer": "To improve rice yield in Karnataka:\n"
+                  "1. **Temperature Management**: Opt for rice varieties that are tolerant to higher temperatures "
+                  "(if it frequently exceeds 32°C).\n"
+                  "2. **Water Management**: Use efficient irrigation techniques (e.g., SRI - System of Rice "
+                  "Intensification) to manage water and reduce irrigation needs.\n"
+                  "3. **Soil Fertility**: Apply balanced fertilizers, including micronutrients, to support healthy "
+                  "growth and increase yield.\n"
+                  "4. **Pest Control**: Monitor for pests and diseases, and use organic or chemical treatments as "
+                  "needed to prevent yield loss.",
+    },
+    {
+        "intents": ("improve", "yield", "soil"),
+        "context": "State | Crop | Yield | Soil Type | Irrigation\nTamil Nadu | Groundnut | 1200 | Sandy | Drip\n"
+                   "Tamil Nadu | Groundnut | 1000 | Clay | Flood",
+        "query": "What can be done to increase groundnut yield in Tamil Nadu?",
+        "answer": "To increase groundnut yield in Tamil Nadu:\n"
+                  "1. **Improve Irrigation**: For clay soils, switch from flood to drip irrigation to prevent "
+                  "waterlogging and ensure better root development.\n"
+                  "2. **Soil Health**: Use organic compost to improve soil texture and enhance nutrient retention, "
+                  "especially for sandy soils.\n"
+                  "3. **Fertilization**: Use a balanced mix of nitrogen, phosphorus, and potassium, along with "
+                  "micronutrients to enhance growth.\n"
+                  "4. **Pest and Disease Control**: Regularly monitor for pests and treat early to prevent any damage "
+                  "that may reduce yields.",
+    },
+    {
+        "intents": ("improve", "yield", "timing"),
+        "context": "State | Crop | Yield | Sowing Month | Harvest Month | Temperature\n"
+                   "Uttar Pradesh | Maize | 3.2 | March | July | 25°C\nUttar Pradesh | Maize | 2.8 | April | August | 28°C",
+        "query": "How can I increase maize yield in Uttar Pradesh?",
+        "answer": "To increase maize yield in Uttar Pradesh:\n"
+                  "1. **Optimize Sowing Month**: Sowing in March (as shown in the dataset) has a higher yield. Avoid "
+                  "delaying sowing into April when temperatures rise.\n"
+                  "2. **Temperature Management**: Use heat-resistant maize varieties to cope with temperatures "
+                  "exceeding 28°C during the growing season.\n"
+                  "3. **Irrigation Techniques**: Implement water-saving irrigation practices (e.g., drip or sprinkler) "
+                  "to maintain soil moisture during peak heat periods.\n"
+                  "4. **Soil Fertility**: Apply high-quality fertilizers and ensure the soil has adequate levels of "
+                  "nitrogen and other essential nutrients for maize growth.",
+    },
+    {
+        "intents": ("yield",),
+        "context": "Crop | Fertilizer | Yield\nBarley | Urea | 32\nBarley | DAP | 35\nBarley | NPK | 38",
+        "query": "What is the best fertilizer for Barley?",
+        "answer": "The best fertilizer for Barley is NPK, as it gives the highest yield (38) compared to Urea (32) "
+                  "and DAP (35).",
+    },
+    {
+        "intents": ("weather",),
+        "context": "Weather forecast for Delhi_India on day 2: Time 2024-01-22T12:00:00Z, Temperature 18.5°C, "
+                   "Humidity 65.0, Soil moisture 22.3, Wind speed 12.5 km/h, Precipitation 0.0 mm (tomorrow)",
+        "query": "What will be the weather tomorrow in Delhi?",
+        "answer": "Tomorrow in Delhi, the weather will be: Temperature 18.5°C, Humidity 65%, Soil moisture 22.3%, "
+                  "Wind speed 12.5 km/h, with no precipitation expected (0.0 mm).",
+    },
+    {
+        "intents": ("weather",),
+        "context": "Current weather in Mumbai_India: Temperature 28.2°C, Feels like 30.1°C, Humidity 78.0, "
+                   "Soil moisture 35.2, Wind speed 3.2 m/s, Description: humid and warm\n"
+                   "Weather forecast for Mumbai_India on day 1: Temperature 29.0°C, Humidity 75.0, (today)",
+        "query": "What's the weather like today in Mumbai?",
+        "answer": "Today in Mumbai: Current temperature is 28.2°C (feels like 30.1°C), humidity 78%, soil moisture "
+                  "35.2%, wind speed 3.2 m/s. Conditions are humid and warm. Forecast shows temperature reaching 29°C "
+                  "with 75% humidity.",
+    },
+    {
+        "intents": ("weather",),
+        "context": "Weather forecast for Bangalore_India on day 3: Temperature 22.8°C, Humidity 58.0, Soil moisture "
+                   "18.7, Wind speed 8.3 km/h, Precipitation 2.5 mm (in 3 days)\n"
+                   "Weather forecast for Bangalore_India on day 4: Temperature 23.1°C, Humidity 60.0, Soil moisture "
+                   "19.2, Wind speed 9.1 km/h, Precipitation 1.2 mm (in 4 days)",
+        "query": "Will it rain in Bangalore this week?",
+        "answer": "Yes, rain is expected in Bangalore this week. Day 3: light rain with 2.5 mm precipitation, "
+                  "temperature 22.8°C. Day 4: light rain with 1.2 mm precipitation, temperature 23.1°C.",
+    },
+    {
+        "intents": ("suitability", "weather"),
+        "context": "Current weather in Hyderabad_India: Temperature 24.1°C, Humidity 90.0%, Soil moisture 75.0%\n"
+                   "Crop data: Cotton - Temperature range 21-30°C, Humidity tolerance high, Water requirement moderate\n"
+                   "Rice - Temperature range 20-35°C, Humidity tolerance very high, Water requirement high\n"
+                   "Wheat - Temperature range 15-25°C, Humidity tolerance low, Water requirement moderate",
+        "query": "What are suitable crops for current weather?",
+        "answer": "Based on current weather in Hyderabad (24.1°C, 90% humidity, 75% soil moisture), suitable crops "
+                  "are:\n1. Rice/Paddy - Excellent match (thrives in high humidity and moisture)\n"
+                  "2. Cotton - Good match (suitable temperature and humidity tolerance)\n"
+                  "3. Sugarcane - Good for high moisture conditions\n"
+                  "Avoid wheat as it prefers lower humidity conditions.",
+    },
+    {
+        "intents": ("suitability", "weather"),
+        "context": "Current weather in Delhi_India: Temperature 18.5°C, Humidity 45.0%, Soil moisture 35.0%",
+        "query": "Which crops are best for current weather conditions?",
+        "answer": "For Delhi's current conditions (18.5°C, 45% humidity, 35% soil moisture), recommended crops:\n"
+                  "1. Wheat - Perfect temperature range and moderate moisture needs\n"
+                  "2. Mustard - Thrives in cooler temperatures and moderate humidity\n"
+                  "3. Barley - Well-suited for these conditions\n"
+                  "4. Peas - Good for cooler weather and moderate moisture",
+    },
+    {
+        "intents": ("suitability", "weather"),
+        "context": "Weather forecast for Chennai_India on day 1: Temperature 32.1°C, Humidity 82.0, Soil moisture "
+                   "28.5, Wind speed 15.2 km/h, Precipitation 0.0 mm (today)\n"
+                   "Weather forecast for Chennai_India on day 2: Temperature 33.5°C, Humidity 79.0, Soil moisture "
+                   "26.8, Wind speed 17.1 km/h, Precipitation 0.0 mm (tomorrow)",
+        "query": "Is it good weather for farming in Chennai this week?",
+        "answer": "Chennai weather shows: Today 32.1°C with 82% humidity, tomorrow 33.5°C with 79% humidity. Soil "
+                  "moisture is good (28.5% today, 26.8% tomorrow). No rain expected. The high humidity and warm "
+                  "temperatures are suitable for tropical crops, but irrigation may be needed due to no precipitation.",
+    },
+    {
+        "intents": ("soil", "weather"),
+        "context": "Soil information for Delhi_India: Dominant soil type is Alluvial\n"
+                   "Weather forecast for Delhi_India on day 1: Temperature 15.2°C, Humidity 45.0, Soil moisture 12.3, "
+                   "Wind speed 6.8 km/h (today)",
+        "query": "What type of soil is in Delhi and current conditions?",
+        "answer": "Delhi has Alluvial soil type. Current conditions: Temperature 15.2°C, Humidity 45%, Soil moisture "
+                  "12.3%, Wind speed 6.8 km/h. The alluvial soil with current low moisture (12.3%) may need irrigation "
+                  "for optimal crop growth.",
+    },
+    {
+        "intents": ("weather",),
+        "context": "Weather forecast for Hyderabad_India on day 7: Temperature 26.8°C, Humidity 62.0, Soil moisture "
+                   "24.1, Wind speed 11.5 km/h, Precipitation 0.5 mm (in 7 days, week 1)",
+        "query": "What will be the weather next week in Hyderabad?",
+        "answer": "Next week (day 7) in Hyderabad: Temperature 26.8°C, Humidity 62%, Soil moisture 24.1%, Wind speed "
+                  "11.5 km/h, with light precipitation of 0.5 mm expected.",
+    },
+]
+
+
+def format_example(number: int, example: Dict[str, Any]) -> str:
+    return f"Example {number}:\nContext:\n{example['context']}\nQuery:\n{example['query']}\nAnswer:\n{example['answer']}\n"
+
+
+def format_examples(examples: Sequence[Dict[str, Any]]) -> str:
+    """Few-shot block for the REPL prompt, numbered in the given order"""
+    return "\n".join(format_example(number, example) for number, example in enumerate(examples, start=1))
+
+
+def query_intents(query: str) -> FrozenSet[str]:
+    """Intent tags whose keywords occur in the query"""
+    features = query_features(query)
+    return frozenset(intent for intent, group in INTENT_GROUPS.items() if features.has(group))
+
+
+class FewShotSelector:
+    """Example records with their query embeddings, chosen per request by similarity"""
+
+    def __init__(self, examples: Sequence[Dict[str, Any]], embed: Callable[[List[str]], np.ndarray]):
+        """
+        Args:
+            examples: Few-shot records (see FEW_SHOT_EXAMPLES)
+            embed: Maps encoder inputs to normalized float32 vectors; called once for all example queries
+        """
+        self.examples = list(examples)
+        self.vectors = np.asarray(embed([embedding_input(example["query"]) for example in self.examples]),
+                                  dtype=np.float32)
+        self.costs = [estimate_tokens(format_example(len(self.examples), example)) for example in self.examples]
+
+    def select(self, query: str, query_vector: np.ndarray, k: int = 4, token_budget: int = 600,
+               filter_intents: bool = True) -> List[Dict[str, Any]]:
+        """
+        Choose the examples for one query
+
+        Args:
+            query: English query text, used for the intent filter
+            query_vector: Normalized embedding of the query
+            k: Maximum number of examples
+            token_budget: Maximum estimated tokens of the chosen examples (0 = no limit)
+            filter_intents: Only consider examples sharing an intent with the query; ignored when the
+                query matches no intent or no example shares one
+
+        Returns:
+            Chosen example records, most similar first
+        """
+        if not self.examples or k <= 0:
+            return []
+        scores = self.vectors @ np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        candidates = range(len(self.examples))
+        if filter_intents:
+            intents = query_intents(query)
+            matching = [i for i in candidates if intents.intersection(self.examples[i]["intents"])]
+            if matching:
+                candidates = matching
+
+        chosen, used = [], 0
+        for i in sorted(candidates, key=lambda i: -scores[i]):
+            if token_budget and used + self.costs[i] > token_budget:
+                # A shorter, less similar example may still fit
+                continue
+            chosen.append(self.examples[i])
+            used += self.costs[i]
+            if len(chosen) == k:
+                break
+        return chosen
@@ -0,0 +1,246 @@
+"""
+Versioned index generations for the RAG index
+A full build is written to its own directory, sealed with a manifest of file
+checksums and renamed into place, and only then published by atomically
+replacing a small pointer file. Readers resolve the pointer once per load, so
+they always see a complete generation; the previous one is kept for rollback.
+Incremental updates publish a new generation too, cloned from the served one
+with hard links, so a published generation is never written again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+GENERATIONS_DIR = "faiss_generations"
+POINTER_FILE = "CURRENT.json"
+MANIFEST_FILE = "manifest.json"
+STAGING_SUFFIX = ".building"
+
+
+def new_generation_id() -> str:
+    """Sortable, unique generation name"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def generation_dir(generation: str, root: str = GENERATIONS_DIR) -> str:
+    return os.path.join(root, generation)
+
+
+def staging_dir(generation: str, root: str = GENERATIONS_DIR) -> str:
+    """Directory a generation is built in; never read by the server"""
+    return os.path.join(root, generation + STAGING_SUFFIX)
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: str, payload: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _generation_files(path: str):
+    for directory, _, names in os.walk(path):
+        for name in names:
+            relative = os.path.relpath(os.path.join(directory, name), path)
+            if relative != MANIFEST_FILE and not relative.endswith(".tmp"):
+                yield relative.replace(os.sep, "/")
+
+
+def _same_file(path: str, other: str) -> bool:
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def write_manifest(path: str, meta: Dict[str, Any], base: str = None) -> Dict[str, Any]:
+    """
+    Record size, mtime and checksum of every file of a generation
+
+    Args:
+        path: Generation directory
+        meta: Index metadata stored with the manifest
+        base: Sealed generation the files were hard-linked from (see clone_generation);
+            files still linked to it take their checksum from its manifest
+
+    Returns:
+        The manifest written
+    """
+    base_files = (read_manifest(base) or {}).get("files", {}) if base else {}
+    files = {}
+    for relative in sorted(_generation_files(path)):
+        file_path = os.path.join(path, relative)
+        stat = os.stat(file_path)
+        old = base_files.get(relative)
+        if old and _same_file(file_path, os.path.join(base, relative)):
+            files[relative] = old
+        else:
+            files[relative] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_checksum(file_path)}
+    manifest = {
+        "generation": os.path.basename(os.path.normpath(path)).replace(STAGING_SUFFIX, ""),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "meta": meta,
+        "files": files,
+    }
+    _write_json_atomic(os.path.join(path, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def clone_generation(source: str, staging: str, names: Iterable[str] = None):
+    """
+    Fill a staging directory with hard links to the files of another generation
+
+    An incremental update starts from such a clone and replaces the files it
+    changes (written under a temporary name and renamed over the link), so the
+    source generation is never modified. Files are copied where links fail.
+
+    Args:
+        source: Generation directory to start from ("" for the working directory)
+        staging: Staging directory of the new generation
+        names: Top-level files and directories to take; everything but the manifest if None
+    """
+    source = source or "."
+    if names is None:
+        relatives = list(_generation_files(source))
+    else:
+        relatives = []
+        for name in names:
+            if os.path.isdir(os.path.join(source, name)):
+                relatives.extend(f"{name}/{relative}" for relative in _generation_files(os.path.join(source, name)))
+            elif os.path.isfile(os.path.join(source, name)):
+                relatives.append(name)
+    for relative in relatives:
+        target = os.path.join(staging, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(os.path.join(source, relative), target)
+        except OSError:
+            shutil.copy2(os.path.join(source, relative), target)
+
+
+def verify_generation(path: str) -> bool:
+    """True if every file listed in the manifest is present with its recorded checksum"""
+    manifest = read_manifest(path)
+    if not manifest or not manifest.get("files"):
+        return False
+    for relative, entry in manifest["files"].items():
+        file_path = os.path.join(path, relative)
+        if not os.path.isfile(file_path) or os.path.getsize(file_path) != entry["size"]:
+            return False
+        if file_checksum(file_path) != entry["sha256"]:
+            return False
+    return True
+
+
+def seal_generation(staging: str, meta: Dict[str, Any], base: str = None) -> str:
+    """Write the manifest of a finished build and rename it to its final name; returns the generation"""
+    manifest = write_manifest(staging, meta, base)
+    final = staging[:-len(STAGING_SUFFIX)] if staging.endswith(STAGING_SUFFIX) else staging
+    if final != staging:
+        os.replace(staging, final)
+    return manifest["generation"]
+
+
+def read_pointer(root: str = GENERATIONS_DIR) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(root, POINTER_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def pointer_version(root: str = GENERATIONS_DIR) -> Optional[Tuple[int, int]]:
+    """Cheap change marker of the pointer file (None without one); every publish replaces the file"""
+    try:
+        stat = os.stat(os.path.join(root, POINTER_FILE))
+        return stat.st_ino, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+def current_generation(root: str = GENERATIONS_DIR) -> Optional[str]:
+    """Published generation whose directory exists, None for the legacy single-directory layout"""
+    generation = read_pointer(root).get("current")
+    if generation and os.path.isdir(generation_dir(generation, root)):
+        return generation
+    return None
+
+
+def publish_generation(generation: str, root: str = GENERATIONS_DIR, keep: int = 2) -> Dict[str, Any]:
+    """
+    Make a sealed generation the served one by swapping the pointer file
+
+    Args:
+        generation: Sealed generation name
+        root: Generations directory
+        keep: Sealed generations kept on disk, at least the current and previous one
+
+    Returns:
+        The new pointer
+
+    Raises:
+        ValueError: If the generation is missing or fails checksum verification
+    """
+    if not verify_generation(generation_dir(generation, root)):
+        raise ValueError(f"Index generation {generation} is incomplete or corrupt")
+    old = read_pointer(root)
+    previous = old.get("current") if old.get("current") != generation else old.get("previous")
+    pointer = {"current": generation, "previous": previous, "published_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    _write_json_atomic(os.path.join(root, POINTER_FILE), pointer)
+    prune_generations(root, keep)
+    return pointer
+
+
+def rollback_generation(root: str = GENERATIONS_DIR) -> Dict[str, Any]:
+    """
+    Serve the previous generation again (the current one becomes the previous)
+
+    Raises:
+        ValueError: If there is no intact previous generation
+    """
+    pointer = read_pointer(root)
+    previous = pointer.get("previous")
+    if not previous or not verify_generation(generation_dir(previous, root)):
+        raise ValueError("No intact previous index generation to roll back to")
+    pointer = {"current": previous, "previous": pointer.get("current"),
+               "published_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    _write_json_atomic(os.path.join(root, POINTER_FILE), pointer)
+    return pointer
+
+
+def prune_generations(root: str = GENERATIONS_DIR, keep: int = 2):
+    """Delete the oldest sealed generations beyond keep; the current and previous ones always stay"""
+    pointer = read_pointer(root)
+    protected = {pointer.get("current"), pointer.get("previous")}
+    sealed = sorted(name for name in os.listdir(root)
+                    if os.path.isdir(os.path.join(root, name)) and not name.endswith(STAGING_SUFFIX))
+    excess = len(sealed) - max(keep, len(protected - {None}))
+    for name in sealed:
+        if excess <= 0:
+            break
+        if name not in protected:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            excess -= 1
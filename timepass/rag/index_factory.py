@@ -0,0 +1,477 @@
+"""
+FAISS index factory for the RAG system
+Builds flat, HNSW, IVF-Flat or IVF-PQ indexes from config, optionally storing
+vectors as float16, int8 or PQ codes, applies search-time knobs (efSearch /
+nprobe), and reports recall@k, latency and size against exact float32 search.
+"""
+
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config import config
+from rag.embedding_store import embedding_input, shared_embedding_store
+from rag.embedders import embedding_key, load_embedder
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+# How vectors are stored in the index; ivf_pq always stores PQ codes
+QUANTIZATIONS = ["none", "fp16", "int8", "pq"]
+SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def index_params_from_config() -> Dict[str, Any]:
+    """Collect index build and search parameters from the central config"""
+    return {
+        "index_type": config.RAG_INDEX_TYPE,
+        "quantization": config.RAG_INDEX_QUANTIZATION,
+        "train_sample": config.RAG_INDEX_TRAIN_SAMPLE,
+        "hnsw_m": config.RAG_HNSW_M,
+        "ef_construction": config.RAG_HNSW_EF_CONSTRUCTION,
+        "ef_search": config.RAG_HNSW_EF_SEARCH,
+        "nlist": config.RAG_IVF_NLIST,
+        "nprobe": config.RAG_IVF_NPROBE,
+        "pq_m": config.RAG_PQ_M,
+        "pq_nbits": config.RAG_PQ_NBITS,
+    }
+
+
+def default_nlist(num_vectors: int) -> int:
+    """About 4*sqrt(n) lists, capped so every list gets ~39 training points"""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def _training_sample(embeddings: np.ndarray, sample_size: int) -> np.ndarray:
+    if sample_size <= 0 or len(embeddings) <= sample_size:
+        return embeddings
+    rows = np.random.default_rng(42).choice(len(embeddings), sample_size, replace=False)
+    return embeddings[np.sort(rows)]
+
+
+def create_index(dimension: int, num_vectors: int, params: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """
+    Create an empty (untrained) inner-product index
+
+    Args:
+        dimension: Embedding dimension
+        num_vectors: Expected corpus size, used to size IVF lists
+        params: Index parameters (defaults to index_params_from_config())
+    """
+    params = {**index_params_from_config(), **(params or {})}
+    index_type = params["index_type"].lower()
+    quantization = str(params.get("quantization") or "none").lower()
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATIONS}")
+    if (quantization == "pq" or index_type == "ivf_pq") and dimension % params["pq_m"] != 0:
+        raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dimension}")
+
+    if index_type == "flat":
+        if quantization == "none":
+            return faiss.IndexFlatIP(dimension)
+        if quantization == "pq":
+            return faiss.IndexPQ(dimension, params["pq_m"], params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexScalarQuantizer(dimension, SQ_TYPES[quantization], faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        if quantization == "none":
+            index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            storage = {"fp16": "SQfp16", "int8": "SQ8", "pq": f"PQ{params['pq_m']}x{params['pq_nbits']}"}[quantization]
+            # The factory already returns the concrete IndexHNSWSQ / IndexHNSWPQ; downcasting its
+            # temporary would drop the wrapper that owns the index
+            index = faiss.index_factory(dimension, f"HNSW{params['hnsw_m']},{storage}", faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+
+    nlist = params["nlist"] or default_nlist(num_vectors)
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf_flat" and quantization in SQ_TYPES:
+        return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, SQ_TYPES[quantization],
+                                             faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivf_flat" and quantization == "none":
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, params["pq_m"], params["pq_nbits"],
+                                faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def apply_search_params(index: faiss.Index, params: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """Set search-time knobs (efSearch for HNSW, nprobe for IVF) on a built or loaded index"""
+    params = {**index_params_from_config(), **(params or {})}
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = params["ef_search"]
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(params["nprobe"], base.nlist)
+    return index
+
+
+def build_index(embeddings: np.ndarray, params: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """
+    Build and populate an index, training on a sample when the type needs it
+
+    Args:
+        embeddings: float32 matrix of normalized embeddings
+        params: Index parameters (defaults to index_params_from_config())
+    """
+    params = {**index_params_from_config(), **(params or {})}
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = create_index(embeddings.shape[1], len(embeddings), params)
+    if not index.is_trained:
+        index.train(_training_sample(embeddings, params["train_sample"]))
+    index.add(embeddings)
+    return apply_search_params(index, params)
+
+
+def create_id_index(training: np.ndarray, num_vectors: int,
+                    params: Optional[Dict[str, Any]] = None) -> faiss.IndexIDMap2:
+    """
+    Create an empty, trained index that stores chunk ids
+
+    Args:
+        training: Vectors to train on when the type needs it (sampled down to train_sample)
+        num_vectors: Expected corpus size, used to size IVF lists
+        params: Index parameters (defaults to index_params_from_config())
+    """
+    params = {**index_params_from_config(), **(params or {})}
+    training = np.ascontiguousarray(training, dtype=np.float32)
+    base = create_index(training.shape[1], num_vectors, params)
+    if not base.is_trained:
+        base.train(_training_sample(training, params["train_sample"]))
+    return faiss.IndexIDMap2(base)
+
+
+def build_id_index(embeddings: np.ndarray, ids: Optional[np.ndarray] = None,
+                   params: Optional[Dict[str, Any]] = None) -> faiss.IndexIDMap2:
+    """
+    Build an index whose search results are chunk ids rather than insertion positions
+
+    Args:
+        embeddings: float32 matrix of normalized embeddings
+        ids: Chunk id for each row (defaults to 0..n-1)
+        params: Index parameters (defaults to index_params_from_config())
+    """
+    params = {**index_params_from_config(), **(params or {})}
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = create_id_index(embeddings, len(embeddings), params)
+    ids = np.arange(len(embeddings), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    index.add_with_ids(embeddings, ids)
+    return apply_search_params(index, params)
+
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """Chunk ids currently stored in an id-mapped (or segmented) index"""
+    if isinstance(index, SegmentedIndex):
+        return index.ids()
+    return faiss.vector_to_array(index.id_map)
+
+
+def remove_ids(index: faiss.IndexIDMap2, ids: np.ndarray) -> faiss.IndexIDMap2:
+    """
+    Remove chunk ids from a flat or IVF id-mapped index in place
+
+    HNSW graphs cannot delete; their removed ids are marked deleted and filtered
+    at search time instead (see SegmentedIndex), and dropped at compaction.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return index
+    if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        raise ValueError("HNSW indexes cannot remove ids; mark them deleted and compact instead")
+    index.remove_ids(ids)
+    return index
+
+
+def search_ids(index: faiss.IndexIDMap2, queries: np.ndarray, ids: np.ndarray, k: int,
+               exact_limit: int = 4096):
+    """
+    Search only among the given chunk ids
+
+    HNSW graph search degrades with very selective filters, so small HNSW
+    candidate sets are scored exactly from their stored vectors instead.
+
+    Returns:
+        (distances, ids) like index.search
+    """
+    if isinstance(index, SegmentedIndex):
+        return index.search_ids(queries, ids, k)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexHNSW) and len(ids) <= exact_limit:
+        vectors = np.vstack([index.reconstruct(int(i)) for i in ids])
+        scores = queries @ vectors.T
+        top = np.argsort(-scores, axis=1)[:, :k]
+        found = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        found[:, :top.shape[1]] = ids[top]
+        distances[:, :top.shape[1]] = np.take_along_axis(scores, top, axis=1)
+        return distances, found
+
+    selector = faiss.IDSelectorBatch(ids)
+    # Candidates can sit in any IVF list, so probe them all; the selector keeps the scan cheap
+    return index.search(queries, k, params=_search_params(base, selector, k, nprobe=getattr(base, "nlist", None)))
+
+
+def _search_params(base: faiss.Index, selector, k: int, nprobe: Optional[int] = None) -> faiss.SearchParameters:
+    """Search parameters restricting a search to selector's ids, keeping the index's own search effort"""
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(base.hnsw.efSearch, 4 * k))
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or base.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def _merge_results(results: List[tuple], k: int):
+    """Best k of several (distances, ids) search results over the same queries"""
+    distances = np.hstack([d for d, _ in results])
+    found = np.hstack([i for _, i in results])
+    distances = np.where(found < 0, -np.inf, distances)
+    top = np.argsort(-distances, axis=1, kind="stable")[:, :k]
+    distances, found = np.take_along_axis(distances, top, axis=1), np.take_along_axis(found, top, axis=1)
+    if found.shape[1] < k:
+        pad = k - found.shape[1]
+        distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=-np.inf)
+        found = np.pad(found, ((0, 0), (0, pad)), constant_values=-1)
+    return distances.astype(np.float32), found
+
+
+class SegmentedIndex:
+    """
+    Search view over a base index, a small delta index of chunks added since it
+    was built, and base ids marked deleted
+
+    Deleted ids are filtered out of every base search with an IDSelector, so
+    incremental updates never rewrite (or, for HNSW, rebuild) the base index.
+    """
+
+    def __init__(self, base: faiss.IndexIDMap2, delta: Optional[faiss.IndexIDMap2] = None,
+                 deleted: Optional[np.ndarray] = None):
+        self.base = base
+        self.delta = delta
+        self.deleted = np.unique(np.asarray([] if deleted is None else deleted, dtype=np.int64))
+        self._deleted_selector = faiss.IDSelectorBatch(self.deleted) if len(self.deleted) else None
+        self._exclude = faiss.IDSelectorNot(self._deleted_selector) if len(self.deleted) else None
+        base_ids = index_ids(base)
+        self._base_live = int(base.ntotal - np.count_nonzero(np.isin(self.deleted, base_ids)))
+        self.ntotal = self._base_live + (delta.ntotal if delta is not None else 0)
+
+    def ids(self) -> np.ndarray:
+        base_ids = np.setdiff1d(index_ids(self.base), self.deleted)
+        return base_ids if self.delta is None else np.union1d(base_ids, index_ids(self.delta))
+
+    def search(self, queries: np.ndarray, k: int, params=None):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        results = []
+        if self._base_live:
+            base = faiss.downcast_index(self.base.index)
+            params = _search_params(base, self._exclude, k) if self._exclude is not None else None
+            results.append(self.base.search(queries, min(k, self.base.ntotal), params=params))
+        if self.delta is not None and self.delta.ntotal:
+            results.append(self.delta.search(queries, min(k, self.delta.ntotal)))
+        if not results:
+            return (np.full((len(queries), k), -np.inf, dtype=np.float32),
+                    np.full((len(queries), k), -1, dtype=np.int64))
+        return _merge_results(results, k)
+
+    def search_ids(self, queries: np.ndarray, ids: np.ndarray, k: int):
+        ids = np.asarray(ids, dtype=np.int64)
+        in_delta = np.isin(ids, index_ids(self.delta)) if self.delta is not None else np.zeros(len(ids), bool)
+        base_ids = np.setdiff1d(ids[~in_delta], self.deleted)
+        results = []
+        if len(base_ids):
+            results.append(search_ids(self.base, queries, base_ids, min(k, len(base_ids))))
+        if in_delta.any():
+            results.append(search_ids(self.delta, queries, ids[in_delta], min(k, int(in_delta.sum()))))
+        if not results:
+            return (np.full((len(queries), k), -np.inf, dtype=np.float32),
+                    np.full((len(queries), k), -1, dtype=np.int64))
+        return _merge_results(results, k)
+
+    def reconstruct(self, chunk_id: int) -> np.ndarray:
+        if self.delta is not None and np.isin(chunk_id, index_ids(self.delta)):
+            return self.delta.reconstruct(chunk_id)
+        return self.base.reconstruct(chunk_id)
+
+
+def _vector_storage(index: faiss.Index) -> faiss.Index:
+    """The part of an index that holds the vector codes"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.downcast_index(base.storage)
+    return base
+
+
+def index_quantization(index: faiss.Index) -> str:
+    """How an index stores its vectors (one of QUANTIZATIONS)"""
+    storage = _vector_storage(index)
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if storage.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    if isinstance(storage, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def describe_index(index: faiss.Index) -> Dict[str, Any]:
+    """Short description of an index for faiss_meta.json and status endpoints"""
+    if isinstance(index, SegmentedIndex):
+        delta = index.delta.ntotal if index.delta is not None else 0
+        return {**describe_index(index.base), "ntotal": int(index.ntotal),
+                "delta_chunks": int(delta), "deleted_chunks": int(len(index.deleted))}
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    info = {"index_class": type(base).__name__, "ntotal": int(index.ntotal),
+            "quantization": index_quantization(index)}
+    code_size = getattr(_vector_storage(index), "code_size", None)
+    if code_size:
+        info["bytes_per_vector"] = int(code_size)
+    if isinstance(base, faiss.IndexHNSW):
+        info["ef_search"] = int(base.hnsw.efSearch)
+    elif isinstance(base, faiss.IndexIVF):
+        info.update({"nlist": int(base.nlist), "nprobe": int(base.nprobe)})
+    return info
+
+
+# ==== Recall / latency report ====
+def sample_queries(embeddings: np.ndarray, num_queries: int = 200, noise: float = 0.05) -> np.ndarray:
+    """Perturbed corpus vectors, so queries land near real chunks without being exact copies"""
+    rng = np.random.default_rng(7)
+    rows = rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+    queries = embeddings[rows] + rng.normal(0, noise, (len(rows), embeddings.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / float(truth.size) if k else 0.0
+
+
+def index_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 5,
+                 configs: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Compare index configurations against exact flat search
+
+    Args:
+        embeddings: Corpus embeddings
+        queries: Query embeddings
+        k: Number of neighbours for recall@k
+        configs: Parameter overrides per configuration (default: one per index type and
+            one per quantization of the flat and HNSW indexes)
+
+    Returns:
+        One result dict per configuration with recall, latency and size figures
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    configs = configs or ([{"index_type": index_type, "quantization": "none"} for index_type in INDEX_TYPES] +
+                          [{"index_type": index_type, "quantization": quantization}
+                           for index_type in ("flat", "hnsw") for quantization in QUANTIZATIONS[1:]])
+
+    exact = build_index(embeddings, {"index_type": "flat", "quantization": "none"})
+    _, truth = exact.search(queries, k)
+    exact_bytes = len(faiss.serialize_index(exact))
+
+    results = []
+    for overrides in configs:
+        params = {**index_params_from_config(), **overrides}
+        result = {"index_type": params["index_type"], "quantization": params["quantization"], "params": overrides}
+        try:
+            start = time.perf_counter()
+            index = build_index(embeddings, params)
+            result["build_seconds"] = round(time.perf_counter() - start, 4)
+
+            # Time single-query searches, which is how the API uses the index
+            latencies = []
+            found = np.empty((len(queries), k), dtype=np.int64)
+            for row in range(len(queries)):
+                start = time.perf_counter()
+                _, ids = index.search(queries[row:row + 1], k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found[row] = ids[0]
+
+            result.update({
+                "recall_at_k": round(recall_at_k(truth, found), 4),
+                "search_ms_p50": round(float(np.percentile(latencies, 50)), 4),
+                "search_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+                "index_bytes": len(faiss.serialize_index(index)),
+                "index": describe_index(index),
+            })
+            result["compression"] = round(exact_bytes / max(result["index_bytes"], 1), 2)
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+    return results
+
+
+def load_report_embeddings(chunks_csv: str, embeddings_path: str, store_dir: str = "embedding_store") -> np.ndarray:
+    """Load embeddings for a chunk CSV from a matching .npy or the embedding store, encoding only what is missing"""
+    import pandas as pd
+    texts = pd.read_csv(chunks_csv, usecols=["text"])["text"].fillna("").astype(str).tolist()
+    if os.path.exists(embeddings_path):
+        embeddings = np.load(embeddings_path)
+        if embeddings.shape[0] == len(texts):
+            return embeddings.astype(np.float32)
+
+    store = shared_embedding_store(store_dir, embedding_key(config.EMBEDDING_MODEL), dtype=config.RAG_EMBEDDING_DTYPE)
+    return store.embed([embedding_input(text) for text in texts], _lazy_encoder())
+
+
+def _lazy_encoder():
+    """Encode function that loads the configured embedder on first use"""
+    embedder = None
+
+    def encode(batch: List[str]) -> np.ndarray:
+        nonlocal embedder
+        if embedder is None:
+            embedder = load_embedder(config.EMBEDDING_MODEL)
+        return embedder.encode(batch, convert_to_numpy=True, normalize_embeddings=True,
+                               show_progress_bar=False).astype(np.float32)
+
+    return encode
+
+
+def load_report_queries(path: str) -> np.ndarray:
+    """Encode real user queries, one per line, as they are encoded at query time"""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return _lazy_encoder()(lines)
+
+
+def print_report(results: List[Dict[str, Any]], k: int):
+    print(f"{'index':<16} {'recall@' + str(k):>10} {'p50 ms':>9} {'p95 ms':>9} {'build s':>9} {'MB':>9} {'x smaller':>9}")
+    for result in results:
+        name = result["index_type"] + ("" if result["quantization"] == "none" else f"+{result['quantization']}")
+        if "error" in result:
+            print(f"{name:<16} error: {result['error']}")
+            continue
+        print(f"{name:<16} {result['recall_at_k']:>10.4f} {result['search_ms_p50']:>9.4f} "
+              f"{result['search_ms_p95']:>9.4f} {result['build_seconds']:>9.3f} "
+              f"{result['index_bytes'] / 1e6:>9.2f} {result['compression']:>9.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare RAG index types and quantizations by recall@k, latency and size")
+    parser.add_argument("--chunks", default="faiss_chunks.csv", help="Chunk CSV to index")
+    parser.add_argument("--embeddings", default="embeddings.npy", help="Row-aligned embeddings for the chunks (falls back to the embedding store)")
+    parser.add_argument("-k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled queries")
+    parser.add_argument("--query-file", help="Real queries, one per line, used instead of sampled ones")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = load_report_embeddings(args.chunks, args.embeddings)
+    queries = load_report_queries(args.query_file) if args.query_file else sample_queries(corpus, args.queries)
+    report = index_report(corpus, queries, k=args.k)
+    print(f"Corpus: {len(corpus)} chunks, {corpus.shape[1]} dims, {len(queries)} queries")
+    print_report(report, args.k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,282 @@
+"""
+Shared LLM client for the RAG answer step
+One background event loop owns the chat models, so every caller (API handlers,
+worker threads, the CLI) shares their HTTP connections, one concurrency limit
+and one request rate, and identical prompts already in flight go upstream once.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_openai import ChatOpenAI
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config import config
+from rag.answer_cache import prompt_hash
+
+
+def chat_model(model: str, temperature: float) -> ChatOpenAI:
+    """ChatOpenAI with its own retries off; the client retries 429s through its token bucket"""
+    return ChatOpenAI(model=model, temperature=temperature, max_retries=0,
+                      timeout=config.RAG_LLM_TIMEOUT or None)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 responses (openai.RateLimitError or anything carrying status_code=429)"""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a 429's Retry-After header, if the server sent one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Request rate limiter whose rate halves on each 429 and creeps back up on success
+
+    A rate of 0 sends requests unthrottled until the first 429; the bucket then
+    limits from capacity requests per second and lifts again once it has recovered.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_rate: float = 0.1):
+        self.max_rate = max(rate, 0.0)
+        self.min_rate = min_rate
+        self.capacity = max(capacity, 1.0)
+        # Rate recovered to after a 429; the bucket starts at it unless it is unlimited
+        self.ceiling = max(self.max_rate, min_rate) if self.max_rate else self.capacity
+        self.rate = self.ceiling if self.max_rate else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a request may be sent (0 when a token is available now or there is no limit)"""
+        if not self.limited:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                if self.limited:
+                    self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+    def throttle(self, wait: Optional[float] = None):
+        """Back off after a 429: halve the rate and hold requests for wait seconds (or one token)"""
+        self._refill()
+        self.rate = max(self.min_rate, (self.rate or self.ceiling) / 2)
+        self.tokens = min(self.tokens, 1 - (wait * self.rate if wait else 1))
+
+    def recover(self):
+        if not self.limited:
+            return
+        self.rate = min(self.ceiling, self.rate + self.ceiling / 10)
+        if not self.max_rate and self.rate >= self.ceiling:
+            self.rate = 0.0
+
+
+class LLMClient:
+    """Pooled chat models behind a concurrency limit, a 429-aware token bucket and in-flight coalescing"""
+
+    def __init__(self, llm_factory: Callable[[str, float], Any] = None, max_concurrency: int = None,
+                 rate: float = None, burst: int = None, max_retries: int = None):
+        self.llm_factory = llm_factory or chat_model
+        self.max_concurrency = max(1, config.RAG_LLM_MAX_CONCURRENCY if max_concurrency is None else max_concurrency)
+        self.rate = config.RAG_LLM_RATE_LIMIT if rate is None else rate
+        self.burst = config.RAG_LLM_BURST if burst is None else burst
+        self.max_retries = config.RAG_LLM_MAX_RETRIES if max_retries is None else max_retries
+        self._models: Dict[Tuple[str, float], Any] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket = TokenBucket(self.rate, self.burst)
+        # (model, temperature, prompt hash) -> (running upstream call, text streamed so far, token listeners)
+        self._inflight: Dict[Tuple[str, float, str], Tuple[asyncio.Future, List[str], List[Callable]]] = {}
+        self._queued = 0
+        self.stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "rate_limited": 0, "errors": 0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, args=(loop,), name="llm-client", daemon=True)
+                self._thread.start()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._inflight = {}
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _model(self, model: str, temperature: float):
+        key = (model, temperature)
+        if key not in self._models:
+            self._models[key] = self.llm_factory(model, temperature)
+        return self._models[key]
+
+    def submit(self, prompt: str, model: str = None, temperature: float = None,
+               on_token: Callable[[str], None] = None) -> Future:
+        """
+        Schedule a completion on the client loop
+
+        Args:
+            prompt: Final prompt text
+            model: Chat model name (defaults to config.OPENAI_MODEL)
+            temperature: Sampling temperature (defaults to config.LLM_TEMPERATURE)
+            on_token: Called on the client loop with each piece of answer text as it
+                streams in; a caller joining an identical call gets the text so far first
+
+        Returns:
+            concurrent.futures.Future resolving to the answer text
+        """
+        model = model or config.OPENAI_MODEL
+        temperature = config.LLM_TEMPERATURE if temperature is None else temperature
+        return asyncio.run_coroutine_threadsafe(self._complete(str(prompt), model, temperature, on_token),
+                                                self._ensure_loop())
+
+    def invoke(self, prompt: str, model: str = None, temperature: float = None,
+               on_token: Callable[[str], None] = None) -> str:
+        """Blocking completion for worker threads and the CLI"""
+        return self.submit(prompt, model, temperature, on_token).result()
+
+    async def ainvoke(self, prompt: str, model: str = None, temperature: float = None,
+                      on_token: Callable[[str], None] = None) -> str:
+        """Completion awaitable from another event loop (e.g. a FastAPI handler) without blocking it"""
+        return await asyncio.wrap_future(self.submit(prompt, model, temperature, on_token))
+
+    async def _complete(self, prompt: str, model: str, temperature: float,
+                        on_token: Callable[[str], None] = None) -> str:
+        self.stats["requests"] += 1
+        key = (model, temperature, prompt_hash(prompt))
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+            task, tokens, listeners = self._inflight[key]
+        else:
+            tokens, listeners = [], []
+            task = asyncio.ensure_future(self._call(prompt, model, temperature, tokens, listeners))
+            self._inflight[key] = (task, tokens, listeners)
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        if on_token is not None:
+            for token in tokens:
+                on_token(token)
+            listeners.append(on_token)
+        # A caller going away must not cancel the call other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _generate(self, llm, prompt: str, tokens: List[str], listeners: List[Callable[[str], None]]) -> str:
+        """Stream the answer when someone is listening for tokens, otherwise make one plain call"""
+        if not listeners:
+            response = await llm.ainvoke(prompt)
+            return str(response.content).strip()
+        async for chunk in llm.astream(prompt):
+            text = str(chunk.content)
+            if not text:
+                continue
+            tokens.append(text)
+            for listener in list(listeners):
+                listener(text)
+        return "".join(tokens).strip()
+
+    async def _call(self, prompt: str, model: str, temperature: float,
+                    tokens: List[str], listeners: List[Callable[[str], None]]) -> str:
+        llm = self._model(model, temperature)
+        self._queued += 1
+        async with self._semaphore:
+            self._queued -= 1
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                self.stats["upstream_calls"] += 1
+                try:
+                    answer = await self._generate(llm, prompt, tokens, listeners)
+                except Exception as e:
+                    # Text already streamed cannot be taken back, so only a 429 before it is retried
+                    if not is_rate_limited(e) or tokens or attempt == self.max_retries:
+                        self.stats["errors"] += 1
+                        raise
+                    self.stats["rate_limited"] += 1
+                    self._bucket.throttle(retry_after(e))
+                    print(f" LLM rate limited, retrying in {self._bucket.delay():.1f}s")
+                    continue
+                self._bucket.recover()
+                if not tokens:
+                    # Listeners that joined a non-streaming call get the whole answer at once
+                    tokens.append(answer)
+                    for listener in list(listeners):
+                        listener(answer)
+                return answer
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            "in_flight": len(self._inflight),
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": round(self._bucket.rate, 3),  # 0 = not limited
+        })
+        return stats
+
+    async def _cancel_pending(self):
+        """Cancel upstream calls and the requests waiting on them, so blocked callers see CancelledError"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+
+    def close(self):
+        """
+        Stop the client loop; the next request starts a new one
+
+        Requests still running are cancelled, and the chat models are dropped with
+        the loop their HTTP clients were bound to.
+        """
+        with self._lock:
+            loop, thread, self._loop = self._loop, self._thread, None
+            self._models = {}
+        if loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_pending(), loop).result(timeout=5)
+            except Exception as e:
+                print(f" LLM client did not cancel its pending requests: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client, creating it on first call"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient()
+    return _llm_client
@@ -0,0 +1,159 @@
+"""
+Location posting index for the RAG chunk store
+Maps place names (states, districts, markets, cities) to the ids of chunks that
+mention them in their text or source file name, so retrieval can search within
+a location's chunks instead of hoping they land in the global top-k.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Table columns whose values are place names
+LOCATION_COLUMNS = {"state", "district", "market", "city", "location", "region", "village", "taluk", "block"}
+# Written next to the chunk store by the build, read when the posting index is built
+LOCATION_NAMES_FILE = "location_names.json"
+MAX_NAME_TOKENS = 4
+
+
+def name_tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z]+", str(text).lower())
+
+
+def is_location_column(column: str) -> bool:
+    return " ".join(name_tokens(column)) in LOCATION_COLUMNS
+
+
+def clean_location_names(values: Iterable[str]) -> Set[str]:
+    """Normalized place names, dropping blanks, numbers and very short tokens"""
+    names = set()
+    for value in values:
+        if value is None or value != value:  # None / NaN cells
+            continue
+        tokens = name_tokens(value)[:MAX_NAME_TOKENS]
+        name = " ".join(tokens)
+        if len(name) >= 3:
+            names.add(name)
+    return names
+
+
+def read_location_names(path: str) -> Set[str]:
+    try:
+        with open(os.path.join(path, LOCATION_NAMES_FILE), encoding="utf-8") as f:
+            return set(json.load(f))
+    except Exception:
+        return set()
+
+
+def write_location_names(path: str, names: Iterable[str]):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCATION_NAMES_FILE), "w", encoding="utf-8") as f:
+        json.dump(sorted(set(names)), f)
+
+
+class LocationIndex:
+    """Place name -> sorted array of chunk ids"""
+
+    def __init__(self, postings: Optional[Dict[str, np.ndarray]] = None):
+        self.postings: Dict[str, np.ndarray] = postings or {}
+        self._names = {tuple(name.split()): name for name in self.postings}
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def match(self, text: str) -> List[str]:
+        """Known place names occurring in text, longest match first at each position"""
+        tokens = name_tokens(text)
+        found, position = [], 0
+        while position < len(tokens):
+            for size in range(min(MAX_NAME_TOKENS, len(tokens) - position), 0, -1):
+                name = self._names.get(tuple(tokens[position:position + size]))
+                if name is not None:
+                    found.append(name)
+                    position += size
+                    break
+            else:
+                position += 1
+        return found
+
+    @classmethod
+    def build(cls, names: Iterable[str], chunks) -> "LocationIndex":
+        """
+        Index every chunk of a ChunkStore against a set of place names
+
+        Args:
+            names: Normalized place names (see clean_location_names)
+            chunks: ChunkStore; chunk ids are its row numbers
+        """
+        index = cls({name: np.empty(0, dtype=np.int64) for name in names})
+        postings: Dict[str, List[int]] = {name: [] for name in index.postings}
+        source_matches = {source: index.match(source.replace("_", " ")) for source in chunks.sources}
+        for chunk_id in range(len(chunks)):
+            text, source = chunks.get(chunk_id)
+            for name in set(index.match(text) + source_matches[source]):
+                postings[name].append(chunk_id)
+        return cls({name: np.asarray(ids, dtype=np.int64) for name, ids in postings.items() if ids})
+
+    def candidates(self, *texts: Optional[str]) -> np.ndarray:
+        """
+        Chunk ids for the places named in the first text that names any
+
+        When several places are named ("Kannur, Kerala") the chunks mentioning all
+        of them are used, falling back to the most specific (smallest) place.
+        """
+        for text in texts:
+            names = self.match(text) if text else []
+            if not names:
+                continue
+            lists = sorted((self.postings[name] for name in set(names)), key=len)
+            common = lists[0]
+            for ids in lists[1:]:
+                common = np.intersect1d(common, ids, assume_unique=True)
+            return common if len(common) else lists[0]
+        return np.empty(0, dtype=np.int64)
+
+    def add(self, chunk_id: int, text: str, source: str, names: Iterable[str] = ()):
+        """Index a chunk appended after the build, optionally registering new place names"""
+        for name in clean_location_names(names):
+            if name not in self.postings:
+                self.postings[name] = np.empty(0, dtype=np.int64)
+                self._names[tuple(name.split())] = name
+        for name in set(self.match(text) + self.match(source.replace("_", " "))):
+            self.postings[name] = np.union1d(self.postings[name], [chunk_id]).astype(np.int64)
+
+    def retain(self, live_ids: np.ndarray):
+        """Drop ids that are no longer in the index"""
+        live_ids = np.asarray(live_ids, dtype=np.int64)
+        for name, ids in self.postings.items():
+            self.postings[name] = ids[np.isin(ids, live_ids)]
+
+    def remap(self, live_ids: np.ndarray):
+        """Renumber ids to their positions in sorted live_ids (after compacting the chunk store)"""
+        live_ids = np.asarray(live_ids, dtype=np.int64)
+        for name, ids in self.postings.items():
+            ids = ids[np.isin(ids, live_ids)]
+            self.postings[name] = np.searchsorted(live_ids, ids).astype(np.int64)
+
+    def save(self, path: str):
+        names = sorted(self.postings)
+        lengths = np.array([len(self.postings[name]) for name in names], dtype=np.int64)
+        ids = np.concatenate([self.postings[name] for name in names]) if names else np.empty(0, dtype=np.int64)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, names=np.array(names, dtype=str), lengths=lengths, ids=ids)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LocationIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            offsets = np.concatenate([[0], np.cumsum(data["lengths"])])
+            return cls({str(name): data["ids"][offsets[i]:offsets[i + 1]].astype(np.int64)
+                        for i, name in enumerate(data["names"])})
+        except Exception as e:
+            print(f" Warning: Could not load location index: {e}")
+            return None
@@ -0,0 +1,280 @@
+"""
+Prompt registry for the RAG answer step
+Every answer prompt is parsed into a ChatPromptTemplate once, when the registry
+is created; a request only fills the variable slots (weather values, location,
+context, query) instead of building and parsing large f-strings per query.
+"""
+
+from typing import Any, Dict
+
+from langchain.prompts import ChatPromptTemplate
+
+# Static apart from examples/context/query; the examples are chosen per query (see rag/few_shots.py)
+REPL_PROMPT = """
+You are an Agriculture assistant.
+- Use the context tables to interpolate/extrapolate values when queries involve numeric estimates (e.g., cost of cultivation → yield).
+- Always show your calculation steps.
+- If no relevant numeric context is found, reply "Data not available".
+- Treat "rice" as equivalent to "paddy".
+-If the query includes a numeric value that does not exactly match the dataset, 
+analyze the nearest available values and explain the estimated trend 
+(e.g., "for cultivation cost slightly lower/higher than X, the yield increases/decreases, 
+so the expected value is around Y").
+-- If no relevant numeric context is found, DO NOT reply "Data not available".
+  Instead, fall back to general agricultural knowledge (e.g., cotton usually takes 150–180 days to harvest).
+                                                        
+
+
+{examples}
+
+Context:
+{context}
+
+Query:
+{query}
+"""
+
+# ==== Answer prompts (one per query type) ====
+TOMORROW_TEMPERATURE_PROMPT = """
+Answer this weather question directly and briefly. Only provide the temperature information requested.
+
+Question: {query}
+
+Tomorrow's temperature in {location}: {tomorrow_temp}°C
+
+Keep the response short and only mention the temperature. Do not provide farming advice or other weather details unless specifically asked."""
+
+WEATHER_UNAVAILABLE_PROMPT = """
+Weather data is not available for {location} at this time. Please try again later.
+
+Question: {query}"""
+
+SIMPLE_WEATHER_PROMPT = """
+IMPORTANT: ALWAYS start your response with current weather data for {location}:
+
+{weather_context}
+
+Then give a simple, direct answer for the SPECIFIC LOCATION requested.
+
+Location requested: {location_label}
+Original query language: {detected_language}
+
+Context:
+{context}
+
+English Query: {query}
+
+IMPORTANT: 
+1. ALWAYS show current weather data first
+2. Only use weather data that matches the requested location "{location}"
+3. If no data for "{location}" is found, say "Weather data not available for {location}"
+4. Keep it simple and direct
+
+Answer format: 
+**Current Weather in {location}:**
+[Show current weather data]
+
+**Forecast:**
+[Answer the specific question]"""
+
+SEED_VARIETY_PROMPT = """
+IMPORTANT: ALWAYS start your response with current weather data for {location}:
+
+**Current Weather in {location}:**
+- Temperature: {temperature}°C
+- Humidity: {humidity}%
+- Soil Moisture: {moisture}%
+- Wind Speed: {wind_speed} m/s
+- Rainfall: {precip_mm} mm
+
+Based on these weather conditions, provide comprehensive seed variety recommendations:
+
+**Best Seed Varieties for Current Conditions (5-7 varieties):**
+1. [Crop Name + Variety] - [Why this variety is ideal for current weather]
+2. [Crop Name + Variety] - [Why this variety is ideal for current weather]
+3. [Crop Name + Variety] - [Why this variety is ideal for current weather]
+4. [Crop Name + Variety] - [Why this variety is ideal for current weather]
+5. [Crop Name + Variety] - [Why this variety is ideal for current weather]
+
+**Seed Varieties to Avoid (3-4 varieties):**
+• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
+• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
+• [Crop Name + Variety] - [Why this variety is unsuitable for current weather]
+
+**Seed Selection Strategy for Unpredictable Weather:**
+• **Disease-Resistant Varieties**: Essential for high humidity conditions
+• **Drought-Tolerant Seeds**: Important if soil moisture varies
+• **Early-Maturing Varieties**: Reduce exposure to weather changes
+• **Weather-Adaptive Strains**: Handle temperature and humidity fluctuations
+• **Local Climate-Adapted Seeds**: Best suited for {location} conditions
+
+**Planting Recommendations:**
+- Plant in stages to spread risk
+- Start with hardy, weather-resistant varieties
+- Consider crop rotation for disease prevention
+- Monitor weather forecasts for optimal planting times
+
+Context: {context}
+Question: {query}"""
+
+CROP_RECOMMENDATION_PROMPT = """
+IMPORTANT: ALWAYS start your response with current weather data for {location}:
+
+**Current Weather in {location}:**
+- Temperature: {temperature}°C
+- Humidity: {humidity}%
+- Soil Moisture: {moisture}%
+- Wind Speed: {wind_speed} m/s
+- Rainfall: {precip_mm} mm
+
+Based on these weather conditions, provide:
+
+**Recommended Crops (3-5 crops):**
+1. [Crop Name] - [Brief reason why it's suitable for current weather]
+2. [Crop Name] - [Brief reason why it's suitable for current weather]  
+3. [Crop Name] - [Brief reason why it's suitable for current weather]
+
+**Crops to Avoid (2-3 crops):**
+• [Crop Name] - [Reason why it's not suitable for current weather]
+• [Crop Name] - [Reason why it's not suitable for current weather]
+
+**Key Considerations:**
+- Temperature range: {temperature}°C is [optimal/too hot/too cold] for [crop types]
+- Humidity level: {humidity}% is [ideal/too high/too low] for [crop types]
+- Soil moisture: {moisture}% indicates [good drainage/water retention needed]
+
+Keep recommendations practical and based on current weather conditions.
+
+Context: {context}
+Question: {query}"""
+
+SPECIFIC_CROP_PROMPT = """
+Answer this specific crop question directly and concisely.
+
+**Current Weather in {location}:**
+- Temperature: {temperature}°C
+- Humidity: {humidity}%
+- Soil Moisture: {moisture}%
+- Wind Speed: {wind_speed} m/s
+- Rainfall: {precip_mm} mm
+
+Based on the current weather conditions above, answer the specific question about the crop mentioned.
+
+Question: {query}
+
+**Answer Format:**
+1. **Direct Answer**: [YES/NO] - [Crop name] is [suitable/not suitable] for current weather
+2. **Reasoning**: [Brief explanation based on temperature, humidity, and soil conditions]
+3. **Alternative Crops**: If not suitable, suggest 2-3 crops that would work better
+4. **Avoidance Note**: If applicable, mention what conditions this crop prefers
+
+Be specific to the crop and weather mentioned in the question. Keep it concise but informative.
+
+Context: {context}"""
+
+GENERAL_WEATHER_PROMPT = """
+Provide current weather information for {location}.
+
+**Current Weather in {location}:**
+- Temperature: {temperature}°C
+- Humidity: {humidity}%
+- Soil Moisture: {moisture}%
+- Wind Speed: {wind_speed} m/s
+- Rainfall: {precip_mm} mm
+- Description: {description}
+
+Answer the weather question directly based on the current conditions above.
+
+Question: {query}"""
+
+DETAILED_PROMPT = """
+You are an expert Agriculture and Weather assistant. Answer the user's question directly and specifically.
+
+{weather_context}
+
+CRITICAL INSTRUCTIONS:
+1. Read the question carefully and answer EXACTLY what is being asked
+2. Do NOT provide generic farming advice unless specifically requested
+3. For specific crop questions (like "is wheat good for this weather"): Give a direct YES/NO answer with brief reasoning
+4. For weather questions: Provide the specific weather information requested
+5. For crop recommendation questions: List suitable crops
+6. Keep responses focused and relevant to the specific question
+
+Question: {query}
+Location: {location_label}
+
+Available context: {context}
+
+Answer the question directly and specifically. Do not add unnecessary information."""
+
+WEATHER_BLOCK = """
+**Current Weather in {location}:**
+- Temperature: {temperature}°C
+- Humidity: {humidity}%
+- Soil Moisture: {moisture}%
+- Wind Speed: {wind_speed} m/s
+- Rainfall: {precip_mm} mm
+"""
+
+NO_WEATHER_BLOCK = """
+**Weather Data:**
+No current weather data available for {location}
+"""
+
+PROMPT_TEMPLATES = {
+    "tomorrow_temperature": TOMORROW_TEMPERATURE_PROMPT,
+    "weather_unavailable": WEATHER_UNAVAILABLE_PROMPT,
+    "simple_weather": SIMPLE_WEATHER_PROMPT,
+    "seed_variety": SEED_VARIETY_PROMPT,
+    "crop_recommendation": CROP_RECOMMENDATION_PROMPT,
+    "specific_crop": SPECIFIC_CROP_PROMPT,
+    "general_weather": GENERAL_WEATHER_PROMPT,
+    "detailed": DETAILED_PROMPT,
+    "repl": REPL_PROMPT,
+}
+
+WEATHER_FIELDS = ("temperature", "humidity", "moisture", "wind_speed", "precip_mm", "description")
+
+
+def weather_slots(weather_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Weather values for the prompt slots, 'N/A' where missing"""
+    weather_data = weather_data or {}
+    return {field: weather_data.get(field, 'N/A') for field in WEATHER_FIELDS}
+
+
+def weather_context(location: str, weather_data: Dict[str, Any]) -> str:
+    """Current-weather block for the simple-weather and detailed prompts"""
+    if weather_data and 'error' not in str(weather_data).lower():
+        return WEATHER_BLOCK.format(location=location, **weather_slots(weather_data))
+    return NO_WEATHER_BLOCK.format(location=location)
+
+
+class PromptRegistry:
+    """Answer prompts compiled once and filled per request"""
+
+    def __init__(self, templates: Dict[str, str] = None):
+        self.templates = {name: ChatPromptTemplate.from_template(text)
+                          for name, text in (templates or PROMPT_TEMPLATES).items()}
+
+    def get(self, name: str) -> ChatPromptTemplate:
+        return self.templates[name]
+
+    def format(self, name: str, **values) -> str:
+        """
+        Fill a compiled prompt's slots
+
+        Args:
+            name: Registry name (see PROMPT_TEMPLATES)
+            values: Slot values; slots the prompt does not use are ignored
+
+        Returns:
+            The prompt text sent to the LLM
+        """
+        template = self.templates[name]
+        return template.format(**{key: values[key] for key in template.input_variables if key in values})
+
+    def sizes(self) -> Dict[str, Dict[str, Any]]:
+        """Compiled size of each prompt: static characters and slot names"""
+        return {name: {"chars": len(template.messages[0].prompt.template),
+                       "variables": sorted(template.input_variables)}
+                for name, template in self.templates.items()}
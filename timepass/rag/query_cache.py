@@ -0,0 +1,148 @@
+"""
+Query cache for RAG retrieval
+Maps canonicalized query text to its embedding and to its top-k (ids, scores),
+so repeated questions skip both transformer inference and the index search.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Query-side synonyms applied as whole words ("price" must not become "ppaddy")
+QUERY_SYNONYMS = {"rice": "paddy"}
+
+
+def canonicalize_query(query: str) -> str:
+    """Lower-case, strip punctuation, collapse whitespace and apply query synonyms"""
+    if not query:
+        return ""
+    text = unicodedata.normalize("NFKC", str(query)).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    tokens = [QUERY_SYNONYMS.get(token, token) for token in text.split()]
+    return " ".join(tokens)
+
+
+def index_version(meta: Optional[Dict[str, Any]], ntotal: int = 0) -> str:
+    """Stable fingerprint of an index build, taken from its metadata"""
+    payload = json.dumps({"meta": meta or {}, "ntotal": int(ntotal)}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class QueryCache:
+    """Bounded LRU of canonical query -> embedding and (query, top_k) -> (ids, scores)"""
+
+    def __init__(self, max_size: int = 2048, path: str = "", model_name: str = "", save_every: int = 100):
+        self.max_size = max_size
+        self.path = path
+        self.model_name = model_name
+        self.save_every = save_every
+        self.version = None
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._results: "OrderedDict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.stats = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+        if path:
+            self.load()
+
+    def set_version(self, version: str):
+        """Drop cached results when the index they came from changes"""
+        with self._lock:
+            if version != self.version:
+                self._results.clear()
+                self.version = version
+
+    def _get(self, store: OrderedDict, key, stat: str):
+        with self._lock:
+            value = store.get(key)
+            if value is None:
+                self.stats[f"{stat}_misses"] += 1
+                return None
+            store.move_to_end(key)
+            self.stats[f"{stat}_hits"] += 1
+            return value
+
+    def _put(self, store: OrderedDict, key, value):
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > self.max_size:
+                store.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def get_embedding(self, canonical_query: str) -> Optional[np.ndarray]:
+        return self._get(self._embeddings, canonical_query, "embedding")
+
+    def put_embedding(self, canonical_query: str, embedding: np.ndarray):
+        self._put(self._embeddings, canonical_query, np.asarray(embedding, dtype=np.float32))
+
+    def get_results(self, canonical_query: str, top_k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        return self._get(self._results, (canonical_query, top_k), "result")
+
+    def put_results(self, canonical_query: str, top_k: int, indices: np.ndarray, scores: np.ndarray):
+        self._put(self._results, (canonical_query, top_k), (np.array(indices), np.array(scores)))
+
+    def hit_ratio(self) -> float:
+        """Share of lookups answered without running the index search"""
+        lookups = self.stats["result_hits"] + self.stats["result_misses"]
+        return self.stats["result_hits"] / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"embeddings_cached": len(self._embeddings), "results_cached": len(self._results)})
+        stats["hit_ratio"] = round(self.hit_ratio(), 4)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def save(self):
+        """Persist the cache to disk (no-op without a path)"""
+        if not self.path:
+            return
+        with self._lock:
+            state = {
+                "model_name": self.model_name,
+                "version": self.version,
+                "embeddings": list(self._embeddings.items()),
+                "results": list(self._results.items()),
+            }
+            self._unsaved = 0
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f" Warning: Could not save query cache: {e}")
+
+    def load(self):
+        """Restore a persisted cache; embeddings from another model are discarded"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f" Warning: Could not load query cache: {e}")
+            return
+        if state.get("model_name") != self.model_name:
+            return
+        with self._lock:
+            self._embeddings = OrderedDict(state.get("embeddings", [])[-self.max_size:])
+            self.version = state.get("version")
+            self._results = OrderedDict(state.get("results", [])[-self.max_size:])
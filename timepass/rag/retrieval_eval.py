@@ -0,0 +1,239 @@
+"""
+Offline retrieval evaluation and latency benchmark
+Runs labelled queries through retrieval only (no LLM) against the served chunks
+and reports recall@k, hit rate, MRR and encode/search latency percentiles per
+index configuration as JSON, so a change to index type, chunking or caching can
+be accepted or rejected on numbers. A chunk is relevant to a query when its text
+contains the label's terms (whole words) and its source file matches.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config import config
+from rag import current as rag
+from rag.few_shots import FEW_SHOT_EXAMPLES
+from rag.index_factory import INDEX_TYPES, build_id_index, describe_index, index_ids
+from rag.query_cache import QueryCache, canonicalize_query
+
+EVAL_QUERIES_PATH = os.path.join(os.path.dirname(__file__), "eval_queries.jsonl")
+
+
+def _words(text: str) -> str:
+    """Lowercase words separated by single spaces and padded, for whole-word matching"""
+    return " " + " ".join(re.findall(r'\w+', str(text).lower())) + " "
+
+
+def seed_from_few_shots(examples: Sequence[Dict[str, Any]] = FEW_SHOT_EXAMPLES) -> List[Dict[str, Any]]:
+    """
+    Labelled queries from the worked examples
+
+    A query's terms are the table values of its example context that it names
+    ("Karnataka", "Arhar"); examples whose query names none are skipped.
+    """
+    labels = []
+    for example in examples:
+        rows = example["context"].split("\n")[1:]
+        values = {cell.strip() for row in rows for cell in row.split("|")}
+        query_words = _words(example["query"])
+        terms = sorted({_words(value).strip() for value in values
+                        if value and not re.fullmatch(r'[\d.,\s-]+', value) and _words(value) in query_words})
+        if terms:
+            labels.append({"query": example["query"], "all": terms, "origin": "few_shots"})
+    return labels
+
+
+def load_labelled_queries(path: Optional[str] = EVAL_QUERIES_PATH, include_few_shots: bool = True) -> List[Dict[str, Any]]:
+    """Labelled queries from a JSON Lines file (query, all, any, source), plus those seeded from the few-shot examples"""
+    labels = seed_from_few_shots() if include_few_shots else []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            labels += [{"origin": os.path.basename(path), **json.loads(line)} for line in f if line.strip()]
+    return labels
+
+
+def is_relevant(label: Dict[str, Any], text_words: str, source: str) -> bool:
+    if label.get("source") and label["source"].lower() not in source.lower():
+        return False
+    if any(_words(term) not in text_words for term in label.get("all", [])):
+        return False
+    return not label.get("any") or any(_words(term) in text_words for term in label["any"])
+
+
+def relevant_ids(label: Dict[str, Any], chunk_ids: np.ndarray, texts: List[str], sources: List[str]) -> set:
+    return {int(chunk_id) for chunk_id, text, source in zip(chunk_ids, texts, sources)
+            if is_relevant(label, text, source)}
+
+
+def rank_metrics(found: Sequence[int], relevant: set, k: int) -> Dict[str, Any]:
+    """Recall@k (out of min(k, relevant), since most labels match more chunks than k), hit and reciprocal rank"""
+    top = [int(i) for i in found[:k] if i >= 0]
+    ranks = [rank for rank, chunk_id in enumerate(top, start=1) if chunk_id in relevant]
+    return {
+        "recall": len(ranks) / min(k, len(relevant)),
+        "hit": 1.0 if ranks else 0.0,
+        "reciprocal_rank": 1.0 / ranks[0] if ranks else 0.0,
+        "first_hit_rank": ranks[0] if ranks else None,
+    }
+
+
+def latency_summary(timings_ms: Sequence[float]) -> Dict[str, float]:
+    if not len(timings_ms):
+        return {}
+    return {f"p{q}": round(float(np.percentile(timings_ms, q)), 4) for q in (50, 95, 99)}
+
+
+def default_configs() -> List[Dict[str, Any]]:
+    """The served index as it is, plus a fresh build of every index type"""
+    return [{"name": "served"}] + [{"name": index_type, "index_type": index_type} for index_type in INDEX_TYPES]
+
+
+def evaluate(engine: "rag.RagEngine", labels: List[Dict[str, Any]], configs: List[Dict[str, Any]] = None,
+             k: int = 5) -> Dict[str, Any]:
+    """
+    Run labelled queries through retrieval for each index configuration
+
+    Args:
+        engine: Loaded RAG engine whose chunks, BM25 index and embedder are used
+        labels: Labelled queries (see load_labelled_queries)
+        configs: Index parameter overrides, each with a name; "served" uses the loaded
+            index and hybrid_weight overrides RAG_HYBRID_WEIGHT (default: default_configs())
+        k: Cut-off for recall, hit rate and MRR
+
+    Returns:
+        Run description and one result per configuration
+    """
+    engine.load()
+    served, chunks, _, sparse = engine.snapshot()
+    embedder = engine.get_embedder()
+    live = np.sort(index_ids(served)) if isinstance(served, faiss.IndexIDMap) else np.arange(served.ntotal, dtype=np.int64)
+    texts = [_words(chunks.text(int(i))) for i in live]
+    sources = [chunks.source(int(i)) for i in live]
+
+    judged = []
+    for label in labels:
+        relevant = relevant_ids(label, live, texts, sources)
+        judged.append((label, relevant))
+    scored = [(label, relevant) for label, relevant in judged if relevant]
+
+    embeddings = None
+    results = []
+    for overrides in configs or default_configs():
+        overrides = dict(overrides)
+        name = overrides.pop("name", None) or overrides.get("index_type", "served")
+        weight = overrides.pop("hybrid_weight", config.RAG_HYBRID_WEIGHT)
+        result = {"name": name, "params": overrides, "hybrid_weight": weight}
+        try:
+            if name == "served" and not overrides:
+                index = served
+            else:
+                if embeddings is None:
+                    embeddings = rag.generate_embeddings_safely([chunks.text(int(i)) for i in live], embedder,
+                                                                engine.embedding_key)
+                start = time.perf_counter()
+                index = build_id_index(embeddings, ids=live, params=overrides)
+                result["build_seconds"] = round(time.perf_counter() - start, 4)
+            result["index"] = describe_index(index)
+
+            # A fresh cache per configuration: encode is timed on its own, then the search
+            # finds the query embedding cached and times retrieval alone
+            cache = QueryCache(max_size=2 * len(scored) + 1, model_name=engine.embedding_key)
+            encode_ms, search_ms, per_query = [], [], []
+            for label, relevant in scored:
+                canonical_query = canonicalize_query(rag.normalize_text(label["query"]))
+                start = time.perf_counter()
+                vector = embedder.encode([canonical_query], convert_to_numpy=True, show_progress_bar=False,
+                                         normalize_embeddings=True).astype(np.float32)[0]
+                encode_ms.append((time.perf_counter() - start) * 1000)
+                cache.put_embedding(canonical_query, vector)
+
+                start = time.perf_counter()
+                found, _ = rag.hybrid_search([label["query"]], embedder, index, sparse, top_k=k, weight=weight,
+                                             cache=cache)[0]
+                search_ms.append((time.perf_counter() - start) * 1000)
+                per_query.append({"query": label["query"], "relevant": len(relevant),
+                                  **rank_metrics(list(found), relevant, k)})
+
+            result.update({
+                "recall_at_k": round(float(np.mean([q["recall"] for q in per_query])), 4) if per_query else None,
+                "hit_rate_at_k": round(float(np.mean([q["hit"] for q in per_query])), 4) if per_query else None,
+                "mrr": round(float(np.mean([q["reciprocal_rank"] for q in per_query])), 4) if per_query else None,
+                "encode_ms": latency_summary(encode_ms),
+                "search_ms": latency_summary(search_ms),
+                "queries": per_query,
+            })
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+
+    return {
+        "run": {"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "k": k, "chunks": len(live),
+                "embedding_key": engine.embedding_key, "generation": engine.generation,
+                "labelled_queries": len(labels), "scored_queries": len(scored),
+                "unmatched_queries": [label["query"] for label, relevant in judged if not relevant]},
+        "results": results,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    k = report["run"]["k"]
+    print(f"{report['run']['scored_queries']} of {report['run']['labelled_queries']} labelled queries match "
+          f"chunks in {report['run']['chunks']} chunks")
+    previous = {result["name"]: result for result in (baseline or {}).get("results", [])}
+    print(f"{'config':<12} {'recall@' + str(k):>9} {'hit@' + str(k):>7} {'MRR':>7} "
+          f"{'enc p50':>8} {'enc p95':>8} {'srch p50':>8} {'srch p95':>8} {'srch p99':>8}")
+    for result in report["results"]:
+        if "error" in result:
+            print(f"{result['name']:<12} error: {result['error']}")
+            continue
+        print(f"{result['name']:<12} {result['recall_at_k'] or 0:>9.4f} {result['hit_rate_at_k'] or 0:>7.4f} "
+              f"{result['mrr'] or 0:>7.4f} {result['encode_ms'].get('p50', 0):>8.3f} "
+              f"{result['encode_ms'].get('p95', 0):>8.3f} {result['search_ms'].get('p50', 0):>8.3f} "
+              f"{result['search_ms'].get('p95', 0):>8.3f} {result['search_ms'].get('p99', 0):>8.3f}")
+        old = previous.get(result["name"])
+        if old and "error" not in old:
+            print(f"{'  vs base':<12} {(result['recall_at_k'] or 0) - (old['recall_at_k'] or 0):>+9.4f} "
+                  f"{(result['hit_rate_at_k'] or 0) - (old['hit_rate_at_k'] or 0):>+7.4f} "
+                  f"{(result['mrr'] or 0) - (old['mrr'] or 0):>+7.4f} "
+                  f"{result['encode_ms'].get('p50', 0) - old['encode_ms'].get('p50', 0):>+8.3f} "
+                  f"{result['encode_ms'].get('p95', 0) - old['encode_ms'].get('p95', 0):>+8.3f} "
+                  f"{result['search_ms'].get('p50', 0) - old['search_ms'].get('p50', 0):>+8.3f} "
+                  f"{result['search_ms'].get('p95', 0) - old['search_ms'].get('p95', 0):>+8.3f} "
+                  f"{result['search_ms'].get('p99', 0) - old['search_ms'].get('p99', 0):>+8.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate RAG retrieval quality and latency on labelled queries")
+    parser.add_argument("--queries", default=EVAL_QUERIES_PATH, help="Labelled queries (JSON Lines)")
+    parser.add_argument("--no-few-shots", action="store_true", help="Do not add queries seeded from the few-shot examples")
+    parser.add_argument("--configs", help="JSON list of index configurations (default: served index and every index type)")
+    parser.add_argument("-k", type=int, default=5, help="Cut-off for recall, hit rate and MRR")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier JSON report to print deltas against")
+    args = parser.parse_args()
+
+    config_list = None
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            config_list = json.load(f)
+    baseline_report = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_report = json.load(f)
+
+    report = evaluate(rag.get_rag_engine(), load_labelled_queries(args.queries, not args.no_few_shots),
+                      config_list, k=args.k)
+    print_report(report, baseline_report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,179 @@
+"""
+BM25 inverted index over the RAG chunk store
+Dense MiniLM vectors blur exact tokens such as fertilizer codes ("14-35-14"),
+district names and years; this index scores those exact matches so retrieval
+can fuse them with the FAISS results.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Standard Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def bm25_tokens(text: str) -> List[str]:
+    """
+    Terms of a chunk or query
+
+    Runs of two or more numbers are also kept as one code term, since chunk
+    normalization turns "14-35-14" into "14 35 14".
+    """
+    words = re.findall(r"[a-z0-9]+", str(text).lower())
+    terms = list(words)
+    run = []
+    for word in words + [""]:
+        if word.isdigit():
+            run.append(word)
+            continue
+        if len(run) > 1:
+            terms.append("-".join(run))
+        run = []
+    return terms
+
+
+class SparseIndex:
+    """Term -> sorted chunk ids and term frequencies, plus per-chunk lengths"""
+
+    def __init__(self, postings: Optional[Dict[str, np.ndarray]] = None,
+                 frequencies: Optional[Dict[str, np.ndarray]] = None,
+                 lengths: Optional[np.ndarray] = None):
+        self.postings: Dict[str, np.ndarray] = postings or {}
+        self.frequencies: Dict[str, np.ndarray] = frequencies or {}
+        self.lengths = np.zeros(0, dtype=np.float32) if lengths is None else lengths.astype(np.float32)
+        self._update_stats()
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def _update_stats(self):
+        live = self.lengths[self.lengths > 0]
+        self.doc_count = len(live)
+        self.avg_length = float(live.mean()) if len(live) else 1.0
+
+    @classmethod
+    def build(cls, chunks) -> "SparseIndex":
+        """
+        Index every chunk of a ChunkStore
+
+        Args:
+            chunks: ChunkStore; chunk ids are its row numbers
+        """
+        postings: Dict[str, List[int]] = {}
+        frequencies: Dict[str, List[int]] = {}
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for chunk_id, text in enumerate(chunks.texts()):
+            terms = Counter(bm25_tokens(text))
+            lengths[chunk_id] = sum(terms.values())
+            for term, count in terms.items():
+                postings.setdefault(term, []).append(chunk_id)
+                frequencies.setdefault(term, []).append(count)
+        return cls({term: np.asarray(ids, dtype=np.int64) for term, ids in postings.items()},
+                   {term: np.asarray(tf, dtype=np.float32) for term, tf in frequencies.items()},
+                   lengths)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk id for query (0 where no term matches)"""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(bm25_tokens(query)):
+            ids = self.postings.get(term)
+            if ids is None or len(ids) == 0:
+                continue
+            tf = self.frequencies[term]
+            idf = math.log(1 + (self.doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[ids] / self.avg_length)
+            scores[ids] += idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k chunks by BM25 score
+
+        Returns:
+            (ids, scores), best first; only chunks matching at least one term
+        """
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if len(matched) > k > 0:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = np.argsort(-scores[matched], kind="stable")[:max(k, 0)]
+        return matched[order].astype(np.int64), scores[matched[order]]
+
+    def add(self, chunk_id: int, text: str):
+        """Index a chunk appended after the build"""
+        self.extend([chunk_id], [text])
+
+    def extend(self, chunk_ids: List[int], texts: List[str]):
+        """Index chunks appended after the build, in ascending id order"""
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        if not chunk_ids:
+            return
+        if chunk_ids[-1] >= len(self.lengths):
+            self.lengths = np.concatenate([self.lengths, np.zeros(chunk_ids[-1] + 1 - len(self.lengths), dtype=np.float32)])
+        postings: Dict[str, List[int]] = {}
+        frequencies: Dict[str, List[int]] = {}
+        for chunk_id, text in zip(chunk_ids, texts):
+            terms = Counter(bm25_tokens(text))
+            self.lengths[chunk_id] = sum(terms.values())
+            for term, count in terms.items():
+                postings.setdefault(term, []).append(chunk_id)
+                frequencies.setdefault(term, []).append(count)
+        for term, ids in postings.items():
+            # Appended ids are larger than any existing id, so lists stay sorted
+            self.postings[term] = np.append(self.postings.get(term, np.empty(0, dtype=np.int64)), ids).astype(np.int64)
+            self.frequencies[term] = np.append(self.frequencies.get(term, np.empty(0, dtype=np.float32)),
+                                               frequencies[term]).astype(np.float32)
+        self._update_stats()
+
+    def retain(self, live_ids: np.ndarray):
+        """Drop ids that are no longer in the index"""
+        live_ids = np.asarray(live_ids, dtype=np.int64)
+        dead = np.ones(len(self.lengths), dtype=bool)
+        dead[live_ids[live_ids < len(self.lengths)]] = False
+        if not (dead & (self.lengths > 0)).any():
+            return
+        for term, ids in self.postings.items():
+            keep = ~dead[ids]
+            self.postings[term], self.frequencies[term] = ids[keep], self.frequencies[term][keep]
+        self.lengths[dead] = 0
+        self._update_stats()
+
+    def remap(self, live_ids: np.ndarray):
+        """Renumber ids to their positions in sorted live_ids (after compacting the chunk store)"""
+        live_ids = np.asarray(live_ids, dtype=np.int64)
+        self.retain(live_ids)
+        for term, ids in self.postings.items():
+            self.postings[term] = np.searchsorted(live_ids, ids).astype(np.int64)
+        self.lengths = self.lengths[live_ids[live_ids < len(self.lengths)]]
+        self._update_stats()
+
+    def save(self, path: str):
+        terms = sorted(term for term, ids in self.postings.items() if len(ids))
+        counts = np.array([len(self.postings[term]) for term in terms], dtype=np.int64)
+        ids = np.concatenate([self.postings[term] for term in terms]) if terms else np.empty(0, dtype=np.int64)
+        tf = np.concatenate([self.frequencies[term] for term in terms]) if terms else np.empty(0, dtype=np.float32)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, terms=np.array(terms, dtype=str), counts=counts, ids=ids, tf=tf, lengths=self.lengths)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SparseIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            offsets = np.concatenate([[0], np.cumsum(data["counts"])])
+            ids, tf = data["ids"].astype(np.int64), data["tf"].astype(np.float32)
+            terms = [str(term) for term in data["terms"]]
+            return cls({term: ids[offsets[i]:offsets[i + 1]] for i, term in enumerate(terms)},
+                       {term: tf[offsets[i]:offsets[i + 1]] for i, term in enumerate(terms)},
+                       data["lengths"])
+        except Exception as e:
+            print(f" Warning: Could not load BM25 index: {e}")
+            return None
@@ -0,0 +1,363 @@
+"""
+Structured tables answered by aggregation instead of retrieval
+Tables such as data_core.csv (temperature, humidity, moisture, soil, crop, N/P/K
+and fertilizer per row) are held as typed columns: numeric columns as float32
+arrays, text columns dictionary-encoded with a group-by index per value. A
+question naming table values ("fertilizer for cotton on black soil", "NPK for
+maize") is answered by filtering on those groups and aggregating the matching
+rows with vectorized operations, instead of embedding every row as a text chunk
+and asking the LLM to generalize from the few that are retrieved.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rag.query_cache import canonicalize_query
+
+# A column is numeric when this share of its non-blank cells parse as numbers
+NUMERIC_SHARE = 0.95
+MAX_VALUE_TOKENS = 4
+# Column name words too generic to say which column a query asks about ("soil type", "fertilizer name")
+GENERIC_COLUMN_WORDS = {"type", "name", "value", "of"}
+# Query words naming columns beyond the columns' own words (data_core.csv spells "Temparature", "Phosphorous")
+COLUMN_ALIASES = {
+    "npk": ("nitrogen", "phosphorous", "potassium"),
+    "nutrient": ("nitrogen", "phosphorous", "potassium"),
+    "nutrients": ("nitrogen", "phosphorous", "potassium"),
+    "phosphorus": ("phosphorous",),
+    "temperature": ("temparature",),
+    "fertilizers": ("fertilizer",),
+    "crops": ("crop",),
+    "soils": ("soil",),
+}
+TOP_VALUES = 3
+
+
+def value_tokens(text: str) -> Tuple[str, ...]:
+    """Canonical query tokens of a cell or query ("14-35-14" -> 14 35 14, rice -> paddy)"""
+    return tuple(canonicalize_query(text).split())
+
+
+class StructuredTable:
+    """One table as numeric float32 columns and dictionary-encoded text columns with group-by indexes"""
+
+    def __init__(self, name: str, numeric: Dict[str, np.ndarray], categorical: Dict[str, Tuple[np.ndarray, List[str]]]):
+        """
+        Args:
+            name: Source file name
+            numeric: Column -> float32 values (NaN for blank cells)
+            categorical: Column -> (int32 codes, -1 for blank cells; distinct values)
+        """
+        self.name = name
+        self.numeric = numeric
+        self.categorical = categorical
+        columns = list(numeric.values()) + [codes for codes, _ in categorical.values()]
+        self.rows = len(columns[0]) if columns else 0
+        # Group-by index per text column: row ids sorted by value code, and each code's slice of them
+        self.groups: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for column, (codes, values) in categorical.items():
+            present = np.flatnonzero(codes >= 0)
+            order = present[np.argsort(codes[present], kind="stable")].astype(np.int64)
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[present], minlength=len(values)))])
+            self.groups[column] = (order, offsets.astype(np.int64))
+        self._values = {}
+        for column, (_, values) in categorical.items():
+            for code, value in enumerate(values):
+                tokens = value_tokens(value)[:MAX_VALUE_TOKENS]
+                if tokens:
+                    self._values.setdefault(tokens, (column, code))
+        self._column_words: Dict[str, List[str]] = {}
+        for column in list(numeric) + list(categorical):
+            for word in value_tokens(column):
+                if word not in GENERIC_COLUMN_WORDS:
+                    self._column_words.setdefault(word, []).append(column)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @classmethod
+    def from_frame(cls, name: str, df: pd.DataFrame) -> Optional["StructuredTable"]:
+        """
+        Type the columns of a string DataFrame
+
+        Returns:
+            The table, or None if it lacks a numeric or a text column to aggregate by
+        """
+        numeric, categorical = {}, {}
+        for column in df.columns:
+            if column == "source_file":
+                continue
+            cells = df[column].fillna("").astype(str).str.strip()
+            cells = cells.where((cells != "") & (cells != "nan"))
+            parsed = pd.to_numeric(cells, errors="coerce")
+            present = cells.notna()
+            if present.any() and parsed[present].notna().mean() >= NUMERIC_SHARE:
+                numeric[str(column)] = parsed.to_numpy(dtype=np.float32)
+            else:
+                codes, values = pd.factorize(cells)
+                categorical[str(column)] = (codes.astype(np.int32), [str(value) for value in values])
+        if not numeric or not categorical:
+            return None
+        return cls(name, numeric, categorical)
+
+    @classmethod
+    def from_file(cls, filepath: Path) -> Optional["StructuredTable"]:
+        filepath = Path(filepath)
+        if filepath.name.endswith(('.csv', '.csv.xls')):
+            df = pd.read_csv(filepath, dtype=str, encoding_errors='ignore')
+        elif filepath.name.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(filepath, engine='openpyxl' if filepath.name.endswith('.xlsx') else 'xlrd', dtype=str)
+        else:
+            return None
+        return cls.from_frame(filepath.name, df)
+
+    def rows_for(self, column: str, code: int) -> np.ndarray:
+        """Row ids holding one value of a text column"""
+        order, offsets = self.groups[column]
+        return order[offsets[code]:offsets[code + 1]]
+
+    def match(self, query: str) -> Dict[str, List[int]]:
+        """Values named in the query, longest match first at each position: text column -> value codes"""
+        tokens = value_tokens(query)
+        found: Dict[str, List[int]] = {}
+        position = 0
+        while position < len(tokens):
+            for size in range(min(MAX_VALUE_TOKENS, len(tokens) - position), 0, -1):
+                hit = self._values.get(tokens[position:position + size])
+                if hit is not None:
+                    column, code = hit
+                    if code not in found.setdefault(column, []):
+                        found[column].append(code)
+                    position += size
+                    break
+            else:
+                position += 1
+        return found
+
+    def columns_named(self, query: str) -> List[str]:
+        """Columns the query asks about by name or alias, numeric columns first"""
+        words = set()
+        for token in value_tokens(query):
+            words.add(token)
+            words.update(COLUMN_ALIASES.get(token, ()))
+        named = {column for word in words for column in self._column_words.get(word, ())}
+        return [column for column in list(self.numeric) + list(self.categorical) if column in named]
+
+    def select(self, filters: Dict[str, List[int]]) -> np.ndarray:
+        """Row ids matching every filtered column (any of its values)"""
+        selection = np.arange(self.rows, dtype=np.int64)
+        for column, codes in filters.items():
+            ids = np.concatenate([self.rows_for(column, code) for code in codes]) if codes else np.empty(0, dtype=np.int64)
+            selection = np.intersect1d(selection, ids)
+        return selection
+
+    def aggregate(self, filters: Dict[str, List[int]], target: str = None) -> Dict[str, Any]:
+        """
+        Summarize the rows matching the filters
+
+        Args:
+            filters: Text column -> value codes (see match)
+            target: Text column whose value distribution is reported; its own filter is
+                ignored for the distribution so "is urea good for wheat" ranks urea among
+                the fertilizers used for wheat
+
+        Returns:
+            Table name, filters, matching row count, numeric column statistics and the
+            target's most common values with their rows, share and numeric means
+        """
+        selection = self.select(filters)
+        result = {
+            "table": self.name,
+            "filters": {column: [self.categorical[column][1][code] for code in codes] for column, codes in filters.items()},
+            "rows": int(len(selection)),
+            "numeric": {},
+            "target": target,
+            "distribution": [],
+        }
+        for column, values in self.numeric.items():
+            selected = values[selection]
+            selected = selected[~np.isnan(selected)]
+            if len(selected):
+                result["numeric"][column] = {"mean": round(float(selected.mean()), 2),
+                                             "min": round(float(selected.min()), 2),
+                                             "max": round(float(selected.max()), 2)}
+        if target is None:
+            return result
+
+        base = self.select({column: codes for column, codes in filters.items() if column != target})
+        codes, values = self.categorical[target]
+        base_codes = codes[base]
+        present = base_codes >= 0
+        counts = np.bincount(base_codes[present], minlength=len(values))
+        means = {}
+        for column, numbers in self.numeric.items():
+            column_values = numbers[base][present]
+            valid = ~np.isnan(column_values)
+            totals = np.bincount(base_codes[present][valid], weights=column_values[valid], minlength=len(values))
+            valid_counts = np.bincount(base_codes[present][valid], minlength=len(values))
+            means[column] = np.divide(totals, valid_counts, out=np.full(len(values), np.nan), where=valid_counts > 0)
+        ranked = np.argsort(-counts, kind="stable")
+        shown = [int(code) for code in ranked[:TOP_VALUES] if counts[code]]
+        # A value the query names is reported even when it ranks low or never occurs
+        shown += [code for code in filters.get(target, []) if code not in shown]
+        total = int(counts.sum())
+        result["distribution"] = [{
+            "value": values[code],
+            "rows": int(counts[code]),
+            "share": round(float(counts[code]) / total, 4) if total else 0.0,
+            "rank": int(np.flatnonzero(ranked == code)[0]) + 1,
+            "means": {column: round(float(column_means[code]), 2) for column, column_means in means.items()
+                      if not np.isnan(column_means[code])},
+        } for code in shown]
+        return result
+
+    def answer(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Aggregate the table for a query that names its values
+
+        The query must name at least one value ("cotton") and either a column
+        ("fertilizer", "NPK") or values of two columns ("urea", "wheat"), so a
+        passing mention of a crop ("wheat yield in Punjab") is left to retrieval.
+
+        Returns:
+            See aggregate, None if the query is not about this table
+        """
+        filters = self.match(query)
+        if not filters:
+            return None
+        named = self.columns_named(query)
+        if not named and len(filters) < 2:
+            return None
+        # The distribution reported is of the text column the query asks about, preferring
+        # one it does not filter on; otherwise the table's last text column (its label)
+        text_columns = list(self.categorical)
+        named_text = [column for column in named if column in self.categorical]
+        target = next((column for column in named_text if column not in filters), None)
+        if target is None:
+            target = text_columns[-1] if (text_columns[-1] not in filters or len(filters) > 1) else None
+        return self.aggregate(filters, target)
+
+    def save(self, path: str):
+        numeric_columns = list(self.numeric)
+        text_columns = list(self.categorical)
+        values = [value for column in text_columns for value in self.categorical[column][1]]
+        lengths = np.array([len(self.categorical[column][1]) for column in text_columns], dtype=np.int64)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 meta=np.array(json.dumps({"name": self.name, "numeric": numeric_columns, "categorical": text_columns})),
+                 numeric=np.stack([self.numeric[column] for column in numeric_columns], axis=1),
+                 codes=np.stack([self.categorical[column][0] for column in text_columns], axis=1),
+                 values=np.array(values, dtype=str), lengths=lengths)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["StructuredTable"]:
+        try:
+            data = np.load(path)
+            meta = json.loads(str(data["meta"]))
+            offsets = np.concatenate([[0], np.cumsum(data["lengths"])])
+            values = [str(value) for value in data["values"]]
+            numeric = {column: data["numeric"][:, i].astype(np.float32) for i, column in enumerate(meta["numeric"])}
+            categorical = {column: (data["codes"][:, i].astype(np.int32), values[offsets[i]:offsets[i + 1]])
+                           for i, column in enumerate(meta["categorical"])}
+            return cls(meta["name"], numeric, categorical)
+        except Exception as e:
+            print(f" Warning: Could not load structured table {path}: {e}")
+            return None
+
+
+class StructuredTables:
+    """The structured tables of an index generation"""
+
+    def __init__(self, tables: Iterable[StructuredTable] = ()):
+        self.tables = list(tables)
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    @property
+    def names(self) -> List[str]:
+        return [table.name for table in self.tables]
+
+    def sizes(self) -> Dict[str, int]:
+        return {table.name: table.rows for table in self.tables}
+
+    @classmethod
+    def build(cls, files: Iterable[Path]) -> "StructuredTables":
+        """Type each file's columns; files without numeric and text columns are left out (and chunked as text)"""
+        tables = []
+        for filepath in files:
+            try:
+                table = StructuredTable.from_file(filepath)
+            except Exception as e:
+                print(f" Could not read {Path(filepath).name} as a structured table: {e}")
+                continue
+            if table is None:
+                print(f" {Path(filepath).name} has no numeric and text columns to aggregate, indexing it as text")
+                continue
+            print(f" Loaded {table.name} as a structured table ({table.rows} rows, "
+                  f"{len(table.numeric)} numeric and {len(table.categorical)} text columns)")
+            tables.append(table)
+        return cls(tables)
+
+    def answer(self, query: str) -> Optional[Dict[str, Any]]:
+        """Aggregate of the table the query names most values of, None if it names none"""
+        results = [result for result in (table.answer(query) for table in self.tables) if result is not None]
+        if not results:
+            return None
+        return max(results, key=lambda result: (len(result["filters"]), result["rows"]))
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for table in self.tables:
+            table.save(os.path.join(path, re.sub(r'\W+', '_', table.name) + ".npz"))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["StructuredTables"]:
+        if not os.path.isdir(path):
+            return None
+        tables = [StructuredTable.load(os.path.join(path, name)) for name in sorted(os.listdir(path))
+                  if name.endswith(".npz") and not name.endswith(".tmp.npz")]
+        return cls(table for table in tables if table is not None)
+
+
+def describe_result(result: Dict[str, Any]) -> str:
+    """
+    One-sentence summary of an aggregate, used as prompt context and as the direct answer
+
+    e.g. "data_core.csv, 142 rows with crop type Cotton, soil type Black: fertilizer name
+    14-35-14 in 40% of rows (average nitrogen 8.1, ...); average nitrogen 8.1 (range 4 to 12), ..."
+    """
+    filters = ", ".join(f"{column.lower()} {' or '.join(values)}" for column, values in result["filters"].items())
+    parts = [f"{result['table']}, {result['rows']} rows with {filters}"]
+    if result["distribution"]:
+        target = result["target"].lower()
+        ranked = ", ".join(
+            f"{entry['value']} in {entry['share'] * 100:.0f}% of rows (rank {entry['rank']}"
+            + "".join(f", average {column.lower()} {mean:g}" for column, mean in entry["means"].items()) + ")"
+            for entry in result["distribution"])
+        parts.append(f": {target} {ranked}")
+    if result["numeric"]:
+        parts.append("; " + ", ".join(f"average {column.lower()} {stats['mean']:g} (range {stats['min']:g} to {stats['max']:g})"
+                                      for column, stats in result["numeric"].items()))
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Answer a question from structured tables by aggregation")
+    parser.add_argument("query", help='e.g. "best fertilizer for cotton on black soil"')
+    parser.add_argument("--files", nargs="+", default=["data_core.csv"], help="Table files to load")
+    args = parser.parse_args()
+
+    found = StructuredTables.build(Path(name) for name in args.files).answer(args.query)
+    print(describe_result(found) if found is not None else "The query names no values of these tables")
+    if found is not None:
+        print(json.dumps(found, indent=2))
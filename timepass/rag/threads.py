@@ -0,0 +1,59 @@
+"""
+Thread budget for the RAG system
+Embedding inference, FAISS search and index builds each get their own intra-op
+thread count, set where that work runs instead of clamping the whole process at
+import. FAISS (OpenMP) counts apply to the calling thread only. torch's count is
+process-wide, so the serving process keeps the embed budget and build encodes run
+in their own process with the build budget (see rag/build_encoder.py).
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from typing import Dict
+
+import faiss
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config import config
+
+THREAD_KINDS = ["embed", "search", "build"]
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity / container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def thread_budget() -> Dict[str, int]:
+    """
+    Intra-op threads per kind of work, from RAG_*_THREADS (0 = automatic)
+
+    Automatic: a few threads for query encoding, one for single-query search
+    (requests already run in parallel) and every available core for builds.
+    """
+    cpus = available_cpus()
+    automatic = {"embed": min(4, cpus), "search": 1, "build": cpus}
+    configured = {"embed": config.RAG_EMBED_THREADS, "search": config.RAG_SEARCH_THREADS,
+                  "build": config.RAG_BUILD_THREADS}
+    return {kind: max(1, min(configured[kind] or automatic[kind], cpus)) for kind in THREAD_KINDS}
+
+
+def use_threads(kind: str):
+    """Set the FAISS threads of the calling thread for one kind of work"""
+    faiss.omp_set_num_threads(thread_budget()[kind])
+
+
+@contextmanager
+def build_threads():
+    """Run the FAISS part of an index build in the calling thread with the build budget, restoring its count afterwards"""
+    budget = thread_budget()
+    previous = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(budget["build"])
+    try:
+        yield budget["build"]
+    finally:
+        faiss.omp_set_num_threads(previous)
@@ -57,12 +57,20 @@ class Config:
     # EMBEDDING MODEL SETTINGS
     # ==================================================
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    RAG_EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")  # torch, onnx, onnx_int8
+    RAG_ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR", "models/onnx")
+    RAG_EMBEDDING_PARITY_MIN = float(os.getenv("RAG_EMBEDDING_PARITY_MIN", "0.99"))  # min cosine vs. PyTorch
     
     # ==================================================
     # LLM SETTINGS
     # ==================================================
     LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
     LLM_TEMPERATURE_ZERO = float(os.getenv("LLM_TEMPERATURE_ZERO", "0.0"))
+    RAG_LLM_MAX_CONCURRENCY = int(os.getenv("RAG_LLM_MAX_CONCURRENCY", "8"))  # upstream calls at once; the rest queue
+    RAG_LLM_RATE_LIMIT = float(os.getenv("RAG_LLM_RATE_LIMIT", "0"))  # requests per second, halved on each 429; 0 = no limit until a 429
+    RAG_LLM_BURST = int(os.getenv("RAG_LLM_BURST", "10"))
+    RAG_LLM_MAX_RETRIES = int(os.getenv("RAG_LLM_MAX_RETRIES", "3"))  # retries after a 429
+    RAG_LLM_TIMEOUT = float(os.getenv("RAG_LLM_TIMEOUT", "60"))  # seconds per upstream call, 0 = none
     
     # ==================================================
     # GOOGLE API SETTINGS
@@ -83,11 +91,55 @@ class Config:
     # ==================================================
     # RAG SYSTEM SETTINGS
     # ==================================================
-    MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "15000"))
+    MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "0"))  # 0 = index every row
     EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "150"))
     OVERLAP_SIZE = int(os.getenv("OVERLAP_SIZE", "30"))
-    
+    RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0"))  # 0 = one per CPU
+    RAG_EMBED_THREADS = int(os.getenv("RAG_EMBED_THREADS", "0"))  # query encoding, 0 = min(4, CPUs)
+    RAG_EMBED_BATCH_MAX = int(os.getenv("RAG_EMBED_BATCH_MAX", "32"))  # queries per shared encode call, 1 = no batching
+    RAG_EMBED_BATCH_WAIT_MS = float(os.getenv("RAG_EMBED_BATCH_WAIT_MS", "3"))  # wait for more queries under load
+    RAG_SEARCH_THREADS = int(os.getenv("RAG_SEARCH_THREADS", "0"))  # FAISS per request, 0 = 1
+    RAG_BUILD_THREADS = int(os.getenv("RAG_BUILD_THREADS", "0"))  # index builds, 0 = every CPU
+    RAG_BUILD_ENCODER_PROCESS = int(os.getenv("RAG_BUILD_ENCODER_PROCESS", "1"))  # build encodes in a child process, 0 = serving embedder
+    RAG_READ_CHUNK_ROWS = int(os.getenv("RAG_READ_CHUNK_ROWS", "20000"))
+    RAG_BUILD_BATCH_SIZE = int(os.getenv("RAG_BUILD_BATCH_SIZE", "4096"))
+    RAG_STRUCTURED_TABLES = os.getenv("RAG_STRUCTURED_TABLES", "data_core.csv").split(",")  # aggregated, not embedded
+    RAG_STRUCTURED_ANSWER = os.getenv("RAG_STRUCTURED_ANSWER", "context")  # context (LLM prompt) or direct (no LLM)
+
+    # ==================================================
+    # RAG INDEX SETTINGS
+    # ==================================================
+    RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")  # flat, hnsw, ivf_flat, ivf_pq
+    RAG_INDEX_QUANTIZATION = os.getenv("RAG_INDEX_QUANTIZATION", "none")  # none, fp16, int8, pq
+    RAG_EMBEDDING_DTYPE = os.getenv("RAG_EMBEDDING_DTYPE", "float32")  # embedding store: float32, float16, int8
+    RAG_INDEX_TRAIN_SAMPLE = int(os.getenv("RAG_INDEX_TRAIN_SAMPLE", "20000"))
+    RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+    RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+    RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+    RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 = derive from corpus size
+    RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))
+    RAG_PQ_M = int(os.getenv("RAG_PQ_M", "16"))
+    RAG_PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", "8"))
+    RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+    RAG_QUERY_CACHE_PATH = os.getenv("RAG_QUERY_CACHE_PATH", "")  # empty = in-memory only
+    RAG_WEATHER_MAX_AGE_DAYS = int(os.getenv("RAG_WEATHER_MAX_AGE_DAYS", "3"))
+    RAG_COMPACT_DEAD_RATIO = float(os.getenv("RAG_COMPACT_DEAD_RATIO", "0.25"))
+    RAG_DELTA_MAX_CHUNKS = int(os.getenv("RAG_DELTA_MAX_CHUNKS", "2000"))  # delta segment size that triggers compaction
+    RAG_INDEX_GENERATIONS_KEEP = int(os.getenv("RAG_INDEX_GENERATIONS_KEEP", "2"))  # current + previous for rollback
+    RAG_HYBRID_WEIGHT = float(os.getenv("RAG_HYBRID_WEIGHT", "0.3"))  # BM25 share of fused scores, 0 = dense only
+    RAG_ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "1024"))  # 0 = disabled
+    RAG_ANSWER_CACHE_TTL = int(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))  # seconds
+    RAG_ANSWER_CACHE_SIMILARITY = float(os.getenv("RAG_ANSWER_CACHE_SIMILARITY", "0.95"))
+    RAG_CONTEXT_CANDIDATES = int(os.getenv("RAG_CONTEXT_CANDIDATES", "10"))  # chunks retrieved for context packing
+    RAG_CONTEXT_MAX_CHUNKS = int(os.getenv("RAG_CONTEXT_MAX_CHUNKS", "10"))
+    RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1000"))  # estimated tokens, 0 = no limit
+    RAG_CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("RAG_CONTEXT_DUPLICATE_THRESHOLD", "0.95"))  # cosine
+    RAG_CONTEXT_MMR_LAMBDA = float(os.getenv("RAG_CONTEXT_MMR_LAMBDA", "0.7"))  # 1 = relevance only
+    RAG_FEW_SHOT_K = int(os.getenv("RAG_FEW_SHOT_K", "4"))  # examples per REPL prompt, 0 = none
+    RAG_FEW_SHOT_TOKEN_BUDGET = int(os.getenv("RAG_FEW_SHOT_TOKEN_BUDGET", "600"))  # estimated tokens, 0 = no limit
+    RAG_FEW_SHOT_INTENT_FILTER = os.getenv("RAG_FEW_SHOT_INTENT_FILTER", "true").lower() == "true"
+
     # ==================================================
     # CACHE SETTINGS
     # ==================================================
@@ -12,6 +12,8 @@ from sklearn.pipeline import Pipeline
 import pickle
 import os
 
+from .query_features import KEYWORD_GROUPS, query_features
+
 class IntentExtractor:
     """Extracts intent from user queries"""
     
@@ -21,7 +23,7 @@ class IntentExtractor:
         # Define intent patterns and keywords
         self.intent_patterns = {
             'weather_check': {
-                'keywords': ['weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate', 'hot', 'cold', 'humid', 'dry', 'wind', 'storm', 'drizzle', 'precipitation', 'mausam', 'barish', 'garmi', 'thand', 'pani'],
+                'keywords': list(KEYWORD_GROUPS['intent_weather_check']),
                 'patterns': [
                     r'\b(weather|climate|forecast|mausam)\b',
                     r'\b(rain|raining|rainy|barish)\b',
@@ -33,7 +35,7 @@ class IntentExtractor:
                 ]
             },
             'crop_info': {
-                'keywords': ['crop', 'harvest', 'plant', 'seed', 'agriculture', 'farming', 'yield', 'increase', 'improve', 'grow', 'irrigation', 'technique', 'method', 'practice', 'cultivation', 'sowing', 'watering', 'fertilizing', 'pruning', 'weeding', 'pest', 'disease', 'management'],
+                'keywords': list(KEYWORD_GROUPS['intent_crop_info']),
                 'patterns': [
                     r'\b(crop|harvest|plant|seed)\b',
                     r'\b(agriculture|farming|farm)\b',
@@ -48,7 +50,7 @@ class IntentExtractor:
                 ]
             },
             'soil_analysis': {
-                'keywords': ['soil', 'fertilizer', 'nutrient', 'ph', 'moisture'],
+                'keywords': list(KEYWORD_GROUPS['intent_soil_analysis']),
                 'patterns': [
                     r'\b(soil|dirt|ground)\b',
                     r'\b(fertilizer|nutrient|nitrogen|phosphorus)\b',
@@ -56,7 +58,7 @@ class IntentExtractor:
                 ]
             },
             'pest_control': {
-                'keywords': ['pest', 'insect', 'disease', 'pesticide', 'bug'],
+                'keywords': list(KEYWORD_GROUPS['intent_pest_control']),
                 'patterns': [
                     r'\b(pest|insect|bug|worm)\b',
                     r'\b(disease|sick|infected)\b',
@@ -64,7 +66,7 @@ class IntentExtractor:
                 ]
             },
             'market_price': {
-                'keywords': ['price', 'market', 'cost', 'sell', 'buy', 'value'],
+                'keywords': list(KEYWORD_GROUPS['intent_market_price']),
                 'patterns': [
                     r'\b(price|cost|value|worth)\b',
                     r'\b(market|sell|buy|trade)\b',
@@ -72,7 +74,7 @@ class IntentExtractor:
                 ]
             },
             'general_question': {
-                'keywords': ['what', 'how', 'when', 'where', 'why', 'which'],
+                'keywords': list(KEYWORD_GROUPS['intent_general_question']),
                 'patterns': [
                     r'\b(what|how|when|where|why|which)\b',
                     r'\b(question|ask|tell|explain)\b'
@@ -227,6 +229,7 @@ class IntentExtractor:
         """
         text_lower = text.lower().strip()
         words = text_lower.split()
+        features = query_features(text_lower)
         
         # Base confidence from pattern matching
         pattern_confidence = pattern_result.get('confidence', 0.0)
@@ -246,7 +249,7 @@ class IntentExtractor:
         for intent_config in self.intent_patterns.values():
             total_keywords += len(intent_config['keywords'])
             for keyword in intent_config['keywords']:
-                if keyword in text_lower:
+                if keyword in features:
                     keyword_count += 1
         
         keyword_density = keyword_count / max(total_keywords, 1)
@@ -295,13 +298,10 @@ class IntentExtractor:
         agricultural_bonus = 0.0
         weather_bonus = 0.0
         
-        agricultural_keywords = ['crop', 'yield', 'harvest', 'plant', 'soil', 'fertilizer', 'pest', 'farm', 'agriculture', 'irrigation', 'technique', 'method', 'practice', 'cultivation', 'watering', 'drip', 'sprinkler', 'sowing', 'fertilizing', 'pruning', 'weeding', 'management']
-        weather_keywords = ['weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate', 'hot', 'cold', 'humid', 'dry', 'wind', 'storm', 'drizzle', 'precipitation']
-        
-        if any(keyword in text_lower for keyword in agricultural_keywords):
+        if features.has('intent_agricultural_bonus'):
             agricultural_bonus = 0.2  # 20% bonus for agricultural queries
         
-        if any(keyword in text_lower for keyword in weather_keywords):
+        if features.has('intent_weather_bonus'):
             weather_bonus = 0.25  # 25% bonus for weather queries (higher than agricultural)
         
         final_confidence += agricultural_bonus
@@ -335,6 +335,7 @@ class IntentExtractor:
     def _pattern_matching(self, text: str) -> Dict[str, Any]:
         """Extract intent using pattern matching"""
         text_lower = text.lower()
+        features = query_features(text_lower)
         best_match = None
         best_score = 0.0
         
@@ -343,7 +344,7 @@ class IntentExtractor:
             
             # Check keywords (more weight for agricultural and weather terms)
             for keyword in config['keywords']:
-                if keyword in text_lower:
+                if keyword in features:
                     if intent == 'crop_info' and keyword in ['irrigation', 'technique', 'method', 'practice', 'agriculture', 'farming']:
                         score += 0.6  # Higher weight for core agricultural terms
                     elif intent == 'weather_check':  # Higher weight for weather terms
@@ -354,15 +355,15 @@ class IntentExtractor:
             # Check patterns (higher weight for specific agricultural patterns)
             for pattern in config['patterns']:
                 if re.search(pattern, text_lower):
-                    if intent == 'crop_info' and any(term in text_lower for term in ['irrigation', 'technique', 'method']):
+                    if intent == 'crop_info' and features.has('intent_technique'):
                         score += 0.8  # Higher weight for agricultural technique patterns
                     else:
                         score += 0.6
             
             # Bonus for agricultural and weather intent
-            if intent == 'crop_info' and any(term in text_lower for term in ['irrigation', 'technique', 'method', 'practice', 'agriculture', 'farming']):
+            if intent == 'crop_info' and features.has('intent_crop_core'):
                 score += 0.2
-            elif intent == 'weather_check' and any(term in text_lower for term in ['weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate']):
+            elif intent == 'weather_check' and features.has('intent_weather_core'):
                 score += 0.3  # Higher bonus for weather queries
             
             if score > best_score:
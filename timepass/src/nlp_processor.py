@@ -13,6 +13,7 @@ from .translation_service import TranslationService
 from .intent_extraction import IntentExtractor
 from .entity_extraction import EntityExtractor
 from .weather_service import WeatherService
+from .query_features import query_features
 
 class NLPProcessor:
     """Main processor for Member A's NLP + Language Layer"""
@@ -175,17 +176,6 @@ class NLPProcessor:
         
         return cleaned_query
     
-    def _is_agricultural_query(self, text: str) -> bool:
-        """Check if the query is related to agriculture"""
-        agricultural_keywords = [
-            'crop', 'harvest', 'plant', 'seed', 'agriculture', 'farming', 'yield',
-            'fertilizer', 'pest', 'soil', 'irrigation', 'cultivation', 'grow',
-            'farm', 'farmer', 'field', 'rice', 'wheat', 'corn', 'tomato',
-            'vegetable', 'fruit', 'organic', 'pesticide', 'herbicide'
-        ]
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in agricultural_keywords)
-    
     def _calculate_weather_confidence(self, weather_data: Dict[str, Any]) -> float:
         """Calculate confidence score for weather data quality"""
         confidence = 0.0
@@ -246,14 +236,7 @@ class NLPProcessor:
         Returns:
             bool: True if agricultural query
         """
-        agricultural_keywords = [
-            'crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture',
-            'suitable', 'variety', 'soil', 'moisture', 'farming', 'farm',
-            'planting', 'growing', 'season', 'cultivation', 'yield', 'production'
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in agricultural_keywords)
+        return query_features(query).has("nlp_agricultural")
     
     def _process_weather_query(self, translated_text: str, entities: Dict[str, Any], user_location: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -0,0 +1,178 @@
+"""
+Shared keyword matcher for query routing
+Every router keyword list lives here and is compiled into one Aho-Corasick
+automaton, so a query is scanned once and each router checks the resulting
+feature set instead of re-scanning the text for every list.
+"""
+
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Tuple
+
+# ==================================================
+# ROUTER KEYWORD GROUPS
+# ==================================================
+# Matching is by substring of the lower-cased query, like the `word in query.lower()`
+# checks these lists came from ("rain" also matches "raining").
+KEYWORD_GROUPS: Dict[str, Tuple[str, ...]] = {
+    # api/main.py
+    "api_weather": ('weather', 'temperature', 'rain', 'humidity', 'wind', 'climate', 'forecast',
+                    'hot', 'cold', 'sunny', 'cloudy', 'storm', 'precipitation', 'moisture'),
+    "api_agricultural": ('crop', 'farm', 'agriculture', 'plant', 'seed', 'harvest', 'grow',
+                         'soil', 'irrigation', 'cultivation', 'yield', 'suitable', 'productivity',
+                         'farming', 'agricultural', 'production', 'improve', 'increase', 'better',
+                         'tips', 'advice', 'techniques', 'methods', 'strategies'),
+    "api_crop_names": ('wheat', 'rice', 'corn', 'tomato', 'potato', 'onion', 'cotton', 'sugarcane',
+                       'maize', 'barley', 'oats', 'pulses', 'legumes', 'vegetables', 'fruits'),
+    "api_crop_timing": ('when', 'suitable', 'grow', 'plant', 'cultivate', 'harvest', 'season',
+                        'timing', 'conditions', 'requirements', 'best time', 'optimal'),
+    "yield_improvement": ('increase yield', 'improve yield', 'better yield', 'higher yield', 'maximize yield',
+                          'crop yield', 'farming tips', 'agricultural advice', 'farming techniques',
+                          'how to farm', 'farming methods', 'crop production', 'agricultural productivity'),
+
+    # rag/current.py answer routing
+    "weather_day": ('weather tomorrow', 'weather today', 'temperature tomorrow', 'humidity tomorrow'),
+    "weather_terms": ('weather', 'temperature'),
+    "crop_context": ('crop', 'crops', 'suitable', 'farming', 'agriculture', 'plant', 'grow', 'cultivation'),
+    "simple_weather": ('weather tomorrow', 'temperature tomorrow', 'humidity tomorrow', 'weather today',
+                       'tomorrow weather', 'tomorrow temperature', 'tomorrow humidity'),
+    "tomorrow_temperature": ('what will be the weather tomorrow', 'weather tomorrow', 'temperature tomorrow',
+                             'tomorrow weather', 'tomorrow temperature'),
+    "crop_recommendation": ('suitable crops', 'crops for', 'which crops', 'best crops', 'recommend crops',
+                            'what crops', 'crop recommendations', 'crops suitable', 'good crops',
+                            'seed variety', 'seed varieties', 'what seeds', 'which seeds', 'unpredictable weather',
+                            'variable weather', 'changing weather', 'weather resistant', 'hardy crops',
+                            'resilient crops', 'adaptable crops', 'flexible crops'),
+    "specific_crop_names": ('wheat', 'rice', 'corn', 'tomato', 'potato', 'onion', 'cotton', 'sugarcane',
+                            'barley', 'mustard', 'peas', 'lentils', 'beans', 'cucumber', 'carrot'),
+    "crop_suitability": ('good', 'suitable', 'grow', 'plant', 'weather'),
+    "general_weather": ('how is the weather', 'weather conditions', 'current weather', 'weather forecast'),
+    "general_weather_exclusions": ('crop', 'plant', 'grow', 'farm'),
+    "farming_advice": ('farming advice', 'agricultural advice', 'when to plant', 'how to grow',
+                       'irrigation', 'fertilizer', 'pest control', 'harvest time'),
+    "seed_variety": ('seed variety', 'seed varieties', 'what seeds', 'which seeds', 'unpredictable weather',
+                     'variable weather', 'changing weather', 'weather resistant'),
+
+    # src/nlp_processor.py
+    "nlp_agricultural": ('crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture',
+                         'suitable', 'variety', 'soil', 'moisture', 'farming', 'farm',
+                         'planting', 'growing', 'season', 'cultivation', 'yield', 'production'),
+
+    # src/timeline_extractor.py
+    "timeline_agricultural": ('crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture',
+                              'suitable', 'variety', 'soil', 'moisture', 'temperature',
+                              'planting', 'growing', 'season', 'unpredictable', 'climate',
+                              'agricultural', 'cultivation', 'yield', 'production'),
+    "timeline_weather_only": ('weather', 'forecast', 'conditions'),
+    "timeline_agri_core": ('crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture', 'farming', 'farm'),
+    "timeline_farm": ('farming', 'farm'),
+    "timeline_crop_core": ('crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture'),
+
+    # src/intent_extraction.py intent keywords
+    "intent_weather_check": ('weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate', 'hot',
+                             'cold', 'humid', 'dry', 'wind', 'storm', 'drizzle', 'precipitation', 'mausam',
+                             'barish', 'garmi', 'thand', 'pani'),
+    "intent_crop_info": ('crop', 'harvest', 'plant', 'seed', 'agriculture', 'farming', 'yield', 'increase',
+                         'improve', 'grow', 'irrigation', 'technique', 'method', 'practice', 'cultivation',
+                         'sowing', 'watering', 'fertilizing', 'pruning', 'weeding', 'pest', 'disease',
+                         'management'),
+    "intent_soil_analysis": ('soil', 'fertilizer', 'nutrient', 'ph', 'moisture'),
+    "intent_pest_control": ('pest', 'insect', 'disease', 'pesticide', 'bug'),
+    "intent_market_price": ('price', 'market', 'cost', 'sell', 'buy', 'value'),
+    "intent_general_question": ('what', 'how', 'when', 'where', 'why', 'which'),
+    # src/intent_extraction.py confidence bonuses
+    "intent_agricultural_bonus": ('crop', 'yield', 'harvest', 'plant', 'soil', 'fertilizer', 'pest', 'farm',
+                                  'agriculture', 'irrigation', 'technique', 'method', 'practice', 'cultivation',
+                                  'watering', 'drip', 'sprinkler', 'sowing', 'fertilizing', 'pruning', 'weeding',
+                                  'management'),
+    "intent_weather_bonus": ('weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate', 'hot',
+                             'cold', 'humid', 'dry', 'wind', 'storm', 'drizzle', 'precipitation'),
+    "intent_technique": ('irrigation', 'technique', 'method'),
+    "intent_crop_core": ('irrigation', 'technique', 'method', 'practice', 'agriculture', 'farming'),
+    "intent_weather_core": ('weather', 'rain', 'sunny', 'cloudy', 'temperature', 'forecast', 'climate'),
+
+    # rag/few_shots.py example intents
+    "few_shot_yield": ('yield', 'productiv', 'fertilizer'),
+    "few_shot_cost": ('cost', 'a2+fl', 'c2', 'ratio', 'efficient', 'price'),
+    "few_shot_weather": ('weather', 'temperature', 'rain', 'humid', 'forecast', 'precipitation', 'wind',
+                         'dry day', 'degrees'),
+    "few_shot_timing": ('when', 'best time', 'month', 'season', 'sow', 'how many days', 'harvest'),
+    "few_shot_estimate": ('if my', 'estimate', 'expected', 'will be my', 'predict'),
+    "few_shot_improve": ('increase', 'improve', 'boost', 'better yield', 'higher yield'),
+    "few_shot_suitability": ('suitable', 'good for', 'best crop', 'which crops', 'what crops', 'recommend',
+                             'good weather for'),
+    "few_shot_statistics": ('average', 'total', 'median', 'mean', 'highest', 'lowest', 'how many'),
+    "few_shot_soil": ('soil',),
+}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton finding every phrase that occurs in a text in one pass"""
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases = frozenset(phrase.lower() for phrase in phrases if phrase)
+        goto, fail, output = [{}], [0], [set()]
+        for phrase in self.phrases:
+            node = 0
+            for char in phrase:
+                if char not in goto[node]:
+                    goto[node][char] = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    output.append(set())
+                node = goto[node][char]
+            output[node].add(phrase)
+
+        # Breadth-first so each node's failure link is resolved before its children's
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                output[child] |= output[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = [frozenset(phrases) for phrases in output]
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """Phrases occurring anywhere in text (case-insensitive)"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        node = 0
+        for char in str(text or "").lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+        return frozenset(found)
+
+
+class QueryFeatures(frozenset):
+    """Keyword phrases found in a query, checked by group name"""
+
+    def has(self, group: str) -> bool:
+        """True if any phrase of the group occurs in the query"""
+        return not self.isdisjoint(KEYWORD_GROUPS[group])
+
+
+QUERY_MATCHER = KeywordMatcher(phrase for phrases in KEYWORD_GROUPS.values() for phrase in phrases)
+
+
+@lru_cache(maxsize=2048)
+def query_features(text: str) -> QueryFeatures:
+    """
+    Scan a query once for every router keyword
+
+    Args:
+        text: Query text (any case)
+
+    Returns:
+        QueryFeatures; repeated calls for the same text are served from a cache
+    """
+    return QueryFeatures(QUERY_MATCHER.find(text))
@@ -7,6 +7,8 @@ import re
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
+from .query_features import query_features
+
 class TimelineExtractor:
     """Extracts timeline information from user queries"""
     
@@ -168,24 +170,19 @@ class TimelineExtractor:
         Returns:
             bool: True if agricultural query
         """
-        agricultural_keywords = [
-            'crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture',
-            'suitable', 'variety', 'soil', 'moisture', 'temperature',
-            'planting', 'growing', 'season', 'unpredictable', 'climate',
-            'agricultural', 'cultivation', 'yield', 'production'
-        ]
+        features = query_features(query)
         
         # Don't mark as agricultural if it's just asking about weather
         # (which is more of a weather query than agricultural planning)
-        if any(word in query for word in ['weather', 'forecast', 'conditions']) and not any(word in query for word in ['crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture', 'farming', 'farm']):
+        if features.has("timeline_weather_only") and not features.has("timeline_agri_core"):
             return False
         
         # Don't mark as agricultural if it's just asking about weather for farming
         # (which is more of a weather query than agricultural planning)
-        if any(word in query for word in ['farming', 'farm']) and not any(word in query for word in ['crop', 'seed', 'plant', 'harvest', 'grow', 'agriculture']):
+        if features.has("timeline_farm") and not features.has("timeline_crop_core"):
             return False
         
-        return any(keyword in query for keyword in agricultural_keywords)
+        return features.has("timeline_agricultural")
     
     def get_weather_data_period(self, query: str) -> int:
         """
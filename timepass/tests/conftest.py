@@ -0,0 +1,136 @@
+"""
+Shared fixtures for the RAG tests
+Provides a small deterministic embedder so tests never download a model
+"""
+
+import hashlib
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class FakeEmbedder:
+    """Hashed bag-of-words embedder with the SentenceTransformer.encode signature"""
+
+    def __init__(self, dimension: int = 64):
+        self.dimension = dimension
+        self.encode_calls = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, convert_to_numpy=True, show_progress_bar=False,
+               normalize_embeddings=True, batch_size=32, device=None):
+        self.encode_calls += 1
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in re.findall(r'\w+', str(sentence).lower()):
+                slot = int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dimension
+                vectors[row, slot] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        return vectors
+
+
+SAMPLE_CHUNKS = [
+    ("state: kerala | district: kannur | date: 2025 02 20 | avg_rainfall: 0.0", "District-wise-rainfall-2025.csv"),
+    ("state: punjab | district: ludhiana | date: 2025 02 20 | avg_rainfall: 1.2", "District-wise-rainfall-2025.csv"),
+    ("crop type: cotton | soil type: black | fertilizer name: 14 35 14", "data_core.csv"),
+    ("crop type: maize | soil type: sandy | fertilizer name: urea", "data_core.csv"),
+    ("weather forecast for delhi, india on day 2 temperature 18.5 c tomorrow", "weather_forecast_Delhi_India_day_2.txt"),
+    ("paddy grows best between 20 c and 35 c with high humidity", "Indian_Crops_Dataset_Filled.csv"),
+]
+
+WEATHER = {"temperature": 31, "humidity": 72, "description": "clear sky", "wind_speed": 2.1,
+           "moisture": 40, "timeline_info": {"mode": "ultra_fast"}}
+
+
+def random_vectors(n, dim=32):
+    vectors = np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_sample_index(embedder):
+    """Write a legacy-layout index of SAMPLE_CHUNKS in the working directory"""
+    import pandas as pd
+    import rag.current as rag
+
+    df_chunks = pd.DataFrame([{"text": text, "source_file": source} for text, source in SAMPLE_CHUNKS])
+    index = rag.build_faiss_index_safe(df_chunks["text"].tolist(), embedder)
+    rag.save_index(index, df_chunks, {"model_name": "fake", "total_chunks": len(df_chunks)})
+    return df_chunks
+
+
+@pytest.fixture(autouse=True)
+def in_process_build_encoder(monkeypatch):
+    """Builds use the test's embedder instead of loading a model in a child process"""
+    from src.config import config
+    monkeypatch.setattr(config, "RAG_BUILD_ENCODER_PROCESS", 0)
+
+
+@pytest.fixture
+def fake_embedder():
+    return FakeEmbedder()
+
+
+@pytest.fixture
+def rag_workdir(tmp_path, monkeypatch):
+    """Run the test inside an empty directory so index files land in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def engine(rag_workdir, fake_embedder):
+    """RagEngine over the sample index with the fake embedder and English-only language services;
+    it is also what get_rag_engine() returns, so module-level update functions act on it"""
+    from unittest.mock import Mock, patch
+    import rag.current as rag
+
+    build_sample_index(fake_embedder)
+    engine = rag.RagEngine(model_name="fake")
+    engine.embedder = fake_embedder
+    engine.language_detector = Mock(detect_language=Mock(return_value=('en', 0.99)),
+                                    get_language_name=Mock(return_value='English'))
+    engine.translation_service = Mock()
+    with patch.object(rag, 'get_rag_engine', return_value=engine):
+        yield engine
+
+
+@pytest.fixture
+def data_dir(rag_workdir):
+    """Working directory with a small rainfall table, data_core.csv and a legacy chunk export; no weather"""
+    from unittest.mock import patch
+    import pandas as pd
+    import rag.current as rag
+
+    pd.DataFrame({"State": ["Kerala", "Punjab", "Bihar"],
+                  "District": ["Kannur", "Ludhiana", None],
+                  "Avg_rainfall": ["0.0", "1.2", "3.4"]}).to_csv("rainfall.csv", index=False)
+    pd.DataFrame({"Crop Type": ["Cotton", "Maize"],
+                  "Fertilizer Name": ["14-35-14", "Urea"]}).to_csv("data_core.csv", index=False)
+    pd.DataFrame({"text": ["old export row"], "source_file": ["x.csv"]}).to_csv(rag.CHUNKS_CSV, index=False)
+    with patch.object(rag, 'load_cached_weather_data', return_value=[]), \
+         patch.object(rag, 'load_weather_data_from_backend', return_value=[]):
+        yield rag_workdir
+
+
+@pytest.fixture
+def fake_llm():
+    """Async chat model mock served through a fresh LLMClient; set fake_llm.ainvoke.return_value"""
+    from unittest.mock import AsyncMock, patch
+    import rag.current as rag
+    from rag.llm_client import LLMClient
+
+    llm = AsyncMock()
+    client = LLMClient(lambda model, temperature: llm)
+    with patch.object(rag, 'get_llm_client', return_value=client):
+        yield llm
+    client.close()
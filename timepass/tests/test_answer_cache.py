@@ -0,0 +1,83 @@
+"""
+Tests for the semantic LLM answer cache
+"""
+
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from rag.answer_cache import AnswerCache, answer_partition, weather_bucket
+
+WEATHER = {"temperature": 31.2, "humidity": 72, "moisture": 40}
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestAnswerCache:
+    """Test exact and nearest-neighbour lookups, expiry and bounds"""
+
+    def test_exact_hit(self):
+        cache = AnswerCache()
+        cache.put("k", ("pune", "detailed", ()), None, "Sow in June.")
+        assert cache.get("k", ("pune", "detailed", ())) == ("Sow in June.", "exact")
+
+    def test_semantic_hit_needs_same_partition_and_similarity(self):
+        cache = AnswerCache(similarity=0.9)
+        partition = answer_partition("Pune", WEATHER, "detailed")
+        cache.put("a", partition, unit(1, 0), "Sow in June.")
+
+        assert cache.get("b", partition, unit(1, 0.1)) == ("Sow in June.", "semantic")
+        assert cache.get("b", partition, unit(0, 1)) is None
+        assert cache.get("b", answer_partition("Nashik", WEATHER, "detailed"), unit(1, 0)) is None
+
+    def test_entries_expire(self):
+        cache = AnswerCache(ttl=10)
+        with patch("rag.answer_cache.time.time", return_value=100.0):
+            cache.put("k", (), unit(1, 0), "old")
+        with patch("rag.answer_cache.time.time", return_value=111.0):
+            assert cache.get("k", (), unit(1, 0)) is None
+        assert cache.get_stats()["expired"] == 1
+
+    def test_size_bound_evicts_least_recent(self):
+        cache = AnswerCache(max_size=2)
+        for key in "abc":
+            cache.put(key, (), None, key)
+        assert cache.get("a", ()) is None
+        assert cache.get("c", ()) == ("c", "exact")
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_new_index_version_clears(self):
+        cache = AnswerCache()
+        cache.set_version("v1")
+        cache.put("k", (), None, "answer")
+        cache.set_version("v2")
+        assert cache.get("k", ()) is None
+
+    def test_weather_bucket(self):
+        assert weather_bucket(WEATHER) == weather_bucket({"temperature": 30.1, "humidity": 79, "moisture": 49})
+        assert weather_bucket(WEATHER) != weather_bucket({"temperature": 33, "humidity": 72, "moisture": 40})
+        assert weather_bucket({"error": "offline"}) == ()
+
+
+class TestEngineAnswerCache:
+    """Test that the engine skips the LLM for repeated questions"""
+
+    def test_repeated_question_skips_the_llm(self, engine, fake_llm):
+        fake_llm.ainvoke.return_value = Mock(content="Use urea.")
+        first = engine.process_query("fertilizer for maize on sandy soil", location="Pune", weather_data=WEATHER)
+        second = engine.process_query("Fertilizer for maize on sandy soil?", location="Pune", weather_data=WEATHER)
+
+        assert fake_llm.ainvoke.call_count == 1
+        assert first["answer_cache"] == "miss"
+        assert second["answer_cache"] in ("exact", "semantic")
+        assert second["answer"] == "Use urea."
+
+    def test_weather_refresh_invalidates(self, engine, fake_llm):
+        fake_llm.ainvoke.return_value = Mock(content="Use urea.")
+        engine.process_query("fertilizer for maize on sandy soil", location="Pune", weather_data=WEATHER)
+        engine.reset()
+        engine.process_query("fertilizer for maize on sandy soil", location="Pune", weather_data=WEATHER)
+        assert fake_llm.ainvoke.call_count == 2
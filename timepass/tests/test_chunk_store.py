@@ -0,0 +1,45 @@
+"""
+Tests for the memory-mapped chunk store
+"""
+
+import pandas as pd
+
+from rag import current as rag
+from rag.chunk_store import ChunkStore
+
+
+class TestChunkStore:
+    """Test writing and reading the columnar chunk store"""
+
+    def test_round_trip(self, tmp_path):
+        texts = ["state: kerala | district: kannur", "crop type: cotton | fertilizer name: 14 35 14", "तापमान 30"]
+        sources = ["rainfall.csv", "data_core.csv", "rainfall.csv"]
+        store = ChunkStore.write(str(tmp_path / "store"), texts, sources)
+
+        assert len(store) == 3
+        assert store.get(1) == (texts[1], "data_core.csv")
+        assert store.text(2) == "तापमान 30"
+        assert store.sources == ["rainfall.csv", "data_core.csv"]
+        assert list(store.texts()) == texts
+        assert list(store.source_names()) == sources
+
+    def test_empty_store(self, tmp_path):
+        store = ChunkStore.write(str(tmp_path / "store"), [], [])
+        assert len(store) == 0
+        assert list(store.texts()) == []
+
+    def test_exists(self, tmp_path):
+        assert not ChunkStore.exists(str(tmp_path / "missing"))
+        ChunkStore.write(str(tmp_path / "store"), ["a"], ["b"])
+        assert ChunkStore.exists(str(tmp_path / "store"))
+
+    def test_legacy_csv_is_migrated(self, rag_workdir):
+        pd.DataFrame({"text": ["paddy yield 4.2", "wheat yield 3.5"],
+                      "source_file": ["crops.csv", "crops.csv"],
+                      "chunk_id": ["", ""]}).to_csv(rag.CHUNKS_CSV, index=False)
+
+        store = rag.load_chunk_store()
+
+        assert ChunkStore.exists(rag.CHUNK_STORE_DIR)
+        assert len(store) == 2
+        assert store.get(0) == ("paddy yield 4.2", "crops.csv")
@@ -0,0 +1,64 @@
+"""
+Tests for packing retrieved chunks into the prompt context
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+
+from rag import current as rag
+from rag.context_packing import estimate_tokens, pack_context
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestPackContext:
+    """Test duplicate removal, MMR ordering and the token budget"""
+
+    def test_near_duplicates_are_dropped(self):
+        vectors = np.vstack([unit(1, 0, 0), unit(1, 0.01, 0), unit(0, 1, 0)])
+        chosen = pack_context([0.9, 0.89, 0.5], vectors, ["a", "b", "c"], duplicate_threshold=0.95)
+        assert chosen == [0, 2]
+
+    def test_mmr_prefers_new_information(self):
+        vectors = np.vstack([unit(1, 0, 0), unit(1, 0.5, 0), unit(0, 0, 1)])
+        relevance_only = pack_context([0.9, 0.85, 0.8], vectors, ["a", "b", "c"], mmr_lambda=1.0,
+                                      duplicate_threshold=1.1)
+        diverse = pack_context([0.9, 0.85, 0.8], vectors, ["a", "b", "c"], mmr_lambda=0.5,
+                               duplicate_threshold=1.1)
+        assert relevance_only == [0, 1, 2]
+        assert diverse == [0, 2, 1]
+
+    def test_token_budget(self):
+        vectors = np.eye(3, dtype=np.float32)
+        texts = ["x" * 400, "y" * 400, "z" * 40]
+        chosen = pack_context([0.9, 0.8, 0.7], vectors, texts, token_budget=120)
+        # The second chunk does not fit after the first, the short third one still does
+        assert chosen == [0, 2]
+        assert sum(estimate_tokens(texts[i]) for i in chosen) <= 120
+
+    def test_max_chunks_and_empty(self):
+        vectors = np.eye(4, dtype=np.float32)
+        assert pack_context([0.9, 0.8, 0.7, 0.6], vectors, ["a"] * 4, max_chunks=2) == [0, 1]
+        assert pack_context([], np.zeros((0, 4)), []) == []
+
+
+class TestEngineContextPacking:
+    """Test that the engine packs its retrieved context"""
+
+    def test_duplicate_chunks_reach_the_prompt_once(self, engine, fake_llm):
+        fake_llm.ainvoke.return_value = type("Response", (), {"content": "Use urea."})()
+        engine.load()
+        maize = next(i for i in range(len(engine.chunks)) if "maize" in engine.chunks.text(i))
+        vectors = rag.chunk_vectors(engine.index, [maize, maize], engine.chunks, engine.embedder)
+        assert np.allclose(vectors[0], vectors[1])
+
+        with patch.object(rag, 'hybrid_search', return_value=[(np.array([maize, maize]), np.array([0.8, 0.8]))]):
+            response = engine.process_query("fertilizer for maize on sandy soil")
+
+        prompt = fake_llm.ainvoke.call_args.args[0]
+        assert prompt.count("crop type: maize") == 1
+        assert response["relevant_chunks"] == 1
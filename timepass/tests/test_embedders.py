@@ -0,0 +1,87 @@
+"""
+Tests for the embedding backends and the ONNX parity gate
+"""
+
+import json
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from rag import embedders
+from rag.embedders import (MODEL_FILES, PARITY_FILE, embedding_key, load_embedder, mean_pool, onnx_model_dir,
+                           parity_problem)
+
+
+def write_export(model_dir, backend="onnx_int8", min_cosine=0.998):
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, MODEL_FILES[backend])
+    with open(path, "wb") as f:
+        f.write(b"graph")
+    stat = os.stat(path)
+    parity = {"backends": {backend: {"min_cosine": min_cosine, "mean_cosine": 0.999,
+                                     "model_file": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}}}}
+    with open(os.path.join(model_dir, PARITY_FILE), "w") as f:
+        json.dump(parity, f)
+    return path
+
+
+class TestParityGate:
+    """Test that only exports with a passing parity check are served"""
+
+    def test_passing_export(self, tmp_path):
+        write_export(str(tmp_path))
+        assert parity_problem(str(tmp_path), "onnx_int8", min_cosine=0.99) is None
+
+    def test_missing_or_unchecked_export(self, tmp_path):
+        assert "not found" in parity_problem(str(tmp_path), "onnx", min_cosine=0.99)
+        write_export(str(tmp_path))
+        os.remove(os.path.join(str(tmp_path), PARITY_FILE))
+        assert parity_problem(str(tmp_path), "onnx_int8", min_cosine=0.99) == "no parity check recorded"
+
+    def test_low_parity_or_changed_model(self, tmp_path):
+        write_export(str(tmp_path), min_cosine=0.95)
+        assert "below" in parity_problem(str(tmp_path), "onnx_int8", min_cosine=0.99)
+
+        path = write_export(str(tmp_path))
+        with open(path, "ab") as f:
+            f.write(b"retrained")
+        assert parity_problem(str(tmp_path), "onnx_int8", min_cosine=0.99) == "model changed since its parity check"
+
+    def test_failed_parity_falls_back_to_torch(self, tmp_path):
+        write_export(str(tmp_path), min_cosine=0.5)
+        with patch.object(embedders, 'load_torch_embedder', return_value="torch model") as load_torch, \
+             patch.object(embedders, 'OnnxEmbedder') as onnx_embedder:
+            assert load_embedder("mini", "onnx_int8", model_dir=str(tmp_path)) == "torch model"
+        load_torch.assert_called_once_with("mini", 1)
+        onnx_embedder.assert_not_called()
+
+    def test_passing_export_is_loaded(self, tmp_path):
+        write_export(str(tmp_path))
+        with patch.object(embedders, 'load_torch_embedder') as load_torch, \
+             patch.object(embedders, 'OnnxEmbedder') as onnx_embedder:
+            load_embedder("mini", "onnx_int8", model_dir=str(tmp_path))
+        onnx_embedder.assert_called_once_with(str(tmp_path), quantized=True, threads=1)
+        load_torch.assert_not_called()
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            load_embedder("mini", "tensorrt")
+
+
+class TestEmbedderHelpers:
+    """Test pooling and cache identities"""
+
+    def test_mean_pool_ignores_padding(self):
+        tokens = np.array([[[1.0, 3.0], [3.0, 5.0], [100.0, 100.0]]], dtype=np.float32)
+        mask = np.array([[1, 1, 0]])
+        assert np.allclose(mean_pool(tokens, mask), [[2.0, 4.0]])
+
+    def test_embedding_key(self):
+        assert embedding_key("all-MiniLM-L6-v2", "torch") == embedding_key("all-MiniLM-L6-v2", "onnx")
+        assert embedding_key("all-MiniLM-L6-v2", "onnx_int8") != embedding_key("all-MiniLM-L6-v2", "torch")
+
+    def test_model_dir_is_a_single_directory(self):
+        assert os.path.basename(onnx_model_dir("sentence-transformers/all-MiniLM-L6-v2", "models")) == \
+            "sentence-transformers_all-MiniLM-L6-v2"
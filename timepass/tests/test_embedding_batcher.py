@@ -0,0 +1,88 @@
+"""
+Tests for the micro-batching query encoder
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from rag import current as rag
+from rag.embedding_batcher import EmbeddingBatcher
+from tests.conftest import FakeEmbedder
+
+
+class SlowEmbedder(FakeEmbedder):
+    """Fake embedder whose encode takes a while, so concurrent callers pile up"""
+
+    def __init__(self, delay: float = 0.02):
+        super().__init__()
+        self.delay = delay
+        self.batch_sizes = []
+
+    def encode(self, sentences, **kwargs):
+        time.sleep(self.delay)
+        self.batch_sizes.append(len(sentences))
+        return super().encode(sentences, **kwargs)
+
+
+class TestEmbeddingBatcher:
+    """Test coalescing, result routing and error handling"""
+
+    def test_concurrent_callers_share_encode_calls(self):
+        embedder = SlowEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_batch=64, max_wait_ms=5)
+        queries = [f"fertilizer for crop {i}" for i in range(24)]
+        results = {}
+
+        def ask(query):
+            results[query] = batcher.encode([query])
+
+        threads = [threading.Thread(target=ask, args=(query,)) for query in queries]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        assert len(embedder.batch_sizes) < len(queries)
+        assert sum(embedder.batch_sizes) == len(queries)
+        for query in queries:
+            assert np.allclose(results[query], FakeEmbedder().encode([query]))
+        assert batcher.get_stats()["requests"] == len(queries)
+
+    def test_lone_request_does_not_wait(self):
+        batcher = EmbeddingBatcher(FakeEmbedder(), max_batch=64, max_wait_ms=2000)
+        start = time.perf_counter()
+        vectors = batcher.encode(["paddy yield", "wheat yield"])
+        assert time.perf_counter() - start < 1.0
+        assert vectors.shape == (2, 64)
+        assert batcher.encode("paddy yield").shape == (64,)
+        batcher.close()
+
+    def test_errors_reach_every_caller(self):
+        embedder = FakeEmbedder()
+        with patch.object(embedder, 'encode', side_effect=RuntimeError("model crashed")):
+            batcher = EmbeddingBatcher(embedder)
+            with pytest.raises(RuntimeError):
+                batcher.encode(["paddy yield"])
+        assert batcher.encode(["paddy yield"]).shape == (1, 64)
+        assert batcher.get_stats()["errors"] == 1
+        batcher.close()
+
+
+class TestEngineBatching:
+    """Test that request-time queries go through the shared batcher"""
+
+    def test_queries_use_the_batcher(self, engine):
+        encoder = engine.query_encoder()
+        assert isinstance(encoder, EmbeddingBatcher)
+        assert engine.query_encoder() is encoder
+        engine.batch_search(["fertilizer for cotton on black soil"])
+        assert encoder.get_stats()["texts"] == 1
+
+    def test_batching_can_be_disabled(self, engine):
+        with patch.object(rag.config, 'RAG_EMBED_BATCH_MAX', 1):
+            assert engine.query_encoder() is engine.embedder
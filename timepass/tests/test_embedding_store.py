@@ -0,0 +1,161 @@
+"""
+Tests for the content-addressed embedding store
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from rag import current as rag
+from tests.conftest import FakeEmbedder
+from rag.embedding_store import (KEYS_FILE, VECTOR_FILES, EmbeddingStore, content_key, embedding_input,
+                                  shared_embedding_store)
+
+
+def append_texts(path, texts):
+    store = EmbeddingStore(path, "fake")
+    for text in texts:
+        store.embed([text], FakeEmbedder().encode)
+
+
+class TestEmbeddingStore:
+    """Test lookup, persistence and partial re-encoding"""
+
+    def test_only_new_texts_are_encoded(self, tmp_path, fake_embedder):
+        store = EmbeddingStore(str(tmp_path / "store"), "fake")
+        first = store.embed(["paddy yield", "wheat yield"], fake_embedder.encode)
+
+        encoded = []
+        second = store.embed(["wheat yield", "maize yield", "paddy yield"],
+                             lambda batch: encoded.extend(batch) or fake_embedder.encode(batch))
+
+        assert encoded == ["maize yield"]
+        assert np.allclose(second[0], first[1])
+        assert np.allclose(second[2], first[0])
+
+    def test_persists_across_instances(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        EmbeddingStore(path, "fake").embed(["paddy yield"], fake_embedder.encode)
+        fake_embedder.encode_calls = 0
+
+        store = EmbeddingStore(path, "fake")
+        vectors = store.embed(["paddy yield"], fake_embedder.encode)
+
+        assert fake_embedder.encode_calls == 0
+        assert np.allclose(vectors[0], fake_embedder.encode(["paddy yield"])[0])
+
+    def test_model_name_is_part_of_the_key(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        EmbeddingStore(path, "model-a").embed(["paddy yield"], fake_embedder.encode)
+        assert EmbeddingStore(path, "model-b").lookup([content_key("model-b", "paddy yield")])[0] == -1
+
+    def test_duplicate_texts_are_stored_once(self, tmp_path, fake_embedder):
+        store = EmbeddingStore(str(tmp_path / "store"), "fake")
+        vectors = store.embed(["paddy", "paddy", "wheat"], fake_embedder.encode)
+        assert len(store) == 2
+        assert np.allclose(vectors[0], vectors[1])
+
+    @pytest.mark.parametrize("dtype,tolerance,itemsize", [("float16", 1e-3, 2), ("int8", 1e-2, 1)])
+    def test_quantized_storage(self, tmp_path, fake_embedder, dtype, tolerance, itemsize):
+        path = str(tmp_path / "store")
+        texts = ["paddy yield", "wheat yield", "maize yield"]
+        vectors = EmbeddingStore(path, "fake", dtype=dtype).embed(texts, fake_embedder.encode)
+
+        assert vectors.dtype == np.float32
+        assert np.abs(vectors - fake_embedder.encode(texts)).max() < tolerance
+        assert os.path.getsize(os.path.join(path, VECTOR_FILES[dtype])) == 3 * 64 * itemsize
+
+    def test_dtype_change_converts_existing_store(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        original = EmbeddingStore(path, "fake").embed(["paddy yield", "wheat yield"], fake_embedder.encode)
+        fake_embedder.encode_calls = 0
+
+        store = EmbeddingStore(path, "fake", dtype="float16")
+        vectors = store.embed(["wheat yield", "paddy yield"], fake_embedder.encode)
+
+        assert fake_embedder.encode_calls == 0
+        assert np.allclose(vectors, original[::-1], atol=1e-3)
+        assert sorted(os.listdir(path)) == ["append.lock", "keys.bin", "meta.json", "vectors.f16"]
+
+    def test_stores_sharing_a_directory(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        first, second = EmbeddingStore(path, "fake"), EmbeddingStore(path, "fake")
+        first.embed(["paddy yield"], fake_embedder.encode)
+        second.embed(["wheat yield"], fake_embedder.encode)
+        # The second store saw the first one's row and appended after it
+        fake_embedder.encode_calls = 0
+        second.embed(["paddy yield"], fake_embedder.encode)
+        assert fake_embedder.encode_calls == 0
+
+        expected = fake_embedder.encode(["paddy yield", "wheat yield"])
+        for store in [first, second, EmbeddingStore(path, "fake")]:
+            assert np.allclose(store.embed(["paddy yield", "wheat yield"], fake_embedder.encode), expected)
+            assert len(store) == 2
+        assert fake_embedder.encode_calls == 1
+
+    def test_concurrent_processes(self, tmp_path):
+        path = str(tmp_path / "store")
+        texts = [f"crop {i}" for i in range(40)]
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("fork")) as pool:
+            list(pool.map(append_texts, [path, path], [texts[::2] + texts[:5], texts[1::2] + texts[:5]]))
+
+        store = EmbeddingStore(path, "fake")
+        assert len(store) == 40
+        assert np.allclose(store.vectors(store.lookup(store.keys_for(texts))), FakeEmbedder().encode(texts))
+
+    def test_interrupted_append_is_dropped(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        EmbeddingStore(path, "fake").embed(["paddy yield"], fake_embedder.encode)
+        with open(os.path.join(path, VECTOR_FILES["float32"]), "ab") as f:
+            f.write(b"\0" * 100)
+        with open(os.path.join(path, KEYS_FILE), "ab") as f:
+            f.write(b"0" * 7)
+
+        store = EmbeddingStore(path, "fake")
+        assert len(store) == 1
+        vectors = store.embed(["wheat yield", "paddy yield"], fake_embedder.encode)
+        assert np.allclose(vectors, fake_embedder.encode(["wheat yield", "paddy yield"]))
+        assert os.path.getsize(os.path.join(path, KEYS_FILE)) == 2 * 32
+
+    def test_legacy_key_table_is_migrated(self, tmp_path, fake_embedder):
+        path = str(tmp_path / "store")
+        EmbeddingStore(path, "fake").embed(["paddy yield", "wheat yield"], fake_embedder.encode)
+        keys = np.frombuffer(open(os.path.join(path, KEYS_FILE), "rb").read(), dtype="S32")
+        os.remove(os.path.join(path, KEYS_FILE))
+        np.save(os.path.join(path, "keys.npy"), keys)
+
+        store = EmbeddingStore(path, "fake")
+        assert store.lookup(keys.tolist()).tolist() == [0, 1]
+        assert not os.path.exists(os.path.join(path, "keys.npy"))
+
+    def test_shared_store_per_directory(self, tmp_path):
+        path = str(tmp_path / "store")
+        assert shared_embedding_store(path, "fake") is shared_embedding_store(path, "fake")
+        assert shared_embedding_store(path, "fake") is not shared_embedding_store(path, "fake", dtype="int8")
+
+    def test_unknown_dtype(self, tmp_path):
+        with pytest.raises(ValueError):
+            EmbeddingStore(str(tmp_path / "store"), "fake", dtype="bfloat16")
+
+    def test_embedding_input(self):
+        assert embedding_input("  ab ") == "empty text"
+        assert len(embedding_input("x" * 600)) == 500
+
+
+class TestIndexRebuild:
+    """Test that index rebuilds reuse stored embeddings"""
+
+    def test_rebuild_after_new_chunk_encodes_one_text(self, rag_workdir, fake_embedder):
+        texts = ["crop type: cotton | soil type: black", "crop type: maize | soil type: sandy"]
+        rag.build_faiss_index_safe(texts, fake_embedder, "fake")
+
+        encoded = []
+        original_encode = fake_embedder.encode
+        fake_embedder.encode = lambda batch, **kwargs: encoded.extend(batch) or original_encode(batch, **kwargs)
+        index = rag.build_faiss_index_safe(["crop type: wheat | soil type: loamy"] + texts[::-1], fake_embedder, "fake")
+
+        assert encoded == ["crop type: wheat | soil type: loamy"]
+        assert index.ntotal == 3
@@ -0,0 +1,80 @@
+"""
+Tests for choosing few-shot examples per query
+"""
+
+import numpy as np
+
+from rag.few_shots import FEW_SHOT_EXAMPLES, FewShotSelector, format_examples, query_intents
+from rag.prompts import PromptRegistry
+from tests.conftest import FakeEmbedder
+
+
+def encoder(embedder):
+    calls = []
+
+    def encode(texts):
+        calls.append(len(texts))
+        return embedder.encode(texts, normalize_embeddings=True)
+    return encode, calls
+
+
+def query_vector(embedder, query):
+    return embedder.encode([query], normalize_embeddings=True)[0]
+
+
+class TestFewShotSelector:
+    """Test similarity ranking, the intent filter and the token budget"""
+
+    def test_example_queries_are_embedded_once(self):
+        encode, calls = encoder(FakeEmbedder())
+        selector = FewShotSelector(FEW_SHOT_EXAMPLES, encode)
+        selector.select("weather tomorrow", np.ones(64, dtype=np.float32))
+        assert calls == [len(FEW_SHOT_EXAMPLES)]
+
+    def test_closest_examples_first(self):
+        embedder = FakeEmbedder()
+        selector = FewShotSelector(FEW_SHOT_EXAMPLES, encoder(embedder)[0])
+        query = "If my cost of cultivation is 11000, what will be my cost of production and yield?"
+        chosen = selector.select(query, query_vector(embedder, query), k=2, token_budget=0)
+        assert len(chosen) == 2
+        assert all(example["query"].startswith("If my cost of cultivation") for example in chosen)
+
+    def test_intent_filter(self):
+        embedder = FakeEmbedder()
+        selector = FewShotSelector(FEW_SHOT_EXAMPLES, encoder(embedder)[0])
+        query = "Will it rain in Kannur tomorrow?"
+        assert "weather" in query_intents(query)
+        chosen = selector.select(query, query_vector(embedder, query), k=3, token_budget=0)
+        assert all("weather" in example["intents"] for example in chosen)
+        # A query without intent keywords is matched against every example
+        assert query_intents("paddy in Odisha") == frozenset()
+        assert len(selector.select("paddy in Odisha", query_vector(embedder, "paddy in Odisha"), k=3)) == 3
+
+    def test_token_budget_and_k(self):
+        embedder = FakeEmbedder()
+        selector = FewShotSelector(FEW_SHOT_EXAMPLES, encoder(embedder)[0])
+        query = "How can I increase cotton yield in Gujarat?"
+        vector = query_vector(embedder, query)
+        assert len(selector.select(query, vector, k=2, token_budget=0)) == 2
+        assert selector.select(query, vector, k=0) == []
+        chosen = selector.select(query, vector, k=10, token_budget=150)
+        assert 0 < len(chosen) < 10
+        assert sum(selector.costs[FEW_SHOT_EXAMPLES.index(example)] for example in chosen) <= 150
+
+
+class TestReplPrompt:
+    """Test that the REPL prompt only carries the chosen examples"""
+
+    def test_block_is_much_smaller_than_all_examples(self, engine):
+        block = engine.few_shot_block("What will be the weather tomorrow in Kannur?")
+        prompt = PromptRegistry().format("repl", examples=block, context="- rain 0 mm", query="q")
+        assert block.startswith("Example 1:")
+        assert "What will be the weather tomorrow in Delhi?" in block
+        assert len(block) * 4 < len(format_examples(FEW_SHOT_EXAMPLES))
+        assert block in prompt
+
+    def test_selector_is_built_once(self, engine):
+        engine.few_shot_block("best fertilizer for barley")
+        selector = engine.few_shots
+        engine.few_shot_block("average yield of bajra")
+        assert engine.few_shots is selector
@@ -0,0 +1,203 @@
+"""
+Tests for id-mapped incremental updates of the RAG index
+"""
+
+import os
+from unittest.mock import patch
+
+import faiss
+import numpy as np
+import pytest
+
+from rag import current as rag
+from rag.chunk_store import ChunkStore
+from rag.generations import GENERATIONS_DIR, current_generation, generation_dir, read_pointer, verify_generation
+from rag.index_factory import SegmentedIndex, build_id_index, index_ids, remove_ids, search_ids
+from tests.conftest import SAMPLE_CHUNKS, WEATHER, random_vectors
+
+
+class TestIdIndex:
+    """Test removal on id-mapped indexes and the segmented search view"""
+
+    def test_remove_ids(self):
+        vectors = random_vectors(50)
+        index = remove_ids(build_id_index(vectors, params={"index_type": "flat"}), np.array([3, 7]))
+
+        assert index.ntotal == 48
+        assert not {3, 7} & set(index_ids(index))
+        _, ids = index.search(vectors[10:11], 1)
+        assert ids[0][0] == 10
+
+    def test_hnsw_cannot_remove_ids(self):
+        index = build_id_index(random_vectors(50), params={"index_type": "hnsw"})
+        with pytest.raises(ValueError):
+            remove_ids(index, np.array([3]))
+
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+    def test_segmented_index_filters_deleted_ids(self, index_type):
+        vectors = random_vectors(53)
+        base = build_id_index(vectors[:50], params={"index_type": index_type, "nlist": 4, "nprobe": 4})
+        delta = build_id_index(vectors[50:], ids=np.arange(50, 53), params={"index_type": "flat"})
+        index = SegmentedIndex(base, delta, np.array([3, 7]))
+
+        assert index.ntotal == 51
+        _, ids = index.search(vectors[[3, 10, 51]], 5)
+        assert not {3, 7} & set(ids.ravel())
+        assert list(ids[1:, 0]) == [10, 51]
+        _, ids = search_ids(index, vectors[3:4], np.array([3, 10, 51]), 3)
+        assert set(ids[0]) == {10, 51, -1}
+        assert np.allclose(index.reconstruct(51), vectors[51])
+        assert sorted(index_ids(index)) == sorted(set(range(53)) - {3, 7})
+
+
+class TestChunkStoreAppend:
+    """Test appending to an existing chunk store"""
+
+    def test_append_keeps_existing_rows(self, tmp_path):
+        path = str(tmp_path / "store")
+        ChunkStore.write(path, ["a", "b", "ä"], ["x.csv", "y.csv", "x.csv"])
+        store = ChunkStore.append(path, str(tmp_path / "appended"), ["c"], ["weather_data_Pune_20250101.txt"])
+
+        assert len(store) == 4
+        assert store.get(0) == ("a", "x.csv")
+        assert store.get(2) == ("ä", "x.csv")
+        assert store.get(3) == ("c", "weather_data_Pune_20250101.txt")
+        assert list(store.ids_with_source_prefix("weather_data_Pune_")) == [3]
+
+    def test_append_leaves_the_open_store_alone(self, tmp_path):
+        path = str(tmp_path / "store")
+        reader = ChunkStore.write(path, ["a", "b"], ["x.csv", "y.csv"])
+        files = {name: os.stat(os.path.join(path, name)) for name in os.listdir(path)}
+        ChunkStore.append(path, str(tmp_path / "appended"), ["c"], ["z.csv"])
+
+        assert {name: os.stat(os.path.join(path, name)) for name in os.listdir(path)} == files
+        assert len(reader) == 2 and reader.get(1) == ("b", "y.csv")
+        with pytest.raises(ValueError):
+            ChunkStore.append(path, path, ["c"], ["z.csv"])
+
+
+class TestWeatherUpdates:
+    """Test adding, superseding and expiring weather chunks"""
+
+    def test_add_embeds_only_the_new_chunk(self, engine, fake_embedder):
+        fake_embedder.encode_calls = 0
+        assert rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+
+        assert fake_embedder.encode_calls == 1
+        engine.load()
+        assert engine.index.ntotal == len(SAMPLE_CHUNKS) + 1
+        assert engine.meta["weather_locations"] == ["Pune"]
+        # The new chunk lives in the delta segment and is in the BM25 index loaded for the base
+        new_id = len(SAMPLE_CHUNKS)
+        assert engine.chunks.source(new_id) == rag.weather_source_name("Pune")
+        assert new_id in engine.sparse.search(engine.chunks.text(new_id), 3)[0]
+
+    def test_same_day_update_is_skipped(self, engine, fake_embedder):
+        rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        fake_embedder.encode_calls = 0
+        assert rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        assert fake_embedder.encode_calls == 0
+
+    def test_older_forecast_is_superseded(self, engine):
+        with patch.object(rag, 'weather_source_name', return_value="weather_data_Pune_20000101.txt"):
+            rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+
+        engine.load()
+        live_sources = [engine.chunks.source(int(i)) for i in index_ids(engine.index)]
+        assert "weather_data_Pune_20000101.txt" not in live_sources
+        assert rag.weather_source_name("Pune") in live_sources
+        assert engine.index.ntotal == len(SAMPLE_CHUNKS) + 1
+        _, ids = engine.index.search(engine.embedder.encode([engine.chunks.text(len(SAMPLE_CHUNKS))]), len(SAMPLE_CHUNKS) + 2)
+        assert len(SAMPLE_CHUNKS) not in ids[0]
+
+    def test_longer_location_name_is_kept(self, engine):
+        rag.add_weather_data_to_existing_index(WEATHER, "Hyderabad_India")
+        with patch.object(rag, 'weather_source_name', return_value="weather_data_Hyderabad_20000101.txt"):
+            rag.add_weather_data_to_existing_index(WEATHER, "Hyderabad")
+
+        engine.load()
+        assert engine.meta["weather_locations"] == ["Hyderabad", "Hyderabad_India"]
+
+    def test_expire_weather_chunks(self, engine):
+        with patch.object(rag, 'weather_source_name', return_value="weather_data_Pune_20000101.txt"):
+            rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        rag.add_weather_data_to_existing_index(WEATHER, "Delhi")
+
+        assert rag.expire_weather_chunks(max_age_days=3) == 1
+        engine.load()
+        assert engine.meta["weather_locations"] == ["Delhi"]
+
+    def test_base_is_not_rewritten_or_rebuilt(self, engine):
+        rag.add_weather_data_to_existing_index(WEATHER, "Delhi")
+        engine.load()
+        first_dir = generation_dir(engine.generation)
+        with patch.object(rag, 'compact_index', side_effect=AssertionError("compacted")):
+            assert rag.expire_weather_chunks(max_age_days=-1) == 1
+
+        engine.load()
+        for name in [rag.INDEX_PATH, "faiss_chunks/text.bin", rag.SPARSE_INDEX_PATH]:
+            assert os.path.samefile(os.path.join(first_dir, name), rag.live_path(name))
+        assert engine.meta["deleted_chunks"] == 0 and engine.meta["delta_chunks"] == 0
+        assert engine.index.ntotal == len(SAMPLE_CHUNKS)
+
+    def test_compaction_renumbers_ids(self, engine):
+        chunks, delta, rebuilt = rag.open_index_for_update()
+        delta.remove(np.arange(4))
+        with rag.staged_index_update() as staging:
+            rag.commit_index_update(chunks, delta, staging, compact_ratio=0.1, rebuilt=rebuilt)
+
+        engine.load()
+        assert isinstance(engine.index, faiss.IndexIDMap2)
+        assert len(engine.chunks) == len(SAMPLE_CHUNKS) - 4
+        assert sorted(index_ids(engine.index)) == list(range(len(SAMPLE_CHUNKS) - 4))
+        indices, _ = rag.faiss_search(SAMPLE_CHUNKS[5][0], engine.embedder, engine.index, top_k=1)
+        assert engine.chunks.text(int(indices[0])) == SAMPLE_CHUNKS[5][0]
+
+    def test_legacy_index_is_rebuilt_with_ids(self, engine):
+        plain = faiss.IndexFlatIP(engine.embedder.dimension)
+        plain.add(engine.embedder.encode([text for text, _ in SAMPLE_CHUNKS]))
+        faiss.write_index(plain, rag.INDEX_PATH)
+
+        assert rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        assert isinstance(faiss.read_index(rag.live_path(rag.INDEX_PATH)), faiss.IndexIDMap2)
+
+    def test_large_delta_is_compacted(self, engine):
+        rag.add_weather_data_to_existing_index(WEATHER, "Delhi")
+        with patch.object(rag.config, 'RAG_DELTA_MAX_CHUNKS', 1):
+            rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+
+        engine.load()
+        assert isinstance(engine.index, faiss.IndexIDMap2)
+        assert engine.index.ntotal == len(engine.chunks) == len(SAMPLE_CHUNKS) + 2
+        assert engine.meta["delta_chunks"] == 0
+        assert engine.meta["weather_locations"] == ["Delhi", "Pune"]
+        (pune,) = engine.chunks.ids_with_source_prefix("weather_data_Pune_")
+        assert pune in engine.sparse.search(engine.chunks.text(int(pune)), 3)[0]
+
+    def test_update_publishes_a_new_generation(self, engine):
+        with patch.object(rag, 'weather_source_name', return_value="weather_data_Pune_20000101.txt"):
+            rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        engine.load()
+        first, old_index = engine.generation, engine.index
+        first_dir = generation_dir(first)
+        inodes = {name: os.stat(os.path.join(first_dir, name)).st_ino
+                  for name in [rag.INDEX_PATH, rag.META_PATH, "faiss_chunks/text.bin"]}
+
+        assert rag.expire_weather_chunks(max_age_days=3) == 1
+        assert engine.generation == current_generation() != first
+        assert engine.index is not old_index
+        assert read_pointer()["previous"] == first
+        # The served generation is left as it was; only the delta segment and metadata change
+        assert verify_generation(first_dir)
+        assert inodes == {name: os.stat(os.path.join(first_dir, name)).st_ino for name in inodes}
+        for name in [rag.INDEX_PATH, "faiss_chunks/text.bin"]:
+            assert os.path.samefile(os.path.join(first_dir, name), rag.live_path(name))
+        deleted = os.path.join(rag.DELTA_DIR, "deleted.npy")
+        assert not os.path.samefile(os.path.join(first_dir, deleted), rag.live_path(deleted))
+
+    def test_failed_update_leaves_no_staging(self, engine):
+        with patch.object(rag.DeltaSegment, 'save', side_effect=RuntimeError("disk full")):
+            assert not rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        assert current_generation() is None
+        assert [name for name in os.listdir(GENERATIONS_DIR) if name.endswith(".building")] == []
@@ -0,0 +1,95 @@
+"""
+Tests for the RAG index factory and its recall/latency report
+"""
+
+import faiss
+import numpy as np
+import pytest
+
+from rag.index_factory import (INDEX_TYPES, QUANTIZATIONS, apply_search_params, build_index, build_id_index,
+                               create_index, default_nlist, index_quantization, index_report, remove_ids,
+                               sample_queries)
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(2000, 32)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestIndexFactory:
+    """Test building each supported index type"""
+
+    @pytest.mark.parametrize("index_type", INDEX_TYPES)
+    def test_build_each_type(self, corpus, index_type):
+        index = build_index(corpus, {"index_type": index_type, "pq_m": 8, "pq_nbits": 6})
+        assert index.ntotal == len(corpus)
+        _, ids = index.search(corpus[:3], 1)
+        if index_type != "ivf_pq":
+            assert list(ids[:, 0]) == [0, 1, 2]
+
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+    @pytest.mark.parametrize("quantization", QUANTIZATIONS[1:])
+    def test_quantized_indexes(self, corpus, index_type, quantization):
+        params = {"index_type": index_type, "quantization": quantization, "pq_m": 8, "pq_nbits": 6, "nlist": 16,
+                  "nprobe": 16}
+        index = build_id_index(corpus, params=params)
+        assert index_quantization(index) == quantization
+        assert index.ntotal == len(corpus)
+        if quantization != "pq":
+            _, ids = index.search(corpus[:3], 1)
+            assert list(ids[:, 0]) == [0, 1, 2]
+
+        if index_type != "hnsw":
+            index = remove_ids(index, np.array([0, 1]))
+            assert index.ntotal == len(corpus) - 2
+            assert index_quantization(index) == quantization
+
+    def test_search_params_applied(self, corpus):
+        hnsw = build_index(corpus, {"index_type": "hnsw", "ef_search": 77})
+        assert hnsw.hnsw.efSearch == 77
+        ivf = build_index(corpus, {"index_type": "ivf_flat", "nlist": 16, "nprobe": 4})
+        assert ivf.nprobe == 4
+        apply_search_params(ivf, {"nprobe": 100})
+        assert ivf.nprobe == 16
+
+    def test_invalid_params(self):
+        with pytest.raises(ValueError):
+            create_index(32, 1000, {"index_type": "annoy"})
+        with pytest.raises(ValueError):
+            create_index(30, 1000, {"index_type": "ivf_pq", "pq_m": 8})
+        with pytest.raises(ValueError):
+            create_index(32, 1000, {"index_type": "flat", "quantization": "int4"})
+
+    def test_default_nlist(self):
+        assert default_nlist(10) == 1
+        assert default_nlist(10000) == 256
+        assert default_nlist(1000000) == 4000
+
+
+class TestIndexReport:
+    """Test the recall@k / latency comparison"""
+
+    def test_report_against_flat(self, corpus):
+        queries = sample_queries(corpus, 50)
+        report = index_report(corpus, queries, k=5,
+                              configs=[{"index_type": "flat"}, {"index_type": "ivf_flat", "nlist": 16, "nprobe": 16}])
+        flat, ivf = report
+        assert flat["recall_at_k"] == 1.0
+        assert ivf["recall_at_k"] == 1.0
+        assert flat["search_ms_p50"] >= 0
+        assert ivf["index"]["index_class"] == "IndexIVFFlat"
+
+    def test_report_sizes_quantized_indexes(self, corpus):
+        report = index_report(corpus, sample_queries(corpus, 50), k=5,
+                              configs=[{"index_type": "flat", "quantization": q} for q in ["none", "fp16", "int8"]])
+        flat, fp16, int8 = report
+        assert flat["compression"] == 1.0
+        assert fp16["compression"] > 1.9 and int8["compression"] > 3.5
+        assert fp16["recall_at_k"] >= 0.95 and int8["recall_at_k"] >= 0.8
+        assert int8["index"]["bytes_per_vector"] == 32
+
+    def test_report_records_errors(self, corpus):
+        report = index_report(corpus, sample_queries(corpus, 5), k=5, configs=[{"index_type": "unknown"}])
+        assert "error" in report[0]
@@ -0,0 +1,140 @@
+"""
+Tests for versioned index generations and the atomic hot swap
+"""
+
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from rag import current as rag
+from rag import generations
+from rag.generations import (GENERATIONS_DIR, clone_generation, current_generation, generation_dir, publish_generation,
+                             read_pointer, rollback_generation, seal_generation, staging_dir, verify_generation)
+
+
+def make_generation(root, name, content="data"):
+    staging = staging_dir(name, root)
+    os.makedirs(os.path.join(staging, "faiss_chunks"))
+    with open(os.path.join(staging, "faiss_index.idx"), "w") as f:
+        f.write(content)
+    with open(os.path.join(staging, "faiss_chunks", "text.bin"), "w") as f:
+        f.write(content * 2)
+    return seal_generation(staging, {"generation": name})
+
+
+class TestGenerations:
+    """Test sealing, publishing, rollback and pruning of generation directories"""
+
+    def test_seal_renames_and_verifies(self, tmp_path):
+        root = str(tmp_path)
+        assert make_generation(root, "g1") == "g1"
+        assert not os.path.exists(staging_dir("g1", root))
+        assert verify_generation(generation_dir("g1", root))
+
+    def test_corrupt_generation_is_not_published(self, tmp_path):
+        root = str(tmp_path)
+        make_generation(root, "g1")
+        with open(os.path.join(generation_dir("g1", root), "faiss_index.idx"), "w") as f:
+            f.write("datb")
+        with pytest.raises(ValueError):
+            publish_generation("g1", root)
+        assert current_generation(root) is None
+
+    def test_publish_and_rollback(self, tmp_path):
+        root = str(tmp_path)
+        make_generation(root, "g1")
+        make_generation(root, "g2")
+        publish_generation("g1", root)
+        publish_generation("g2", root)
+        assert read_pointer(root)["previous"] == "g1"
+
+        assert rollback_generation(root)["current"] == "g1"
+        assert current_generation(root) == "g1"
+        assert read_pointer(root)["previous"] == "g2"
+
+    def test_prune_keeps_current_and_previous(self, tmp_path):
+        root = str(tmp_path)
+        for name in ["g1", "g2", "g3"]:
+            make_generation(root, name)
+            publish_generation(name, root, keep=2)
+        assert sorted(os.listdir(root)) == ["CURRENT.json", "g2", "g3"]
+
+    def test_clone_only_rehashes_changed_files(self, tmp_path):
+        root = str(tmp_path)
+        make_generation(root, "g1")
+        staging = staging_dir("g2", root)
+        clone_generation(generation_dir("g1", root), staging)
+        with open(os.path.join(staging, "faiss_index.idx.tmp"), "w") as f:
+            f.write("changed")
+        os.replace(os.path.join(staging, "faiss_index.idx.tmp"), os.path.join(staging, "faiss_index.idx"))
+        with patch.object(generations, 'file_checksum', wraps=generations.file_checksum) as checksum:
+            seal_generation(staging, {}, base=generation_dir("g1", root))
+        assert checksum.call_count == 1
+        assert verify_generation(generation_dir("g1", root))
+        assert verify_generation(generation_dir("g2", root))
+
+
+class TestHotSwap:
+    """Test that rebuilds never take the served index away"""
+
+    @pytest.fixture
+    def engine(self, data_dir, fake_embedder):
+        engine = rag.RagEngine(model_name="fake")
+        engine.embedder = fake_embedder
+        with patch.object(rag, 'get_rag_engine', return_value=engine), \
+             patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            yield engine
+
+    def test_first_load_publishes_a_generation(self, engine):
+        engine.load()
+        assert engine.generation == current_generation()
+        assert verify_generation(generation_dir(engine.generation))
+        assert engine.index.ntotal == 5
+
+    def test_refresh_swaps_in_new_generation(self, engine):
+        engine.load()
+        old_generation, old_index = engine.generation, engine.index
+        pd.DataFrame({"Crop Type": ["Wheat"], "Fertilizer Name": ["DAP"]}).to_csv("wheat.csv", index=False)
+
+        with patch.object(rag, 'load_index', wraps=rag.load_index) as load_index:
+            response = rag.refresh_weather_data(wait=True)
+        assert response["status"] == "success"
+        # The new generation is opened once, by the swap, and never rebuilt on the query path
+        assert load_index.call_count == 1
+        assert engine.generation == response["generation"] != old_generation
+        assert engine.index is not old_index
+        assert engine.index.ntotal == 6
+        assert read_pointer()["previous"] == old_generation
+
+        with patch.object(rag, 'build_index_generation') as build:
+            engine.load()
+        build.assert_not_called()
+
+    def test_failed_rebuild_keeps_serving(self, engine):
+        engine.load()
+        generation = engine.generation
+        with patch.object(rag, 'build_index_from_store', side_effect=RuntimeError("out of memory")):
+            response = rag.refresh_weather_data(wait=True)
+        assert response["status"] == "error"
+        assert engine.generation == current_generation() == generation
+        assert [name for name in os.listdir(GENERATIONS_DIR) if name.endswith(".building")] == []
+
+    def test_other_workers_pick_up_a_publish(self, engine, fake_embedder):
+        engine.load()
+        other = rag.RagEngine(model_name="fake")
+        other.embedder = fake_embedder
+        other.load()
+        assert rag.refresh_weather_data(wait=True)["status"] == "success"
+
+        assert other.generation != engine.generation
+        other.load()
+        assert other.generation == engine.generation
+
+    def test_rollback(self, engine):
+        engine.load()
+        first = engine.generation
+        rag.refresh_weather_data(wait=True)
+        assert rag.rollback_index_generation()["generation"] == first
+        assert engine.generation == first
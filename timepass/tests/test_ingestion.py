@@ -0,0 +1,115 @@
+"""
+Tests for vectorized, parallel ingestion of the RAG source files
+"""
+
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from rag import current as rag
+
+
+class TestNormalizeSeries:
+    """Test that the vectorized normalizer matches normalize_text"""
+
+    def test_matches_scalar_version(self):
+        texts = ["State: Kerala | District: Kannur!", "  Crop   Type:\tCOTTON  ", "nan", "", None, "x" * 1200]
+        assert rag.normalize_series(pd.Series(texts)).tolist() == [rag.normalize_text(t) for t in texts]
+
+
+class TestPrepareFileChunks:
+    """Test row serialization"""
+
+    def test_rows_are_serialized_and_normalized(self):
+        df = pd.DataFrame({"State": ["Kerala", "Bihar"], "District": ["Kannur", ""],
+                           "Rainfall": ["0.0", "3.4"], "source_file": "rain.csv"})
+        chunks = rag.prepare_file_chunks(df)
+
+        assert chunks["text"].tolist() == ["state kerala district kannur rainfall 0.0", "state bihar rainfall 3.4"]
+        assert set(chunks["source_file"]) == {"rain.csv"}
+
+    def test_short_rows_are_dropped(self):
+        df = pd.DataFrame({"a": ["1", "long enough value for a chunk"], "source_file": "f.csv"})
+        assert rag.prepare_file_chunks(df)["text"].tolist() == ["a long enough value for a chunk"]
+
+    def test_empty_frame(self):
+        assert rag.prepare_file_chunks(pd.DataFrame()).empty
+
+
+class TestLoadAllData:
+    """Test streaming files into the chunk store"""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_files_are_streamed_to_the_store(self, data_dir, workers):
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', workers):
+            store = rag.load_all_data()
+
+        assert len(store) == 5
+        assert set(store.sources) == {"data_core.csv", "rainfall.csv"}
+        assert store.get(0) == ("crop type cotton fertilizer name 14 35 14", "data_core.csv")
+
+    def test_max_chunks_is_respected(self, data_dir):
+        with patch.object(rag, 'MAX_CHUNKS', 3), patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            store = rag.load_all_data()
+        assert len(store) == 3
+
+    def test_no_data_raises(self, rag_workdir):
+        with patch.object(rag, 'load_cached_weather_data', return_value=[]), \
+             patch.object(rag, 'load_weather_data_from_backend', return_value=[]):
+            with pytest.raises(ValueError):
+                rag.load_all_data()
+
+    def test_engine_builds_index_from_streamed_store(self, data_dir, fake_embedder):
+        engine = rag.RagEngine(model_name="fake")
+        engine.embedder = fake_embedder
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            engine.load()
+        assert engine.index.ntotal == len(engine.chunks) == 5
+        assert engine.meta["total_chunks"] == 5
+        assert not os.path.exists(rag.BUILD_DIR)
+
+
+class TestResumableBuild:
+    """Test that an interrupted build resumes from its checkpoint"""
+
+    def test_finished_files_are_not_parsed_again(self, data_dir):
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            rag.load_all_data()
+            with patch.object(rag, 'write_file_shard', wraps=rag.write_file_shard) as write_file_shard:
+                store = rag.load_all_data()
+        write_file_shard.assert_not_called()
+        assert len(store) == 5
+
+    def test_changed_file_is_parsed_again(self, data_dir):
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            rag.load_all_data()
+            pd.DataFrame({"Crop Type": ["Wheat"], "Fertilizer Name": ["DAP"]}).to_csv("data_core.csv", index=False)
+            with patch.object(rag, 'write_file_shard', wraps=rag.write_file_shard) as write_file_shard:
+                store = rag.load_all_data()
+        assert [call.args[0].name for call in write_file_shard.call_args_list] == ["data_core.csv"]
+        assert len(store) == 4
+
+    def test_unreadable_file_is_reported(self, data_dir, capsys):
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', 1), \
+             patch.object(rag, 'iter_file_frames', side_effect=[ValueError("bad header"), iter([])]):
+            rag.build_file_shards([rag.Path("data_core.csv"), rag.Path("rainfall.csv")])
+        assert "Could not read data_core.csv, leaving it out of the index: bad header" in capsys.readouterr().out
+        assert list(rag.read_build_checkpoint()["files"]) == ["rainfall.csv"]
+
+    def test_large_files_are_read_in_batches(self, data_dir):
+        frames = list(rag.iter_file_frames(rag.Path("rainfall.csv"), chunk_rows=2))
+        assert [len(df) for df in frames] == [2, 1]
+        assert (frames[1]["source_file"] == "rainfall.csv").all()
+
+    def test_streamed_index_matches_in_memory_build(self, data_dir, fake_embedder):
+        with patch.object(rag.config, 'RAG_INGEST_WORKERS', 1), patch.object(rag.config, 'RAG_BUILD_BATCH_SIZE', 2):
+            store = rag.load_all_data()
+            streamed = rag.build_index_from_store(store, fake_embedder, "fake")
+        texts = list(store.texts())
+        in_memory = rag.build_faiss_index_safe(texts, fake_embedder, "fake")
+
+        query = fake_embedder.encode(["rainfall in ludhiana punjab"])
+        assert streamed.ntotal == in_memory.ntotal == 5
+        assert list(streamed.search(query, 3)[1][0]) == list(in_memory.search(query, 3)[1][0])
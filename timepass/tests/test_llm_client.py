@@ -0,0 +1,252 @@
+"""
+Tests for the shared LLM client
+"""
+
+import asyncio
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from rag.llm_client import LLMClient, TokenBucket, is_rate_limited, retry_after
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = Mock(headers={"retry-after": retry_after} if retry_after else {})
+
+
+class SlowChat:
+    """Chat model that answers after a delay and tracks concurrent calls"""
+
+    def __init__(self, delay=0.05, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def ainvoke(self, prompt):
+        self.calls.append(prompt)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise RateLimitError()
+            return Mock(content=f" answer to {prompt} ")
+        finally:
+            self.active -= 1
+
+    async def astream(self, prompt):
+        self.calls.append(prompt)
+        for word in ["answer ", "to ", prompt]:
+            await asyncio.sleep(self.delay)
+            yield Mock(content=word)
+
+
+@pytest.fixture
+def client_for():
+    clients = []
+
+    def make(chat, **kwargs):
+        kwargs = {"max_concurrency": 4, "rate": 1000, "burst": 1000, "max_retries": 2, **kwargs}
+        client = LLMClient(lambda model, temperature: chat, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+class TestLLMClient:
+    """Test coalescing, the concurrency limit and 429 retries"""
+
+    def test_identical_prompts_share_one_call(self, client_for):
+        chat = SlowChat(delay=0.2)
+        client = client_for(chat)
+        with ThreadPoolExecutor(8) as pool:
+            answers = list(pool.map(lambda _: client.invoke("crops for kannur"), range(8)))
+
+        assert answers == ["answer to crops for kannur"] * 8
+        assert len(chat.calls) == 1
+        assert client.get_stats()["coalesced"] == 7
+
+    def test_finished_prompts_are_not_coalesced(self, client_for):
+        chat = SlowChat(delay=0)
+        client = client_for(chat)
+        client.invoke("crops for kannur")
+        client.invoke("crops for kannur")
+        assert len(chat.calls) == 2
+
+    def test_temperature_is_part_of_the_key(self, client_for):
+        chat = SlowChat(delay=0.1)
+        client = client_for(chat)
+        first = client.submit("crops for kannur", temperature=0.0)
+        second = client.submit("crops for kannur", temperature=0.1)
+        first.result(), second.result()
+        assert len(chat.calls) == 2
+
+    def test_concurrency_limit(self, client_for):
+        chat = SlowChat(delay=0.05)
+        client = client_for(chat, max_concurrency=2)
+        futures = [client.submit(f"question {i}") for i in range(6)]
+        assert [future.result() for future in futures] == [f"answer to question {i}" for i in range(6)]
+        assert chat.peak == 2
+
+    def test_retries_after_rate_limit(self, client_for):
+        chat = SlowChat(delay=0, failures=2)
+        client = client_for(chat, rate=100, burst=1)
+        assert client.invoke("urea dose") == "answer to urea dose"
+
+        stats = client.get_stats()
+        assert stats["rate_limited"] == 2
+        assert stats["upstream_calls"] == 3
+        assert stats["rate_per_second"] < 100
+
+    def test_gives_up_after_max_retries(self, client_for):
+        chat = SlowChat(delay=0, failures=5)
+        client = client_for(chat, rate=100, burst=1, max_retries=1)
+        with pytest.raises(RateLimitError):
+            client.invoke("urea dose")
+        assert len(chat.calls) == 2
+        assert client.get_stats()["errors"] == 1
+
+    def test_other_errors_are_not_retried(self, client_for):
+        chat = Mock()
+        chat.ainvoke.side_effect = ValueError("bad request")
+        client = client_for(chat)
+        with pytest.raises(ValueError):
+            client.invoke("urea dose")
+        assert chat.ainvoke.call_count == 1
+
+    def test_ainvoke_does_not_block_the_callers_loop(self, client_for):
+        client = client_for(SlowChat(delay=0.2))
+
+        async def handler():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            answer = await client.ainvoke("paddy humidity")
+            task.cancel()
+            return answer, ticks
+
+        answer, ticks = asyncio.run(handler())
+        assert answer == "answer to paddy humidity"
+        assert ticks >= 5
+
+    def test_models_are_created_once(self, client_for):
+        created = []
+        chat = SlowChat(delay=0)
+        client = client_for(chat)
+        client.llm_factory = lambda model, temperature: created.append((model, temperature)) or chat
+        for _ in range(3):
+            client.invoke("urea dose", model="gpt-4o-mini", temperature=0.1)
+        assert created == [("gpt-4o-mini", 0.1)]
+
+    def test_tokens_are_streamed(self, client_for):
+        chat = SlowChat(delay=0.01)
+        client = client_for(chat)
+        tokens = []
+        assert client.invoke("urea dose", on_token=tokens.append) == "answer to urea dose"
+        assert tokens == ["answer ", "to ", "urea dose"]
+
+    def test_coalesced_listener_gets_earlier_tokens(self, client_for):
+        chat = SlowChat(delay=0.1)
+        client = client_for(chat)
+        first_tokens, second_tokens = [], []
+        first = client.submit("urea dose", on_token=first_tokens.append)
+        time.sleep(0.15)
+        second = client.submit("urea dose", on_token=second_tokens.append)
+        assert first.result() == second.result() == "answer to urea dose"
+        assert len(chat.calls) == 1
+        assert first_tokens == second_tokens == ["answer ", "to ", "urea dose"]
+
+    def test_listener_on_plain_call_gets_whole_answer(self, client_for):
+        chat = SlowChat(delay=0.1)
+        client = client_for(chat)
+        tokens = []
+        first = client.submit("urea dose")
+        time.sleep(0.02)
+        client.invoke("urea dose", on_token=tokens.append)
+        assert first.result() == "answer to urea dose"
+        assert tokens == ["answer to urea dose"]
+
+    def test_close_and_reuse(self, client_for):
+        client = client_for(SlowChat(delay=0))
+        client.invoke("urea dose")
+        client.close()
+        assert client.invoke("urea dose") == "answer to urea dose"
+
+
+    def test_close_cancels_waiting_callers(self):
+        chat = SlowChat(delay=5)
+        models = []
+        client = LLMClient(lambda model, temperature: models.append(chat) or chat, rate=0)
+        future = client.submit("urea dose")
+        time.sleep(0.05)
+        started = time.monotonic()
+        client.close()
+        with pytest.raises(CancelledError):
+            future.result(timeout=1)
+        assert time.monotonic() - started < 2
+        assert client.get_stats()["in_flight"] == 0
+
+        client.llm_factory = lambda model, temperature: models.append(SlowChat(delay=0)) or models[-1]
+        assert client.invoke("urea dose") == "answer to urea dose"
+        assert len(models) == 2
+        client.close()
+
+
+class TestTokenBucket:
+    """Test the 429 backoff behaviour of the rate limiter"""
+
+    def test_throttle_halves_rate_and_empties_bucket(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        assert bucket.delay() == 0
+        bucket.throttle()
+        assert bucket.rate == 5
+        assert bucket.delay() == pytest.approx(0.2, abs=0.01)
+
+    def test_retry_after_is_honoured(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.throttle(wait=3)
+        assert bucket.delay() == pytest.approx(3, abs=0.01)
+
+    def test_recovers_to_max_rate(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.throttle()
+        for _ in range(20):
+            bucket.recover()
+        assert bucket.rate == 10
+
+    def test_zero_rate_is_unlimited_until_a_429(self):
+        bucket = TokenBucket(rate=0, capacity=5)
+        for _ in range(100):
+            asyncio.run(bucket.acquire())
+        assert bucket.delay() == 0
+        bucket.throttle()
+        assert bucket.rate == 2.5
+        assert bucket.delay() > 0
+        for _ in range(20):
+            bucket.recover()
+        assert not bucket.limited
+        assert bucket.delay() == 0
+
+    def test_rate_limit_detection(self):
+        assert is_rate_limited(RateLimitError())
+        assert not is_rate_limited(ValueError())
+        assert retry_after(RateLimitError(retry_after="2")) == 2.0
+        assert retry_after(RateLimitError()) is None
@@ -0,0 +1,109 @@
+"""
+Tests for the location posting index and location-filtered search
+"""
+
+import numpy as np
+import pytest
+
+from rag import current as rag
+from rag.chunk_store import ChunkStore
+from rag.index_factory import build_id_index, search_ids
+from rag.location_index import LocationIndex, clean_location_names, write_location_names
+from tests.conftest import SAMPLE_CHUNKS, WEATHER, random_vectors
+
+NAMES = {"kerala", "kannur", "punjab", "ludhiana", "delhi", "uttar pradesh"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    texts, sources = zip(*SAMPLE_CHUNKS)
+    return ChunkStore.write(str(tmp_path / "store"), list(texts), list(sources))
+
+
+class TestLocationIndex:
+    """Test name matching and posting lists"""
+
+    def test_clean_location_names(self):
+        assert clean_location_names(["Uttar Pradesh", "  Kannur ", "12", "Ab", None]) == {"uttar pradesh", "kannur"}
+
+    def test_match_prefers_longest_name(self):
+        locations = LocationIndex({"uttar pradesh": np.array([1]), "pradesh": np.array([2])})
+        assert locations.match("Rainfall in Uttar Pradesh today") == ["uttar pradesh"]
+
+    def test_build_uses_text_and_source_names(self, store):
+        locations = LocationIndex.build(NAMES, store)
+        assert list(locations.postings["kannur"]) == [0]
+        assert list(locations.postings["delhi"]) == [4]
+        assert "uttar pradesh" not in locations.postings
+
+    def test_candidates_intersect_named_places(self, store):
+        locations = LocationIndex.build(NAMES, store)
+        assert list(locations.candidates("Kannur, Kerala")) == [0]
+        assert list(locations.candidates(None, "rain in ludhiana")) == [1]
+        assert len(locations.candidates("Mars")) == 0
+
+    def test_save_and_load(self, store, tmp_path):
+        path = str(tmp_path / "locations.npz")
+        LocationIndex.build(NAMES, store).save(path)
+        locations = LocationIndex.load(path)
+        assert list(locations.candidates("punjab")) == [1]
+        assert LocationIndex.load(str(tmp_path / "missing.npz")) is None
+
+    def test_add_retain_and_remap(self, store):
+        locations = LocationIndex.build(NAMES, store)
+        locations.add(6, "weather for pune", "weather_data_Pune_20250101.txt", names=["Pune"])
+        assert list(locations.candidates("Pune")) == [6]
+
+        locations.retain(np.array([1, 4, 6]))
+        assert len(locations.candidates("kannur")) == 0
+        locations.remap(np.array([1, 4, 6]))
+        assert list(locations.candidates("pune")) == [2]
+        assert list(locations.candidates("delhi")) == [1]
+
+
+class TestSearchIds:
+    """Test that filtered search only returns candidate ids"""
+
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_pq"])
+    def test_results_come_from_candidates(self, index_type):
+        vectors = random_vectors(400)
+        params = {"index_type": index_type, "nlist": 4, "pq_m": 8, "pq_bits": 4}
+        index = build_id_index(vectors, params=params)
+        candidates = np.array([5, 17, 250])
+
+        _, ids = search_ids(index, vectors[17:18], candidates, 2)
+        assert set(ids[0]) <= set(candidates)
+        assert ids[0][0] == 17
+
+
+class TestEngineLocations:
+    """Test that the engine builds and maintains the location index"""
+
+    @pytest.fixture
+    def located_engine(self, rag_workdir, fake_embedder, engine):
+        write_location_names(rag.CHUNK_STORE_DIR, NAMES)
+        return engine
+
+    def test_location_index_is_built_on_load(self, located_engine):
+        located_engine.load()
+        assert list(located_engine.locations.candidates("Kannur")) == [0]
+
+    def test_location_rows_outside_global_top_k_are_found(self, located_engine):
+        located_engine.load()
+        query = "crop type cotton rainfall"
+        global_ids, _ = rag.faiss_search(query, located_engine.embedder, located_engine.index, top_k=1)
+        local_ids, _ = rag.location_search(query, located_engine.embedder, located_engine.index,
+                                           located_engine.locations.candidates("Kannur"), top_k=1)
+        assert list(global_ids) != [0]
+        assert list(local_ids) == [0]
+
+    def test_weather_updates_keep_postings_in_sync(self, located_engine):
+        located_engine.load()
+        rag.add_weather_data_to_existing_index(WEATHER, "Pune, India")
+        located_engine.load()
+        (new_id,) = located_engine.locations.candidates("Pune")
+        assert located_engine.chunks.source(int(new_id)) == rag.weather_source_name("Pune, India")
+
+        rag.expire_weather_chunks(max_age_days=-1)
+        located_engine.load()
+        assert len(located_engine.locations.candidates("Pune")) == 0
@@ -0,0 +1,167 @@
+"""
+Tests for the compiled prompt registry
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+from langchain.prompts import ChatPromptTemplate
+
+from rag import current as rag
+from rag.prompts import PROMPT_TEMPLATES, PromptRegistry, weather_context, weather_slots
+
+WEATHER = {"temperature": 31, "humidity": 72, "moisture": 40, "wind_speed": 2.1, "precip_mm": 0.0}
+
+
+class TestPromptRegistry:
+    """Test compiling once and filling slots per request"""
+
+    def test_every_prompt_is_compiled(self):
+        registry = PromptRegistry()
+        assert set(registry.templates) == set(PROMPT_TEMPLATES)
+        assert registry.get("repl").input_variables == ["context", "examples", "query"]
+
+    def test_format_fills_slots_and_ignores_unused_values(self):
+        prompt = PromptRegistry().format("weather_unavailable", location="Kannur", query="rain?", context="unused")
+        assert "Weather data is not available for Kannur" in prompt
+        assert "rain?" in prompt
+
+    def test_filled_values_are_not_parsed_as_slots(self):
+        prompt = PromptRegistry().format("repl", examples="", context="{not a slot}", query="q")
+        assert "{not a slot}" in prompt
+
+    def test_sizes(self):
+        sizes = PromptRegistry().sizes()
+        assert sizes["seed_variety"]["chars"] > sizes["weather_unavailable"]["chars"]
+        assert "temperature" in sizes["crop_recommendation"]["variables"]
+
+    def test_weather_context(self):
+        assert "Temperature: 31°C" in weather_context("Kannur", WEATHER)
+        assert "No current weather data available for Kannur" in weather_context("Kannur", None)
+        assert weather_slots(None)["humidity"] == "N/A"
+
+
+def baseline_prompts(location, weather, detected_language, tomorrow_temp):
+    """Prompts as the per-query f-strings built them before the registry, for the same values"""
+    weather_context = f"""
+**Current Weather in {location}:**
+- Temperature: {weather.get('temperature', 'N/A')}°C
+- Humidity: {weather.get('humidity', 'N/A')}%
+- Soil Moisture: {weather.get('moisture', 'N/A')}%
+- Wind Speed: {weather.get('wind_speed', 'N/A')} m/s
+- Rainfall: {weather.get('precip_mm', 'N/A')} mm
+"""
+    return {
+        "tomorrow_temperature": f"""
+Answer this weather question directly and briefly. Only provide the temperature information requested.
+
+Question: {{query}}
+
+Tomorrow's temperature in {location}: {tomorrow_temp}°C
+
+Keep the response short and only mention the temperature. Do not provide farming advice or other weather details unless specifically asked.""",
+        "weather_unavailable": f"""
+Weather data is not available for {location} at this time. Please try again later.
+
+Question: {{query}}""",
+        "simple_weather": f"""
+IMPORTANT: ALWAYS start your response with current weather data for {location}:
+
+{weather_context}
+
+Then give a simple, direct answer for the SPECIFIC LOCATION requested.
+
+Location requested: {location or 'Not specified'}
+Original query language: {detected_language}
+
+Context:
+{{context}}
+
+English Query: {{query}}
+
+IMPORTANT: 
+1. ALWAYS show current weather data first
+2. Only use weather data that matches the requested location "{location}"
+3. If no data for "{location}" is found, say "Weather data not available for {location}"
+4. Keep it simple and direct
+
+Answer format: 
+**Current Weather in {location}:**
+[Show current weather data]
+
+**Forecast:**
+[Answer the specific question]""",
+        "general_weather": f"""
+Provide current weather information for {location}.
+
+**Current Weather in {location}:**
+- Temperature: {weather.get('temperature', 'N/A')}°C
+- Humidity: {weather.get('humidity', 'N/A')}%
+- Soil Moisture: {weather.get('moisture', 'N/A')}%
+- Wind Speed: {weather.get('wind_speed', 'N/A')} m/s
+- Rainfall: {weather.get('precip_mm', 'N/A')} mm
+- Description: {weather.get('description', 'N/A')}
+
+Answer the weather question directly based on the current conditions above.
+
+Question: {{query}}""",
+        "detailed": f"""
+You are an expert Agriculture and Weather assistant. Answer the user's question directly and specifically.
+
+{weather_context}
+
+CRITICAL INSTRUCTIONS:
+1. Read the question carefully and answer EXACTLY what is being asked
+2. Do NOT provide generic farming advice unless specifically requested
+3. For specific crop questions (like "is wheat good for this weather"): Give a direct YES/NO answer with brief reasoning
+4. For weather questions: Provide the specific weather information requested
+5. For crop recommendation questions: List suitable crops
+6. Keep responses focused and relevant to the specific question
+
+Question: {{query}}
+Location: {location or 'Not specified'}
+
+Available context: {{context}}
+
+Answer the question directly and specifically. Do not add unnecessary information.""",
+    }
+
+
+class TestBaselinePrompts:
+    """Test that the compiled prompts render exactly as the per-query f-strings did"""
+
+    @pytest.mark.parametrize("name", ["tomorrow_temperature", "weather_unavailable", "simple_weather",
+                                      "general_weather", "detailed"])
+    def test_rendering_matches_baseline(self, name):
+        values = {"context": "- paddy grows best between 20 c and 35 c (source: crops.csv)",
+                  "query": "is paddy good for this weather", "location": "Kannur", "location_label": "Kannur",
+                  "detected_language": "English", "tomorrow_temp": 29,
+                  "weather_context": weather_context("Kannur", WEATHER), **weather_slots(WEATHER)}
+        expected = ChatPromptTemplate.from_template(
+            baseline_prompts("Kannur", WEATHER, "English", 29)[name]).format(context=values["context"],
+                                                                             query=values["query"])
+        assert PromptRegistry().format(name, **values) == expected
+
+    def test_templates_are_not_indented(self):
+        for name, text in PROMPT_TEMPLATES.items():
+            assert not any(line.startswith("    ") and line.strip() for line in text.splitlines()), name
+
+
+class TestEnginePrompts:
+    """Test that queries reuse the engine's compiled prompts"""
+
+    def test_no_templates_are_parsed_per_query(self, engine, fake_llm):
+        fake_llm.ainvoke.return_value = Mock(content="Grow cotton.")
+        with patch('langchain_core.prompts.ChatPromptTemplate.from_template') as from_template:
+            response = engine.process_query("suitable crops for black soil", location="Kannur", weather_data=WEATHER)
+
+        from_template.assert_not_called()
+        prompt = fake_llm.ainvoke.call_args.args[0]
+        assert "**Current Weather in Kannur:**" in prompt
+        assert "Humidity: 72%" in prompt
+        assert response["answer"] == "Grow cotton."
+
+    def test_status_reports_prompt_sizes(self, engine):
+        with patch.object(rag, 'get_rag_engine', return_value=engine):
+            status = rag.get_rag_status()
+        assert status["prompts"]["detailed"]["chars"] > 0
@@ -0,0 +1,88 @@
+"""
+Tests for the canonical query cache used by faiss_search
+"""
+
+import numpy as np
+
+from rag import current as rag
+from rag.query_cache import QueryCache, canonicalize_query, index_version
+from rag.index_factory import build_index
+
+
+class TestCanonicalize:
+    """Test query canonicalization"""
+
+    def test_punctuation_case_and_spacing(self):
+        assert canonicalize_query("  Weather   TOMORROW?? ") == "weather tomorrow"
+
+    def test_rice_is_paddy_as_whole_word(self):
+        assert canonicalize_query("Rice yield") == "paddy yield"
+        assert canonicalize_query("price of wheat") == "price of wheat"
+
+    def test_empty(self):
+        assert canonicalize_query("") == ""
+
+
+class TestQueryCache:
+    """Test LRU behaviour, invalidation and persistence"""
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_size=2)
+        for key in ["a", "b", "c"]:
+            cache.put_embedding(key, np.ones(4))
+        assert cache.get_embedding("a") is None
+        assert cache.get_embedding("c") is not None
+
+    def test_version_change_drops_results_only(self):
+        cache = QueryCache()
+        cache.set_version("v1")
+        cache.put_embedding("q", np.ones(4))
+        cache.put_results("q", 5, np.array([1, 2]), np.array([0.9, 0.8]))
+        cache.set_version("v2")
+        assert cache.get_results("q", 5) is None
+        assert cache.get_embedding("q") is not None
+
+    def test_hit_ratio(self):
+        cache = QueryCache()
+        cache.put_results("q", 5, np.array([1]), np.array([0.5]))
+        cache.get_results("q", 5)
+        cache.get_results("other", 5)
+        assert cache.hit_ratio() == 0.5
+        assert cache.get_stats()["results_cached"] == 1
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / "query_cache.pkl")
+        cache = QueryCache(path=path, model_name="m")
+        cache.set_version("v1")
+        cache.put_embedding("q", np.ones(4))
+        cache.put_results("q", 5, np.array([3]), np.array([0.7]))
+        cache.save()
+
+        restored = QueryCache(path=path, model_name="m")
+        assert restored.get_embedding("q") is not None
+        restored.set_version("v1")
+        assert restored.get_results("q", 5)[0][0] == 3
+
+        other_model = QueryCache(path=path, model_name="other")
+        assert other_model.get_embedding("q") is None
+
+    def test_index_version_tracks_meta(self):
+        assert index_version({"created_at": "a"}, 10) == index_version({"created_at": "a"}, 10)
+        assert index_version({"created_at": "a"}, 10) != index_version({"created_at": "b"}, 10)
+
+
+class TestCachedSearch:
+    """Test that repeated queries skip encoding and search"""
+
+    def test_repeat_query_skips_encode(self, fake_embedder):
+        vectors = fake_embedder.encode(["paddy yield in kerala", "wheat yield in punjab"])
+        index = build_index(vectors, {"index_type": "flat"})
+        cache = QueryCache()
+
+        first = rag.faiss_search("Rice yield in Kerala?", fake_embedder, index, top_k=2, cache=cache)
+        second = rag.faiss_search("rice   yield in kerala", fake_embedder, index, top_k=2, cache=cache)
+
+        assert fake_embedder.encode_calls == 2  # corpus + first query only
+        assert list(first[0]) == list(second[0])
+        assert first[0][0] == 0
+        assert cache.get_stats()["result_hits"] == 1
@@ -0,0 +1,64 @@
+"""
+Tests for the shared query keyword matcher
+"""
+
+import random
+
+import pytest
+
+from src.query_features import KEYWORD_GROUPS, QUERY_MATCHER, KeywordMatcher, query_features
+from src.timeline_extractor import TimelineExtractor
+
+
+class TestKeywordMatcher:
+    """Test that one pass finds exactly the phrases a substring check would"""
+
+    def test_overlapping_and_nested_phrases(self):
+        matcher = KeywordMatcher(["he", "she", "his", "hers", "crop", "crops"])
+        assert matcher.find("USHERS grow crops") == {"he", "she", "hers", "crop", "crops"}
+
+    def test_matches_substring_checks(self):
+        phrases = sorted(QUERY_MATCHER.phrases)
+        rng = random.Random(0)
+        for _ in range(500):
+            text = " ".join(rng.choice(phrases + ["the", "x", "tomorrowweather"]) for _ in range(rng.randint(0, 6)))
+            assert QUERY_MATCHER.find(text) == {phrase for phrase in phrases if phrase in text.lower()}
+
+    def test_empty_text(self):
+        assert QUERY_MATCHER.find("") == frozenset()
+        assert QUERY_MATCHER.find(None) == frozenset()
+
+
+class TestQueryFeatures:
+    """Test group checks used by the routers"""
+
+    @pytest.mark.parametrize("query, group, expected", [
+        ("Will it rain in Pune?", "api_weather", True),
+        ("Best fertilizer for wheat", "api_weather", False),
+        ("Which seeds suit unpredictable weather", "seed_variety", True),
+        ("Is wheat good for this weather", "specific_crop_names", True),
+        ("How is the weather for my farm", "general_weather_exclusions", True),
+    ])
+    def test_has(self, query, group, expected):
+        assert query_features(query).has(group) is expected
+
+    def test_repeated_queries_are_scanned_once(self):
+        query_features.cache_clear()
+        query_features("weather tomorrow in kannur")
+        query_features("weather tomorrow in kannur")
+        assert query_features.cache_info().hits == 1
+
+    def test_every_group_is_compiled(self):
+        assert all(set(phrases) <= QUERY_MATCHER.phrases for phrases in KEYWORD_GROUPS.values())
+
+
+class TestRouters:
+    """Test routers that consult the feature set"""
+
+    @pytest.mark.parametrize("query, expected", [
+        ("which crop to plant this season", True),
+        ("weather forecast for next days", False),
+        ("farming weather update", False),
+    ])
+    def test_timeline_agricultural_query(self, query, expected):
+        assert TimelineExtractor()._is_agricultural_query(query) is expected
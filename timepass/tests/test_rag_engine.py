@@ -0,0 +1,97 @@
+"""
+Tests for the resident RAG engine in rag/current.py
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rag import current as rag
+from tests.conftest import SAMPLE_CHUNKS
+
+
+class TestRagEngine:
+    """Test that the engine keeps its state resident between queries"""
+
+    def test_load_is_done_once(self, engine):
+        with patch.object(rag, 'load_index', wraps=rag.load_index) as load_index:
+            engine.load()
+            engine.load()
+        assert load_index.call_count == 1
+        assert engine.is_loaded
+        assert engine.index.ntotal == len(SAMPLE_CHUNKS)
+
+    def test_queries_reuse_loaded_state(self, engine, fake_llm):
+        fake_llm.ainvoke.return_value = Mock(content="Cotton suits black soil.")
+        with patch.object(rag, 'load_index', wraps=rag.load_index) as load_index, \
+             patch.object(rag, 'load_embedder') as load_embedder:
+            first = engine.process_query("fertilizer for cotton on black soil")
+            second = engine.process_query("fertilizer for maize on sandy soil")
+
+        assert load_index.call_count == 1
+        load_embedder.assert_not_called()
+        assert first["answer"] == "Cotton suits black soil."
+        assert second["source"] == "RAG System"
+        assert "data_core.csv" in first["context_sources"]
+
+    def test_streams_sources_and_tokens(self, engine, fake_llm):
+        async def astream(prompt):
+            for text in ["Use ", "urea."]:
+                yield Mock(content=text)
+        fake_llm.astream = astream
+        events = []
+        response = engine.process_query("fertilizer for maize on sandy soil",
+                                        on_event=lambda name, data: events.append((name, data)))
+
+        assert events[0][0] == "sources"
+        assert "data_core.csv" in [source["source"] for source in events[0][1]["sources"]]
+        assert [data["text"] for name, data in events[1:]] == ["Use ", "urea."]
+        assert response["answer"] == "Use urea."
+
+    def test_reset_forces_reload(self, engine):
+        engine.load()
+        engine.reset()
+        assert not engine.is_loaded
+        engine.load()
+        assert engine.is_loaded
+
+    def test_get_rag_engine_is_singleton(self):
+        assert rag.get_rag_engine() is rag.get_rag_engine()
+
+
+class TestBatchSearch:
+    """Test batched retrieval across many queries"""
+
+    def test_matches_single_query_search(self, engine):
+        engine.load()
+        queries = ["fertilizer for cotton on black soil", "rainfall in kannur kerala", "paddy humidity"]
+        batched = rag.batch_search(queries, engine.embedder, engine.index, top_k=3)
+        for query, (indices, scores) in zip(queries, batched):
+            single_indices, single_scores = rag.faiss_search(query, engine.embedder, engine.index, top_k=3)
+            assert list(indices) == list(single_indices)
+            assert scores == pytest.approx(single_scores)
+
+    def test_one_encode_for_all_queries(self, engine, fake_embedder):
+        engine.load()
+        fake_embedder.encode_calls = 0
+        results = engine.batch_search(["cotton black soil", "Cotton, black soil!", "maize urea", ""], top_k=2)
+
+        assert fake_embedder.encode_calls == 1
+        assert list(results[0][0]) == list(results[1][0])
+        assert len(results[3][0]) == 0
+
+    def test_cached_queries_skip_encoding(self, engine, fake_embedder):
+        engine.batch_search(["cotton black soil", "maize urea"], top_k=2)
+        fake_embedder.encode_calls = 0
+        engine.batch_search(["maize urea", "cotton black soil"], top_k=2)
+        assert fake_embedder.encode_calls == 0
+
+    def test_process_rag_queries_batches_retrieval(self, engine, fake_embedder, fake_llm):
+        fake_llm.ainvoke.return_value = Mock(content="Use urea.")
+        with patch.object(rag, 'get_rag_engine', return_value=engine):
+            engine.load()
+            fake_embedder.encode_calls = 0
+            responses = rag.process_rag_queries(["fertilizer for maize", "fertilizer for cotton"])
+
+        assert fake_embedder.encode_calls == 1
+        assert [response["answer"] for response in responses] == ["Use urea.", "Use urea."]
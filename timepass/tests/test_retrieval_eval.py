@@ -0,0 +1,55 @@
+"""
+Tests for the offline retrieval evaluation
+"""
+
+from rag.retrieval_eval import (evaluate, is_relevant, load_labelled_queries, rank_metrics, seed_from_few_shots,
+                                _words)
+
+LABELS = [
+    {"query": "fertilizer for cotton on black soil", "all": ["cotton", "black"], "source": "data_core"},
+    {"query": "urea for maize on sandy soil", "all": ["maize"], "any": ["urea", "dap"]},
+    {"query": "rainfall in bhopal", "all": ["bhopal"]},
+]
+
+
+class TestLabels:
+    """Test the labelled query set and relevance matching"""
+
+    def test_seeded_from_few_shots(self):
+        seeded = {label["query"]: label["all"] for label in seed_from_few_shots()}
+        assert seeded["Which crop has the highest yield in Karnataka?"] == ["karnataka"]
+        assert seeded["What is the average A2+FL for Arhar?"] == ["arhar"]
+        assert "What was the total rainfall in the first two days of July 2023?" not in seeded
+
+    def test_bundled_queries_load(self):
+        labels = load_labelled_queries()
+        assert any(label["origin"] == "few_shots" for label in labels)
+        assert all(label.get("all") or label.get("any") for label in labels)
+
+    def test_whole_word_matching(self):
+        label = {"query": "rice", "all": ["rice"]}
+        assert is_relevant(label, _words("crop: rice | state: punjab"), "crops.csv")
+        assert not is_relevant(label, _words("market price: 1200"), "crops.csv")
+        assert not is_relevant({**label, "source": "data_core"}, _words("crop: rice"), "crops.csv")
+
+    def test_rank_metrics(self):
+        metrics = rank_metrics([7, 3, 9, -1], {3, 9, 11}, k=3)
+        assert metrics["first_hit_rank"] == 2
+        assert metrics["reciprocal_rank"] == 0.5
+        assert round(metrics["recall"], 4) == 0.6667
+        assert rank_metrics([1, 2], {5}, k=2)["hit"] == 0.0
+
+
+class TestEvaluate:
+    """Test retrieval-only evaluation against the sample index"""
+
+    def test_report_per_config(self, engine):
+        report = evaluate(engine, LABELS, configs=[{"name": "served"}, {"name": "dense", "index_type": "flat",
+                                                                         "hybrid_weight": 0.0}], k=3)
+        assert report["run"]["scored_queries"] == 2
+        assert report["run"]["unmatched_queries"] == ["rainfall in bhopal"]
+        served, dense = report["results"]
+        assert served["recall_at_k"] == 1.0 and served["mrr"] == 1.0
+        assert dense["hybrid_weight"] == 0.0 and "build_seconds" in dense
+        assert set(served["search_ms"]) == {"p50", "p95", "p99"}
+        assert served["queries"][0]["first_hit_rank"] == 1
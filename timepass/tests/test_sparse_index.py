@@ -0,0 +1,104 @@
+"""
+Tests for the BM25 index and hybrid dense + BM25 retrieval
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from rag import current as rag
+from rag.chunk_store import ChunkStore
+from rag.index_factory import build_id_index
+from rag.sparse_index import SparseIndex, bm25_tokens
+from tests.conftest import SAMPLE_CHUNKS, WEATHER
+
+FERTILIZER_CHUNKS = [
+    "crop type cotton soil type black fertilizer name urea recommended for cotton on black soil",
+    "crop type cotton soil type red fertilizer name 14 35 14",
+    "crop type cotton soil type black fertilizer name 28 28 recommended for cotton",
+    "crop type paddy soil type clayey fertilizer name 10 26 26",
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore.write(str(tmp_path / "store"), FERTILIZER_CHUNKS, ["data_core.csv"] * len(FERTILIZER_CHUNKS))
+
+
+class TestSparseIndex:
+    """Test tokenization, scoring and updates"""
+
+    def test_number_runs_become_code_terms(self):
+        assert bm25_tokens("fertilizer 14 35 14 for 2025") == ["fertilizer", "14", "35", "14", "for", "2025", "14-35-14"]
+
+    def test_exact_code_ranks_first(self, store):
+        ids, scores = SparseIndex.build(store).search("which soil gets 14-35-14", 2)
+        assert ids[0] == 1
+        assert scores[0] > scores[1]
+
+    def test_unmatched_query_returns_nothing(self, store):
+        ids, _ = SparseIndex.build(store).search("monsoon", 3)
+        assert len(ids) == 0
+
+    def test_save_and_load(self, store, tmp_path):
+        path = str(tmp_path / "bm25.npz")
+        sparse = SparseIndex.build(store)
+        sparse.save(path)
+        loaded = SparseIndex.load(path)
+        assert np.allclose(loaded.scores("paddy 10 26 26"), sparse.scores("paddy 10 26 26"))
+
+    def test_add_retain_and_remap(self, store):
+        sparse = SparseIndex.build(store)
+        sparse.add(4, "weather for pune humidity 72")
+        assert list(sparse.search("pune", 3)[0]) == [4]
+
+        sparse.retain(np.array([2, 3, 4]))
+        assert len(sparse) == 3
+        assert len(sparse.search("14 35 14", 3)[0]) == 0
+        sparse.remap(np.array([2, 3, 4]))
+        assert list(sparse.search("pune", 3)[0]) == [2]
+        assert list(sparse.search("10-26-26", 1)[0]) == [1]
+
+
+class TestHybridSearch:
+    """Test fusion of dense and BM25 results"""
+
+    @pytest.fixture
+    def dense_index(self, fake_embedder):
+        return build_id_index(fake_embedder.encode(FERTILIZER_CHUNKS))
+
+    def test_exact_code_is_found_without_raising_top_k(self, store, dense_index, fake_embedder):
+        query = "fertilizer recommended for cotton on black soil 14-35-14"
+        dense_ids, _ = rag.faiss_search(query, fake_embedder, dense_index, top_k=1)
+        (ids, scores), = rag.hybrid_search([query], fake_embedder, dense_index, SparseIndex.build(store),
+                                           top_k=1, weight=0.6)
+        assert list(dense_ids) != [1]
+        assert list(ids) == [1]
+        assert 0 < scores[0] <= 1
+
+    def test_zero_weight_is_dense_only(self, store, dense_index, fake_embedder):
+        query = "fertilizer 14-35-14"
+        dense = rag.faiss_search(query, fake_embedder, dense_index, top_k=2)
+        (ids, scores), = rag.hybrid_search([query], fake_embedder, dense_index, SparseIndex.build(store),
+                                           top_k=2, weight=0)
+        assert list(ids) == list(dense[0])
+        assert np.allclose(scores, dense[1])
+
+
+class TestEngineSparseIndex:
+    """Test that the engine builds the BM25 index and keeps it in step with updates"""
+
+    def test_built_on_load_and_updated_with_weather(self, engine):
+        engine.load()
+        assert len(engine.sparse) == len(SAMPLE_CHUNKS)
+
+        rag.add_weather_data_to_existing_index(WEATHER, "Pune")
+        engine.load()
+        (new_id,), _ = engine.sparse.search("pune", 1)
+        assert engine.chunks.source(int(new_id)) == rag.weather_source_name("Pune")
+
+    def test_engine_batch_search_fuses_scores(self, engine):
+        with patch.object(rag.config, 'RAG_HYBRID_WEIGHT', 0.5):
+            (ids, _), = engine.batch_search(["fertilizer 14-35-14"], top_k=1)
+        assert engine.chunks.text(int(ids[0])) == SAMPLE_CHUNKS[2][0]
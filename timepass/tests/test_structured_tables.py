@@ -0,0 +1,109 @@
+"""
+Tests for answering structured table questions by aggregation
+"""
+
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rag import current as rag
+from rag.structured_tables import StructuredTable, StructuredTables, describe_result
+
+DATA_CORE = pd.DataFrame({
+    "Temparature": ["26", "34", "33", "30", "25", "27"],
+    "Nitrogen": ["37", "7", "9", "12", "40", ""],
+    "Phosphorous": ["0", "30", "34", "20", "0", "36"],
+    "Soil Type": ["Sandy", "Black", "Black", "Black", "Sandy", "Clayey"],
+    "Crop Type": ["Maize", "Cotton", "Cotton", "Cotton", "Maize", "Paddy"],
+    "Fertilizer Name": ["Urea", "14-35-14", "14-35-14", "DAP", "Urea", "DAP"],
+})
+
+
+@pytest.fixture
+def table():
+    return StructuredTable.from_frame("data_core.csv", DATA_CORE)
+
+
+class TestStructuredTable:
+    """Test column typing, group-by indexes and query aggregation"""
+
+    def test_columns_are_typed(self, table):
+        assert list(table.numeric) == ["Temparature", "Nitrogen", "Phosphorous"]
+        assert list(table.categorical) == ["Soil Type", "Crop Type", "Fertilizer Name"]
+        assert table.numeric["Nitrogen"].dtype == np.float32
+        assert np.isnan(table.numeric["Nitrogen"][5])
+        _, values = table.categorical["Crop Type"]
+        assert sorted(table.rows_for("Crop Type", values.index("Cotton")).tolist()) == [1, 2, 3]
+        assert StructuredTable.from_frame("names.csv", DATA_CORE[["Crop Type", "Fertilizer Name"]]) is None
+
+    def test_best_fertilizer_for_crop_and_soil(self, table):
+        result = table.answer("best fertilizer for cotton on black soil")
+        assert result["filters"] == {"Soil Type": ["Black"], "Crop Type": ["Cotton"]}
+        assert result["rows"] == 3
+        assert result["target"] == "Fertilizer Name"
+        best = result["distribution"][0]
+        assert (best["value"], best["rows"], best["rank"]) == ("14-35-14", 2, 1)
+        assert best["means"]["Nitrogen"] == 8.0
+        assert "14-35-14 in 67% of rows" in describe_result(result)
+
+    def test_npk_for_crop(self, table):
+        result = table.answer("NPK for maize")
+        assert result["rows"] == 2
+        assert result["numeric"]["Nitrogen"] == {"mean": 38.5, "min": 37.0, "max": 40.0}
+        # Rice is matched as paddy, and blank cells are left out of the statistics
+        assert table.answer("nitrogen for rice")["numeric"].get("Nitrogen") is None
+
+    def test_named_value_is_ranked_among_the_others(self, table):
+        result = table.answer("is DAP good for cotton")
+        assert result["rows"] == 1
+        assert [entry["value"] for entry in result["distribution"]] == ["14-35-14", "DAP"]
+        assert result["distribution"][1]["rank"] == 2
+
+    def test_passing_mentions_are_left_to_retrieval(self, table):
+        assert table.answer("maize yield in Punjab") is None
+        assert table.answer("weather in Delhi tomorrow") is None
+
+    def test_save_and_load(self, table, tmp_path):
+        tables = StructuredTables([table])
+        tables.save(str(tmp_path))
+        loaded = StructuredTables.load(str(tmp_path))
+        assert loaded.sizes() == {"data_core.csv": 6}
+        assert loaded.answer("fertilizer for cotton") == tables.answer("fertilizer for cotton")
+        assert StructuredTables.load(str(tmp_path / "missing")) is None
+
+
+class TestStructuredIngestion:
+    """Test that structured tables leave the chunk store and reach the engine"""
+
+    def test_tables_are_not_embedded(self, rag_workdir):
+        DATA_CORE.to_csv("data_core.csv", index=False)
+        pd.DataFrame({"State": ["Kerala"], "Avg_rainfall": ["0.0"]}).to_csv("rainfall.csv", index=False)
+        with patch.object(rag, 'load_cached_weather_data', return_value=[]), \
+             patch.object(rag, 'load_weather_data_from_backend', return_value=[]), \
+             patch.object(rag.config, 'RAG_INGEST_WORKERS', 1):
+            store = rag.load_all_data()
+
+        assert set(store.sources) == {"rainfall.csv"}
+        assert StructuredTables.load(rag.STRUCTURED_TABLES_DIR).names == ["data_core.csv"]
+
+    def test_direct_answer_skips_the_llm(self, engine, fake_llm, table):
+        engine.load()
+        engine.tables = StructuredTables([table])
+        with patch.object(rag.config, 'RAG_STRUCTURED_ANSWER', 'direct'):
+            response = engine.process_query("best fertilizer for cotton on black soil")
+        fake_llm.ainvoke.assert_not_called()
+        assert response["source"] == "Structured Table"
+        assert response["table_rows"] == 3
+        assert response["answer"].startswith("data_core.csv, 3 rows")
+
+    def test_aggregate_leads_the_prompt_context(self, engine, fake_llm, table):
+        fake_llm.ainvoke.return_value = Mock(content="Use 14-35-14.")
+        engine.load()
+        engine.tables = StructuredTables([table])
+        response = engine.process_query("best fertilizer for cotton on black soil")
+        prompt = str(fake_llm.ainvoke.call_args)
+        assert response["answer"] == "Use 14-35-14."
+        assert response["context_sources"][0] == "data_core.csv"
+        assert "14-35-14 in 67% of rows" in prompt
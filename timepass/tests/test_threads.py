@@ -0,0 +1,78 @@
+"""
+Tests for the per-workload thread budget
+"""
+
+import threading
+from functools import partial
+from unittest.mock import Mock, patch
+
+import faiss
+import numpy as np
+
+from rag import current as rag
+from rag import threads
+from rag.build_encoder import ProcessEncoder
+from rag.threads import build_threads, thread_budget, use_threads
+from tests.conftest import FakeEmbedder
+
+
+def budget_with(cpus=16, embed=0, search=0, build=0):
+    with patch.object(threads, 'available_cpus', return_value=cpus), \
+         patch.multiple(threads.config, RAG_EMBED_THREADS=embed, RAG_SEARCH_THREADS=search, RAG_BUILD_THREADS=build):
+        return thread_budget()
+
+
+class TestThreadBudget:
+    """Test resolving and applying thread counts"""
+
+    def test_automatic_budget(self):
+        assert budget_with(cpus=16) == {"embed": 4, "search": 1, "build": 16}
+        assert budget_with(cpus=2) == {"embed": 2, "search": 1, "build": 2}
+
+    def test_configured_budget_is_capped_by_cpus(self):
+        assert budget_with(cpus=8, embed=2, search=3, build=64) == {"embed": 2, "search": 3, "build": 8}
+
+    def test_build_threads_are_restored(self):
+        with patch.object(threads, 'thread_budget', return_value={"embed": 1, "search": 1, "build": 2}):
+            use_threads("search")
+            with build_threads() as count:
+                assert count == 2
+                assert faiss.omp_get_max_threads() == 2
+            assert faiss.omp_get_max_threads() == 1
+
+    def test_search_threads_are_per_calling_thread(self):
+        faiss.omp_set_num_threads(2)
+        with patch.object(threads, 'thread_budget', return_value={"embed": 1, "search": 1, "build": 2}):
+            worker = threading.Thread(target=use_threads, args=("search",))
+            worker.start()
+            worker.join()
+        assert faiss.omp_get_max_threads() == 2
+
+
+class TestBuildEncoder:
+    """Test that build encodes run outside the serving process"""
+
+    def test_process_encoder_matches_the_embedder(self):
+        texts = ["urea for cotton", "rain in kannur"]
+        with ProcessEncoder(partial(FakeEmbedder, 16)) as encoder:
+            assert encoder.get_sentence_embedding_dimension() == 16
+            vectors = encoder.encode(texts, normalize_embeddings=True)
+        np.testing.assert_allclose(vectors, FakeEmbedder(16).encode(texts))
+
+    def test_builds_encode_in_a_child_process(self):
+        engine = Mock(model_name="all-MiniLM-L6-v2")
+        with patch.object(rag.config, 'RAG_BUILD_ENCODER_PROCESS', 1), \
+             patch.object(rag, 'ProcessEncoder') as process_encoder:
+            with rag.build_encoder(engine) as encoder:
+                assert encoder is process_encoder.return_value.__enter__.return_value
+        loader = process_encoder.call_args[0][0]
+        assert loader.func is rag.load_embedder
+        assert loader.args == ("all-MiniLM-L6-v2",) and loader.keywords == {"threads": thread_budget()["build"]}
+        engine.get_embedder.assert_not_called()
+
+    def test_build_threads_leave_torch_alone(self):
+        torch = patch.dict("sys.modules", {"torch": Mock()})
+        with torch as modules, patch.object(threads, 'thread_budget', return_value={"embed": 1, "search": 1, "build": 2}):
+            with build_threads():
+                pass
+            modules["torch"].set_num_threads.assert_not_called()